@@ -0,0 +1,85 @@
+import json
+from typing import Any, Dict, List, Optional
+
+from parsers.valores import converte_valor, normalizar_coluna
+
+CAMPOS_VALOR = ("campo_a", "campo_b", "campo_c", "campo_d", "campo_e")
+
+# Colunas numéricas gravadas em comunicacoes: valor total e campos A a E (None = ausente/inválido)
+COLUNAS_VALOR = ("valor_total",) + CAMPOS_VALOR
+
+
+def valores_comunicacao(parsed: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Colunas numéricas de uma única comunicação (usado nas correções)"""
+    return {coluna: converte_valor(parsed.get(coluna)) for coluna in COLUNAS_VALOR}
+
+
+def valores_lote(parseds: List[Dict[str, Any]]) -> List[Dict[str, Optional[float]]]:
+    """Colunas numéricas de um lote de comunicações, convertidas coluna a coluna"""
+    colunas = [normalizar_coluna([parsed.get(coluna) for parsed in parseds]) for coluna in COLUNAS_VALOR]
+    return [dict(zip(COLUNAS_VALOR, linha)) for linha in zip(*colunas)]
+
+
+class AgregadosRIF:
+    """Totais de um upload, mantidos incrementalmente a cada comunicação adicionada ou corrigida.
+
+    Os valores são acumulados na mesma ordem em que o dashboard e as
+    estatísticas os somavam ao percorrer as comunicações.
+    """
+
+    __slots__ = ('total', 'volume_total', 'total_valor', 'bancos')
+
+    def __init__(self):
+        self.total = 0
+        self.volume_total = 0.0
+        self.total_valor = 0.0
+        self.bancos: Dict[str, Dict[str, Any]] = {}
+
+    def adicionar(self, banco: Optional[str], valores: Dict[str, Optional[float]], sinal: int = 1):
+        valor_total = valores.get("valor_total") or 0.0
+        self.total += sinal
+        for campo in CAMPOS_VALOR:
+            self.volume_total += sinal * (valores.get(campo) or 0.0)
+        self.total_valor += sinal * valor_total
+        banco = banco or "Não identificado"
+        if banco not in self.bancos:
+            self.bancos[banco] = {"count": 0, "valor_total": 0.0}
+        self.bancos[banco]["count"] += sinal
+        self.bancos[banco]["valor_total"] += sinal * valor_total
+        if self.bancos[banco]["count"] <= 0:
+            del self.bancos[banco]
+
+    def remover(self, banco: Optional[str], valores: Dict[str, Optional[float]]):
+        self.adicionar(banco, valores, sinal=-1)
+
+    def dashboard(self) -> Dict[str, Any]:
+        return {
+            "volume_total": self.volume_total,
+            "num_comunicacoes": self.total
+        }
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "total_comunicacoes": self.total,
+            "total_valor": self.total_valor,
+            "bancos": {banco: dict(valores) for banco, valores in self.bancos.items()},
+            "media_valor": self.total_valor / self.total if self.total > 0 else 0
+        }
+
+    def para_json(self) -> str:
+        return json.dumps({
+            "total": self.total,
+            "volume_total": self.volume_total,
+            "total_valor": self.total_valor,
+            "bancos": self.bancos
+        }, ensure_ascii=False)
+
+    @classmethod
+    def de_json(cls, texto: str) -> "AgregadosRIF":
+        dados = json.loads(texto)
+        agregados = cls()
+        agregados.total = dados["total"]
+        agregados.volume_total = dados["volume_total"]
+        agregados.total_valor = dados["total_valor"]
+        agregados.bancos = dados["bancos"]
+        return agregados
@@ -1,11 +1,41 @@
-import sqlite3
-from typing import Optional
-from ldap3 import Server, Connection, ALL, NTLM
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, Header, HTTPException, Query
+from ldap3 import Server, Connection, NONE, NTLM, SYNC
+
+logger = logging.getLogger(__name__)
 
 LDAP_DOMAIN = "pcrn.local"
 LDAP_URL = "ldap://10.9.0.4"
 LDAP_PORT = 389
 
+# Conexões LDAP mantidas abertas e reaproveitadas entre logins
+LDAP_POOL = int(os.environ.get("RIF_LDAP_POOL", "4"))
+LDAP_TIMEOUT = 5
+# Por quanto tempo um login bem-sucedido dispensa novo bind (0 desliga o cache)
+LDAP_CACHE_TTL = int(os.environ.get("RIF_LDAP_CACHE_TTL", "300"))
+LDAP_CACHE_MAX = 1000
+ITERACOES_HASH = 20000
+
+# Tokens de sessão assinados com HMAC. Sem RIF_SECRET_KEY, a chave é gerada no
+# primeiro uso e guardada em CAMINHO_CHAVE, onde os demais workers e os
+# reinícios a encontram
+SECRET_KEY = os.environ.get("RIF_SECRET_KEY", "").encode()
+CAMINHO_CHAVE = os.environ.get("RIF_SECRET_KEY_ARQUIVO", "backend/database/secret_key")
+SESSAO_TTL = int(os.environ.get("RIF_SESSAO_HORAS", "8")) * 3600
+# Com RIF_EXIGIR_TOKEN=1, as rotas recusam requisições sem token válido
+EXIGIR_TOKEN = os.environ.get("RIF_EXIGIR_TOKEN", "0") == "1"
+
 # Credenciais de teste para desenvolvimento
 TEST_USERS = {
     "admin": "admin123",
@@ -17,20 +47,240 @@ TEST_USERS = {
     "oscar": "oscar123"
 }
 
+
+class ConfiguracaoLDAP:
+    """Servidor e forma de bind; trocável para testes com a estratégia MOCK_SYNC do ldap3"""
+
+    def __init__(self, servidor: Optional[Server] = None, estrategia=SYNC, autenticacao=NTLM,
+                 formato_usuario: str = LDAP_DOMAIN + "\\{usuario}"):
+        # get_info=NONE: o login só precisa do bind, não do schema do diretório
+        self.servidor = servidor or Server(LDAP_URL, port=LDAP_PORT, get_info=NONE, connect_timeout=LDAP_TIMEOUT)
+        self.estrategia = estrategia
+        self.autenticacao = autenticacao
+        self.formato_usuario = formato_usuario
+        self.conexoes: "queue.LifoQueue[Connection]" = queue.LifoQueue(maxsize=max(LDAP_POOL, 1))
+
+    def nova_conexao(self) -> Connection:
+        return Connection(self.servidor, client_strategy=self.estrategia, authentication=self.autenticacao,
+                          receive_timeout=LDAP_TIMEOUT, raise_exceptions=False)
+
+    def bind(self, usuario: str, senha: str) -> bool:
+        """Bind com as credenciais do usuário em uma conexão do pool"""
+        try:
+            conn = self.conexoes.get_nowait()
+        except queue.Empty:
+            conn = self.nova_conexao()
+        try:
+            if conn.closed:
+                conn.open(read_server_info=False)
+            ok = conn.rebind(user=self.formato_usuario.format(usuario=usuario), password=senha,
+                             authentication=self.autenticacao, read_server_info=False)
+        except Exception:
+            # Conexão em estado desconhecido (queda, timeout): descarta
+            conn.unbind()
+            raise
+        try:
+            self.conexoes.put_nowait(conn)
+        except queue.Full:
+            conn.unbind()
+        return bool(ok)
+
+    def fechar(self):
+        while True:
+            try:
+                self.conexoes.get_nowait().unbind()
+            except queue.Empty:
+                return
+
+
+_ldap: Optional[ConfiguracaoLDAP] = None
+_ldap_lock = threading.Lock()
+
+# usuario -> (sal, hash da senha, expiração); nunca guarda a senha
+_binds: Dict[str, Tuple[bytes, bytes, float]] = {}
+_binds_lock = threading.Lock()
+
+
+def configurar_ldap(configuracao: Optional[ConfiguracaoLDAP] = None):
+    """Troca a configuração LDAP (None volta à padrão na próxima autenticação) e limpa o cache"""
+    global _ldap
+    with _ldap_lock:
+        if _ldap is not None:
+            _ldap.fechar()
+        _ldap = configuracao
+    limpar_cache_binds()
+
+
+def _get_ldap() -> ConfiguracaoLDAP:
+    global _ldap
+    with _ldap_lock:
+        if _ldap is None:
+            _ldap = ConfiguracaoLDAP()
+        return _ldap
+
+
+def _hash_senha(senha: str, sal: bytes) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", senha.encode(), sal, ITERACOES_HASH)
+
+
+def _bind_em_cache(usuario: str, senha: str) -> bool:
+    with _binds_lock:
+        entrada = _binds.get(usuario)
+    if entrada is None:
+        return False
+    sal, hash_senha, expira = entrada
+    if expira < time.time():
+        with _binds_lock:
+            _binds.pop(usuario, None)
+        return False
+    return hmac.compare_digest(_hash_senha(senha, sal), hash_senha)
+
+
+def _guardar_bind(usuario: str, senha: str):
+    if LDAP_CACHE_TTL <= 0:
+        return
+    sal = secrets.token_bytes(16)
+    entrada = (sal, _hash_senha(senha, sal), time.time() + LDAP_CACHE_TTL)
+    with _binds_lock:
+        if len(_binds) >= LDAP_CACHE_MAX:
+            agora = time.time()
+            for chave in [u for u, (_, _, expira) in _binds.items() if expira < agora] or list(_binds)[:1]:
+                del _binds[chave]
+        _binds[usuario] = entrada
+
+
+def limpar_cache_binds():
+    with _binds_lock:
+        _binds.clear()
+
+
 def validar_usuario(usuario: str, senha: str) -> bool:
+    if not usuario or not senha:
+        # Senha vazia vira bind anônimo, que o servidor aceita
+        return False
+
     # Primeiro, verificar se é um usuário de teste
     if usuario in TEST_USERS and TEST_USERS[usuario] == senha:
-        print(f"✅ Usuário de teste autenticado: {usuario}")
+        logger.info("Usuário de teste autenticado: %s", usuario)
+        return True
+
+    if _bind_em_cache(usuario, senha):
+        logger.debug("Usuário LDAP autenticado (cache): %s", usuario)
         return True
-    
+
     # Se não for usuário de teste, tentar LDAP
-    user_dn = f"{LDAP_DOMAIN}\\{usuario}"
     try:
-        server = Server(LDAP_URL, port=LDAP_PORT, get_info=ALL)
-        conn = Connection(server, user=user_dn, password=senha, authentication=NTLM, auto_bind=True)
-        conn.unbind()
-        print(f"✅ Usuário LDAP autenticado: {usuario}")
-        return True
+        if _get_ldap().bind(usuario, senha):
+            _guardar_bind(usuario, senha)
+            logger.info("Usuário LDAP autenticado: %s", usuario)
+            return True
+        logger.warning("Credenciais LDAP inválidas: %s", usuario)
     except Exception as e:
-        print(f"❌ Erro de autenticação LDAP: {e}")
-    return False 
\ No newline at end of file
+        logger.error("Erro de autenticação LDAP: %s", e)
+    return False
+
+
+_chave_gerada: Optional[bytes] = None
+_chave_lock = threading.Lock()
+
+
+def _ler_chave_gerada() -> bytes:
+    """Chave de CAMINHO_CHAVE, criando-a se ainda não existe.
+
+    A chave nova é escrita em um arquivo temporário e ligada ao nome final com
+    os.link, que falha se outro worker chegou antes: todos ficam com a mesma.
+    """
+    try:
+        with open(CAMINHO_CHAVE, 'rb') as f:
+            chave = f.read()
+        if chave:
+            return chave
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(CAMINHO_CHAVE) or '.', exist_ok=True)
+    temporario = f"{CAMINHO_CHAVE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    descritor = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descritor, 'wb') as f:
+        f.write(secrets.token_bytes(32))
+    try:
+        os.link(temporario, CAMINHO_CHAVE)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporario)
+    with open(CAMINHO_CHAVE, 'rb') as f:
+        return f.read()
+
+
+def _chave() -> bytes:
+    global _chave_gerada
+    if SECRET_KEY:
+        return SECRET_KEY
+    with _chave_lock:
+        if _chave_gerada is None:
+            _chave_gerada = _ler_chave_gerada()
+        return _chave_gerada
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode()
+
+
+def _assinatura(carga: str) -> str:
+    return _b64(hmac.new(_chave(), carga.encode(), hashlib.sha256).digest())
+
+
+def emitir_token(usuario: str) -> Tuple[str, int]:
+    """Token de sessão `carga.assinatura` e sua expiração (epoch)"""
+    expira = int(time.time()) + SESSAO_TTL
+    carga = _b64(json.dumps({"u": usuario, "exp": expira}, separators=(",", ":")).encode())
+    return f"{carga}.{_assinatura(carga)}", expira
+
+
+def verificar_token(token: str) -> Optional[str]:
+    """Usuário do token, ou None se a assinatura não confere ou ele expirou"""
+    carga, _, assinatura = token.partition(".")
+    if not carga or not hmac.compare_digest(assinatura.encode(), _assinatura(carga).encode()):
+        return None
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(carga + "=" * (-len(carga) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(dados, dict) or dados.get("exp", 0) < time.time():
+        return None
+    return dados.get("u")
+
+
+def usuario_token(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """Usuário do cabeçalho `Authorization: Bearer <token>` (None sem cabeçalho)"""
+    if not authorization:
+        if EXIGIR_TOKEN:
+            raise HTTPException(status_code=401, detail="Token de sessão ausente")
+        return None
+    tipo, _, token = authorization.partition(" ")
+    usuario = verificar_token(token.strip()) if tipo.lower() == "bearer" else None
+    if usuario is None:
+        raise HTTPException(status_code=401, detail="Token de sessão inválido ou expirado")
+    return usuario
+
+
+def usuario_token_ou_parametro(authorization: Optional[str] = Header(None),
+                               token: Optional[str] = Query(None)) -> Optional[str]:
+    """Como usuario_token, aceitando também `?token=`: o EventSource do navegador não envia cabeçalhos"""
+    if not authorization and token:
+        authorization = f"Bearer {token}"
+    return usuario_token(authorization)
+
+
+def conferir_usuario(usuario: Optional[str], autenticado: Optional[str]) -> Optional[str]:
+    """Usuário efetivo da requisição: o do token, que não pode divergir do informado"""
+    if autenticado is None:
+        return usuario
+    if usuario and usuario != autenticado:
+        raise HTTPException(status_code=403, detail="Usuário diferente do autenticado")
+    return autenticado
+
+
+def usuario_atual(usuario: Optional[str] = None, autenticado: Optional[str] = Depends(usuario_token)) -> Optional[str]:
+    """Dependência das rotas de leitura: `?usuario=` conferido contra o token, se houver"""
+    return conferir_usuario(usuario, autenticado)
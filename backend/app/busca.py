@@ -0,0 +1,113 @@
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import column, delete, insert, table, update
+
+# Tabela FTS5 criada junto com o schema (ver models.py); rowid = comunicacoes.id
+TABELA_FTS = "comunicacoes_fts"
+
+# CPFs e CNPJs, formatados ou não; no índice entram só os dígitos
+DOCUMENTO = re.compile(r'\d[\d./-]{9,19}\d')
+TAMANHOS_DOCUMENTO = (11, 14)
+
+# Termos da busca: "frase entre aspas" ou palavra solta
+TERMO = re.compile(r'"([^"]*)"|(\S+)')
+OPERADORES = frozenset(("OR", "AND", "NOT"))
+
+comunicacoes_fts = table(
+    TABELA_FTS, column('rowid'), column('informacoes_adicionais'), column('campos'), column('documentos')
+)
+
+
+def _textos(valor: Any) -> Iterator[str]:
+    """Strings contidas no parsing_json, em qualquer nível"""
+    if isinstance(valor, str):
+        if valor:
+            yield valor
+    elif isinstance(valor, dict):
+        for item in valor.values():
+            yield from _textos(item)
+    elif isinstance(valor, (list, tuple)):
+        for item in valor:
+            yield from _textos(item)
+
+
+def somente_digitos(documento: str) -> Optional[str]:
+    digitos = re.sub(r'\D', '', documento)
+    if len(digitos) == 15 and digitos[0] == '0':
+        # CNPJ com zero à esquerda, como alguns bancos informam ("008114514000180")
+        digitos = digitos[1:]
+    return digitos if len(digitos) in TAMANHOS_DOCUMENTO else None
+
+
+def documentos(*textos: str) -> str:
+    encontrados = dict.fromkeys(
+        d for texto in textos if texto for d in map(somente_digitos, DOCUMENTO.findall(texto)) if d
+    )
+    return " ".join(encontrados)
+
+
+def linha_indice(id: int, informacoes_adicionais: Optional[str], parsed: Dict[str, Any],
+                 extras: Iterable[Optional[str]] = ()) -> Dict[str, Any]:
+    """Linha do índice de uma comunicação: texto bruto, campos extraídos e documentos.
+
+    `extras` são campos da própria comunicação (titular, CPF, banco, ocorrência)
+    pesquisáveis junto com os do parser.
+    """
+    campos = "\n".join([*(e for e in extras if e), *_textos(parsed)])
+    return {
+        'id': id,
+        'informacoes_adicionais': informacoes_adicionais or "",
+        'campos': campos,
+        'documentos': documentos(informacoes_adicionais or "", campos)
+    }
+
+
+def indexar(session, linhas: List[Dict[str, Any]]):
+    if linhas:
+        session.execute(insert(comunicacoes_fts), [
+            {'rowid': linha['id'], 'informacoes_adicionais': linha['informacoes_adicionais'],
+             'campos': linha['campos'], 'documentos': linha['documentos']}
+            for linha in linhas
+        ])
+
+
+def atualizar_campos(session, linha: Dict[str, Any]):
+    """Reindexa os campos de uma comunicação corrigida (o texto bruto não muda)"""
+    session.execute(
+        update(comunicacoes_fts).where(comunicacoes_fts.c.rowid == linha['id'])
+        .values(campos=linha['campos'], documentos=linha['documentos'])
+    )
+
+
+def remover_do_indice(session, ids):
+    """Remove do índice as comunicações de `ids` (lista ou select de comunicacoes.id)"""
+    session.execute(delete(comunicacoes_fts).where(comunicacoes_fts.c.rowid.in_(ids)))
+
+
+def expressao_fts(consulta: str) -> str:
+    """Converte a busca digitada em uma expressão MATCH do FTS5.
+
+    Palavras soltas devem aparecer todas (AND implícito); "entre aspas" busca
+    a frase exata; palavra* busca por prefixo; OR, AND e NOT em maiúsculas são
+    operadores. Um CPF/CNPJ formatado também encontra a versão só com dígitos.
+    Qualquer outro caractere especial é tratado como texto.
+    """
+    partes = []
+    for frase, palavra in TERMO.findall(consulta):
+        if frase:
+            partes.append('"' + frase.replace('"', '""') + '"')
+        elif palavra in OPERADORES:
+            partes.append(palavra)
+        elif palavra.endswith('*') and palavra.rstrip('*'):
+            partes.append('"' + palavra.rstrip('*').replace('"', '""') + '"*')
+        elif palavra.strip('*'):
+            termo = '"' + palavra.strip('*').replace('"', '""') + '"'
+            digitos = somente_digitos(palavra) if DOCUMENTO.fullmatch(palavra) else None
+            partes.append(f'({termo} OR "{digitos}")' if digitos and digitos != palavra else termo)
+    # Operador nas pontas não forma uma expressão válida
+    while partes and partes[0] in OPERADORES:
+        partes.pop(0)
+    while partes and partes[-1] in OPERADORES:
+        partes.pop()
+    return " ".join(partes)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter
+from sqlalchemy import delete, func, insert, select, update
+
+from parsers import registro
+
+from . import metricas
+from .database import get_engine
+from .models import ParseCache
+from .parsing_paralelo import escolher_parser, parse_lotes
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Cache persistente da saída dos parsers, chaveado por parser + versão + hash do texto
+CACHE_ATIVO = os.environ.get("RIF_PARSE_CACHE", "1") != "0"
+LIMITE_CACHE_BYTES = int(os.environ.get("RIF_PARSE_CACHE_MB", "256")) * 1024 * 1024
+# Arquivo próprio: o cache é gravado durante a ingestão, enquanto a transação
+# que grava o RIF mantém o lock de escrita do banco principal
+CAMINHO_CACHE = os.environ.get("RIF_PARSE_CACHE_DB", "backend/database/cache_parsing.db")
+
+# Limite de parâmetros por consulta do SQLite
+TAMANHO_CONSULTA = 500
+
+estatisticas = {'hits': 0, 'misses': 0, 'gravacoes': 0, 'despejos': 0}
+_estatisticas_lock = threading.Lock()
+_inicializado = False
+_inicializacao_lock = threading.Lock()
+
+
+def _contar(**valores):
+    with _estatisticas_lock:
+        for chave, valor in valores.items():
+            estatisticas[chave] += valor
+
+
+def _inicializar(engine):
+    """Cria a tabela e remove entradas de versões antigas de cada parser"""
+    global _inicializado
+    with _inicializacao_lock:
+        if _inicializado:
+            return
+        ParseCache.__table__.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            for nome, plugin in registro.PLUGINS.items():
+                conn.execute(delete(ParseCache).where(ParseCache.parser == nome, ParseCache.versao != plugin.versao))
+        _inicializado = True
+
+
+def chave_cache(nome_parser: str, texto: str) -> str:
+    versao = registro.obter(nome_parser).versao
+    return f"{nome_parser}:{versao}:{hashlib.sha256(texto.encode('utf-8')).hexdigest()}"
+
+
+def buscar(chaves: List[str]) -> Dict[str, str]:
+    """Busca em lote os resultados serializados e atualiza o último acesso das entradas encontradas"""
+    engine = get_engine(CAMINHO_CACHE)
+    _inicializar(engine)
+    encontrados = {}
+    agora = time.time()
+    with engine.begin() as conn:
+        for i in range(0, len(chaves), TAMANHO_CONSULTA):
+            parte = chaves[i:i + TAMANHO_CONSULTA]
+            for chave, resultado in conn.execute(
+                select(ParseCache.chave, ParseCache.resultado).where(ParseCache.chave.in_(parte))
+            ):
+                encontrados[chave] = resultado
+            hits = [chave for chave in parte if chave in encontrados]
+            if hits:
+                conn.execute(
+                    update(ParseCache).where(ParseCache.chave.in_(hits)).values(ultimo_acesso=agora)
+                )
+    return encontrados
+
+
+def gravar(itens: List[Tuple[str, str, Dict[str, Any]]]):
+    """Grava (chave, parser, resultado) em lote"""
+    if not itens:
+        return
+    engine = get_engine(CAMINHO_CACHE)
+    _inicializar(engine)
+    agora = time.time()
+    linhas = []
+    for chave, nome_parser, resultado in itens:
+        serializado = json.dumps(resultado, ensure_ascii=False)
+        linhas.append({
+            'chave': chave,
+            'parser': nome_parser,
+            'versao': registro.obter(nome_parser).versao,
+            'resultado': serializado,
+            'tamanho': len(serializado.encode('utf-8')),
+            'ultimo_acesso': agora
+        })
+    with engine.begin() as conn:
+        conn.execute(insert(ParseCache).prefix_with("OR REPLACE"), linhas)
+    _contar(gravacoes=len(linhas))
+
+
+def aplicar_limite():
+    """Despeja as entradas acessadas há mais tempo até o cache caber no limite"""
+    engine = get_engine(CAMINHO_CACHE)
+    _inicializar(engine)
+    with engine.begin() as conn:
+        total = conn.execute(select(func.coalesce(func.sum(ParseCache.tamanho), 0))).scalar()
+        if total <= LIMITE_CACHE_BYTES:
+            return
+        excedente = total - LIMITE_CACHE_BYTES
+        removidas = []
+        liberado = 0
+        for chave, tamanho in conn.execute(
+            select(ParseCache.chave, ParseCache.tamanho).order_by(ParseCache.ultimo_acesso)
+        ):
+            removidas.append(chave)
+            liberado += tamanho
+            if liberado >= excedente:
+                break
+        for i in range(0, len(removidas), TAMANHO_CONSULTA):
+            conn.execute(delete(ParseCache).where(ParseCache.chave.in_(removidas[i:i + TAMANHO_CONSULTA])))
+    _contar(despejos=len(removidas))
+
+
+def parse_lotes_com_cache(lotes: Iterable[List[Dict[str, str]]]) -> Iterator[Tuple[List[Dict[str, str]], List[Dict[str, Any]]]]:
+    """Como parse_lotes, mas só envia ao parsing as linhas ausentes do cache.
+
+    Para cada lote, as chaves são consultadas de uma vez; as linhas não
+    encontradas seguem para o pool de parsing e seus resultados são gravados
+    no cache antes de serem devolvidos (e modificados pela montagem).
+    """
+    if not CACHE_ATIVO:
+        yield from parse_lotes(lotes)
+        return
+
+    pendentes = deque()
+
+    def faltantes():
+        for lote in lotes:
+            resultados: List[Optional[Dict[str, Any]]] = [None] * len(lote)
+            chaves: List[Optional[Tuple[str, str]]] = [None] * len(lote)
+            for i, row in enumerate(lote):
+                nome_parser = escolher_parser(row)
+                if nome_parser is not None:
+                    chaves[i] = (chave_cache(nome_parser, row.get("informacoesAdicionais", "")), nome_parser)
+            try:
+                encontrados = buscar([c[0] for c in chaves if c is not None])
+            except Exception as e:
+                logger.warning("Cache de parsing indisponível: %s", e)
+                encontrados = {}
+            indices = []
+            for i, chave in enumerate(chaves):
+                if chave is not None and chave[0] in encontrados:
+                    # Um dict por linha: a montagem da comunicação altera o resultado, e linhas
+                    # com o mesmo texto compartilham a entrada do cache
+                    resultados[i] = json.loads(encontrados[chave[0]])
+                else:
+                    indices.append(i)
+            misses = sum(1 for i in indices if chaves[i] is not None)
+            _contar(hits=len(lote) - len(indices), misses=misses)
+            metricas.contar_cache('parsing', True, len(lote) - len(indices))
+            metricas.contar_cache('parsing', False, misses)
+            pendentes.append((lote, resultados, chaves, indices))
+            yield [lote[i] for i in indices]
+
+    try:
+        for _, parseados in parse_lotes(faltantes()):
+            lote, resultados, chaves, indices = pendentes.popleft()
+            novos = []
+            for i, resultado in zip(indices, parseados):
+                # O resultado do parser genérico após estourar o limite de tempo não é guardado
+                if chaves[i] is not None and "limite_parsing" not in resultado:
+                    novos.append((chaves[i][0], chaves[i][1], resultado))
+                resultados[i] = resultado
+            try:
+                gravar(novos)
+            except Exception as e:
+                logger.warning("Falha ao gravar no cache de parsing: %s", e)
+            yield lote, resultados
+    finally:
+        try:
+            aplicar_limite()
+        except Exception as e:
+            logger.warning("Falha ao aplicar limite do cache de parsing: %s", e)
+
+
+def resumo() -> Dict[str, Any]:
+    engine = get_engine(CAMINHO_CACHE)
+    _inicializar(engine)
+    with engine.connect() as conn:
+        entradas, tamanho = conn.execute(
+            select(func.count(), func.coalesce(func.sum(ParseCache.tamanho), 0))
+        ).one()
+    with _estatisticas_lock:
+        contadores = dict(estatisticas)
+    consultas = contadores['hits'] + contadores['misses']
+    return {
+        **contadores,
+        'taxa_acerto': contadores['hits'] / consultas if consultas else 0.0,
+        'entradas': entradas,
+        'tamanho_bytes': tamanho,
+        'limite_bytes': LIMITE_CACHE_BYTES
+    }
+
+
+@router.get("/api/cache-parsing")
+def estatisticas_cache():
+    """Contadores de acerto/erro e ocupação do cache de parsing"""
+    return resumo()
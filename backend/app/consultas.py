@@ -0,0 +1,377 @@
+import base64
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.exc import OperationalError
+
+from .busca import TABELA_FTS, comunicacoes_fts, expressao_fts, indexar, linha_indice
+from .database import SessionLocal, garantir_schema
+from .ingestao import data_iso, em_lotes
+from .models import Comunicacao
+from .persistencia import TAMANHO_LOTE_INSERCAO, upload_atual
+
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 1000
+
+# Linhas lidas do banco por vez e bytes acumulados antes de cada envio na exportação NDJSON
+LOTE_EXPORTACAO = 1000
+TAMANHO_BLOCO_EXPORTACAO = 64 * 1024
+_codificar_json = json.JSONEncoder(ensure_ascii=False).encode
+
+LIMITE_BUSCA_PADRAO = 20
+LIMITE_BUSCA_MAXIMO = 200
+# Tokens de contexto em cada trecho devolvido pela busca
+TOKENS_TRECHO = 16
+# Máximo de ocorrências ranqueadas por busca; termos muito comuns são ranqueados
+# só entre as primeiras, na ordem do upload, e a resposta vem com "parcial": true
+MAX_CANDIDATOS_BUSCA = int(os.environ.get("RIF_BUSCA_MAX_CANDIDATOS", "5000"))
+
+# Chaves de ordenação aceitas em ?ordenar= (prefixo "-" para ordem decrescente)
+ORDENACOES = {
+    "id": Comunicacao.numero,
+    "data": Comunicacao.data_iso,
+    "valor": Comunicacao.valor_total,
+    "banco": Comunicacao.banco,
+    "titular": Comunicacao.titular,
+}
+
+# Filtros por igualdade; cada um tem um índice (upload_id, coluna, numero)
+FILTROS_IGUALDADE = {
+    "banco": Comunicacao.banco,
+    "uf": Comunicacao.uf_agencia,
+    "cidade": Comunicacao.cidade_agencia,
+    "segmento": Comunicacao.codigo_segmento,
+    "cpf": Comunicacao.cpf,
+}
+
+COLUNAS_ITEM = (
+    Comunicacao.numero, Comunicacao.titular, Comunicacao.cpf, Comunicacao.banco,
+    Comunicacao.codigo_segmento, Comunicacao.data, Comunicacao.data_fim, Comunicacao.data_iso,
+    Comunicacao.valor_total, Comunicacao.cidade_agencia, Comunicacao.uf_agencia,
+)
+
+# Maior code point: "prefixo + FIM_PREFIXO" limita o intervalo do filtro por início do titular
+FIM_PREFIXO = '\U0010ffff'
+
+
+class ErroConsulta(ValueError):
+    """Parâmetro de listagem ou busca inválido (ordenação, cursor, data, limite ou expressão)"""
+
+
+def _codificar_cursor(ordenar: str, valor: Any, numero: int) -> str:
+    texto = json.dumps([ordenar, valor, numero], ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar_cursor(cursor: str, ordenar: str):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        chave, valor, numero = json.loads(texto)
+        numero = int(numero)
+    except (ValueError, TypeError):
+        raise ErroConsulta("Cursor inválido")
+    if chave != ordenar:
+        raise ErroConsulta("Cursor gerado para outra ordenação")
+    return valor, numero
+
+
+def _normalizar_data(texto: Optional[str], parametro: str) -> Optional[str]:
+    """Aceita DD/MM/AAAA ou AAAA-MM-DD e devolve AAAA-MM-DD"""
+    if not texto:
+        return None
+    if '/' in texto:
+        convertida = data_iso(texto)
+    else:
+        partes = texto.strip().split('-')
+        valido = [len(p) for p in partes] == [4, 2, 2] and all(p.isdigit() for p in partes)
+        convertida = texto.strip() if valido else None
+    if convertida is None:
+        raise ErroConsulta(f"Data inválida em {parametro}: {texto}")
+    return convertida
+
+
+def _segmentos(coluna, decrescente: bool, cursor) -> List[tuple]:
+    """Trechos percorridos em sequência pela paginação: (condição, ordem).
+
+    O SQLite coloca NULL antes de qualquer valor no índice. Em vez de um OR
+    (que impede a busca por intervalo), os registros sem valor são lidos em
+    um trecho separado: primeiro na ordem crescente, por último na
+    decrescente. Dentro de cada trecho a continuação é uma comparação de
+    row values, respondida diretamente pelo índice (upload_id, coluna, numero).
+    """
+    numero = Comunicacao.numero
+    if coluna is numero:
+        ordem = (numero.desc(),) if decrescente else (numero,)
+        if cursor is None:
+            return [((), ordem)]
+        return [((numero < cursor[1] if decrescente else numero > cursor[1],), ordem)]
+
+    if decrescente:
+        com_valor = ((coluna.is_not(None),), (coluna.desc(), numero.desc()))
+        sem_valor = ((coluna.is_(None),), (numero.desc(),))
+        if cursor is None:
+            return [com_valor, sem_valor]
+        valor, ultimo = cursor
+        if valor is None:
+            return [((coluna.is_(None), numero < ultimo), sem_valor[1])]
+        return [((tuple_(coluna, numero) < tuple_(valor, ultimo),), com_valor[1]), sem_valor]
+
+    sem_valor = ((coluna.is_(None),), (numero,))
+    com_valor = ((coluna.is_not(None),), (coluna, numero))
+    if cursor is None:
+        return [sem_valor, com_valor]
+    valor, ultimo = cursor
+    if valor is None:
+        return [((coluna.is_(None), numero > ultimo), sem_valor[1]), com_valor]
+    return [((tuple_(coluna, numero) > tuple_(valor, ultimo),), com_valor[1])]
+
+
+def _filtros(upload_id: int, filtros: Dict[str, Any]) -> list:
+    condicoes = [Comunicacao.upload_id == upload_id]
+    for nome, coluna in FILTROS_IGUALDADE.items():
+        if filtros.get(nome):
+            condicoes.append(coluna == filtros[nome])
+    if filtros.get("titular"):
+        prefixo = filtros["titular"]
+        condicoes.append(Comunicacao.titular >= prefixo)
+        condicoes.append(Comunicacao.titular < prefixo + FIM_PREFIXO)
+    data_inicio = _normalizar_data(filtros.get("data_inicio"), "data_inicio")
+    data_fim = _normalizar_data(filtros.get("data_fim"), "data_fim")
+    if data_inicio:
+        condicoes.append(Comunicacao.data_iso >= data_inicio)
+    if data_fim:
+        condicoes.append(Comunicacao.data_iso <= data_fim)
+    if filtros.get("valor_min") is not None:
+        condicoes.append(Comunicacao.valor_total >= filtros["valor_min"])
+    if filtros.get("valor_max") is not None:
+        condicoes.append(Comunicacao.valor_total <= filtros["valor_max"])
+    return condicoes
+
+
+def _item(linha) -> Dict[str, Any]:
+    """Mesmo formato dos itens da listagem sem paginação"""
+    return {
+        "id": linha.numero,
+        "titular": linha.titular,
+        "cpf": linha.cpf,
+        "banco": linha.banco,
+        "codigo_segmento": linha.codigo_segmento or "41",
+        "periodo": {"inicio": linha.data, "fim": linha.data_fim},
+        "valor": linha.valor_total or 0.0,
+        "data": linha.data,
+        "localizacao": {
+            "cidade": linha.cidade_agencia,
+            "uf": linha.uf_agencia
+        }
+    }
+
+
+def listar_pagina(usuario: Optional[str] = None, filtros: Optional[Dict[str, Any]] = None,
+                  ordenar: str = "id", limite: int = LIMITE_PADRAO,
+                  cursor: Optional[str] = None, pagina: Optional[int] = None) -> Dict[str, Any]:
+    """Uma página de comunicações do upload vigente, filtrada e ordenada no banco.
+
+    A paginação por cursor (keyset) continua a partir do último registro
+    devolvido e custa o mesmo em qualquer ponto da listagem. `pagina` usa
+    OFFSET e fica mais lenta quanto mais distante a página.
+    """
+    chave = ordenar.lstrip('-')
+    if chave not in ORDENACOES:
+        raise ErroConsulta(f"Ordenação inválida: {ordenar}. Use uma de: {', '.join(ORDENACOES)}")
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ErroConsulta(f"limite deve estar entre 1 e {LIMITE_MAXIMO}")
+    if pagina is not None and (cursor or pagina < 1):
+        raise ErroConsulta("Use cursor ou pagina (a partir de 1), não ambos")
+    decrescente = ordenar.startswith('-')
+    coluna = ORDENACOES[chave]
+    posicao = _decodificar_cursor(cursor, ordenar) if cursor else None
+
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return {"itens": [], "limite": limite, "proximo_cursor": None}
+        condicoes = _filtros(upload.id, filtros or {})
+
+        linhas = []
+        pular = (pagina - 1) * limite if pagina else 0
+        for condicao, ordem in _segmentos(coluna, decrescente, posicao):
+            # Um registro a mais indica se existe próxima página
+            faltam = limite + 1 - len(linhas)
+            consulta = select(*COLUNAS_ITEM).where(*condicoes, *condicao).order_by(*ordem)
+            if pular:
+                consulta = consulta.offset(pular)
+            resultado = session.execute(consulta.limit(faltam)).all()
+            linhas.extend(resultado)
+            if len(linhas) > limite:
+                break
+            if pular and not resultado:
+                # O OFFSET passou do fim deste trecho: desconta o que ele tinha e segue para o próximo
+                pular -= session.scalar(select(func.count()).where(*condicoes, *condicao))
+            else:
+                pular = 0
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        valor = ultima.numero if coluna is Comunicacao.numero else getattr(ultima, coluna.key)
+        proximo = _codificar_cursor(ordenar, valor, ultima.numero)
+    resposta = {"itens": [_item(linha) for linha in linhas], "limite": limite, "proximo_cursor": proximo}
+    if pagina:
+        resposta["pagina"] = pagina
+    return resposta
+
+
+def exportar_ndjson(usuario: Optional[str] = None, filtros: Optional[Dict[str, Any]] = None,
+                    incluir_parsing: bool = False) -> Iterator[bytes]:
+    """Todas as comunicações do upload vigente em NDJSON (um objeto por linha), na ordem do id.
+
+    Os filtros são validados antes de devolver o gerador, para que um erro
+    vire 400 e não uma resposta interrompida. O gerador lê o banco em lotes
+    e envia blocos de até TAMANHO_BLOCO_EXPORTACAO bytes, com a primeira linha
+    enviada assim que lida; a memória não cresce com o tamanho do upload. O
+    parsing_json é copiado do banco como está, sem ser desserializado.
+    """
+    filtros = filtros or {}
+    _filtros(0, filtros)
+    garantir_schema()
+    return _gerar_ndjson(usuario, filtros, incluir_parsing)
+
+
+def _gerar_ndjson(usuario: Optional[str], filtros: Dict[str, Any], incluir_parsing: bool) -> Iterator[bytes]:
+    colunas = COLUNAS_ITEM + ((Comunicacao.parsing_json,) if incluir_parsing else ())
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return
+        consulta = (
+            select(*colunas).where(*_filtros(upload.id, filtros)).order_by(Comunicacao.numero)
+            .execution_options(yield_per=LOTE_EXPORTACAO)
+        )
+        bloco, tamanho, primeira = [], 0, True
+        for linha in session.execute(consulta):
+            texto = _codificar_json(_item(linha))
+            if incluir_parsing:
+                texto = f'{texto[:-1]}, "parsing_json": {linha.parsing_json or "{}"}}}'
+            dados = (texto + "\n").encode()
+            if primeira:
+                primeira = False
+                yield dados
+                continue
+            bloco.append(dados)
+            tamanho += len(dados)
+            if tamanho >= TAMANHO_BLOCO_EXPORTACAO:
+                yield b"".join(bloco)
+                bloco, tamanho = [], 0
+        if bloco:
+            yield b"".join(bloco)
+
+
+# bm25 (rank) é negativo: quanto menor, mais relevante. O intervalo de rowid restringe a varredura do
+# índice (um workspace pode ter ids de outros uploads entre os seus); o upload_id garante o isolamento
+DO_UPLOAD = f"EXISTS (SELECT 1 FROM comunicacoes WHERE id = {TABELA_FTS}.rowid AND upload_id = :upload)"
+# Rowid da ocorrência seguinte à última candidata; sem ranking, percorre só a lista de documentos
+CORTE = text(f"""
+    SELECT rowid FROM {TABELA_FTS}
+    WHERE {TABELA_FTS} MATCH :expressao AND rowid BETWEEN :inicio AND :fim AND {DO_UPLOAD}
+    LIMIT 1 OFFSET :candidatos
+""")
+# ORDER BY rank é resolvido dentro do FTS5, que só gera o trecho das linhas devolvidas
+BUSCA = text(f"""
+    SELECT c.numero, c.titular, c.cpf, c.banco, c.data, f.trecho, f.rank
+    FROM (
+        SELECT rowid AS id, rank,
+               snippet({TABELA_FTS}, -1, '<mark>', '</mark>', '…', :tokens) AS trecho
+        FROM {TABELA_FTS}
+        WHERE {TABELA_FTS} MATCH :expressao AND rowid BETWEEN :inicio AND :fim AND {DO_UPLOAD}
+        ORDER BY rank
+        LIMIT :limite
+    ) AS f
+    JOIN comunicacoes AS c ON c.id = f.id
+    ORDER BY f.rank
+""")
+
+# Gerações (não ids, que o SQLite reaproveita) dos uploads já conferidos
+_uploads_indexados = set()
+_indexacao_lock = threading.Lock()
+
+
+def _garantir_indice(upload_id: int, geracao: str, inicio: int):
+    """Indexa uma única vez um upload gravado antes de existir o índice de busca"""
+    if geracao in _uploads_indexados:
+        return
+    with _indexacao_lock, SessionLocal() as session, session.begin():
+        # O upload é indexado por inteiro na gravação: basta conferir a primeira comunicação
+        indexado = session.scalar(
+            select(comunicacoes_fts.c.rowid).where(comunicacoes_fts.c.rowid == inicio).limit(1)
+        )
+        if indexado is None:
+            linhas = session.execute(select(
+                Comunicacao.id, Comunicacao.informacoes_adicionais, Comunicacao.parsing_json,
+                Comunicacao.titular, Comunicacao.cpf, Comunicacao.banco, Comunicacao.descricao_ocorrencia
+            ).where(Comunicacao.upload_id == upload_id)).all()
+            for lote in em_lotes(linhas, TAMANHO_LOTE_INSERCAO):
+                indexar(session, [
+                    linha_indice(c.id, c.informacoes_adicionais, json.loads(c.parsing_json or "{}"),
+                                 (c.titular, c.cpf, c.banco, c.descricao_ocorrencia))
+                    for c in lote
+                ])
+        _uploads_indexados.add(geracao)
+
+
+def buscar_texto(consulta: str, usuario: Optional[str] = None, limite: int = LIMITE_BUSCA_PADRAO) -> Dict[str, Any]:
+    """Busca no texto das comunicações do upload vigente, ordenada por relevância (bm25).
+
+    O índice cobre o informacoesAdicionais bruto, os campos extraídos pelos
+    parsers e os CPFs/CNPJs só com dígitos. Cada item traz um trecho com os
+    termos encontrados entre <mark></mark>. Com mais de MAX_CANDIDATOS_BUSCA
+    ocorrências, só as primeiras são ranqueadas e "parcial" vem true.
+    """
+    expressao = expressao_fts(consulta or "")
+    if not expressao:
+        raise ErroConsulta("Informe o texto a buscar")
+    if not 1 <= limite <= LIMITE_BUSCA_MAXIMO:
+        raise ErroConsulta(f"limite deve estar entre 1 e {LIMITE_BUSCA_MAXIMO}")
+
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        upload_id = upload.id if upload else None
+        geracao = upload.geracao if upload else None
+        # Os ids crescem com o numero dentro do upload, mas um workspace acrescido depois de
+        # outros uploads intercala ids deles: o intervalo só delimita a varredura
+        ids = select(Comunicacao.id).where(Comunicacao.upload_id == upload_id).limit(1)
+        inicio = session.scalar(ids.order_by(Comunicacao.numero))
+        fim = session.scalar(ids.order_by(Comunicacao.numero.desc()))
+    if inicio is None:
+        return {"consulta": consulta, "itens": [], "limite": limite, "parcial": False}
+    _garantir_indice(upload_id, geracao, inicio)
+
+    with SessionLocal() as session:
+        try:
+            corte = session.scalar(CORTE, {
+                'expressao': expressao, 'inicio': inicio, 'fim': fim, 'upload': upload_id,
+                'candidatos': MAX_CANDIDATOS_BUSCA
+            })
+            if corte is not None:
+                fim = corte - 1
+            linhas = session.execute(BUSCA, {
+                'expressao': expressao, 'inicio': inicio, 'fim': fim, 'upload': upload_id,
+                'limite': limite, 'tokens': TOKENS_TRECHO
+            }).all()
+        except OperationalError:
+            raise ErroConsulta(f"Expressão de busca inválida: {consulta}")
+    itens = [{
+        "id": linha.numero,
+        "titular": linha.titular,
+        "cpf": linha.cpf,
+        "banco": linha.banco,
+        "data": linha.data,
+        "trecho": linha.trecho,
+        "relevancia": -linha.rank
+    } for linha in linhas]
+    return {"consulta": consulta, "itens": itens, "limite": limite, "parcial": corte is not None}
@@ -1,15 +1,78 @@
-from sqlalchemy import create_engine
+import threading
+from functools import lru_cache
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker
 from app.models import Base
 import os
 
+# Espera (em segundos) por um lock de escrita de outro worker antes de falhar
+TIMEOUT_SQLITE = int(os.environ.get("RIF_SQLITE_TIMEOUT", "30"))
+
+def _configurar_conexao(dbapi_connection, connection_record):
+    # WAL: leitores não bloqueiam o escritor, permitindo vários workers do uvicorn
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={TIMEOUT_SQLITE * 1000}")
+    cursor.close()
+
+@lru_cache(maxsize=None)
 def get_engine(db_path='backend/database/dados.db'):
-    return create_engine(f'sqlite:///{db_path}', connect_args={"check_same_thread": False})
+    # Um engine (e seu pool de conexões) por arquivo de banco
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    engine = create_engine(
+        f'sqlite:///{db_path}',
+        connect_args={"check_same_thread": False, "timeout": TIMEOUT_SQLITE},
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True
+    )
+    event.listen(engine, "connect", _configurar_conexao)
+    return engine
 
-def init_db():
-    os.makedirs('backend/database', exist_ok=True)
-    engine = get_engine()
+def migrar_schema(engine):
+    """Cria tabelas e índices ausentes e adiciona colunas novas a tabelas existentes"""
     Base.metadata.create_all(engine)
+    inspetor = inspect(engine)
+    adicionadas = set()
+    with engine.begin() as conn:
+        for tabela in Base.metadata.sorted_tables:
+            existentes = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name not in existentes:
+                    tipo = coluna.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {tabela.name} ADD COLUMN {coluna.name} {tipo}'))
+                    adicionadas.add((tabela.name, coluna.name))
+            for indice in tabela.indexes:
+                indice.create(conn, checkfirst=True)
+        if ('uploads', 'geracao') in adicionadas:
+            # Uploads gravados antes da coluna recebem uma geração própria
+            conn.execute(text("UPDATE uploads SET geracao = lower(hex(randomblob(16)))"))
+        if ('entidades_rif', 'geracao') in adicionadas:
+            # Só herda a geração do upload que ainda tem a comunicação da linha: um id
+            # reaproveitado por um upload posterior não torna a linha vigente
+            conn.execute(text(
+                "UPDATE entidades_rif SET geracao = (SELECT uploads.geracao FROM uploads"
+                " WHERE uploads.id = entidades_rif.upload_id AND uploads.usuario IS entidades_rif.usuario"
+                " AND (entidades_rif.numero IS NULL OR EXISTS (SELECT 1 FROM comunicacoes"
+                " WHERE comunicacoes.upload_id = uploads.id AND comunicacoes.numero = entidades_rif.numero"
+                " AND comunicacoes.id_comunicacao IS entidades_rif.id_comunicacao)))"
+            ))
+
+_schema_migrado = set()
+_schema_lock = threading.Lock()
+
+def garantir_schema(engine=None):
+    """Executa migrar_schema uma vez por engine neste processo"""
+    engine = engine or get_engine()
+    with _schema_lock:
+        if str(engine.url) not in _schema_migrado:
+            migrar_schema(engine)
+            _schema_migrado.add(str(engine.url))
     return engine
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine()) 
\ No newline at end of file
+def init_db():
+    os.makedirs('backend/database', exist_ok=True)
+    return garantir_schema(get_engine())
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
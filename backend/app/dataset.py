@@ -0,0 +1,317 @@
+import json
+import math
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from . import metricas
+from .agregados import CAMPOS_VALOR, COLUNAS_VALOR, AgregadosRIF
+from .database import SessionLocal, garantir_schema
+from .grafo import Grafo
+from .models import Comunicacao
+from .persistencia import upload_atual
+
+# Quantidade de RIFs (uploads) mantidos carregados em memória por processo
+MAX_DATASETS = int(os.environ.get("RIF_MAX_DATASETS", "8"))
+# Grafos de contrapartes mantidos em memória por processo
+MAX_GRAFOS = int(os.environ.get("RIF_MAX_GRAFOS", "4"))
+
+NULO = float('nan')
+
+
+class ColunaCategorica:
+    """Coluna de texto codificada por dicionário: cada valor distinto é guardado uma vez"""
+
+    __slots__ = ('valores', 'codigos', '_indice')
+
+    def __init__(self):
+        self.valores: List[Optional[str]] = []
+        self.codigos = array('I')
+        self._indice: Dict[Optional[str], int] = {}
+
+    def _codigo(self, valor: Optional[str]) -> int:
+        codigo = self._indice.get(valor)
+        if codigo is None:
+            codigo = len(self.valores)
+            self._indice[valor] = codigo
+            self.valores.append(valor)
+        return codigo
+
+    def adicionar(self, valor: Optional[str]):
+        self.codigos.append(self._codigo(valor))
+
+    def definir(self, linha: int, valor: Optional[str]):
+        self.codigos[linha] = self._codigo(valor)
+
+    def __getitem__(self, linha: int) -> Optional[str]:
+        return self.valores[self.codigos[linha]]
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+
+COLUNAS_TEXTO = ('banco', 'uf_agencia', 'cidade_agencia', 'codigo_segmento',
+                 'ocorrencia', 'titular', 'cpf', 'data', 'data_fim')
+
+
+class DatasetRIF:
+    """Comunicações de um upload em formato colunar.
+
+    Valores numéricos ficam em arrays de float (NaN = nulo) e os textos
+    repetitivos em colunas categóricas. O texto bruto e o parsing_json
+    completo não são mantidos em memória: o detalhe os busca no banco pela
+    chave primária.
+
+    `versao` é a versão do upload já refletida nas colunas: `sincronizar`
+    aplica só as comunicações gravadas ou corrigidas depois dela.
+    """
+
+    __slots__ = (
+        'upload_id', 'usuario', 'versao', '_lock', 'ids', 'ids_banco', '_linha_por_id',
+        'banco', 'uf_agencia', 'cidade_agencia', 'codigo_segmento', 'ocorrencia',
+        'titular', 'cpf', 'data', 'data_fim',
+        'valor_total', 'campos'
+    )
+
+    def __init__(self, upload_id: int, usuario: str, versao: int = 1):
+        self.upload_id = upload_id
+        self.usuario = usuario
+        self.versao = versao
+        self._lock = threading.Lock()
+        self.ids = array('q')  # id exposto pela API
+        self.ids_banco = array('q')  # chave primária em comunicacoes
+        # Índice id -> linha; None enquanto os ids forem consecutivos (linha = id - ids[0])
+        self._linha_por_id: Optional[Dict[int, int]] = None
+        self.banco = ColunaCategorica()
+        self.uf_agencia = ColunaCategorica()
+        self.cidade_agencia = ColunaCategorica()
+        self.codigo_segmento = ColunaCategorica()
+        self.ocorrencia = ColunaCategorica()
+        self.titular = ColunaCategorica()
+        self.cpf = ColunaCategorica()
+        self.data = ColunaCategorica()
+        self.data_fim = ColunaCategorica()
+        self.valor_total = array('d')
+        self.campos = tuple(array('d') for _ in CAMPOS_VALOR)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def adicionar(self, id: int, id_banco: int, registro: Dict[str, Any]):
+        """Acrescenta uma comunicação a partir das colunas de texto e dos valores já convertidos"""
+        linha = len(self.ids)
+        if self._linha_por_id is None and linha and id != self.ids[0] + linha:
+            self._linha_por_id = {id_existente: i for i, id_existente in enumerate(self.ids)}
+        if self._linha_por_id is not None:
+            self._linha_por_id[id] = linha
+        self.ids.append(id)
+        self.ids_banco.append(id_banco)
+
+        for coluna in COLUNAS_TEXTO:
+            getattr(self, coluna).adicionar(registro.get(coluna))
+
+        for coluna, nome in zip((self.valor_total,) + self.campos, COLUNAS_VALOR):
+            valor = registro.get(nome)
+            coluna.append(NULO if valor is None else valor)
+
+    def substituir(self, linha: int, registro: Dict[str, Any]):
+        """Reescreve uma linha existente (comunicação corrigida)"""
+        for coluna in COLUNAS_TEXTO:
+            getattr(self, coluna).definir(linha, registro.get(coluna))
+        for coluna, nome in zip((self.valor_total,) + self.campos, COLUNAS_VALOR):
+            valor = registro.get(nome)
+            coluna[linha] = NULO if valor is None else valor
+
+    def sincronizar(self, session, versao: int):
+        """Aplica as comunicações gravadas ou corrigidas depois da versão já carregada.
+
+        Na primeira vez lê o upload inteiro; depois, uma correção reescreve só a
+        linha corrigida e um acréscimo ao workspace estende as colunas com as
+        comunicações novas. Aplicar de novo uma linha já aplicada não muda nada.
+        """
+        with self._lock:
+            if self.versao >= versao:
+                return
+            desde = self.versao if self.versao else None
+            for id, id_banco, registro in _ler_upload(session, self.upload_id, desde):
+                linha = self.linha(id) if desde is not None else None
+                if linha is None:
+                    self.adicionar(id, id_banco, registro)
+                else:
+                    self.substituir(linha, registro)
+            self.versao = versao
+
+    def linha(self, id: int) -> Optional[int]:
+        """Linha da comunicação com o id informado, em tempo constante"""
+        if self._linha_por_id is not None:
+            return self._linha_por_id.get(id)
+        if not self.ids:
+            return None
+        linha = id - self.ids[0]
+        return linha if 0 <= linha < len(self.ids) else None
+
+    def periodo(self, linha: int) -> Dict[str, Optional[str]]:
+        return {"inicio": self.data[linha], "fim": self.data_fim[linha]}
+
+    def valor(self, linha: int) -> float:
+        """Valor total da linha, com 0.0 para valores nulos"""
+        valor = self.valor_total[linha]
+        return 0.0 if math.isnan(valor) else valor
+
+    def valores(self, linha: int) -> Dict[str, Optional[float]]:
+        return {
+            nome: None if math.isnan(coluna[linha]) else coluna[linha]
+            for nome, coluna in zip(COLUNAS_VALOR, (self.valor_total,) + self.campos)
+        }
+
+    def agregados(self) -> AgregadosRIF:
+        """Recalcula os agregados percorrendo as colunas (uploads gravados sem agregados)"""
+        agregados = AgregadosRIF()
+        for linha in range(len(self)):
+            agregados.adicionar(self.banco[linha], self.valores(linha))
+        return agregados
+
+
+def construir_dataset(upload_id: int, usuario: str,
+                      linhas: Iterable[Tuple[int, int, Dict[str, Any]]],
+                      versao: int = 1) -> DatasetRIF:
+    dataset = DatasetRIF(upload_id, usuario, versao)
+    for id, id_banco, registro in linhas:
+        dataset.adicionar(id, id_banco, registro)
+    return dataset
+
+
+def _ler_upload(session, upload_id: int, desde_versao: Optional[int] = None):
+    """Comunicações do upload por id; com `desde_versao`, só as gravadas ou corrigidas depois dela"""
+    consulta = select(
+        Comunicacao.numero, Comunicacao.id, Comunicacao.banco, Comunicacao.uf_agencia,
+        Comunicacao.cidade_agencia, Comunicacao.codigo_segmento, Comunicacao.descricao_ocorrencia,
+        Comunicacao.titular, Comunicacao.cpf, Comunicacao.data, Comunicacao.data_fim,
+        *(getattr(Comunicacao, coluna) for coluna in COLUNAS_VALOR)
+    ).where(Comunicacao.upload_id == upload_id).order_by(Comunicacao.numero)
+    if desde_versao is not None:
+        consulta = consulta.where(Comunicacao.versao > desde_versao)
+    for c in session.execute(consulta).yield_per(1000):
+        yield c.numero, c.id, {
+            **{coluna: getattr(c, coluna) for coluna in COLUNAS_VALOR},
+            'banco': c.banco,
+            'uf_agencia': c.uf_agencia,
+            'cidade_agencia': c.cidade_agencia,
+            'codigo_segmento': c.codigo_segmento,
+            'ocorrencia': c.descricao_ocorrencia,
+            'titular': c.titular,
+            'cpf': c.cpf,
+            'data': c.data,
+            'data_fim': c.data_fim
+        }
+
+
+# Chaveados pela geração do upload: o id é reaproveitado quando um upload substitui o anterior
+_datasets: "OrderedDict[str, DatasetRIF]" = OrderedDict()
+_datasets_lock = threading.Lock()
+
+
+def carregar_dataset(usuario: Optional[str] = None) -> Optional[DatasetRIF]:
+    """Dataset do upload vigente do usuário (ou do mais recente), carregado uma vez por processo.
+
+    O upload vigente é consultado no banco a cada chamada, de modo que um novo
+    upload feito em outro worker é percebido na requisição seguinte. Correções
+    e acréscimos ao workspace (mesma geração, versão maior) são aplicados ao
+    dataset já carregado, sem relê-lo inteiro.
+    """
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return None
+        geracao = upload.geracao
+        with _datasets_lock:
+            dataset = _datasets.get(geracao)
+            metricas.contar_cache('dataset', dataset is not None and dataset.versao == upload.versao)
+            if dataset is None:
+                dataset = _datasets[geracao] = DatasetRIF(upload.id, upload.usuario, versao=0)
+                while len(_datasets) > MAX_DATASETS:
+                    _datasets.popitem(last=False)
+            else:
+                _datasets.move_to_end(geracao)
+        dataset.sincronizar(session, upload.versao)
+    return dataset
+
+
+_agregados: "OrderedDict[Tuple[str, int], AgregadosRIF]" = OrderedDict()
+
+
+def carregar_agregados(usuario: Optional[str] = None) -> Optional[AgregadosRIF]:
+    """Agregados do upload vigente, lidos da linha do upload sem carregar as comunicações"""
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return None
+        chave = (upload.geracao, upload.versao)
+        with _datasets_lock:
+            agregados = _agregados.get(chave)
+            if agregados is not None:
+                _agregados.move_to_end(chave)
+        metricas.contar_cache('agregados', agregados is not None)
+        if agregados is not None:
+            return agregados
+        texto = upload.agregados
+    if texto:
+        agregados = AgregadosRIF.de_json(texto)
+    else:
+        agregados = carregar_dataset(usuario).agregados()
+    with _datasets_lock:
+        _agregados[chave] = agregados
+        while len(_agregados) > MAX_DATASETS:
+            _agregados.popitem(last=False)
+    return agregados
+
+
+_grafos: "OrderedDict[str, Grafo]" = OrderedDict()
+
+
+def carregar_grafo(usuario: Optional[str] = None) -> Optional[Grafo]:
+    """Grafo de contrapartes do upload vigente, atualizado só com as arestas alteradas.
+
+    Na primeira consulta as arestas do upload são lidas inteiras; depois de uma
+    correção (ou de qualquer gravação que incremente a versão do upload), só as
+    arestas marcadas com versão posterior à já carregada são aplicadas. Um novo
+    upload tem outra geração e é carregado do zero, mesmo reaproveitando o id.
+    """
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return None
+        with _datasets_lock:
+            grafo = _grafos.get(upload.geracao)
+            metricas.contar_cache('grafo', grafo is not None)
+            if grafo is None:
+                grafo = _grafos[upload.geracao] = Grafo(upload.id)
+                while len(_grafos) > MAX_GRAFOS:
+                    _grafos.popitem(last=False)
+            else:
+                _grafos.move_to_end(upload.geracao)
+        grafo.sincronizar(session, upload.versao)
+    return grafo
+
+
+def textos_comunicacao(dataset: DatasetRIF, linha: int) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Busca no banco o texto bruto e o parsing_json completo de uma linha.
+
+    Retorna None se o upload foi substituído desde que o dataset foi carregado.
+    """
+    with SessionLocal() as session:
+        textos = session.execute(
+            select(Comunicacao.informacoes_adicionais, Comunicacao.parsing_json)
+            .where(Comunicacao.id == dataset.ids_banco[linha])
+        ).first()
+    if textos is None:
+        return None
+    informacoes, parsing_json = textos
+    return informacoes, json.loads(parsing_json) if parsing_json else {}
@@ -0,0 +1,138 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from .auth import usuario_atual
+from .busca import somente_digitos
+from .database import SessionLocal, garantir_schema
+from .ingestao import em_lotes
+from .models import EntidadeRIF, Upload
+from .vinculos import tipo_pessoa
+
+router = APIRouter()
+
+# Linhas por INSERT no índice durante a gravação de um RIF
+TAMANHO_LOTE_INDICE = 1000
+# Documentos por IN nas consultas (limite de parâmetros do SQLite)
+TAMANHO_LOTE_CONSULTA = 500
+MAX_DOCUMENTOS_CONSULTA = 5000
+# Ocorrências devolvidas por documento, das mais recentes para as mais antigas
+MAX_OCORRENCIAS = 100
+
+
+def linhas_indice(envolvidos: Iterable[Dict[str, str]], comunicacoes: Dict[str, Tuple[int, str]],
+                  rif: str, upload_id: int, geracao: str, usuario: str, data: str) -> Iterator[Dict[str, Any]]:
+    """Linhas do índice para cada envolvido com CPF/CNPJ válido, de qualquer papel"""
+    for row in envolvidos:
+        documento = somente_digitos(row.get('cpfCnpjEnvolvido') or '')
+        if not documento:
+            continue
+        indexador = (row.get('Indexador') or '').strip()
+        numero, id_comunicacao = comunicacoes.get(indexador, (None, None))
+        yield {
+            'documento': documento,
+            'nome': (row.get('nomeEnvolvido') or '').strip() or None,
+            'papel': (row.get('tipoEnvolvido') or '').strip() or None,
+            'indexador': indexador,
+            'id_comunicacao': id_comunicacao,
+            'numero': numero,
+            'rif': rif,
+            'upload_id': upload_id,
+            'geracao': geracao,
+            'usuario': usuario,
+            'data': data,
+        }
+
+
+def indexar_envolvidos(session, linhas: Iterable[Dict[str, Any]]) -> int:
+    """Grava as linhas no índice; um RIF carregado de novo só atualiza o upload de origem"""
+    total = 0
+    for lote in em_lotes(linhas, TAMANHO_LOTE_INDICE):
+        novas = insert(EntidadeRIF)
+        session.execute(novas.on_conflict_do_update(
+            index_elements=['documento', 'rif', 'indexador', 'papel'],
+            set_={coluna: getattr(novas.excluded, coluna)
+                  for coluna in ('nome', 'id_comunicacao', 'numero', 'upload_id', 'geracao', 'usuario', 'data')}
+        ), lote)
+        total += len(lote)
+    return total
+
+
+def consultar_documentos(documentos: List[str], limite: int = MAX_OCORRENCIAS) -> Dict[str, Dict[str, Any]]:
+    """Ocorrências de cada documento (já normalizado) em todos os RIFs; ausentes ficam de fora"""
+    garantir_schema()
+    resultado: Dict[str, Dict[str, Any]] = {}
+    # Numeração por documento para limitar as ocorrências de cada um em uma única consulta
+    ordem = func.row_number().over(partition_by=EntidadeRIF.documento, order_by=EntidadeRIF.id.desc())
+    total = func.count().over(partition_by=EntidadeRIF.documento)
+    with SessionLocal() as session:
+        for lote in em_lotes(list(dict.fromkeys(documentos)), TAMANHO_LOTE_CONSULTA):
+            ocorrencias = select(
+                EntidadeRIF, ordem.label('ordem'), total.label('total')
+            ).where(EntidadeRIF.documento.in_(lote)).subquery()
+            entidade = ocorrencias.c
+            consulta = (
+                select(entidade, Upload.id.is_not(None).label('vigente'))
+                .outerjoin(Upload, and_(Upload.id == entidade.upload_id, Upload.geracao == entidade.geracao))
+                .where(entidade.ordem <= limite)
+                .order_by(entidade.documento, entidade.ordem)
+            )
+            for linha in session.execute(consulta):
+                item = resultado.get(linha.documento)
+                if item is None:
+                    item = resultado[linha.documento] = {
+                        'documento': linha.documento,
+                        'tipo': tipo_pessoa(linha.documento),
+                        'total': linha.total,
+                        'rifs': set(),
+                        'ocorrencias': [],
+                    }
+                item['rifs'].add(linha.rif)
+                item['ocorrencias'].append({
+                    'nome': linha.nome,
+                    'papel': linha.papel,
+                    'indexador': linha.indexador,
+                    'id_comunicacao': linha.id_comunicacao,
+                    # Id na API só enquanto o upload de origem for o vigente
+                    'numero': linha.numero if linha.vigente else None,
+                    'rif': linha.rif,
+                    'usuario': linha.usuario,
+                    'data': linha.data,
+                    'vigente': bool(linha.vigente),
+                })
+    for item in resultado.values():
+        item['rifs'] = len(item['rifs'])
+    return resultado
+
+
+def _normalizar(documento: str) -> Optional[str]:
+    return somente_digitos(documento) if documento else None
+
+
+@router.get("/api/entidades/{documento}")
+def consultar_entidade(documento: str = Path(...), usuario: Optional[str] = Depends(usuario_atual)):
+    """Em quais RIFs, comunicações e papéis um CPF/CNPJ aparece"""
+    normalizado = _normalizar(documento)
+    if not normalizado:
+        raise HTTPException(status_code=400, detail="CPF/CNPJ inválido")
+    encontrado = consultar_documentos([normalizado]).get(normalizado)
+    if encontrado is None:
+        raise HTTPException(status_code=404, detail="CPF/CNPJ não encontrado em nenhum RIF")
+    return encontrado
+
+
+@router.post("/api/entidades/consulta")
+def consultar_entidades(documentos: List[str] = Body(..., embed=True),
+                        usuario: Optional[str] = Depends(usuario_atual)):
+    """Consulta em lote: cada documento informado, como enviado, com suas ocorrências"""
+    if len(documentos) > MAX_DOCUMENTOS_CONSULTA:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_DOCUMENTOS_CONSULTA} documentos por consulta")
+    normalizados = {documento: _normalizar(documento) for documento in documentos}
+    encontrados = consultar_documentos([n for n in normalizados.values() if n])
+    return {
+        'encontrados': {documento: encontrados[n] for documento, n in normalizados.items() if n in encontrados},
+        'nao_encontrados': [documento for documento, n in normalizados.items() if n and n not in encontrados],
+        'invalidos': [documento for documento, n in normalizados.items() if not n],
+    }
@@ -0,0 +1,375 @@
+import threading
+from array import array
+from collections import deque
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from .busca import somente_digitos
+from .models import Aresta, EntidadeGrafo
+from .vinculos import contrapartes, tipo_pessoa
+
+# Arestas novas acumuladas fora da adjacência compacta antes de recompactá-la
+MIN_PENDENTES_COMPACTACAO = 10000
+FRACAO_PENDENTES_COMPACTACAO = 0.25
+
+# Limites das consultas
+MAX_SALTOS_EXPANSAO = 3
+MAX_NOS_EXPANSAO = 500
+MAX_ARESTAS_EXPANSAO = 5000
+MAX_SALTOS_CAMINHO = 8
+
+
+def arestas_comunicacao(titular: Optional[str], cpf: Optional[str], parsed: Any
+                        ) -> Iterator[Tuple[str, str, str, int, float, int, Optional[str], Optional[str]]]:
+    """Vínculos do titular com as contrapartes do parser que têm CPF/CNPJ.
+
+    Produz (origem, destino, vínculo, direcionada, valor, quantidade, nome da
+    origem, nome do destino). Contrapartes só com nome ficam de fora: homônimos
+    criariam caminhos falsos entre pessoas diferentes.
+    """
+    documento_titular = somente_digitos(cpf) if cpf else None
+    if not documento_titular or not isinstance(parsed, dict):
+        return
+    for vinculo, direcao, nome, documento, valor, quantidade in contrapartes(parsed):
+        documento = somente_digitos(documento) if documento else None
+        if not documento or documento == documento_titular:
+            continue
+        if direcao == 'entrada':
+            yield documento, documento_titular, vinculo, 1, valor or 0.0, quantidade or 0, nome, titular
+        else:
+            yield documento_titular, documento, vinculo, int(direcao == 'saida'), valor or 0.0, quantidade or 0, titular, nome
+
+
+class ArestasLote:
+    """Arestas de um lote de comunicações somadas por (origem, destino, vínculo), prontas para gravar"""
+
+    def __init__(self):
+        self.arestas: Dict[Tuple[str, str, str], List[Any]] = {}
+        self.nomes: Dict[str, Optional[str]] = {}
+
+    def adicionar(self, titular: Optional[str], cpf: Optional[str], parsed: Any, sinal: int = 1):
+        """Soma (ou, com sinal -1, subtrai) as arestas de uma comunicação"""
+        for origem, destino, vinculo, direcionada, valor, quantidade, nome_origem, nome_destino in \
+                arestas_comunicacao(titular, cpf, parsed):
+            soma = self.arestas.get((origem, destino, vinculo))
+            if soma is None:
+                soma = self.arestas[(origem, destino, vinculo)] = [direcionada, 0.0, 0, 0]
+            soma[1] += sinal * valor
+            soma[2] += sinal * quantidade
+            soma[3] += sinal
+            if sinal > 0:
+                self.nomes.setdefault(origem, nome_origem or None)
+                self.nomes.setdefault(destino, nome_destino or None)
+
+    def gravar(self, session, upload_id: int, versao: int):
+        """Soma o lote às arestas já gravadas do upload, marcando as alteradas com `versao`"""
+        linhas = [
+            {'upload_id': upload_id, 'origem': origem, 'destino': destino, 'vinculo': vinculo,
+             'direcionada': direcionada, 'valor': valor, 'quantidade': quantidade,
+             'comunicacoes': comunicacoes, 'versao': versao}
+            for (origem, destino, vinculo), (direcionada, valor, quantidade, comunicacoes) in self.arestas.items()
+            # Correção que mantém a aresta como estava
+            if valor or quantidade or comunicacoes
+        ]
+        if linhas:
+            novas = insert(Aresta)
+            session.execute(novas.on_conflict_do_update(
+                index_elements=['upload_id', 'origem', 'destino', 'vinculo'],
+                set_={
+                    'valor': Aresta.valor + novas.excluded.valor,
+                    'quantidade': Aresta.quantidade + novas.excluded.quantidade,
+                    'comunicacoes': Aresta.comunicacoes + novas.excluded.comunicacoes,
+                    'versao': novas.excluded.versao,
+                }
+            ), linhas)
+        if self.nomes:
+            session.execute(insert(EntidadeGrafo).on_conflict_do_nothing(
+                index_elements=['upload_id', 'documento']
+            ), [
+                {'upload_id': upload_id, 'documento': documento, 'nome': nome, 'versao': versao}
+                for documento, nome in self.nomes.items()
+            ])
+        self.arestas, self.nomes = {}, {}
+
+
+class Grafo:
+    """Grafo de contrapartes de um upload em arrays compactos.
+
+    As arestas ficam em colunas (origem, destino, vínculo, valor...) e a
+    adjacência em formato CSR: `adjacentes[inicio[n]:inicio[n + 1]]` são os ids
+    das arestas do nó n, nos dois sentidos. Arestas chegadas depois da última
+    compactação ficam em listas à parte até a próxima. `versao` é a versão do
+    upload já refletida; `sincronizar` lê do banco só as arestas alteradas depois dela.
+    """
+
+    def __init__(self, upload_id: int):
+        self.upload_id = upload_id
+        self.versao = 0
+        self.documentos: List[str] = []
+        self.nomes: List[Optional[str]] = []
+        self._no: Dict[str, int] = {}
+        self.vinculos: List[str] = []
+        self._vinculo: Dict[str, int] = {}
+        self.origem = array('l')
+        self.destino = array('l')
+        self.vinculo = array('H')
+        self.direcionada = array('b')
+        self.valor = array('d')
+        self.quantidade = array('q')
+        self.comunicacoes = array('l')
+        # (inicio, adjacentes, pendentes): trocados juntos, para leituras concorrentes
+        self._adjacencia: Tuple[array, array, Dict[int, List[int]]] = (array('q', [0]), array('l'), {})
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.origem)
+
+    def no(self, documento: str, nome: Optional[str] = None) -> int:
+        indice = self._no.get(documento)
+        if indice is None:
+            indice = self._no[documento] = len(self.documentos)
+            self.documentos.append(documento)
+            self.nomes.append(nome)
+        elif nome and not self.nomes[indice]:
+            self.nomes[indice] = nome
+        return indice
+
+    def _codigo_vinculo(self, vinculo: str) -> int:
+        codigo = self._vinculo.get(vinculo)
+        if codigo is None:
+            codigo = self._vinculo[vinculo] = len(self.vinculos)
+            self.vinculos.append(vinculo)
+        return codigo
+
+    def _nova_aresta(self, origem: int, destino: int, vinculo: int, direcionada: int,
+                     valor: float, quantidade: int, comunicacoes: int) -> int:
+        self.origem.append(origem)
+        self.destino.append(destino)
+        self.vinculo.append(vinculo)
+        self.direcionada.append(direcionada)
+        self.valor.append(valor)
+        self.quantidade.append(quantidade)
+        self.comunicacoes.append(comunicacoes)
+        return len(self.origem) - 1
+
+    def arestas_do_no(self, no: int) -> Iterator[int]:
+        inicio, adjacentes, pendentes = self._adjacencia
+        if no + 1 < len(inicio):
+            yield from adjacentes[inicio[no]:inicio[no + 1]]
+        yield from pendentes.get(no, ())
+
+    def grau(self, no: int) -> int:
+        inicio, _, pendentes = self._adjacencia
+        return (inicio[no + 1] - inicio[no] if no + 1 < len(inicio) else 0) + len(pendentes.get(no, ()))
+
+    def compactar(self):
+        """Refaz a adjacência CSR com todas as arestas (ordenação por contagem, O(V + E))"""
+        graus = [0] * (len(self.documentos) + 1)
+        for origem, destino in zip(self.origem, self.destino):
+            graus[origem + 1] += 1
+            graus[destino + 1] += 1
+        inicio = array('q', accumulate(graus))
+        posicao = array('q', inicio)
+        adjacentes = array('l', [0]) * (2 * len(self.origem))
+        for aresta, (origem, destino) in enumerate(zip(self.origem, self.destino)):
+            adjacentes[posicao[origem]] = aresta
+            posicao[origem] += 1
+            adjacentes[posicao[destino]] = aresta
+            posicao[destino] += 1
+        self._adjacencia = (inicio, adjacentes, {})
+        self._pendentes = 0
+
+    def _atualizar(self, origem: int, destino: int, vinculo: int, direcionada: int,
+                   valor: float, quantidade: int, comunicacoes: int):
+        """Substitui os totais de uma aresta existente ou acrescenta uma nova"""
+        # Basta percorrer o nó de menor grau, que costuma ser a contraparte e não o hub
+        for aresta in self.arestas_do_no(min(origem, destino, key=self.grau)):
+            if self.origem[aresta] == origem and self.destino[aresta] == destino and self.vinculo[aresta] == vinculo:
+                self.valor[aresta] = valor
+                self.quantidade[aresta] = quantidade
+                self.comunicacoes[aresta] = comunicacoes
+                return
+        if comunicacoes <= 0:
+            return
+        aresta = self._nova_aresta(origem, destino, vinculo, direcionada, valor, quantidade, comunicacoes)
+        pendentes = self._adjacencia[2]
+        pendentes.setdefault(origem, []).append(aresta)
+        pendentes.setdefault(destino, []).append(aresta)
+        self._pendentes += 1
+        if self._pendentes > max(MIN_PENDENTES_COMPACTACAO, FRACAO_PENDENTES_COMPACTACAO * len(self)):
+            self.compactar()
+
+    def sincronizar(self, session, versao: int):
+        """Aplica as entidades e arestas gravadas depois da versão já carregada"""
+        with self._lock:
+            if self.versao >= versao:
+                return
+            for documento, nome in session.execute(
+                select(EntidadeGrafo.documento, EntidadeGrafo.nome)
+                .where(EntidadeGrafo.upload_id == self.upload_id, EntidadeGrafo.versao > self.versao)
+            ):
+                self.no(documento, nome)
+            linhas = session.execute(
+                select(Aresta.origem, Aresta.destino, Aresta.vinculo, Aresta.direcionada,
+                       Aresta.valor, Aresta.quantidade, Aresta.comunicacoes)
+                .where(Aresta.upload_id == self.upload_id, Aresta.versao > self.versao)
+            ).yield_per(10000)
+            carga_inicial = not len(self)
+            for origem, destino, vinculo, direcionada, valor, quantidade, comunicacoes in linhas:
+                args = (self.no(origem), self.no(destino), self._codigo_vinculo(vinculo),
+                        direcionada, valor, quantidade, comunicacoes)
+                if not carga_inicial:
+                    self._atualizar(*args)
+                elif comunicacoes > 0:
+                    self._nova_aresta(*args)
+            if carga_inicial:
+                self.compactar()
+            self.versao = versao
+
+    # Consultas
+
+    def _outro(self, aresta: int, no: int) -> int:
+        origem = self.origem[aresta]
+        return self.destino[aresta] if origem == no else origem
+
+    def entidade(self, no: int) -> Dict[str, Any]:
+        documento = self.documentos[no]
+        return {'documento': documento, 'nome': self.nomes[no], 'tipo': tipo_pessoa(documento)}
+
+    def aresta(self, aresta: int) -> Dict[str, Any]:
+        return {
+            'origem': self.documentos[self.origem[aresta]],
+            'destino': self.documentos[self.destino[aresta]],
+            'vinculo': self.vinculos[self.vinculo[aresta]],
+            'direcionada': bool(self.direcionada[aresta]),
+            'valor': self.valor[aresta],
+            'quantidade': self.quantidade[aresta],
+            'comunicacoes': self.comunicacoes[aresta],
+        }
+
+    def vizinhos(self, documento: str, direcao: str = 'todas', limite: int = 100) -> Optional[Dict[str, Any]]:
+        """Contrapartes diretas de uma entidade, das de maior valor para as de menor"""
+        no = self._no.get(documento)
+        if no is None:
+            return None
+        arestas = []
+        for aresta in self.arestas_do_no(no):
+            if self.comunicacoes[aresta] <= 0:
+                continue
+            if not self.direcionada[aresta]:
+                sentido = 'relacao'
+            else:
+                sentido = 'saida' if self.origem[aresta] == no else 'entrada'
+            if direcao == 'todas' or direcao == sentido:
+                arestas.append((aresta, sentido))
+        arestas.sort(key=lambda par: self.valor[par[0]], reverse=True)
+        return {
+            'entidade': self.entidade(no),
+            'total': len(arestas),
+            'vizinhos': [
+                {**self.entidade(self._outro(aresta, no)), 'direcao': sentido,
+                 **{chave: valor for chave, valor in self.aresta(aresta).items() if chave not in ('origem', 'destino')}}
+                for aresta, sentido in arestas[:limite]
+            ]
+        }
+
+    def expandir(self, documento: str, saltos: int = 2, max_nos: int = MAX_NOS_EXPANSAO) -> Optional[Dict[str, Any]]:
+        """Vizinhança de até `saltos` saltos (busca em largura, sem considerar o sentido)"""
+        inicial = self._no.get(documento)
+        if inicial is None:
+            return None
+        distancia = {inicial: 0}
+        arestas: Dict[int, None] = {}
+        fila = deque([inicial])
+        truncado = False
+        comunicacoes, origem, destino = self.comunicacoes, self.origem, self.destino
+        while fila and not truncado:
+            no = fila.popleft()
+            atual = distancia[no]
+            if atual >= saltos:
+                break
+            for aresta in self.arestas_do_no(no):
+                if comunicacoes[aresta] <= 0:
+                    continue
+                outro = destino[aresta] if origem[aresta] == no else origem[aresta]
+                if outro not in distancia:
+                    if len(distancia) >= max_nos:
+                        # Chegou a um hub: parar em vez de percorrer todos os seus vínculos
+                        truncado = True
+                        break
+                    distancia[outro] = atual + 1
+                    fila.append(outro)
+                if len(arestas) >= MAX_ARESTAS_EXPANSAO:
+                    truncado = True
+                    break
+                arestas[aresta] = None
+        return {
+            'entidade': self.entidade(inicial),
+            'saltos': saltos,
+            'truncado': truncado,
+            'nos': [{**self.entidade(no), 'distancia': d} for no, d in distancia.items()],
+            'arestas': [self.aresta(aresta) for aresta in arestas],
+        }
+
+    def caminho(self, documento_origem: str, documento_destino: str, max_saltos: int = 6,
+                direcionado: bool = False) -> Optional[Dict[str, Any]]:
+        """Menor caminho entre duas entidades por busca em largura bidirecional.
+
+        Com `direcionado`, só segue arestas no sentido do recurso (origem -> destino).
+        """
+        inicio, fim = self._no.get(documento_origem), self._no.get(documento_destino)
+        if inicio is None or fim is None:
+            return None
+        # nó -> (anterior, aresta, profundidade), a partir de cada ponta
+        lados = ({inicio: (None, None, 0)}, {fim: (None, None, 0)})
+        fronteiras = ([inicio], [fim])
+        encontro = inicio if inicio == fim else None
+        saltos = 0
+        while encontro is None and saltos < max_saltos and fronteiras[0] and fronteiras[1]:
+            # Expande a fronteira menor; a de trás anda contra o sentido das arestas
+            lado = 0 if len(fronteiras[0]) <= len(fronteiras[1]) else 1
+            visitados, outros = lados[lado], lados[1 - lado]
+            proxima, encontros = [], []
+            for no in fronteiras[lado]:
+                profundidade = visitados[no][2] + 1
+                for aresta in self.arestas_do_no(no):
+                    if self.comunicacoes[aresta] <= 0:
+                        continue
+                    if direcionado and (not self.direcionada[aresta]
+                                        or (self.origem[aresta] if lado == 0 else self.destino[aresta]) != no):
+                        continue
+                    outro = self._outro(aresta, no)
+                    if outro in visitados:
+                        continue
+                    visitados[outro] = (no, aresta, profundidade)
+                    proxima.append(outro)
+                    if outro in outros:
+                        encontros.append(outro)
+            fronteiras = (proxima, fronteiras[1]) if lado == 0 else (fronteiras[0], proxima)
+            saltos += 1
+            if encontros:
+                encontro = min(encontros, key=lambda n: lados[0][n][2] + lados[1][n][2])
+        if encontro is None:
+            return {'encontrado': False, 'saltos': None, 'nos': [], 'arestas': []}
+
+        nos, arestas = [encontro], []
+        no = encontro
+        while lados[0][no][0] is not None:
+            no, aresta, _ = lados[0][no]
+            nos.insert(0, no)
+            arestas.insert(0, aresta)
+        no = encontro
+        while lados[1][no][0] is not None:
+            no, aresta, _ = lados[1][no]
+            nos.append(no)
+            arestas.append(aresta)
+        return {
+            'encontrado': True,
+            'saltos': len(arestas),
+            'nos': [self.entidade(no) for no in nos],
+            'arestas': [self.aresta(aresta) for aresta in arestas],
+        }
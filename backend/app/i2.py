@@ -0,0 +1,240 @@
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Set
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from .ingestao import ErroValidacaoCSV, ingerir_rif, ler_linhas, nova_estatistica
+from .upload_chunks import MAX_TAMANHO_ARQUIVO, TAMANHO_CHUNK
+from .utils import HEADERS_COMUNICACOES, HEADERS_ENVOLVIDOS, HEADERS_OCORRENCIAS, detect_encoding
+from .validacao import aviso_cobertura, cobertura_indexador, ler_prefixo, validar_prefixo
+from .vinculos import DIRECAO_ENVOLVIDO, chave_entidade, contrapartes, tipo_pessoa
+from .xlsx import EscritorXLSX, PlanilhaTemporaria
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+NOME_ARQUIVO_I2 = "RIF_InformacoesAdicionais_I2.xlsx"
+MIDIA_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+ARQUIVOS_I2 = ('comunicacoes', 'envolvidos', 'ocorrencias')
+# Colunas obrigatórias e colunas amostradas de cada arquivo na validação rápida
+VALIDACAO_I2 = {
+    'comunicacoes': (HEADERS_COMUNICACOES, {'nomeComunicante': 'bancos_encontrados'}),
+    'envolvidos': (HEADERS_ENVOLVIDOS, {'tipoEnvolvido': 'tipos_envolvidos'}),
+    'ocorrencias': (HEADERS_OCORRENCIAS, {}),
+}
+
+# Uma linha por vínculo, no formato de importação por planilha do i2 Analyst's Notebook
+COLUNAS_VINCULOS = [
+    'ID Origem', 'Tipo Origem', 'Nome Origem', 'ID Destino', 'Tipo Destino', 'Nome Destino',
+    'Vínculo', 'Valor', 'Quantidade', 'Data', 'Data Fim', 'Indexador', 'idComunicacao', 'Comunicante', 'Fonte'
+]
+COLUNAS_ENTIDADES = ['ID', 'Tipo', 'Nome', 'CPF/CNPJ']
+COLUNAS_COMUNICACOES = [
+    'Indexador', 'idComunicacao', 'NumeroOcorrenciaBC', 'Comunicante', 'CPF/CNPJ Comunicante', 'Titular',
+    'CPF/CNPJ Titular', 'Data', 'Data Fim', 'Valor', 'Cidade Agência', 'UF Agência', 'Segmento', 'Ocorrência',
+    'Informações Adicionais'
+]
+
+
+def salvar_temporario(origem: BinaryIO, destino: str):
+    """Copia o arquivo enviado para o disco em blocos, respeitando RIF_MAX_UPLOAD_MB"""
+    total = 0
+    with open(destino, 'wb') as f:
+        while True:
+            bloco = origem.read(TAMANHO_CHUNK)
+            if not bloco:
+                break
+            total += len(bloco)
+            if total > MAX_TAMANHO_ARQUIVO:
+                raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {MAX_TAMANHO_ARQUIVO // (1024 * 1024)} MB.")
+            f.write(bloco)
+
+
+class _Entidades:
+    """Planilha de entidades sem repetição; em memória fica só o conjunto de ids já escritos"""
+
+    def __init__(self):
+        self.planilha = PlanilhaTemporaria('Entidades', COLUNAS_ENTIDADES)
+        self.vistas: Set[str] = set()
+
+    def registrar(self, nome: Optional[str], documento: Optional[str], tipo: Optional[str] = None) -> Optional[Dict[str, str]]:
+        chave = chave_entidade(nome, documento)
+        if chave is None:
+            return None
+        tipo = tipo or tipo_pessoa(chave if not chave.startswith('NOME:') else None)
+        nome = (nome or '').strip() or chave
+        if chave not in self.vistas:
+            self.vistas.add(chave)
+            self.planilha.adicionar((chave, tipo, nome, '' if chave.startswith('NOME:') else chave))
+        return {'id': chave, 'tipo': tipo, 'nome': nome}
+
+
+def _vinculo(origem: Dict[str, str], destino: Dict[str, str], vinculo: str, valor: Optional[float],
+             quantidade: Optional[int], c: Optional[Dict[str, Any]], indexador: str, fonte: str) -> tuple:
+    return (
+        origem['id'], origem['tipo'], origem['nome'], destino['id'], destino['tipo'], destino['nome'],
+        vinculo, valor, quantidade, c['data'] if c else None, c['data_fim'] if c else None, indexador,
+        c['id_comunicacao'] if c else None, c['banco'] if c else None, fonte
+    )
+
+
+def gerar_xlsx_i2(resultado: Dict[str, Any], caminhos: Dict[str, str], encodings: Dict[str, str],
+                  pasta: Optional[str] = None) -> Iterator[bytes]:
+    """Gera o .xlsx para o i2 em fluxo, enquanto as comunicações são lidas e interpretadas.
+
+    A planilha de vínculos vai direto para o cliente; entidades e comunicações
+    são escritas em arquivos temporários e anexadas ao final. A memória fica
+    limitada aos mapas da ingestão e ao conjunto de ids de entidades.
+    `pasta`, se informada, é removida ao final (arquivos enviados).
+    """
+    # Só entrega blocos com conteúdo: cada próximo bloco custa uma ida ao threadpool
+    blocos = _blocos_i2(resultado, caminhos, encodings, pasta)
+    try:
+        for bloco in blocos:
+            if bloco:
+                yield bloco
+    finally:
+        blocos.close()
+
+
+def _blocos_i2(resultado: Dict[str, Any], caminhos: Dict[str, str], encodings: Dict[str, str],
+               pasta: Optional[str]) -> Iterator[bytes]:
+    escritor = EscritorXLSX(['Vinculos', 'Entidades', 'Comunicacoes'])
+    entidades = _Entidades()
+    comunicacoes = PlanilhaTemporaria('Comunicacoes', COLUNAS_COMUNICACOES)
+    try:
+        yield escritor.iniciar_planilha(COLUNAS_VINCULOS)
+        for c in resultado['comunicacoes']:
+            valor = c['valores'].get('valor_total')
+            comunicacoes.adicionar((
+                c['indexador'], c['id_comunicacao'], c['numero_ocorrencia'], c['banco'], c['cpf_cnpj_comunicante'],
+                c['titular'], c['cpf'], c['data'], c['data_fim'], valor, c['cidade_agencia'], c['uf_agencia'],
+                c['codigo_segmento'], c['ocorrencia'], c['informacoes_adicionais']
+            ))
+            titular = entidades.registrar(c['titular'], c['cpf'])
+            if titular is None:
+                continue
+            comunicante = entidades.registrar(c['banco'], c['cpf_cnpj_comunicante'], 'Comunicante')
+            if comunicante:
+                yield escritor.adicionar(_vinculo(comunicante, titular, 'Comunicação', valor, None,
+                                                  c, c['indexador'], 'Comunicacoes.csv'))
+            for vinculo, direcao, nome, documento, valor_contraparte, quantidade in contrapartes(c['parsing_json']):
+                contraparte = entidades.registrar(nome, documento)
+                if contraparte is None or contraparte['id'] == titular['id']:
+                    continue
+                origem, destino = (titular, contraparte) if direcao == 'saida' else (contraparte, titular)
+                yield escritor.adicionar(_vinculo(origem, destino, vinculo, valor_contraparte, quantidade,
+                                                  c, c['indexador'], 'informacoesAdicionais'))
+
+        # Demais envolvidos de cada comunicação (remetentes, beneficiários, sócios...), lidos em fluxo
+        titulares = resultado['envolvidos']
+        for row in ler_linhas(caminhos['envolvidos'], encodings['envolvidos'], HEADERS_ENVOLVIDOS,
+                              'envolvidos', nova_estatistica()):
+            papel = (row.get('tipoEnvolvido') or '').strip()
+            indexador = row.get('Indexador', '')
+            dados_titular = titulares.get(indexador)
+            if papel.lower() == 'titular' or not dados_titular:
+                continue
+            titular = entidades.registrar(dados_titular['nome'], dados_titular['cpf'])
+            envolvido = entidades.registrar(row.get('nomeEnvolvido'), row.get('cpfCnpjEnvolvido'))
+            if titular is None or envolvido is None or envolvido['id'] == titular['id']:
+                continue
+            direcao = DIRECAO_ENVOLVIDO.get(papel.lower(), 'relacao')
+            origem, destino = (titular, envolvido) if direcao == 'saida' else (envolvido, titular)
+            yield escritor.adicionar(_vinculo(origem, destino, papel or 'Envolvido', None, None,
+                                              None, indexador, 'Envolvidos.csv'))
+
+        yield from escritor.copiar_planilha(entidades.planilha)
+        yield from escritor.copiar_planilha(comunicacoes)
+        yield escritor.finalizar()
+    finally:
+        entidades.planilha.fechar()
+        comunicacoes.fechar()
+        if pasta:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _tamanho(arquivo: UploadFile) -> int:
+    posicao = arquivo.file.tell()
+    arquivo.file.seek(0, os.SEEK_END)
+    tamanho = arquivo.file.tell()
+    arquivo.file.seek(posicao)
+    return tamanho
+
+
+@router.post("/api/i2/validar-arquivos")
+def validar_arquivos_i2(
+    comunicacoes: UploadFile = File(...),
+    envolvidos: UploadFile = File(...),
+    ocorrencias: UploadFile = File(...),
+    tamanho_comunicacoes: Optional[int] = Form(None),
+    tamanho_envolvidos: Optional[int] = Form(None),
+    tamanho_ocorrencias: Optional[int] = Form(None)
+):
+    """Validação prévia da tripla lendo só o cabeçalho e o início de cada arquivo.
+
+    O cliente pode enviar apenas o começo de cada arquivo junto com o tamanho
+    real (`tamanho_*`), usado para estimar o número de linhas.
+    """
+    arquivos = {'comunicacoes': comunicacoes, 'envolvidos': envolvidos, 'ocorrencias': ocorrencias}
+    tamanhos = {'comunicacoes': tamanho_comunicacoes, 'envolvidos': tamanho_envolvidos,
+                'ocorrencias': tamanho_ocorrencias}
+    resposta: Dict[str, Any] = {}
+    indexadores: Dict[str, Set[str]] = {}
+    for chave, arquivo in arquivos.items():
+        headers, amostras = VALIDACAO_I2[chave]
+        prefixo = ler_prefixo(arquivo.file)
+        resultado, indexadores[chave] = validar_prefixo(
+            prefixo, tamanhos[chave] or _tamanho(arquivo), headers, amostras)
+        for coluna, nome in amostras.items():
+            resultado[nome] = resultado.pop(coluna)
+        resposta[chave] = resultado
+
+    cobertura, avisos = {}, []
+    for chave in ('envolvidos', 'ocorrencias'):
+        cobertura[chave] = cobertura_indexador(indexadores['comunicacoes'], indexadores[chave])
+        aviso = aviso_cobertura(f'{chave.capitalize()}.csv', cobertura[chave])
+        if aviso:
+            avisos.append(aviso)
+    resposta['status_geral'] = {
+        'valido': all(r['valido'] for r in resposta.values()),
+        'cobertura_indexador': cobertura,
+        'avisos': avisos,
+    }
+    return resposta
+
+
+@router.post("/api/i2/gerar-arquivo")
+def gerar_arquivo_i2(
+    comunicacoes: UploadFile = File(...),
+    envolvidos: UploadFile = File(...),
+    ocorrencias: UploadFile = File(...)
+):
+    """Converte a tripla de CSVs em planilha para o i2 Analyst's Notebook, enviada enquanto é gerada"""
+    pasta = tempfile.mkdtemp(prefix="rif_i2_")
+    try:
+        arquivos = {'comunicacoes': comunicacoes, 'envolvidos': envolvidos, 'ocorrencias': ocorrencias}
+        caminhos = {chave: os.path.join(pasta, f"{chave}.csv") for chave in ARQUIVOS_I2}
+        for chave, arquivo in arquivos.items():
+            salvar_temporario(arquivo.file, caminhos[chave])
+        encodings = {chave: detect_encoding(caminho) for chave, caminho in caminhos.items()}
+        # Headers conferidos e envolvidos/ocorrências mapeados antes de começar a resposta
+        resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings)
+    except ErroValidacaoCSV as e:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Erro no arquivo {e.arquivo}: {e.mensagem}")
+    except BaseException:
+        shutil.rmtree(pasta, ignore_errors=True)
+        raise
+
+    logger.debug("Gerando arquivo i2: %d envolvidos", resultado['estatisticas']['envolvidos']['linhas_validas'])
+    return StreamingResponse(
+        gerar_xlsx_i2(resultado, caminhos, encodings, pasta),
+        media_type=MIDIA_XLSX,
+        headers={"Content-Disposition": f'attachment; filename="{NOME_ARQUIVO_I2}"'}
+    )
@@ -0,0 +1,263 @@
+import csv
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .utils import HEADERS_COMUNICACOES, HEADERS_ENVOLVIDOS, HEADERS_OCORRENCIAS
+from .cache_parsing import parse_lotes_com_cache
+from .agregados import valores_lote
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de linhas processadas por vez; limita o pico de memória da ingestão
+TAMANHO_LOTE = 500
+# Comunicações que passaram do limite de parsing listadas nas estatísticas (o total é sempre contado)
+MAX_PARSING_LIMITADO = 100
+
+HEXADECIMAIS = frozenset('0123456789abcdefABCDEF')
+
+
+class ErroValidacaoCSV(Exception):
+    """Erro de estrutura em um dos arquivos CSV do RIF"""
+
+    def __init__(self, arquivo: str, mensagem: str):
+        super().__init__(mensagem)
+        self.arquivo = arquivo
+        self.mensagem = mensagem
+
+
+def nova_estatistica() -> Dict[str, Any]:
+    """Contadores acumulados durante a leitura de um arquivo"""
+    return {
+        'linhas_lidas': 0,
+        'linhas_validas': 0,
+        'linhas_ignoradas': {'invalida': 0, 'descritiva': 0, 'md5': 0}
+    }
+
+
+def motivo_linha_ignorada(indexador: Optional[str]) -> Optional[str]:
+    """Retorna o motivo para ignorar a linha, ou None se ela contém dados"""
+    # Linhas que são comentários ou não têm dados válidos
+    if not indexador or indexador.startswith('#') or indexador.strip() == "":
+        return 'invalida'
+
+    # Linhas que contêm texto descritivo em vez de dados numéricos
+    if ":" in indexador or "=" in indexador or "CampoA" in indexador or "CampoB" in indexador:
+        return 'descritiva'
+
+    # Linhas que são hashes MD5 (32 caracteres hexadecimais)
+    indexador = indexador.strip()
+    if len(indexador) == 32 and HEXADECIMAIS.issuperset(indexador):
+        return 'md5'
+
+    return None
+
+
+def verificar_headers(caminho: str, encoding: str, expected_headers: List[str], arquivo: str) -> List[str]:
+    """Lê apenas a linha de cabeçalho e confere as colunas obrigatórias"""
+    with open(caminho, encoding=encoding) as f:
+        headers = next(csv.reader(f, delimiter=';'), [])
+    missing_headers = [h for h in expected_headers if h not in headers]
+    if missing_headers:
+        raise ErroValidacaoCSV(arquivo, f'Headers obrigatórios não encontrados: {", ".join(missing_headers)}')
+    return headers
+
+
+def ler_linhas(caminho: str, encoding: str, expected_headers: List[str], arquivo: str,
+               estatistica: Dict[str, Any]) -> Iterator[Dict[str, str]]:
+    """Percorre o CSV uma única vez, validando headers e descartando linhas sem dados.
+
+    As linhas são produzidas sob demanda, de modo que apenas o buffer de leitura
+    fica em memória, independentemente do tamanho do arquivo.
+    """
+    with open(caminho, encoding=encoding) as f:
+        reader = csv.DictReader(f, delimiter=';')
+        headers = reader.fieldnames or []
+        missing_headers = [h for h in expected_headers if h not in headers]
+        if missing_headers:
+            raise ErroValidacaoCSV(arquivo, f'Headers obrigatórios não encontrados: {", ".join(missing_headers)}')
+
+        ignoradas = estatistica['linhas_ignoradas']
+        for row in reader:
+            estatistica['linhas_lidas'] += 1
+            motivo = motivo_linha_ignorada(row.get("Indexador", ""))
+            if motivo:
+                ignoradas[motivo] += 1
+                continue
+            estatistica['linhas_validas'] += 1
+            yield row
+
+
+def em_lotes(linhas: Iterable[Any], tamanho: int = TAMANHO_LOTE) -> Iterator[List[Any]]:
+    """Agrupa um iterável em listas de no máximo `tamanho` itens"""
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def mapear_envolvidos(caminho: str, encoding: str, estatistica: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Mapeia os titulares por Indexador"""
+    envolvido_map = {}
+    for row in ler_linhas(caminho, encoding, HEADERS_ENVOLVIDOS, 'envolvidos', estatistica):
+        tipo = (row.get("tipoEnvolvido", "") or "").strip().lower()
+        if tipo == "titular":
+            envolvido_map[row.get("Indexador", "")] = {
+                "nome": row.get("nomeEnvolvido", ""),
+                "cpf": row.get("cpfCnpjEnvolvido", "")
+            }
+    return envolvido_map
+
+
+def mapear_ocorrencias(caminho: str, encoding: str, estatistica: Dict[str, Any]) -> Dict[str, str]:
+    """Mapeia a descrição das ocorrências por idOcorrencia"""
+    ocorrencia_map = {}
+    for row in ler_linhas(caminho, encoding, HEADERS_OCORRENCIAS, 'ocorrencias', estatistica):
+        ocorrencia_map[row.get("idOcorrencia", "")] = row.get("Ocorrencia", "")
+    return ocorrencia_map
+
+
+def data_iso(data: Optional[str]) -> Optional[str]:
+    """Converte DD/MM/AAAA para AAAA-MM-DD (ordenável); None se a data não estiver nesse formato"""
+    if not data:
+        return None
+    data = data.strip()
+    if len(data) != 10 or data[2] != '/' or data[5] != '/':
+        return None
+    dia, mes, ano = data[:2], data[3:5], data[6:]
+    if not (dia.isdigit() and mes.isdigit() and ano.isdigit()):
+        return None
+    return f"{ano}-{mes}-{dia}"
+
+
+def montar_comunicacao(row: Dict[str, str], parsed: Dict[str, Any], id: int,
+                       envolvido_map: Dict[str, Dict[str, str]], ocorrencia_map: Dict[str, str]) -> Dict[str, Any]:
+    """Monta o registro de comunicação a partir da linha do CSV e do parsing"""
+    titular = envolvido_map.get(row.get("Indexador", ""), {})
+
+    # Adicionar período e valor total diretamente do CSV
+    parsed["periodo"] = {
+        "inicio": row.get("Data_da_operacao", ""),
+        "fim": row.get("DataFimFato", "")
+    }
+    parsed["valor_total"] = str(row.get("CampoA", "0"))
+
+    return {
+        "id": id,
+        "id_comunicacao": row.get("idComunicacao", ""),
+        "banco": row.get("nomeComunicante", ""),
+        "cpf_cnpj_comunicante": row.get("cpfCnpjComunicante", ""),
+        "data": row.get("Data_da_operacao", ""),
+        "data_iso": data_iso(row.get("Data_da_operacao")),
+        "informacoes_adicionais": row.get("informacoesAdicionais", ""),
+        "parsing_json": parsed,
+        "codigo_segmento": row.get("CodigoSegmento", ""),
+        "cidade_agencia": row.get("CidadeAgencia", ""),
+        "uf_agencia": row.get("UFAgencia", ""),
+        "titular": titular.get("nome", ""),
+        "cpf": titular.get("cpf", ""),
+        "ocorrencia": ocorrencia_map.get(row.get("NumeroOcorrenciaBC", ""), ""),
+        "data_fim": row.get("DataFimFato", ""),
+        "indexador": row.get("Indexador", ""),
+        "numero_ocorrencia": row.get("NumeroOcorrenciaBC", "")
+    }
+
+
+def registrar_parsing_limitado(estatistica: Dict[str, Any], row: Dict[str, str], limite: Dict[str, Any]):
+    """Conta a comunicação interpretada pelo parser genérico por ter passado do limite de tempo"""
+    limitado = estatistica['parsing_limitado']
+    limitado['total'] += 1
+    metricas.PARSING_LIMITADO.inc(limite['parser'])
+    logger.warning("Comunicação %s: parser %s excedeu %.0f ms (%.1f ms); interpretada pelo parser genérico",
+                   row.get("Indexador", ""), limite['parser'], limite['limite_ms'], limite['tempo_ms'])
+    if len(limitado['comunicacoes']) < MAX_PARSING_LIMITADO:
+        limitado['comunicacoes'].append({
+            'indexador': row.get("Indexador", ""),
+            'id_comunicacao': row.get("idComunicacao", ""),
+            **limite
+        })
+
+
+def chave_comunicacao(row: Dict[str, str]) -> Tuple[str, str]:
+    """(idComunicacao, NumeroOcorrenciaBC): identifica uma comunicação entre RIFs"""
+    return (row.get("idComunicacao") or "").strip(), (row.get("NumeroOcorrenciaBC") or "").strip()
+
+
+def processar_comunicacoes(caminho: str, encoding: str, envolvido_map: Dict[str, Dict[str, str]],
+                           ocorrencia_map: Dict[str, str], estatistica: Dict[str, Any],
+                           filtro: Optional[Callable[[List[Dict[str, str]]], List[Dict[str, str]]]] = None,
+                           primeiro_id: int = 1) -> Iterator[Dict[str, Any]]:
+    """Lê, interpreta e monta as comunicações lote a lote, em uma única passagem.
+
+    Os valores monetários de cada lote são convertidos para float coluna a
+    coluna e acompanham o registro em "valores". `filtro` recebe cada lote
+    antes do parsing e devolve só as linhas que devem seguir; os ids começam
+    em `primeiro_id`. As comunicações que passaram do limite de tempo do
+    parsing são contadas em estatistica['parsing_limitado'].
+    """
+    proximo_id = primeiro_id
+    lotes = em_lotes(ler_linhas(caminho, encoding, HEADERS_COMUNICACOES, 'comunicacoes', estatistica))
+    if filtro is not None:
+        lotes = (novas for novas in map(filtro, lotes) if novas)
+    for lote, resultados in parse_lotes_com_cache(lotes):
+        comunicacoes = []
+        for row, parsed in zip(lote, resultados):
+            if "limite_parsing" in parsed:
+                registrar_parsing_limitado(estatistica, row, parsed["limite_parsing"])
+            comunicacoes.append(montar_comunicacao(row, parsed, proximo_id, envolvido_map, ocorrencia_map))
+            proximo_id += 1
+        for comunicacao, valores in zip(comunicacoes, valores_lote([c["parsing_json"] for c in comunicacoes])):
+            comunicacao["valores"] = valores
+        yield from comunicacoes
+
+
+def ingerir_rif(comunicacoes_path: str, envolvidos_path: str, ocorrencias_path: str,
+                encodings: Dict[str, str],
+                etapa: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                filtro: Optional[Callable[[List[Dict[str, str]]], List[Dict[str, str]]]] = None,
+                primeiro_id: int = 1) -> Dict[str, Any]:
+    """Processa a tripla de CSVs de um RIF lendo cada arquivo uma única vez.
+
+    Os cabeçalhos dos três arquivos são conferidos antes de qualquer
+    processamento, para que um arquivo malformado falhe sem custo. As
+    comunicações são devolvidas como iterador, consumido pela gravação no
+    banco; as estatísticas de comunicações ficam completas ao fim do consumo.
+    `etapa`, se informado, é chamado no início de cada etapa com o nome dela e
+    as estatísticas, que são atualizadas durante a leitura. `linhas_envolvidos`
+    percorre de novo o Envolvidos.csv, com todos os papéis, quando consumido.
+    `filtro` e `primeiro_id` seguem para processar_comunicacoes (acréscimo a um workspace).
+    """
+    estatisticas = {
+        'envolvidos': nova_estatistica(),
+        'ocorrencias': nova_estatistica(),
+        'comunicacoes': {**nova_estatistica(), 'parsing_limitado': {'total': 0, 'comunicacoes': []}}
+    }
+    etapa = etapa or (lambda nome, estatisticas: None)
+
+    etapa('validacao', estatisticas)
+    verificar_headers(comunicacoes_path, encodings['comunicacoes'], HEADERS_COMUNICACOES, 'comunicacoes')
+    verificar_headers(envolvidos_path, encodings['envolvidos'], HEADERS_ENVOLVIDOS, 'envolvidos')
+    verificar_headers(ocorrencias_path, encodings['ocorrencias'], HEADERS_OCORRENCIAS, 'ocorrencias')
+
+    etapa('envolvidos', estatisticas)
+    envolvido_map = mapear_envolvidos(envolvidos_path, encodings['envolvidos'], estatisticas['envolvidos'])
+    etapa('ocorrencias', estatisticas)
+    ocorrencia_map = mapear_ocorrencias(ocorrencias_path, encodings['ocorrencias'], estatisticas['ocorrencias'])
+    etapa('comunicacoes', estatisticas)
+    comunicacoes = processar_comunicacoes(
+        comunicacoes_path, encodings['comunicacoes'], envolvido_map, ocorrencia_map, estatisticas['comunicacoes'],
+        filtro, primeiro_id
+    )
+
+    return {
+        'envolvidos': envolvido_map,
+        'ocorrencias': ocorrencia_map,
+        'comunicacoes': comunicacoes,
+        'linhas_envolvidos': ler_linhas(envolvidos_path, encodings['envolvidos'], HEADERS_ENVOLVIDOS,
+                                        'envolvidos', nova_estatistica()),
+        'estatisticas': estatisticas
+    }
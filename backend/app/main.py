@@ -1,23 +1,29 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Path
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Form, Path, Body, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, sessionmaker
-from typing import List, Optional
-import json
-import csv
-import io
+from typing import List, Literal, Optional
+import logging
 import os
-import shutil
-from datetime import datetime
-
-from .database import get_engine
-from .models import Usuario, ParsingCorrecao
-from .auth import validar_usuario
-from .utils import (
-    detect_encoding, validate_csv_structure, validate_comunicacoes_csv,
-    validate_envolvidos_csv, validate_ocorrencias_csv, validate_file_size,
-    limpa_valor
-)
-from parsers import bradesco, bb, nubank, parser_generico
+import time
+
+from . import metricas
+from .auth import validar_usuario, emitir_token, usuario_atual, usuario_token, conferir_usuario
+from .utils import detect_encoding, sha256_arquivo
+from .ingestao import ingerir_rif, ErroValidacaoCSV
+from .upload_chunks import router as upload_chunks_router, limpar_sessoes_expiradas, receber_arquivo
+from .parsing_paralelo import encerrar_pool
+from .cache_parsing import router as cache_parsing_router
+from .parsing_router import router as parsing_router
+from .persistencia import salvar_rif, corrigir_comunicacao, contar_registros, proximo_numero, FiltroNovas
+from .dataset import carregar_dataset, carregar_agregados, carregar_grafo, textos_comunicacao
+from .busca import somente_digitos
+from .grafo import MAX_NOS_EXPANSAO, MAX_SALTOS_CAMINHO, MAX_SALTOS_EXPANSAO
+from .respostas import responder_json
+from .consultas import listar_pagina, buscar_texto, exportar_ndjson, ErroConsulta, LIMITE_PADRAO, LIMITE_MAXIMO, LIMITE_BUSCA_PADRAO, LIMITE_BUSCA_MAXIMO
+from .i2 import router as i2_router
+from .entidades import router as entidades_router
+from .workspaces import router as workspaces_router, nome_workspace
+from .tarefas import router as tarefas_router, Tarefa, TarefaCancelada, enfileirar, executar, tarefa_ativa, encerrar_tarefas
 
 def get_significados_campos(codigo_segmento):
     """Retorna os significados dos campos baseado no código do segmento"""
@@ -52,6 +58,12 @@ def get_significados_campos(codigo_segmento):
         "campo_e": "Campo E"
     })
 
+# Nível dos logs da aplicação (DEBUG, INFO, WARNING...); as mensagens de depuração do
+# processamento ficam desligadas por padrão e as bibliotecas seguem em WARNING
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("app").setLevel(os.environ.get("RIF_LOG_LEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="RIF Analisador API")
 
 # Configuração de CORS para permitir frontend local
@@ -61,339 +73,355 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition"],
 )
+# Por último: envolve os demais middlewares e mede a requisição inteira
+app.add_middleware(metricas.MetricasHTTP)
 
-# Armazenamento temporário em memória (apenas para demonstração)
-# Em produção, isso deveria ser persistido de forma adequada
-comunicacoes_data = {}
+app.include_router(upload_chunks_router)
+app.include_router(cache_parsing_router)
+app.include_router(parsing_router)
+app.include_router(tarefas_router)
+app.include_router(i2_router)
+app.include_router(entidades_router)
+app.include_router(workspaces_router)
+
+@app.on_event("startup")
+def limpar_uploads_abandonados():
+    removidas = limpar_sessoes_expiradas()
+    if removidas:
+        logger.info("Sessões de upload expiradas removidas: %d", removidas)
+
+@app.on_event("shutdown")
+def encerrar_parsing():
+    encerrar_tarefas()
+    encerrar_pool()
 
 @app.get("/ping")
 def ping():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def exportar_metricas():
+    """Contadores e histogramas do processo no formato de texto do Prometheus"""
+    return Response(metricas.renderizar(), media_type=metricas.TIPO_CONTEUDO)
+
 @app.post("/login")
 def login(usuario: str = Form(...), senha: str = Form(...)):
     if validar_usuario(usuario, senha):
-        return {"success": True, "usuario": usuario}
+        # As demais rotas identificam o usuário pelo token, sem novo bind no LDAP
+        token, expira = emitir_token(usuario)
+        return {"success": True, "usuario": usuario, "token": token, "expira": expira}
     return {"success": False, "erro": "Usuário ou senha inválidos."}
 
-@app.post("/upload")
-def upload_arquivos(
-    comunicacoes: UploadFile = File(...),
-    envolvidos: UploadFile = File(...),
-    ocorrencias: UploadFile = File(...),
-    usuario: str = Form(...)
-):
-    print(f"[DEBUG] Iniciando upload para usuário: {usuario}")
+ARQUIVOS_RIF = {
+    'comunicacoes': "Comunicacoes.csv",
+    'envolvidos': "Envolvidos.csv",
+    'ocorrencias': "Ocorrencias.csv"
+}
+
+def processar_upload(usuario: str, hashes: Optional[dict] = None, tarefa: Optional[Tarefa] = None,
+                     workspace: Optional[str] = None):
+    """Processa a tripla de CSVs já gravada na pasta do usuário.
+
+    Com `tarefa` (upload assíncrono), o progresso de cada etapa é reportado
+    nela e o cancelamento interrompe o processamento, desfazendo a gravação.
+    Com `workspace`, o RIF é acrescentado ao workspace e só as comunicações
+    ainda não gravadas nele são interpretadas e indexadas.
+    """
     pasta_upload = f"backend/database/uploads/{usuario}"
-    os.makedirs(pasta_upload, exist_ok=True)
-    
-    # Salvar arquivos
-    arquivos_info = []
-    for arquivo, nome in zip([comunicacoes, envolvidos, ocorrencias], ["Comunicacoes.csv", "Envolvidos.csv", "Ocorrencias.csv"]):
-        caminho = os.path.join(pasta_upload, nome)
-        print(f"[DEBUG] Salvando arquivo: {caminho}")
-        with open(caminho, "wb") as buffer:
-            shutil.copyfileobj(arquivo.file, buffer)
-        
-        # Validar tamanho do arquivo
-        print(f"[DEBUG] Validando tamanho do arquivo: {caminho}")
-        size_validation = validate_file_size(caminho)
-        if not size_validation['valid']:
-            return {"success": False, "msg": size_validation['error']}
-        
-        arquivos_info.append((caminho, nome))
+    hashes = dict(hashes or {})
+    caminhos = {chave: os.path.join(pasta_upload, nome) for chave, nome in ARQUIVOS_RIF.items()}
+    for chave, caminho in caminhos.items():
+        if not os.path.exists(caminho):
+            metricas.UPLOADS.inc('invalido')
+            return {"success": False, "msg": f"Arquivo não encontrado: {ARQUIVOS_RIF[chave]}"}
+    if 'comunicacoes' not in hashes:
+        # Identifica o RIF no índice de pessoas: o mesmo arquivo processado de novo não duplica linhas
+        inicio = time.perf_counter()
+        hashes['comunicacoes'] = sha256_arquivo(caminhos['comunicacoes'])
+        metricas.ETAPAS.observar(time.perf_counter() - inicio, 'sha256')
     
-    # Validar estrutura dos arquivos
-    comunicacoes_path = os.path.join(pasta_upload, "Comunicacoes.csv")
-    envolvidos_path = os.path.join(pasta_upload, "Envolvidos.csv")
-    ocorrencias_path = os.path.join(pasta_upload, "Ocorrencias.csv")
-    
-    print(f"[DEBUG] Validando estrutura dos arquivos")
-    # Validar cada arquivo
-    validacoes = {
-        'comunicacoes': validate_comunicacoes_csv(comunicacoes_path),
-        'envolvidos': validate_envolvidos_csv(envolvidos_path),
-        'ocorrencias': validate_ocorrencias_csv(ocorrencias_path)
-    }
-    
-    # Verificar se há erros de validação
-    for nome, validacao in validacoes.items():
-        if not validacao['valid']:
-            return {"success": False, "msg": f"Erro no arquivo {nome}: {validacao['error']}"}
-    
-    print(f"[DEBUG] Detectando encoding dos arquivos")
-    # Detectar encoding dos arquivos
-    enc_com = detect_encoding(comunicacoes_path)
-    enc_env = detect_encoding(envolvidos_path)
-    enc_oco = detect_encoding(ocorrencias_path)
-    print(f"[DEBUG] Encodings detectados - Comunicacoes: {enc_com}, Envolvidos: {enc_env}, Ocorrencias: {enc_oco}")
+    # Detectar encoding uma única vez por arquivo, reaproveitando o hash calculado no upload
+    inicio = time.perf_counter()
+    encodings = {chave: detect_encoding(caminho, hashes.get(chave)) for chave, caminho in caminhos.items()}
+    metricas.ETAPAS.observar(time.perf_counter() - inicio, 'encoding')
+    logger.debug("Encodings detectados: %s", encodings)
     
     try:
-        print(f"[DEBUG] Iniciando processamento dos dados")
-        
-        # Mapear Envolvidos por Indexador
-        envolvido_map = {}
-        print(f"[DEBUG] Processando arquivo de envolvidos")
-        with open(os.path.join(pasta_upload, "Envolvidos.csv"), encoding=enc_env) as f:
-            reader = csv.DictReader(f, delimiter=';')
-            for row in reader:
-                # Pular linhas que são comentários ou não têm dados válidos
-                indexador = row.get("Indexador", "")
-                if not indexador or indexador.startswith('#') or indexador.strip() == "":
-                    print(f"[DEBUG] Pulando linha inválida de envolvidos: {indexador}")
-                    continue
-                
-                # Pular linhas que contêm texto descritivo em vez de dados numéricos
-                if ":" in indexador or "=" in indexador or "CampoA" in indexador or "CampoB" in indexador:
-                    print(f"[DEBUG] Pulando linha descritiva de envolvidos: {indexador}")
-                    continue
-                
-                # Pular linhas que são hashes MD5 (32 caracteres hexadecimais)
-                if len(indexador.strip()) == 32 and all(c in '0123456789abcdefABCDEF' for c in indexador.strip()):
-                    print(f"[DEBUG] Pulando hash MD5 de envolvidos: {indexador}")
-                    continue
-                    
-                tipo = (row.get("tipoEnvolvido", "") or "").strip().lower()
-                if tipo == "titular":
-                    envolvido_map[indexador] = {
-                        "nome": row.get("nomeEnvolvido", ""),
-                        "cpf": row.get("cpfCnpjEnvolvido", "")
-                    }
-        
-        # Ocorrências
-        ocorrencia_map = {}
-        print(f"[DEBUG] Processando arquivo de ocorrências")
-        with open(os.path.join(pasta_upload, "Ocorrencias.csv"), encoding=enc_oco) as f:
-            reader = csv.DictReader(f, delimiter=';')
-            for row in reader:
-                # Pular linhas que são comentários ou não têm dados válidos
-                indexador = row.get("Indexador", "")
-                if not indexador or indexador.startswith('#') or indexador.strip() == "":
-                    print(f"[DEBUG] Pulando linha inválida de ocorrências: {indexador}")
-                    continue
-                
-                # Pular linhas que contêm texto descritivo em vez de dados numéricos
-                if ":" in indexador or "=" in indexador or "CampoA" in indexador or "CampoB" in indexador:
-                    print(f"[DEBUG] Pulando linha descritiva de ocorrências: {indexador}")
-                    continue
-                
-                # Pular linhas que são hashes MD5 (32 caracteres hexadecimais)
-                if len(indexador.strip()) == 32 and all(c in '0123456789abcdefABCDEF' for c in indexador.strip()):
-                    print(f"[DEBUG] Pulando hash MD5 de ocorrências: {indexador}")
-                    continue
-                    
-                ocorrencia_map[row.get("idOcorrencia", "")] = row.get("Ocorrencia", "")
+        # Validação de headers, contagem de linhas e processamento em uma única passagem por arquivo
+        filtro, primeiro_id = None, 1
+        if workspace:
+            upload_id, primeiro_id = proximo_numero(usuario, workspace)
+            filtro = FiltroNovas(upload_id)
+        # A etapa de comunicações inclui o parsing e a gravação, que consome as comunicações
+        cronometro = metricas.CronometroEtapas(tarefa.etapa if tarefa else None)
+        resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings,
+                                etapa=cronometro, filtro=filtro, primeiro_id=primeiro_id)
+        if tarefa:
+            resultado['comunicacoes'] = tarefa.acompanhar(resultado['comunicacoes'])
         
-        # Comunicações
-        comunicacoes_processadas = []
-        print(f"[DEBUG] Processando arquivo de comunicações")
-        with open(os.path.join(pasta_upload, "Comunicacoes.csv"), encoding=enc_com) as f:
-            reader = csv.DictReader(f, delimiter=';')
-            for row in reader:
-                # Pular linhas que são comentários ou não têm dados válidos
-                indexador = row.get("Indexador", "")
-                if not indexador or indexador.startswith('#') or indexador.strip() == "":
-                    print(f"[DEBUG] Pulando linha inválida: {indexador}")
-                    continue
-                
-                # Pular linhas que contêm texto descritivo em vez de dados numéricos
-                if ":" in indexador or "=" in indexador or "CampoA" in indexador or "CampoB" in indexador:
-                    print(f"[DEBUG] Pulando linha descritiva: {indexador}")
-                    continue
-                
-                # Pular linhas que são hashes MD5 (32 caracteres hexadecimais)
-                if len(indexador.strip()) == 32 and all(c in '0123456789abcdefABCDEF' for c in indexador.strip()):
-                    print(f"[DEBUG] Pulando hash MD5: {indexador}")
-                    continue
-                    
-                print(f"[DEBUG] Processando linha de comunicação: {row.get('Indexador', 'N/A')}")
-                titular_nome = envolvido_map.get(indexador, {}).get("nome", "")
-                titular_cpf = envolvido_map.get(indexador, {}).get("cpf", "")
-                
-                info = row.get("informacoesAdicionais", "")
-                banco_nome = (row.get("nomeComunicante") or "").lower().replace(".", "").replace(",", "").replace("-", "").replace("  ", " ").strip()
-                # Parsing do campo informacoesAdicionais baseado no código do segmento
-                codigo_segmento = row.get("CodigoSegmento", "41")
-                
-                if codigo_segmento == "41":
-                    # SFN-Atípicas: Usar parser bancário individual
-                    if "bradesco" in banco_nome:
-                        parsed = bradesco.parse_bradesco(info)
-                    elif "banco do brasil" in banco_nome or (banco_nome.split() and banco_nome.split()[0] == "bb"):
-                        parsed = bb.parse_bb(info)
-                    elif "nubank" in banco_nome or "nu pagamentos" in banco_nome:
-                        parsed = nubank.parse_nubank(info)
-                    else:
-                        parsed = parser_generico.parse_generico(info)
-                else:
-                    # Outros segmentos: Extrair campos específicos
-                    parsed = {
-                        "campo_a": row.get("CampoA", "0"),
-                        "campo_b": row.get("CampoB", "0"),
-                        "campo_c": row.get("CampoC", "0"),
-                        "campo_d": row.get("CampoD", "0"),
-                        "campo_e": row.get("CampoE", "0"),
-                        "codigo_segmento": codigo_segmento
-                    }
-                
-                # Adicionar período e valor total diretamente do CSV
-                periodo = {
-                    "inicio": row.get("Data_da_operacao", ""),
-                    "fim": row.get("DataFimFato", "")
-                }
-                valor_total = str(row.get("CampoA", "0"))
-                print(f"[DEBUG] Valor total extraído: {valor_total} (tipo: {type(valor_total)})")
-                parsed["periodo"] = periodo
-                parsed["valor_total"] = valor_total
-                
-                # Informações de localização da agência
-                cidade_agencia = row.get("CidadeAgencia", "")
-                uf_agencia = row.get("UFAgencia", "")
-                
-                comunicacao = {
-                    "id": len(comunicacoes_processadas) + 1,
-                    "banco": row.get("nomeComunicante", ""),
-                    "data": row.get("Data_da_operacao", ""),
-                    "informacoes_adicionais": info,
-                    "parsing_json": parsed,
-                    "codigo_segmento": row.get("CodigoSegmento", ""),
-                    "cidade_agencia": cidade_agencia,
-                    "uf_agencia": uf_agencia,
-                    "titular": titular_nome,
-                    "cpf": titular_cpf,
-                    "ocorrencia": ocorrencia_map.get(row.get("NumeroOcorrenciaBC", ""), "")
-                }
-                comunicacoes_processadas.append(comunicacao)
-        
-        # Armazenar dados processados para o usuário
-        comunicacoes_data[usuario] = comunicacoes_processadas
+        # Gravar no banco, substituindo o upload anterior do usuário ou acrescentando ao workspace
+        gravado = salvar_rif(usuario, resultado, hashes, progresso=tarefa.gravadas if tarefa else None,
+                             workspace=workspace, filtro=filtro)
+        cronometro.encerrar()
         
-        print(f"[DEBUG] Processamento concluído. {len(comunicacoes_processadas)} comunicações processadas.")
+        logger.info("Upload de %s processado: %d comunicações", usuario, gravado['comunicacoes'])
+        logger.debug("Estatísticas do upload de %s: %s", usuario, resultado['estatisticas'])
         
+    except ErroValidacaoCSV as e:
+        metricas.UPLOADS.inc('invalido')
+        return {"success": False, "msg": f"Erro no arquivo {e.arquivo}: {e.mensagem}"}
+    except TarefaCancelada:
+        metricas.UPLOADS.inc('cancelado')
+        logger.info("Processamento cancelado para usuário: %s", usuario)
+        raise
     except Exception as e:
-        print(f"Erro ao processar upload: {e}")
+        metricas.UPLOADS.inc('erro')
+        logger.exception("Erro ao processar upload de %s", usuario)
         return {"success": False, "msg": f"Erro ao processar arquivos: {e}"}
     
-    return {"success": True, "msg": "Arquivos enviados e processados com sucesso."}
+    metricas.UPLOADS.inc('sucesso')
+    metricas.registrar_linhas(resultado['estatisticas'])
+    resposta = {
+        "success": True,
+        "msg": "Arquivos enviados e processados com sucesso.",
+        "estatisticas": resultado['estatisticas']
+    }
+    if workspace:
+        resposta["workspace"] = {
+            "nome": workspace,
+            "comunicacoes": gravado['comunicacoes'],
+            "novas": gravado['novas'],
+            "duplicadas": gravado['duplicadas'],
+        }
+    return resposta
 
-@app.get("/api/dashboard-resumo")
-def dashboard_resumo():
-    # Para simplificar, vamos usar os dados do primeiro usuário disponível
-    if not comunicacoes_data:
-        return {"volume_total": 0, "num_comunicacoes": 0}
-    
-    # Pegar dados do primeiro usuário (em produção, seria baseado no usuário logado)
-    usuario = list(comunicacoes_data.keys())[0]
-    comunicacoes = comunicacoes_data[usuario]
-    
-    # Total de comunicações
-    total_comunicacoes = len(comunicacoes)
+def iniciar_processamento(usuario: str, hashes: Optional[dict], assincrono: bool, workspace: Optional[str] = None):
+    """Processa na hora ou enfileira no pool de uploads, devolvendo o id da tarefa.
+
+    Nos dois casos o processamento é registrado como tarefa, o que impede dois
+    processamentos da pasta do mesmo usuário ao mesmo tempo em qualquer worker.
+    """
+    def processar(tarefa: Tarefa):
+        return processar_upload(usuario, hashes, tarefa, workspace)
+
+    if not assincrono:
+        resposta = executar(usuario, processar)
+    else:
+        tarefa = enfileirar(usuario, processar)
+        resposta = None if tarefa is None else {
+            "success": True, "msg": "Arquivos recebidos; processamento em andamento.", "job_id": tarefa.id
+        }
+    if resposta is None:
+        return upload_em_andamento(usuario) or {"success": False, "msg": "Já existe um processamento em andamento para este usuário."}
+    if assincrono:
+        logger.debug("Tarefa %s enfileirada para usuário: %s", resposta["job_id"], usuario)
+    return resposta
+
+def upload_em_andamento(usuario: str):
+    job_id = tarefa_ativa(usuario)
+    if job_id:
+        return {"success": False, "msg": "Já existe um processamento em andamento para este usuário.", "job_id": job_id}
+    return None
+
+@app.post("/upload")
+def upload_arquivos(
+    comunicacoes: UploadFile = File(...),
+    envolvidos: UploadFile = File(...),
+    ocorrencias: UploadFile = File(...),
+    usuario: str = Form(...),
+    assincrono: bool = Form(False),
+    workspace: Optional[str] = Form(None),
+    autenticado: Optional[str] = Depends(usuario_token)
+):
+    usuario = conferir_usuario(usuario, autenticado)
+    workspace = nome_workspace(workspace)
+    logger.debug("Iniciando upload para usuário: %s", usuario)
+    # Os arquivos da pasta do usuário não podem ser trocados durante o processamento
+    em_andamento = upload_em_andamento(usuario)
+    if em_andamento:
+        return em_andamento
+    pasta_upload = f"backend/database/uploads/{usuario}"
     
-    # Volume total analisado
-    volume_total = 0.0
-    for c in comunicacoes:
+    # Envia cada arquivo pelo protocolo de chunks: limites verificados durante a
+    # gravação e SHA-256 calculado incrementalmente
+    hashes = {}
+    arquivos = {'comunicacoes': comunicacoes, 'envolvidos': envolvidos, 'ocorrencias': ocorrencias}
+    for chave, arquivo in arquivos.items():
+        caminho = os.path.join(pasta_upload, ARQUIVOS_RIF[chave])
+        logger.debug("Salvando arquivo: %s", caminho)
         try:
-            parsed = c["parsing_json"]
-            for campo in ["campo_a", "campo_b", "campo_c", "campo_d", "campo_e"]:
-                valor = parsed.get(campo)
-                if valor:
-                    try:
-                        volume_total += limpa_valor(valor)
-                    except:
-                        pass
-        except:
-            pass
+            hashes[chave] = receber_arquivo(arquivo.file, usuario, caminho)['sha256']
+        except HTTPException as e:
+            return {"success": False, "msg": e.detail}
     
+    return iniciar_processamento(usuario, hashes, assincrono, workspace)
+
+@app.post("/upload/processar")
+def processar_arquivos(usuario: str = Form(...), assincrono: bool = Form(False),
+                       workspace: Optional[str] = Form(None),
+                       autenticado: Optional[str] = Depends(usuario_token)):
+    """Processa os arquivos enviados previamente por /upload/sessoes"""
+    usuario = conferir_usuario(usuario, autenticado)
+    workspace = nome_workspace(workspace)
+    return upload_em_andamento(usuario) or iniciar_processamento(usuario, None, assincrono, workspace)
+
+@app.get("/api/dashboard-resumo")
+def dashboard_resumo(request: Request, usuario: Optional[str] = Depends(usuario_atual)):
+    return responder_json(request, usuario, ("dashboard",), lambda: montar_dashboard(usuario))
+
+def montar_dashboard(usuario: Optional[str]):
+    # Sem usuário informado, usa o upload mais recente (em produção, seria baseado no usuário logado)
+    # Totais calculados na ingestão e mantidos a cada correção
+    agregados = carregar_agregados(usuario)
+    if not agregados or not agregados.total:
+        return {"volume_total": 0, "num_comunicacoes": 0}
+    return agregados.dashboard()
+
+MIDIA_NDJSON = "application/x-ndjson"
+
+def filtros_comunicacoes(
+    banco: Optional[str] = None,
+    uf: Optional[str] = None,
+    cidade: Optional[str] = None,
+    segmento: Optional[str] = None,
+    titular: Optional[str] = None,
+    cpf: Optional[str] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    valor_min: Optional[float] = None,
+    valor_max: Optional[float] = None
+) -> dict:
+    """Filtros comuns à listagem e à exportação de comunicações"""
     return {
-        "volume_total": volume_total,
-        "num_comunicacoes": total_comunicacoes
+        "banco": banco, "uf": uf, "cidade": cidade, "segmento": segmento, "titular": titular, "cpf": cpf,
+        "data_inicio": data_inicio, "data_fim": data_fim, "valor_min": valor_min, "valor_max": valor_max
     }
 
+def resposta_ndjson(usuario, filtros, incluir_parsing):
+    try:
+        linhas = exportar_ndjson(usuario, filtros, incluir_parsing)
+    except ErroConsulta as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(linhas, media_type=MIDIA_NDJSON)
+
 @app.get("/api/comunicacoes")
-def listar_comunicacoes():
-    # Para simplificar, vamos usar os dados do primeiro usuário disponível
-    if not comunicacoes_data:
+def listar_comunicacoes(
+    request: Request,
+    usuario: Optional[str] = Depends(usuario_atual),
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    pagina: Optional[int] = Query(None, ge=1),
+    ordenar: Optional[str] = None,
+    filtros: dict = Depends(filtros_comunicacoes),
+    incluir_parsing: bool = False
+):
+    # Accept: application/x-ndjson exporta todas as comunicações filtradas, uma por linha
+    if MIDIA_NDJSON in request.headers.get("accept", ""):
+        return resposta_ndjson(usuario, filtros, incluir_parsing)
+
+    # Com qualquer parâmetro de paginação, filtro ou ordenação, responde uma página consultada nos índices
+    paginado = any(v is not None for v in (limite, cursor, pagina, ordenar)) or \
+        any(v is not None for v in filtros.values())
+    if paginado:
+        def construir():
+            try:
+                return listar_pagina(usuario, filtros, ordenar or "id", limite or LIMITE_PADRAO, cursor, pagina)
+            except ErroConsulta as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return responder_json(request, usuario, ("pagina", str(request.query_params)), construir)
+    return responder_json(request, usuario, ("lista",), lambda: montar_lista(usuario))
+
+def montar_lista(usuario: Optional[str]):
+    # Sem usuário informado, usa o upload mais recente (em produção, seria baseado no usuário logado)
+    dataset = carregar_dataset(usuario)
+    if not dataset:
         return []
     
-    # Pegar dados do primeiro usuário (em produção, seria baseado no usuário logado)
-    usuario = list(comunicacoes_data.keys())[0]
-    comunicacoes = comunicacoes_data[usuario]
-    
     agrupadas = {}
-    for c in comunicacoes:
-        indexador = c["data"]
+    for linha in range(len(dataset)):
+        indexador = dataset.data[linha]
         if not indexador:
             continue
         if indexador not in agrupadas:
-            periodo = c["parsing_json"].get("periodo")
-            valor_total = c["parsing_json"].get("valor_total", "0")
-            try:
-                valor_total = limpa_valor(valor_total)
-            except:
-                valor_total = 0.0
             agrupadas[indexador] = {
-                "id": c["id"],
-                "titular": c["titular"],
-                "cpf": c["cpf"],
-                "banco": c["banco"],
-                "codigo_segmento": c["codigo_segmento"] or "41",
-                "periodo": periodo,
-                "valor": valor_total,
+                "id": dataset.ids[linha],
+                "titular": dataset.titular[linha],
+                "cpf": dataset.cpf[linha],
+                "banco": dataset.banco[linha],
+                "codigo_segmento": dataset.codigo_segmento[linha] or "41",
+                "periodo": dataset.periodo(linha),
+                "valor": dataset.valor(linha),
                 "data": indexador,
                 "localizacao": {
-                    "cidade": c["cidade_agencia"],
-                    "uf": c["uf_agencia"]
+                    "cidade": dataset.cidade_agencia[linha],
+                    "uf": dataset.uf_agencia[linha]
                 }
             }
     return list(agrupadas.values())
 
+@app.get("/api/comunicacoes/stream")
+def exportar_comunicacoes(
+    usuario: Optional[str] = Depends(usuario_atual),
+    filtros: dict = Depends(filtros_comunicacoes),
+    incluir_parsing: bool = False
+):
+    # Exportação completa em NDJSON, enviada enquanto é lida do banco
+    return resposta_ndjson(usuario, filtros, incluir_parsing)
+
+@app.get("/api/comunicacoes/busca")
+def buscar_comunicacoes(
+    request: Request,
+    q: str,
+    usuario: Optional[str] = Depends(usuario_atual),
+    limite: int = Query(LIMITE_BUSCA_PADRAO, ge=1, le=LIMITE_BUSCA_MAXIMO)
+):
+    # Busca textual: "frase exata", prefixo*, OR/NOT; resultados por relevância com trecho destacado
+    def construir():
+        try:
+            return buscar_texto(q, usuario, limite)
+        except ErroConsulta as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return responder_json(request, usuario, ("busca", q, limite), construir)
+
 @app.get("/api/comunicacao/{id}")
-def detalhe_comunicacao(id: int = Path(...)):
-    # Para simplificar, vamos usar os dados do primeiro usuário disponível
-    if not comunicacoes_data:
-        return {"erro": "Comunicação não encontrada"}
-    
-    # Pegar dados do primeiro usuário (em produção, seria baseado no usuário logado)
-    usuario = list(comunicacoes_data.keys())[0]
-    comunicacoes = comunicacoes_data[usuario]
-    
-    c = next((com for com in comunicacoes if com["id"] == id), None)
-    if not c:
+def detalhe_comunicacao(request: Request, id: int = Path(...), usuario: Optional[str] = Depends(usuario_atual)):
+    return responder_json(request, usuario, ("detalhe", id), lambda: montar_detalhe(id, usuario))
+
+def montar_detalhe(id: int, usuario: Optional[str]):
+    # Sem usuário informado, usa o upload mais recente (em produção, seria baseado no usuário logado)
+    dataset = carregar_dataset(usuario)
+    linha = dataset.linha(id) if dataset else None
+    textos = textos_comunicacao(dataset, linha) if linha is not None else None
+    if not textos:
         return {"erro": "Comunicação não encontrada"}
     
-    parsed = c["parsing_json"]
-    codigo_segmento = c["codigo_segmento"] or "41"  # Default para compatibilidade
+    informacoes_adicionais, parsed = textos
+    codigo_segmento = dataset.codigo_segmento[linha] or "41"  # Default para compatibilidade
     
     # Estrutura base da resposta
     response = {
-        "id": c["id"],
-        "titular": c["titular"],
-        "cpf": c["cpf"],
-        "banco": c["banco"],
+        "id": id,
+        "titular": dataset.titular[linha],
+        "cpf": dataset.cpf[linha],
+        "banco": dataset.banco[linha],
         "codigo_segmento": codigo_segmento,
-        "informacoes_adicionais": c["informacoes_adicionais"],
+        "informacoes_adicionais": informacoes_adicionais,
         "parsing_json": parsed,
         "localizacao": {
-            "cidade": c["cidade_agencia"],
-            "uf": c["uf_agencia"]
+            "cidade": dataset.cidade_agencia[linha],
+            "uf": dataset.uf_agencia[linha]
         }
     }
     
     # Tratamento específico por código de segmento
     if codigo_segmento == "41":
         # SFN-Atípicas: Usar parser bancário individual
-        periodo = parsed.get("periodo")
-        valor_total = parsed.get("valor_total", "0")
-        try:
-            valor_total = limpa_valor(valor_total)
-        except:
-            valor_total = 0.0
-        
         response.update({
             "tipo": "SFN-Atípicas",
-            "periodo": periodo,
-            "valor": valor_total,
+            "periodo": parsed.get("periodo"),
+            "valor": dataset.valor(linha),
             "detalhes_parsing": parsed
         })
         
@@ -439,69 +467,89 @@ def detalhe_comunicacao(id: int = Path(...)):
     
     return response
 
+@app.post("/api/comunicacao/{id}/correcao")
+def corrigir_parsing(id: int = Path(...), parsing_json: dict = Body(..., embed=True), usuario: Optional[str] = Depends(usuario_atual)):
+    """Grava o parsing_json corrigido de uma comunicação e atualiza os agregados"""
+    versao = corrigir_comunicacao(id, parsing_json, usuario)
+    if versao is None:
+        raise HTTPException(status_code=404, detail="Comunicação não encontrada")
+    return {"success": True, "versao": versao}
+
 @app.get("/api/estatisticas")
-def estatisticas():
+def estatisticas(request: Request, usuario: Optional[str] = Depends(usuario_atual)):
     """Retorna estatísticas detalhadas das comunicações"""
-    # Para simplificar, vamos usar os dados do primeiro usuário disponível
-    if not comunicacoes_data:
+    return responder_json(request, usuario, ("estatisticas",), lambda: montar_estatisticas(usuario))
+
+def montar_estatisticas(usuario: Optional[str]):
+    # Sem usuário informado, usa o upload mais recente (em produção, seria baseado no usuário logado)
+    agregados = carregar_agregados(usuario)
+    if not agregados or not agregados.total:
         return {
             "total_comunicacoes": 0,
             "total_valor": 0,
             "bancos": {},
             "media_valor": 0
         }
-    
-    # Pegar dados do primeiro usuário (em produção, seria baseado no usuário logado)
-    usuario = list(comunicacoes_data.keys())[0]
-    comunicacoes = comunicacoes_data[usuario]
-    
-    # Estatísticas por banco
-    bancos = {}
-    total_valor = 0.0
-    total_comunicacoes = len(comunicacoes)
-    
-    for c in comunicacoes:
-        banco = c["banco"] or "Não identificado"
-        if banco not in bancos:
-            bancos[banco] = {"count": 0, "valor_total": 0.0}
-        
-        bancos[banco]["count"] += 1
-        
-        try:
-            parsed = c["parsing_json"]
-            valor = parsed.get("valor_total", 0)
-            if isinstance(valor, str):
-                valor = limpa_valor(valor)
-            elif isinstance(valor, (int, float)):
-                valor = float(valor)
-            else:
-                valor = 0.0
-            bancos[banco]["valor_total"] += valor
-            total_valor += valor
-        except:
-            pass
-    
-    return {
-        "total_comunicacoes": total_comunicacoes,
-        "total_valor": total_valor,
-        "bancos": bancos,
-        "media_valor": total_valor / total_comunicacoes if total_comunicacoes > 0 else 0
-    }
+    return agregados.estatisticas()
+
+def consultar_grafo(usuario: Optional[str], documentos: List[str], consulta):
+    """Executa `consulta(grafo, *documentos)` com os CPFs/CNPJs normalizados"""
+    normalizados = [somente_digitos(documento) for documento in documentos]
+    if not all(normalizados):
+        raise HTTPException(status_code=400, detail="CPF/CNPJ inválido")
+    grafo = carregar_grafo(usuario)
+    resultado = consulta(grafo, *normalizados) if grafo is not None else None
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Entidade não encontrada no grafo")
+    return resultado
+
+@app.get("/api/grafo/vizinhos/{documento}")
+def grafo_vizinhos(
+    request: Request,
+    documento: str = Path(...),
+    direcao: Literal["todas", "entrada", "saida", "relacao"] = "todas",
+    limite: int = Query(100, ge=1, le=1000),
+    usuario: Optional[str] = Depends(usuario_atual)
+):
+    """Contrapartes diretas de um CPF/CNPJ, somadas sobre todas as comunicações"""
+    return responder_json(request, usuario, ("grafo-vizinhos", documento, direcao, limite), lambda: consultar_grafo(
+        usuario, [documento], lambda grafo, doc: grafo.vizinhos(doc, direcao, limite)))
+
+@app.get("/api/grafo/expandir/{documento}")
+def grafo_expandir(
+    request: Request,
+    documento: str = Path(...),
+    saltos: int = Query(2, ge=1, le=MAX_SALTOS_EXPANSAO),
+    limite: int = Query(MAX_NOS_EXPANSAO, ge=1, le=MAX_NOS_EXPANSAO),
+    usuario: Optional[str] = Depends(usuario_atual)
+):
+    """Entidades a até `saltos` vínculos de distância e as arestas entre elas"""
+    return responder_json(request, usuario, ("grafo-expandir", documento, saltos, limite), lambda: consultar_grafo(
+        usuario, [documento], lambda grafo, doc: grafo.expandir(doc, saltos, limite)))
+
+@app.get("/api/grafo/caminho")
+def grafo_caminho(
+    request: Request,
+    origem: str,
+    destino: str,
+    max_saltos: int = Query(6, ge=1, le=MAX_SALTOS_CAMINHO),
+    direcionado: bool = False,
+    usuario: Optional[str] = Depends(usuario_atual)
+):
+    """Menor cadeia de vínculos entre dois CPFs/CNPJs (com `direcionado`, no sentido do recurso)"""
+    return responder_json(request, usuario, ("grafo-caminho", origem, destino, max_saltos, direcionado),
+                          lambda: consultar_grafo(usuario, [origem, destino], lambda grafo, a, b: grafo.caminho(
+                              a, b, max_saltos, direcionado)))
 
 @app.get("/api/health")
 def health_check():
     """Verifica a saúde da aplicação"""
     try:
-        # Testar se há dados processados
-        total_comunicacoes = sum(len(comunicacoes) for comunicacoes in comunicacoes_data.values())
-        
+        # Testar o acesso ao banco e contar os dados processados
         return {
             "status": "healthy",
-            "database": "not_used",
-            "registros": {
-                "comunicacoes": total_comunicacoes,
-                "usuarios": len(comunicacoes_data)
-            }
+            "database": "sqlite",
+            "registros": contar_registros()
         }
     except Exception as e:
         return {
@@ -0,0 +1,224 @@
+"""Contadores e histogramas do processo, expostos em /metrics no formato de texto do Prometheus.
+
+Sem dependências: o módulo também é importado pelos processos do pool de
+parsing, que não carregam o FastAPI. As medidas desses processos voltam com
+os resultados de cada lote e são registradas no processo do servidor.
+"""
+
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (segundos) dos histogramas, em escalas de acordo com o que medem
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_PARSER = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BUCKETS_ETAPA = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_metricas: List["Metrica"] = []
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes: Tuple[str, ...], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Metrica:
+    """Série com nome, ajuda e rótulos; os valores são guardados por tupla de rótulos"""
+
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        _metricas.append(self)
+
+    def _chave(self, rotulos: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(rotulos) != len(self.rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.rotulos}, recebeu {rotulos}")
+        return tuple(str(r) for r in rotulos)
+
+    def amostras(self) -> List[str]:
+        raise NotImplementedError
+
+    def renderizar(self) -> str:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas.extend(self.amostras())
+        return "\n".join(linhas)
+
+
+class Contador(Metrica):
+    """Valor que só cresce"""
+
+    tipo = "counter"
+
+    def inc(self, *rotulos: str, valor: float = 1):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, *rotulos: str) -> float:
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}" for chave, valor in valores]
+
+
+class Histograma(Metrica):
+    """Distribuição de durações em buckets cumulativos, com soma e contagem"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (), buckets: Tuple[float, ...] = BUCKETS_HTTP):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observar(self, valor: float, *rotulos: str):
+        self.observar_varios((valor,), *rotulos)
+
+    def observar_varios(self, valores: Iterable[float], *rotulos: str):
+        """Registra várias observações com uma única aquisição do lock"""
+        chave = self._chave(rotulos)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                # Contagem por bucket (o último é +Inf) e soma
+                serie = self._valores[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            contagens = serie[0]
+            for valor in valores:
+                contagens[bisect.bisect_left(self.buckets, valor)] += 1
+                serie[1] += valor
+
+    def contagem(self, *rotulos: str) -> int:
+        with self._lock:
+            serie = self._valores.get(self._chave(rotulos))
+            return sum(serie[0]) if serie else 0
+
+    def amostras(self) -> List[str]:
+        with self._lock:
+            series = sorted((chave, list(serie[0]), serie[1]) for chave, serie in self._valores.items())
+        linhas = []
+        for chave, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (math.inf,), contagens):
+                acumulado += contagem
+                le = f'le="{_numero(limite)}"'
+                linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+ETAPAS = Histograma("rif_ingestao_etapa_segundos", "Duração de cada etapa do processamento de um upload",
+                    ("etapa",), BUCKETS_ETAPA)
+UPLOADS = Contador("rif_uploads_total", "Uploads processados, por resultado", ("resultado",))
+LINHAS = Contador("rif_ingestao_linhas_total", "Linhas de dados lidas dos CSVs, por arquivo", ("arquivo",))
+LINHAS_IGNORADAS = Contador("rif_ingestao_linhas_ignoradas_total",
+                            "Linhas dos CSVs descartadas na leitura, por arquivo e motivo", ("arquivo", "motivo"))
+PARSER = Histograma("rif_parser_segundos", "Duração do parsing de uma comunicação, por parser bancário",
+                    ("parser",), BUCKETS_PARSER)
+PARSING_LIMITADO = Contador("rif_parsing_limitado_total",
+                            "Comunicações que passaram do limite de tempo do parsing, por parser", ("parser",))
+HTTP = Histograma("rif_http_requisicao_segundos", "Duração das requisições HTTP, por rota",
+                  ("metodo", "rota", "status"), BUCKETS_HTTP)
+CACHE = Contador("rif_cache_consultas_total", "Consultas aos caches, por cache e resultado (acerto ou falha)",
+                 ("cache", "resultado"))
+
+
+def contar_cache(cache: str, acerto: bool, quantidade: int = 1):
+    if quantidade:
+        CACHE.inc(cache, "acerto" if acerto else "falha", valor=quantidade)
+
+
+def observar_parsers(tempos: Dict[str, List[float]]):
+    """Registra as durações por parser devolvidas por parsing_paralelo.parse_lote_medido"""
+    for parser, valores in tempos.items():
+        PARSER.observar_varios(valores, parser)
+
+
+def registrar_linhas(estatisticas: Dict[str, Dict[str, Any]]):
+    """Soma aos contadores as linhas lidas e ignoradas das estatísticas de uma ingestão"""
+    for arquivo, estatistica in estatisticas.items():
+        LINHAS.inc(arquivo, valor=estatistica['linhas_lidas'])
+        for motivo, quantidade in estatistica['linhas_ignoradas'].items():
+            if quantidade:
+                LINHAS_IGNORADAS.inc(arquivo, motivo, valor=quantidade)
+
+
+class CronometroEtapas:
+    """Callback de etapa da ingestão que mede cada etapa até o início da seguinte.
+
+    Repassa as chamadas a `repassar` (Tarefa.etapa, no upload assíncrono); a
+    última etapa termina em encerrar().
+    """
+
+    def __init__(self, repassar: Optional[Callable[..., None]] = None):
+        self.repassar = repassar
+        self._atual: Optional[Tuple[str, float]] = None
+
+    def __call__(self, nome: str, estatisticas: Optional[Dict[str, Any]] = None):
+        self.encerrar()
+        self._atual = (nome, time.perf_counter())
+        if self.repassar is not None:
+            self.repassar(nome, estatisticas)
+
+    def encerrar(self):
+        if self._atual is not None:
+            nome, inicio = self._atual
+            ETAPAS.observar(time.perf_counter() - inicio, nome)
+            self._atual = None
+
+
+class MetricasHTTP:
+    """Middleware ASGI que mede cada requisição até o fim do envio da resposta.
+
+    A rota é o modelo do caminho (/api/comunicacoes/{comunicacao_id}), para que
+    os parâmetros não multipliquem as séries; caminhos sem rota ficam em "outra".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = getattr(scope.get("route"), "path", None) or "outra"
+            HTTP.observar(time.perf_counter() - inicio, scope["method"], rota, str(status))
+
+
+def renderizar() -> str:
+    return "\n".join(metrica.renderizar() for metrica in _metricas) + "\n"
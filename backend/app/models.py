@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, JSON
+import uuid
+
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Text, JSON, Index, DDL, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -10,33 +12,99 @@ class Usuario(Base):
     usuario = Column(String, unique=True, nullable=False)
     senha = Column(String, nullable=False)
 
+class Upload(Base):
+    __tablename__ = 'uploads'
+    id = Column(Integer, primary_key=True)
+    usuario = Column(String, nullable=False, index=True)
+    data = Column(String)  # Data/hora do processamento (ISO 8601)
+    arquivos_sha256 = Column(Text)  # JSON com o SHA-256 de cada CSV
+    versao = Column(Integer, default=1)  # Incrementada a cada alteração das comunicações
+    # Identificador que nunca se repete: o SQLite reaproveita o id do upload apagado na substituição,
+    # então caches e referências a um upload específico usam a geração, não o id
+    geracao = Column(String, default=lambda: uuid.uuid4().hex)
+    agregados = Column(Text)  # JSON dos totais do dashboard e das estatísticas
+    workspace = Column(String)  # Nome do workspace; NULL no upload avulso, substituído a cada envio
+    ativado_em = Column(Float)  # Quando passou a ser o upload vigente do usuário (epoch)
+    historico = Column(Text)  # JSON dos RIFs acrescentados ao workspace
+    comunicacoes = relationship('Comunicacao', back_populates='upload')
+    __table_args__ = (
+        Index('ix_uploads_usuario_workspace', 'usuario', 'workspace'),
+    )
+
 class Comunicacao(Base):
     __tablename__ = 'comunicacoes'
     id = Column(Integer, primary_key=True)
+    numero = Column(Integer)  # Id exposto pela API, sequencial dentro do upload
+    usuario = Column(String)
+    upload_id = Column(Integer, ForeignKey('uploads.id'))
     banco = Column(String)
     data = Column(String)
+    data_iso = Column(String)  # Data da operação como AAAA-MM-DD, para filtros e ordenação
     informacoes_adicionais = Column(Text)
     parsing_json = Column(Text)  # JSON estruturado extraído
     codigo_segmento = Column(String)  # Código do segmento (41, 42, 37, etc.)
     cidade_agencia = Column(String)  # Cidade da agência
     uf_agencia = Column(String)  # UF da agência
+    titular = Column(String)
+    cpf = Column(String)
+    descricao_ocorrencia = Column(Text)
+    data_fim = Column(String)  # DataFimFato
+    id_comunicacao = Column(String)  # idComunicacao do COAF
+    numero_ocorrencia = Column(String)  # NumeroOcorrenciaBC
+    # Valores já convertidos na ingestão; NULL quando ausentes ou inválidos
+    valor_total = Column(Float)
+    campo_a = Column(Float)
+    campo_b = Column(Float)
+    campo_c = Column(Float)
+    campo_d = Column(Float)
+    campo_e = Column(Float)
     envolvido_id = Column(Integer, ForeignKey('envolvidos.id'))
     ocorrencia_id = Column(Integer, ForeignKey('ocorrencias.id'))
+    versao = Column(Integer)  # Versão do upload em que a comunicação foi gravada ou corrigida por último
+    upload = relationship('Upload', back_populates='comunicacoes')
     envolvido = relationship('Envolvido', back_populates='comunicacoes')
     ocorrencia = relationship('Ocorrencia', back_populates='comunicacoes')
+    __table_args__ = (
+        Index('ix_comunicacoes_upload_numero', 'upload_id', 'numero'),
+        Index('ix_comunicacoes_usuario', 'usuario'),
+        # Índices da listagem paginada: (upload, filtro/ordenação, numero) permitem keyset sem varrer o upload
+        Index('ix_comunicacoes_upload_banco', 'upload_id', 'banco', 'numero'),
+        Index('ix_comunicacoes_upload_uf', 'upload_id', 'uf_agencia', 'numero'),
+        Index('ix_comunicacoes_upload_cidade', 'upload_id', 'cidade_agencia', 'numero'),
+        Index('ix_comunicacoes_upload_segmento', 'upload_id', 'codigo_segmento', 'numero'),
+        Index('ix_comunicacoes_upload_titular', 'upload_id', 'titular', 'numero'),
+        Index('ix_comunicacoes_upload_cpf', 'upload_id', 'cpf', 'numero'),
+        Index('ix_comunicacoes_upload_data', 'upload_id', 'data_iso', 'numero'),
+        Index('ix_comunicacoes_upload_valor', 'upload_id', 'valor_total', 'numero'),
+        # Deduplicação dos RIFs acrescentados a um workspace
+        Index('ix_comunicacoes_upload_id_comunicacao', 'upload_id', 'id_comunicacao', 'numero_ocorrencia'),
+        # Comunicações alteradas desde a versão do dataset em memória
+        Index('ix_comunicacoes_upload_versao', 'upload_id', 'versao'),
+    )
 
 class Envolvido(Base):
     __tablename__ = 'envolvidos'
     id = Column(Integer, primary_key=True)
+    upload_id = Column(Integer, ForeignKey('uploads.id'))
+    indexador = Column(String)
     nome = Column(String)
     cpf = Column(String)
     comunicacoes = relationship('Comunicacao', back_populates='envolvido')
+    __table_args__ = (
+        Index('ix_envolvidos_upload_indexador', 'upload_id', 'indexador'),
+        Index('ix_envolvidos_cpf', 'cpf'),
+    )
 
 class Ocorrencia(Base):
     __tablename__ = 'ocorrencias'
     id = Column(Integer, primary_key=True)
+    upload_id = Column(Integer, ForeignKey('uploads.id'))
+    id_ocorrencia = Column(String)
     descricao = Column(Text)
     comunicacoes = relationship('Comunicacao', back_populates='ocorrencia')
+    __table_args__ = (
+        Index('ix_ocorrencias_upload_id_ocorrencia', 'upload_id', 'id_ocorrencia'),
+    )
 
 class ParsingCorrecao(Base):
     __tablename__ = 'parsing_correcoes'
@@ -44,4 +112,108 @@ class ParsingCorrecao(Base):
     comunicacao_id = Column(Integer, ForeignKey('comunicacoes.id'))
     json_corrigido = Column(Text)  # Armazena o JSON corrigido como string
     usuario_id = Column(Integer, ForeignKey('usuarios.id'))
-    data = Column(String) 
\ No newline at end of file
+    data = Column(String) 
+class Aresta(Base):
+    """Vínculo entre duas pessoas (CPF/CNPJ só com dígitos) somado sobre as comunicações de um upload"""
+    __tablename__ = 'arestas'
+    id = Column(Integer, primary_key=True)
+    upload_id = Column(Integer, ForeignKey('uploads.id'), nullable=False)
+    origem = Column(String, nullable=False)
+    destino = Column(String, nullable=False)
+    vinculo = Column(String, nullable=False)  # Crédito, Débito, Boleto, Sócio/Dirigente, Cônjuge
+    direcionada = Column(Integer, nullable=False, default=1)  # 0: vínculo sem sentido do recurso
+    valor = Column(Float, nullable=False, default=0.0)
+    quantidade = Column(Integer, nullable=False, default=0)
+    comunicacoes = Column(Integer, nullable=False, default=0)  # 0: aresta removida por correção
+    versao = Column(Integer, nullable=False)  # Versão do upload em que a aresta mudou por último
+    __table_args__ = (
+        Index('ix_arestas_chave', 'upload_id', 'origem', 'destino', 'vinculo', unique=True),
+        Index('ix_arestas_upload_versao', 'upload_id', 'versao'),
+    )
+
+class EntidadeGrafo(Base):
+    __tablename__ = 'entidades_grafo'
+    id = Column(Integer, primary_key=True)
+    upload_id = Column(Integer, ForeignKey('uploads.id'), nullable=False)
+    documento = Column(String, nullable=False)
+    nome = Column(String)
+    versao = Column(Integer, nullable=False)
+    __table_args__ = (
+        Index('ix_entidades_grafo_documento', 'upload_id', 'documento', unique=True),
+        Index('ix_entidades_grafo_upload_versao', 'upload_id', 'versao'),
+    )
+
+class EntidadeRIF(Base):
+    """Presença de um CPF/CNPJ (qualquer papel do Envolvidos.csv) em um RIF.
+
+    Não é apagada quando o upload é substituído: forma o índice de pessoas
+    de todos os RIFs já carregados. `upload_id`, `geracao` e `numero` apontam
+    para o upload mais recente que trouxe a linha, que pode já não existir;
+    como o id é reaproveitado, a linha só é vigente se a geração também bate.
+    """
+    __tablename__ = 'entidades_rif'
+    id = Column(Integer, primary_key=True)
+    documento = Column(String, nullable=False)  # CPF/CNPJ só com dígitos
+    nome = Column(String)
+    papel = Column(String)  # tipoEnvolvido: Titular, Remetente, Procurador / Representante Legal...
+    indexador = Column(String)
+    id_comunicacao = Column(String)
+    numero = Column(Integer)  # Id da comunicação na API, dentro do upload
+    rif = Column(String, nullable=False)  # SHA-256 do Comunicacoes.csv
+    upload_id = Column(Integer)
+    geracao = Column(String)  # Upload.geracao do upload de origem
+    usuario = Column(String)
+    data = Column(String)  # Data/hora do upload (ISO 8601)
+    __table_args__ = (
+        Index('ix_entidades_rif_chave', 'documento', 'rif', 'indexador', 'papel', unique=True),
+    )
+
+# Tabelas de arquivos próprios, fora de dados.db, com metadados separados
+BaseTarefas = declarative_base()
+
+class TarefaUpload(BaseTarefas):
+    """Estado de um processamento de upload, compartilhado pelos workers do uvicorn.
+
+    O worker que executa a tarefa grava o progresso e um sinal de vida
+    (`atualizada`); qualquer worker responde às consultas e registra pedidos
+    de cancelamento em `cancelar`.
+    """
+    __tablename__ = 'tarefas'
+    id = Column(String, primary_key=True)
+    usuario = Column(String, nullable=False)
+    estado = Column(String, nullable=False)  # na_fila, processando, concluida, erro, cancelada
+    etapa = Column(String)
+    progresso = Column(Text)  # JSON das linhas lidas/ignoradas e comunicações processadas/gravadas
+    erro = Column(Text)
+    resultado = Column(Text)  # JSON da resposta do processamento
+    criada = Column(Float, nullable=False)
+    iniciada = Column(Float)
+    encerrada = Column(Float)
+    atualizada = Column(Float, nullable=False)
+    versao = Column(Integer, nullable=False, default=0)  # Incrementada a cada mudança, para o SSE
+    cancelar = Column(Integer, nullable=False, default=0)
+    __table_args__ = (
+        # No máximo uma tarefa não encerrada por usuário, entre todos os workers
+        Index('ix_tarefas_usuario_ativa', 'usuario', unique=True, sqlite_where=text('encerrada IS NULL')),
+        Index('ix_tarefas_encerrada', 'encerrada'),
+    )
+
+BaseCache = declarative_base()
+
+class ParseCache(BaseCache):
+    """Saída dos parsers por texto, guardada em cache_parsing.db"""
+    __tablename__ = 'parse_cache'
+    chave = Column(String, primary_key=True)  # parser:versao:sha256(texto)
+    parser = Column(String, nullable=False, index=True)
+    versao = Column(String, nullable=False)
+    resultado = Column(Text, nullable=False)  # JSON da saída do parser
+    tamanho = Column(Integer, nullable=False)  # bytes de resultado, para o limite de tamanho
+    ultimo_acesso = Column(Float, nullable=False, index=True)  # ordem de despejo (LRU)
+
+# Índice de texto completo das comunicações (FTS5). O rowid é o id da comunicação;
+# "campos" guarda os textos extraídos pelos parsers e "documentos" os CPFs/CNPJs só com dígitos.
+event.listen(Base.metadata, 'after_create', DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comunicacoes_fts USING fts5("
+    "informacoes_adicionais, campos, documentos, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+))
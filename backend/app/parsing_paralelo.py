@@ -0,0 +1,250 @@
+import contextlib
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from parsers import registro
+
+from . import metricas
+
+logger = logging.getLogger(__name__)
+
+# Número de processos do pool de parsing; 0 ou 1 desativa o pool (execução serial)
+WORKERS_PARSING = int(os.environ.get("RIF_PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+# Lotes em voo por worker: mantém todos ocupados sem acumular o arquivo inteiro em memória
+LOTES_POR_WORKER = 2
+
+# Tempo máximo de parsing de uma comunicação; acima dele o texto é interpretado
+# pelo parser genérico e o resultado leva "limite_parsing". 0 desativa o limite
+LIMITE_PARSING_MS = float(os.environ.get("RIF_PARSE_LIMITE_MS", "1000"))
+
+# Apenas as colunas usadas pelos parsers atravessam a fronteira entre processos
+CAMPOS_PARSING = (
+    "informacoesAdicionais", "cpfCnpjComunicante", "nomeComunicante", "CodigoSegmento",
+    "CampoA", "CampoB", "CampoC", "CampoD", "CampoE"
+)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: seguro com as threads do servidor e o único modo disponível no Windows
+            _executor = ProcessPoolExecutor(
+                max_workers=max(WORKERS_PARSING, 1),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+def encerrar_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def escolher_parser(row: Dict[str, str]) -> Optional[str]:
+    """Nome do parser bancário da linha (parsers.registro), ou None para segmentos sem parsing de texto"""
+    if row.get("CodigoSegmento", "41") != "41":
+        return None
+    return registro.escolher(row.get("cpfCnpjComunicante") or "", row.get("nomeComunicante") or "")
+
+
+class TempoEsgotado(BaseException):
+    """Parsing interrompido pelo limite de tempo.
+
+    BaseException para não ser engolida por um `except Exception` dentro de um parser.
+    """
+
+
+def _estourar(signum, frame):
+    raise TempoEsgotado()
+
+
+class LimiteParsing:
+    """Aplica LIMITE_PARSING_MS a cada comunicação de um lote.
+
+    Na thread principal de sistemas com setitimer (os processos do pool), um
+    SIGALRM interrompe o parser no meio da expressão regular que estourou o
+    limite. Nas demais threads não há como interromper: o parser vai até o fim
+    e o resultado é descartado se passou do limite; por isso parse_lotes leva
+    ao pool até os lotes que faria em série quando o limite está ativo.
+    """
+
+    def __init__(self, limite_ms: float = LIMITE_PARSING_MS):
+        self.limite_ms = limite_ms
+        self.segundos = limite_ms / 1000
+        self.interromper = (self.segundos > 0 and hasattr(signal, "setitimer")
+                            and threading.current_thread() is threading.main_thread())
+        self._anterior = None
+
+    def __enter__(self):
+        if self.interromper:
+            self._anterior = signal.signal(signal.SIGALRM, _estourar)
+        return self
+
+    def __exit__(self, *exc):
+        if self.interromper:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._anterior)
+
+    def _executar(self, parser, texto: str) -> Tuple[Optional[Dict[str, Any]], float, bool]:
+        """(resultado ou None se passou do limite, segundos, se foi interrompido)"""
+        inicio = time.perf_counter()
+        interrompido = False
+        try:
+            if self.interromper:
+                signal.setitimer(signal.ITIMER_REAL, self.segundos)
+            try:
+                resultado = parser(texto)
+            finally:
+                if self.interromper:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        except TempoEsgotado:
+            resultado, interrompido = None, True
+        segundos = time.perf_counter() - inicio
+        if self.segundos > 0 and segundos > self.segundos:
+            resultado = None
+        return resultado, segundos, interrompido
+
+    def interpretar(self, nome_parser: str, texto: str) -> Dict[str, Any]:
+        # .funcao importa o módulo do parser no primeiro uso, antes de o limite começar a contar
+        resultado, segundos, interrompido = self._executar(registro.obter(nome_parser).funcao, texto)
+        if resultado is not None:
+            return resultado
+        logger.debug("Parser %s excedeu %.0f ms (%.0f ms); usando o parser genérico",
+                     nome_parser, self.limite_ms, segundos * 1000)
+        generico = registro.obter(registro.GENERICO).funcao
+        if nome_parser != registro.GENERICO:
+            resultado, _, _ = self._executar(generico, texto)
+        if resultado is None:
+            resultado = generico("")
+        resultado["limite_parsing"] = {
+            "parser": nome_parser,
+            "tempo_ms": round(segundos * 1000, 1),
+            "limite_ms": self.limite_ms,
+            "interrompido": interrompido,
+        }
+        return resultado
+
+
+def parse_informacoes(row: Dict[str, str], limite: Optional[LimiteParsing] = None) -> Dict[str, Any]:
+    """Interpreta o campo informacoesAdicionais de acordo com o segmento e o banco.
+
+    Com `limite`, um parser bancário que passa do tempo é trocado pelo genérico.
+    """
+    return _interpretar(row, escolher_parser(row), limite)
+
+
+def _interpretar(row: Dict[str, str], nome_parser: Optional[str], limite: Optional[LimiteParsing]) -> Dict[str, Any]:
+    if nome_parser is not None:
+        # SFN-Atípicas: Usar parser bancário individual
+        texto = row.get("informacoesAdicionais", "")
+        if limite is not None:
+            return limite.interpretar(nome_parser, texto)
+        return registro.obter(nome_parser)(texto)
+
+    # Outros segmentos: Extrair campos específicos
+    return {
+        "campo_a": row.get("CampoA", "0"),
+        "campo_b": row.get("CampoB", "0"),
+        "campo_c": row.get("CampoC", "0"),
+        "campo_d": row.get("CampoD", "0"),
+        "campo_e": row.get("CampoE", "0"),
+        "codigo_segmento": row.get("CodigoSegmento", "41")
+    }
+
+
+def _campos_parsing(row: Dict[str, str]) -> Dict[str, str]:
+    return {campo: row[campo] for campo in CAMPOS_PARSING if campo in row}
+
+
+def parse_lote_medido(linhas: List[Dict[str, str]]) -> Tuple[List[Dict[str, Any]], Dict[str, List[float]]]:
+    """Interpreta um lote de linhas; executado nos processos do pool.
+
+    Devolve também a duração, em segundos, de cada comunicação por parser
+    bancário, registrada nas métricas pelo processo que recebe o lote.
+    """
+    resultados = []
+    tempos: Dict[str, List[float]] = {}
+    limite = LimiteParsing() if LIMITE_PARSING_MS > 0 else None
+    with limite or contextlib.nullcontext():
+        for row in linhas:
+            nome_parser = escolher_parser(row)
+            if nome_parser is None:
+                resultados.append(_interpretar(row, None, limite))
+                continue
+            inicio = time.perf_counter()
+            resultados.append(_interpretar(row, nome_parser, limite))
+            tempos.setdefault(nome_parser, []).append(time.perf_counter() - inicio)
+    return resultados, tempos
+
+
+def parse_lote(linhas: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """Interpreta um lote de linhas no processo atual, registrando as durações nas métricas"""
+    resultados, tempos = parse_lote_medido(linhas)
+    metricas.observar_parsers(tempos)
+    return resultados
+
+
+def _resultados(futuro) -> List[Dict[str, Any]]:
+    resultados, tempos = futuro.result()
+    metricas.observar_parsers(tempos)
+    return resultados
+
+
+def parse_lotes(lotes: Iterable[List[Dict[str, str]]],
+                workers: Optional[int] = None) -> Iterator[Tuple[List[Dict[str, str]], List[Dict[str, Any]]]]:
+    """Interpreta lotes de linhas, devolvendo (lote, resultados) na ordem de entrada.
+
+    Com mais de um worker, os lotes são enviados ao ProcessPoolExecutor com uma
+    janela limitada de lotes pendentes; caso contrário o parsing é serial. As
+    duas formas produzem exatamente a mesma saída. Com LIMITE_PARSING_MS ativo,
+    o parsing só é serial se o limite puder interromper o parser nesta thread.
+    """
+    workers = WORKERS_PARSING if workers is None else workers
+    lotes = iter(lotes)
+    primeiro = next(lotes, None)
+    if primeiro is None:
+        return
+    segundo = next(lotes, None)
+    serial = workers <= 1 or segundo is None
+    if serial and LIMITE_PARSING_MS > 0 and hasattr(signal, "setitimer") and not LimiteParsing().interromper:
+        # Aqui o limite não interromperia um parser travado (nem o genérico, usado
+        # no lugar dele): mesmo um único lote vai ao pool, que o interrompe
+        serial = False
+    lotes = itertools.chain([primeiro], [segundo] if segundo is not None else [], lotes)
+    if serial:
+        # Serial, inclusive para arquivos de um único lote, que não compensam o pool
+        for lote in lotes:
+            yield lote, parse_lote(lote)
+        return
+
+    executor = _get_executor()
+    janela = max(workers, 1) * LOTES_POR_WORKER
+    pendentes = deque()
+    try:
+        for lote in lotes:
+            pendentes.append((lote, executor.submit(parse_lote_medido, [_campos_parsing(row) for row in lote])))
+            if len(pendentes) >= janela:
+                lote_pronto, futuro = pendentes.popleft()
+                yield lote_pronto, _resultados(futuro)
+        while pendentes:
+            lote_pronto, futuro = pendentes.popleft()
+            yield lote_pronto, _resultados(futuro)
+    finally:
+        for _, futuro in pendentes:
+            futuro.cancel()
@@ -1,19 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from typing import Dict
-from parsers import bradesco, bb, nubank, parser_generico
+from parsers import registro
 
 router = APIRouter()
 
-@router.post("/parse/{banco}")
+@router.post("/api/parse/{banco}")
 def parse_informacoes(banco: str, payload: Dict[str, str]):
+    """Interpreta um texto com o parser de `banco`: nome do parser, CNPJ ou nome do comunicante"""
     texto = payload.get("texto", "")
     if not texto:
         raise HTTPException(status_code=400, detail="Campo 'texto' é obrigatório.")
-    if banco.lower() == "bradesco":
-        return bradesco.parse_bradesco(texto)
-    elif banco.lower() in ["bb", "banco do brasil"]:
-        return bb.parse_bb(texto)
-    elif banco.lower() == "nubank":
-        return nubank.parse_nubank(texto)
-    else:
-        return parser_generico.parse_generico(texto) 
\ No newline at end of file
+    nome_parser = banco.lower() if banco.lower() in registro.PLUGINS else registro.escolher(banco, banco)
+    return registro.obter(nome_parser)(texto)
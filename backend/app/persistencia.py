@@ -0,0 +1,389 @@
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+
+from .agregados import COLUNAS_VALOR, AgregadosRIF, valores_comunicacao
+from .busca import atualizar_campos, indexar, linha_indice, remover_do_indice
+from .database import SessionLocal, garantir_schema
+from .entidades import indexar_envolvidos, linhas_indice
+from .grafo import ArestasLote
+from .ingestao import chave_comunicacao, em_lotes
+from .models import Aresta, Comunicacao, EntidadeGrafo, Envolvido, Ocorrencia, ParsingCorrecao, Upload, Usuario
+
+# Linhas por INSERT em lote (executemany) durante a gravação de um RIF
+TAMANHO_LOTE_INSERCAO = 1000
+
+
+def _inserir_com_ids(session, modelo, linhas: List[Dict[str, Any]], chave: str) -> Dict[str, int]:
+    """Insere em lote e devolve o id gerado para cada valor de `chave`"""
+    ids = {}
+    for lote in em_lotes(linhas, TAMANHO_LOTE_INSERCAO):
+        gerados = session.scalars(
+            insert(modelo).returning(modelo.id, sort_by_parameter_order=True), lote
+        ).all()
+        ids.update(zip((linha[chave] for linha in lote), gerados))
+    return ids
+
+
+def _remover_uploads(session, usuario: str, workspace: Optional[str] = None):
+    """Apaga os dados do upload avulso anterior do usuário, ou de um workspace dele"""
+    filtro = (Upload.usuario == usuario,
+              Upload.workspace == workspace if workspace else Upload.workspace.is_(None))
+    anteriores = select(Upload.id).where(*filtro).scalar_subquery()
+    comunicacoes = select(Comunicacao.id).where(Comunicacao.upload_id.in_(anteriores))
+    session.execute(delete(ParsingCorrecao).where(ParsingCorrecao.comunicacao_id.in_(comunicacoes)))
+    remover_do_indice(session, comunicacoes)
+    session.execute(delete(Comunicacao).where(Comunicacao.upload_id.in_(anteriores)))
+    session.execute(delete(Envolvido).where(Envolvido.upload_id.in_(anteriores)))
+    session.execute(delete(Ocorrencia).where(Ocorrencia.upload_id.in_(anteriores)))
+    session.execute(delete(Aresta).where(Aresta.upload_id.in_(anteriores)))
+    session.execute(delete(EntidadeGrafo).where(EntidadeGrafo.upload_id.in_(anteriores)))
+    session.execute(delete(Upload).where(*filtro))
+
+
+def extras_indice(c: Dict[str, Any]) -> tuple:
+    """Campos da comunicação (além do parser) incluídos no índice de busca"""
+    return (c['titular'], c['cpf'], c['banco'], c['ocorrencia'])
+
+
+class FiltroNovas:
+    """Filtro da ingestão que descarta, antes do parsing, as comunicações já gravadas em um workspace.
+
+    Uma comunicação é identificada por (idComunicacao, NumeroOcorrenciaBC).
+    A existência é consultada lote a lote pelo índice ix_comunicacoes_upload_id_comunicacao;
+    repetições dentro dos próprios arquivos enviados ficam em um conjunto em
+    memória, que só cresce com as linhas novas.
+    """
+
+    def __init__(self, upload_id: Optional[int]):
+        self.upload_id = upload_id
+        self.vistas: Set[Tuple[str, str]] = set()
+        self.duplicadas = 0
+
+    def _gravadas(self, chaves: List[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        if self.upload_id is None:
+            return set()
+        ids = list({id_comunicacao for id_comunicacao, _ in chaves if id_comunicacao})
+        if not ids:
+            return set()
+        with SessionLocal() as session:
+            return set(session.execute(
+                select(Comunicacao.id_comunicacao, Comunicacao.numero_ocorrencia)
+                .where(Comunicacao.upload_id == self.upload_id, Comunicacao.id_comunicacao.in_(ids))
+            ).tuples())
+
+    def __call__(self, lote: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        chaves = [chave_comunicacao(row) for row in lote]
+        gravadas = self._gravadas(chaves)
+        novas = []
+        for row, chave in zip(lote, chaves):
+            if not chave[0]:
+                # Sem idComunicacao não há como reconhecer a repetição
+                novas.append(row)
+            elif chave in gravadas or chave in self.vistas:
+                self.duplicadas += 1
+            else:
+                self.vistas.add(chave)
+                novas.append(row)
+        return novas
+
+
+def _workspace(session, usuario: str, workspace: str) -> Optional[Upload]:
+    return session.scalars(
+        select(Upload).where(Upload.usuario == usuario, Upload.workspace == workspace).limit(1)
+    ).first()
+
+
+def proximo_numero(usuario: str, workspace: Optional[str]) -> Tuple[Optional[int], int]:
+    """(id do upload, próximo id de comunicação) para acrescentar um RIF ao workspace"""
+    if not workspace:
+        return None, 1
+    garantir_schema()
+    with SessionLocal() as session:
+        upload = _workspace(session, usuario, workspace)
+        if upload is None:
+            return None, 1
+        maior = session.scalar(select(func.max(Comunicacao.numero)).where(Comunicacao.upload_id == upload.id))
+        return upload.id, (maior or 0) + 1
+
+
+def _ids_faltando(session, modelo, coluna: str, upload_id: int, linhas: Dict[str, Dict[str, Any]],
+                  ids: Dict[str, int]) -> None:
+    """Completa `ids` com as linhas do upload já gravadas ou, se ausentes, inseridas agora"""
+    faltando = [valor for valor in linhas if valor not in ids]
+    if not faltando:
+        return
+    campo = getattr(modelo, coluna)
+    for lote in em_lotes(faltando, TAMANHO_LOTE_INSERCAO):
+        ids.update(session.execute(
+            select(campo, modelo.id).where(modelo.upload_id == upload_id, campo.in_(lote))
+        ).all())
+    ids.update(_inserir_com_ids(session, modelo, [
+        {'upload_id': upload_id, coluna: valor, **linhas[valor]} for valor in faltando if valor not in ids
+    ], coluna))
+
+
+def salvar_rif(usuario: str, resultado: Dict[str, Any], hashes: Optional[Dict[str, str]] = None,
+               progresso: Optional[Callable[[int], None]] = None, workspace: Optional[str] = None,
+               filtro: Optional[FiltroNovas] = None) -> Dict[str, Any]:
+    """Grava o RIF ingerido, substituindo o upload anterior do usuário.
+
+    Tudo acontece em uma única transação: outros workers continuam lendo o
+    upload anterior (WAL) até o commit. O índice de pessoas (entidades_rif)
+    não é apagado com o upload anterior: acumula todos os RIFs carregados. As comunicações são consumidas do
+    iterador da ingestão e inseridas em lotes, sem materializar o arquivo.
+    `progresso` recebe o total de comunicações gravadas após cada lote; uma
+    exceção do iterador ou do callback desfaz a transação inteira.
+
+    Com `workspace`, o RIF é acrescentado ao upload do workspace (criado no
+    primeiro envio) em vez de substituí-lo: a ingestão já descartou as
+    comunicações repetidas (`filtro`), os ids continuam a numeração anterior,
+    os agregados e as arestas são somados aos existentes e a versão do
+    upload é incrementada. No acréscimo, só os envolvidos e ocorrências
+    referenciados pelas comunicações novas são gravados.
+    """
+    garantir_schema()
+    with SessionLocal() as session, session.begin():
+        agora = datetime.now().isoformat(timespec='seconds')
+        upload = _workspace(session, usuario, workspace) if workspace else None
+        acrescimo = upload is not None
+        if acrescimo:
+            # Incrementar a versão primeiro obtém o lock de escrita antes da leitura dos agregados
+            session.execute(update(Upload).where(Upload.id == upload.id).values(versao=Upload.versao + 1))
+            session.refresh(upload)
+            upload.data = agora
+            agregados = AgregadosRIF.de_json(upload.agregados) if upload.agregados else AgregadosRIF()
+            anteriores = agregados.total
+            proximo = (session.scalar(
+                select(func.max(Comunicacao.numero)).where(Comunicacao.upload_id == upload.id)
+            ) or 0) + 1
+            envolvido_ids: Dict[str, int] = {}
+            ocorrencia_ids: Dict[str, int] = {}
+        else:
+            if not workspace:
+                _remover_uploads(session, usuario)
+            upload = Upload(
+                usuario=usuario,
+                data=agora,
+                arquivos_sha256=json.dumps(hashes or {}),
+                versao=1,
+                workspace=workspace,
+                historico='[]' if workspace else None
+            )
+            session.add(upload)
+            session.flush()
+            agregados = AgregadosRIF()
+            anteriores = 0
+
+            envolvido_ids = _inserir_com_ids(session, Envolvido, [
+                {'upload_id': upload.id, 'indexador': indexador, 'nome': dados['nome'], 'cpf': dados['cpf']}
+                for indexador, dados in resultado['envolvidos'].items()
+            ], 'indexador')
+            ocorrencia_ids = _inserir_com_ids(session, Ocorrencia, [
+                {'upload_id': upload.id, 'id_ocorrencia': id_ocorrencia, 'descricao': descricao}
+                for id_ocorrencia, descricao in resultado['ocorrencias'].items()
+            ], 'id_ocorrencia')
+        upload.ativado_em = time.time()
+
+        arestas = ArestasLote()
+        # Indexador -> (id, idComunicacao), para ligar os envolvidos às comunicações
+        por_indexador = {}
+        for lote in em_lotes(resultado['comunicacoes'], TAMANHO_LOTE_INSERCAO):
+            if acrescimo:
+                if lote[0]['id'] < proximo:
+                    raise RuntimeError("Workspace alterado durante o processamento; envie os arquivos novamente")
+                # Os Indexadores recomeçam a cada RIF: os titulares deste envio ganham registros próprios
+                envolvido_ids.update(_inserir_com_ids(session, Envolvido, [
+                    {'upload_id': upload.id, 'indexador': indexador, **resultado['envolvidos'][indexador]}
+                    for indexador in dict.fromkeys(c['indexador'] for c in lote)
+                    if indexador in resultado['envolvidos'] and indexador not in envolvido_ids
+                ], 'indexador'))
+                _ids_faltando(session, Ocorrencia, 'id_ocorrencia', upload.id, {
+                    c['numero_ocorrencia']: {'descricao': resultado['ocorrencias'][c['numero_ocorrencia']]}
+                    for c in lote if c['numero_ocorrencia'] in resultado['ocorrencias']
+                }, ocorrencia_ids)
+            for c in lote:
+                agregados.adicionar(c['banco'], c['valores'])
+                arestas.adicionar(c['titular'], c['cpf'], c['parsing_json'])
+                por_indexador[c['indexador']] = (c['id'], c['id_comunicacao'])
+            ids = session.scalars(insert(Comunicacao).returning(Comunicacao.id, sort_by_parameter_order=True), [{
+                'numero': c['id'],
+                'usuario': usuario,
+                'upload_id': upload.id,
+                'banco': c['banco'],
+                'data': c['data'],
+                'data_iso': c['data_iso'],
+                'informacoes_adicionais': c['informacoes_adicionais'],
+                'parsing_json': json.dumps(c['parsing_json'], ensure_ascii=False),
+                'codigo_segmento': c['codigo_segmento'],
+                'cidade_agencia': c['cidade_agencia'],
+                'uf_agencia': c['uf_agencia'],
+                'titular': c['titular'],
+                'cpf': c['cpf'],
+                'descricao_ocorrencia': c['ocorrencia'],
+                'data_fim': c['data_fim'],
+                'id_comunicacao': c['id_comunicacao'],
+                'numero_ocorrencia': c['numero_ocorrencia'],
+                **c['valores'],
+                'envolvido_id': envolvido_ids.get(c['indexador']),
+                'ocorrencia_id': ocorrencia_ids.get(c['numero_ocorrencia']),
+                'versao': upload.versao
+            } for c in lote]).all()
+            # Índice de busca atualizado no mesmo lote e na mesma transação
+            indexar(session, [
+                linha_indice(id, c['informacoes_adicionais'], c['parsing_json'], extras_indice(c))
+                for id, c in zip(ids, lote)
+            ])
+            # Arestas do grafo de contrapartes somadas às dos lotes anteriores
+            arestas.gravar(session, upload.id, upload.versao)
+            if progresso:
+                progresso(agregados.total - anteriores)
+        # Todos os envolvidos, de qualquer papel, no índice de pessoas entre RIFs;
+        # no acréscimo, só os das comunicações novas
+        envolvidos = resultado.get('linhas_envolvidos') or ()
+        if acrescimo:
+            envolvidos = (row for row in envolvidos if (row.get('Indexador') or '').strip() in por_indexador)
+        rif = (hashes or {}).get('comunicacoes') or f"upload-{upload.id}"
+        indexar_envolvidos(session, linhas_indice(envolvidos, por_indexador, rif, upload.id, upload.geracao,
+                                                  usuario, agora))
+        upload.agregados = agregados.para_json()
+        novas = agregados.total - anteriores
+        if workspace:
+            historico = json.loads(upload.historico or '[]')
+            historico.append({
+                'data': agora,
+                'arquivos_sha256': hashes or {},
+                'comunicacoes': novas,
+                'duplicadas': filtro.duplicadas if filtro else 0,
+            })
+            upload.historico = json.dumps(historico)
+            upload.arquivos_sha256 = json.dumps(hashes or {})
+        return {'upload_id': upload.id, 'comunicacoes': agregados.total, 'novas': novas,
+                'duplicadas': filtro.duplicadas if filtro else 0}
+
+
+# Vigente: o último ativado (upload avulso ou workspace); uploads anteriores à coluna ficam por último
+ORDEM_VIGENTE = (Upload.ativado_em.desc(), Upload.id.desc())
+
+
+def upload_atual(session, usuario: Optional[str] = None) -> Optional[Upload]:
+    """Upload vigente do usuário; sem usuário, o upload processado mais recentemente"""
+    consulta = select(Upload).order_by(*ORDEM_VIGENTE).limit(1)
+    if usuario:
+        consulta = consulta.where(Upload.usuario == usuario)
+    return session.scalars(consulta).first()
+
+
+def versao_upload(usuario: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    """(geração, versão) do upload vigente, para chavear caches sem carregar o upload"""
+    garantir_schema()
+    consulta = select(Upload.geracao, Upload.versao).order_by(*ORDEM_VIGENTE).limit(1)
+    if usuario:
+        consulta = consulta.where(Upload.usuario == usuario)
+    with SessionLocal() as session:
+        linha = session.execute(consulta).first()
+    return (linha.geracao, linha.versao) if linha else None
+
+
+def corrigir_comunicacao(numero: int, novo_json: Dict[str, Any], usuario: Optional[str] = None) -> Optional[int]:
+    """Substitui o parsing_json de uma comunicação do upload vigente, registrando a correção.
+
+    Os agregados do upload e as arestas do grafo são ajustados pela diferença
+    entre o registro antigo e o corrigido, sem repercorrer as demais
+    comunicações. Retorna a nova
+    versão do upload, ou None se a comunicação não existir.
+    """
+    garantir_schema()
+    with SessionLocal() as session, session.begin():
+        upload = upload_atual(session, usuario)
+        if upload is None:
+            return None
+        upload_id = upload.id
+        # Incrementar a versão primeiro obtém o lock de escrita antes da leitura dos agregados
+        filtro = (Comunicacao.upload_id == upload_id, Comunicacao.numero == numero)
+        if not session.execute(
+            update(Upload)
+            .where(Upload.id == upload_id, select(Comunicacao.id).where(*filtro).exists())
+            .values(versao=Upload.versao + 1)
+        ).rowcount:
+            return None
+        c = session.scalars(select(Comunicacao).where(*filtro)).one()
+        session.refresh(upload)
+        agregados = AgregadosRIF.de_json(upload.agregados) if upload.agregados else None
+        novos_valores = valores_comunicacao(novo_json)
+        if agregados is not None:
+            agregados.remover(c.banco, {coluna: getattr(c, coluna) for coluna in COLUNAS_VALOR})
+            agregados.adicionar(c.banco, novos_valores)
+            upload.agregados = agregados.para_json()
+
+        arestas = ArestasLote()
+        arestas.adicionar(c.titular, c.cpf, json.loads(c.parsing_json) if c.parsing_json else {}, -1)
+        arestas.adicionar(c.titular, c.cpf, novo_json)
+        arestas.gravar(session, upload_id, upload.versao)
+
+        c.parsing_json = json.dumps(novo_json, ensure_ascii=False)
+        atualizar_campos(session, linha_indice(c.id, c.informacoes_adicionais, novo_json, (
+            c.titular, c.cpf, c.banco, c.descricao_ocorrencia
+        )))
+        for coluna, valor in novos_valores.items():
+            setattr(c, coluna, valor)
+        c.versao = upload.versao
+        usuario_id = session.scalar(select(Usuario.id).where(Usuario.usuario == usuario)) if usuario else None
+        session.add(ParsingCorrecao(
+            comunicacao_id=c.id,
+            json_corrigido=c.parsing_json,
+            usuario_id=usuario_id,
+            data=datetime.now().isoformat(timespec='seconds')
+        ))
+        return upload.versao
+
+
+def contar_registros() -> Dict[str, int]:
+    garantir_schema()
+    with SessionLocal() as session:
+        return {
+            "comunicacoes": session.scalar(select(func.count()).select_from(Comunicacao).where(Comunicacao.upload_id.is_not(None))),
+            "usuarios": session.scalar(select(func.count(func.distinct(Upload.usuario))))
+        }
+
+
+def listar_workspaces(usuario: str) -> List[Dict[str, Any]]:
+    """Workspaces do usuário, do ativado mais recentemente para o mais antigo"""
+    garantir_schema()
+    with SessionLocal() as session:
+        vigente = upload_atual(session, usuario)
+        uploads = session.scalars(
+            select(Upload).where(Upload.usuario == usuario, Upload.workspace.is_not(None)).order_by(*ORDEM_VIGENTE)
+        ).all()
+        return [{
+            'nome': upload.workspace,
+            'upload_id': upload.id,
+            'data': upload.data,
+            'versao': upload.versao,
+            'comunicacoes': AgregadosRIF.de_json(upload.agregados).total if upload.agregados else 0,
+            'rifs': json.loads(upload.historico or '[]'),
+            'ativo': vigente is not None and vigente.id == upload.id,
+        } for upload in uploads]
+
+
+def ativar_workspace(usuario: str, workspace: str) -> bool:
+    """Torna o workspace o upload vigente do usuário; False se não existir"""
+    garantir_schema()
+    with SessionLocal() as session, session.begin():
+        return bool(session.execute(
+            update(Upload).where(Upload.usuario == usuario, Upload.workspace == workspace)
+            .values(ativado_em=time.time())
+        ).rowcount)
+
+
+def remover_workspace(usuario: str, workspace: str) -> bool:
+    """Apaga o workspace e seus dados (o índice de pessoas é mantido); False se não existir"""
+    garantir_schema()
+    with SessionLocal() as session, session.begin():
+        if _workspace(session, usuario, workspace) is None:
+            return False
+        _remover_uploads(session, usuario, workspace)
+        return True
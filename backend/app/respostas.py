@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from . import metricas
+from .persistencia import versao_upload
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele, só gzip
+    brotli = None
+
+# Respostas JSON já serializadas (e comprimidas sob demanda), por upload + versão + rota
+LIMITE_CACHE_RESPOSTAS = int(os.environ.get("RIF_CACHE_RESPOSTAS_MB", "64")) * 1024 * 1024
+# Corpos menores que isso vão sem compressão
+TAMANHO_MINIMO_COMPRESSAO = 1024
+
+MIDIA_JSON = "application/json"
+
+
+def serializar(conteudo: Any) -> bytes:
+    return orjson.dumps(conteudo, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RespostaSerializada:
+    """Corpo JSON de uma resposta, seu ETag e as versões comprimidas já geradas"""
+
+    __slots__ = ('corpo', 'etag', 'codificados', 'tamanho')
+
+    def __init__(self, corpo: bytes):
+        self.corpo = corpo
+        self.etag = hashlib.blake2b(corpo, digest_size=16).hexdigest()
+        self.codificados = {}
+        self.tamanho = len(corpo)
+
+    def codificado(self, codificacao: Optional[str]) -> bytes:
+        if codificacao is None:
+            return self.corpo
+        corpo = self.codificados.get(codificacao)
+        if corpo is None:
+            if codificacao == "br":
+                corpo = brotli.compress(self.corpo, quality=5)
+            else:
+                corpo = gzip.compress(self.corpo, compresslevel=6, mtime=0)
+            self.codificados[codificacao] = corpo
+            self.tamanho += len(corpo)
+        return corpo
+
+    def etag_de(self, codificacao: Optional[str]) -> str:
+        # ETag forte: cada codificação é uma representação diferente
+        return f'"{self.etag}-{codificacao}"' if codificacao else f'"{self.etag}"'
+
+
+_cache: "OrderedDict[Hashable, RespostaSerializada]" = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def _obter(chave: Hashable) -> Optional[RespostaSerializada]:
+    with _cache_lock:
+        entrada = _cache.get(chave)
+        if entrada is not None:
+            _cache.move_to_end(chave)
+    metricas.contar_cache('respostas', entrada is not None)
+    return entrada
+
+
+def _guardar(chave: Hashable, entrada: RespostaSerializada) -> RespostaSerializada:
+    global _cache_bytes
+    with _cache_lock:
+        anterior = _cache.pop(chave, None)
+        if anterior is not None:
+            _cache_bytes -= anterior.tamanho
+        _cache[chave] = entrada
+        _cache_bytes += entrada.tamanho
+        while _cache_bytes > LIMITE_CACHE_RESPOSTAS and len(_cache) > 1:
+            _, removida = _cache.popitem(last=False)
+            _cache_bytes -= removida.tamanho
+    return entrada
+
+
+def _ajustar_tamanho(entrada: RespostaSerializada, antes: int):
+    global _cache_bytes
+    with _cache_lock:
+        _cache_bytes += entrada.tamanho - antes
+
+
+def limpar_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def escolher_codificacao(accept_encoding: str, tamanho: int) -> Optional[str]:
+    """br, gzip ou None (identidade), conforme o Accept-Encoding e o tamanho do corpo"""
+    if tamanho < TAMANHO_MINIMO_COMPRESSAO or not accept_encoding:
+        return None
+    aceitas = {}
+    for parte in accept_encoding.lower().split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        if parametros.strip().startswith("q="):
+            try:
+                q = float(parametros.strip()[2:])
+            except ValueError:
+                q = 0.0
+        aceitas[nome.strip()] = q
+    for codificacao in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if aceitas.get(codificacao, aceitas.get("*", 0)) > 0:
+            return codificacao
+    return None
+
+
+def etag_corresponde(if_none_match: Optional[str], entrada: RespostaSerializada) -> bool:
+    """If-None-Match usa comparação fraca: vale qualquer codificação do mesmo corpo"""
+    if not if_none_match:
+        return False
+    for etag in if_none_match.split(","):
+        etag = etag.strip()
+        if etag == "*":
+            return True
+        if etag.startswith("W/"):
+            etag = etag[2:]
+        if etag.strip('"').split("-", 1)[0] == entrada.etag:
+            return True
+    return False
+
+
+def responder_json(request: Request, usuario: Optional[str], chave: Hashable, construir: Callable[[], Any]) -> Response:
+    """Resposta JSON cacheada por (geração do upload, versão, chave), com ETag, 304 e compressão.
+
+    `construir` só é chamado quando a resposta não está no cache. Uma correção
+    incrementa a versão do upload e um novo upload tem outra geração (o id pode
+    ser o mesmo do upload substituído), então entradas antigas nunca são
+    servidas; elas saem do cache pelo limite de tamanho.
+    """
+    versao = versao_upload(usuario)
+    if versao is None:
+        return Response(serializar(construir()), media_type=MIDIA_JSON)
+
+    chave_completa = (versao, chave)
+    entrada = _obter(chave_completa) or _guardar(chave_completa, RespostaSerializada(serializar(construir())))
+
+    codificacao = escolher_codificacao(request.headers.get("accept-encoding", ""), len(entrada.corpo))
+    cabecalhos = {
+        "ETag": entrada.etag_de(codificacao),
+        "Vary": "Accept-Encoding",
+        # O navegador guarda a resposta, mas revalida a cada uso (If-None-Match -> 304)
+        "Cache-Control": "no-cache"
+    }
+    if etag_corresponde(request.headers.get("if-none-match"), entrada):
+        return Response(status_code=304, headers=cabecalhos)
+    antes = entrada.tamanho
+    corpo = entrada.codificado(codificacao)
+    if entrada.tamanho != antes:
+        _ajustar_tamanho(entrada, antes)
+    if codificacao:
+        cabecalhos["Content-Encoding"] = codificacao
+    return Response(corpo, media_type=MIDIA_JSON, headers=cabecalhos)
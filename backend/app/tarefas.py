@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .auth import usuario_token, usuario_token_ou_parametro
+from .database import get_engine
+from .models import TarefaUpload
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Processamentos de upload simultâneos neste processo; os demais aguardam na fila
+WORKERS_UPLOAD = int(os.environ.get("RIF_UPLOAD_WORKERS", "2"))
+# Tarefas encerradas mantidas para consulta
+MAX_TAREFAS_GUARDADAS = 100
+# Intervalo de verificação do SSE e de envio de comentário para manter a conexão aberta
+INTERVALO_EVENTOS = 0.25
+INTERVALO_HEARTBEAT = 15
+# Arquivo próprio, compartilhado pelos workers: o progresso é gravado enquanto a
+# transação que grava o RIF mantém o lock de escrita do banco principal
+CAMINHO_TAREFAS = os.environ.get("RIF_TAREFAS_DB", "backend/database/tarefas.db")
+# Intervalo com que cada processo publica o progresso e o sinal de vida das suas
+# tarefas e verifica cancelamentos pedidos a outros workers
+INTERVALO_SINAL = 1.0
+# Tarefa não encerrada sem sinal de vida há mais que isso: o worker que a executava parou
+TAREFA_SEM_SINAL = 60
+
+ESTADOS_FINAIS = frozenset(("concluida", "erro", "cancelada"))
+ERRO_SEM_SINAL = "Processamento interrompido: o servidor que o executava foi encerrado."
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro do processamento quando a tarefa é cancelada"""
+
+
+_inicializado = False
+_inicializacao_lock = threading.Lock()
+
+
+def _engine():
+    global _inicializado
+    engine = get_engine(CAMINHO_TAREFAS)
+    with _inicializacao_lock:
+        if not _inicializado:
+            TarefaUpload.__table__.create(engine, checkfirst=True)
+            _inicializado = True
+    return engine
+
+
+class Tarefa:
+    """Processamento de um upload em segundo plano, no processo que o executa.
+
+    O estado é gravado na tabela `tarefas` a cada mudança de estado ou etapa;
+    a contagem de comunicações é publicada periodicamente pelo monitor do processo.
+    """
+
+    def __init__(self, usuario: str):
+        self.id = uuid.uuid4().hex
+        self.usuario = usuario
+        self.estado = "na_fila"
+        self.etapa_atual: Optional[str] = None
+        self.estatisticas: Dict[str, Any] = {}
+        self.comunicacoes_processadas = 0
+        self.comunicacoes_gravadas = 0
+        self.erro: Optional[str] = None
+        self.resultado: Optional[Dict[str, Any]] = None
+        self.criada = time.time()
+        self.iniciada: Optional[float] = None
+        self.encerrada: Optional[float] = None
+        self.versao = 0
+        self._cancelar = threading.Event()
+        self._gravacao_lock = threading.Lock()
+        self._gravado: Optional[Dict[str, Any]] = None
+        self.futuro = None
+
+    def _colunas(self) -> Dict[str, Any]:
+        progresso = {
+            "linhas_lidas": {arquivo: e['linhas_lidas'] for arquivo, e in self.estatisticas.items()},
+            "linhas_ignoradas": {arquivo: dict(e['linhas_ignoradas']) for arquivo, e in self.estatisticas.items()},
+            "comunicacoes_processadas": self.comunicacoes_processadas,
+            "comunicacoes_gravadas": self.comunicacoes_gravadas
+        }
+        return {
+            "estado": self.estado,
+            "etapa": self.etapa_atual,
+            "progresso": json.dumps(progresso, ensure_ascii=False),
+            "erro": self.erro,
+            "resultado": json.dumps(self.resultado, ensure_ascii=False) if self.resultado is not None else None,
+            "iniciada": self.iniciada,
+            "encerrada": self.encerrada,
+        }
+
+    def sincronizar(self):
+        """Grava o estado se mudou desde a última gravação; caso contrário só o sinal de vida"""
+        with self._gravacao_lock:
+            colunas = self._colunas()
+            if colunas != self._gravado:
+                self.versao += 1
+                valores = {**colunas, "versao": self.versao}
+            else:
+                valores = {}
+            with _engine().begin() as conn:
+                conn.execute(update(TarefaUpload).where(TarefaUpload.id == self.id)
+                             .values(atualizada=time.time(), **valores))
+            self._gravado = colunas
+
+    def _atualizar(self, **campos):
+        for campo, valor in campos.items():
+            setattr(self, campo, valor)
+        self.sincronizar()
+
+    def verificar_cancelamento(self):
+        if self._cancelar.is_set():
+            raise TarefaCancelada()
+
+    def etapa(self, nome: str, estatisticas: Optional[Dict[str, Any]] = None):
+        """Início de uma etapa; as estatísticas são as da ingestão, atualizadas durante a leitura"""
+        self.verificar_cancelamento()
+        self._atualizar(etapa_atual=nome, **({'estatisticas': estatisticas} if estatisticas is not None else {}))
+
+    def acompanhar(self, comunicacoes: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Repassa as comunicações da ingestão contando-as e interrompendo se a tarefa for cancelada"""
+        for comunicacao in comunicacoes:
+            self.verificar_cancelamento()
+            self.comunicacoes_processadas += 1
+            yield comunicacao
+
+    def gravadas(self, total: int):
+        self.verificar_cancelamento()
+        self.comunicacoes_gravadas = total
+
+    def cancelar(self) -> bool:
+        if self.estado in ESTADOS_FINAIS:
+            return False
+        self._cancelar.set()
+        if self.futuro is not None and self.futuro.cancel():
+            # Ainda estava na fila: não chegará a executar
+            self._encerrar("cancelada")
+        return True
+
+    def _encerrar(self, estado: str, **campos):
+        self._atualizar(estado=estado, encerrada=time.time(), **campos)
+        with _tarefas_lock:
+            _tarefas.pop(self.id, None)
+
+
+def _para_dict(linha) -> Dict[str, Any]:
+    progresso = json.loads(linha.progresso) if linha.progresso else {}
+    estado, erro, encerrada = linha.estado, linha.erro, linha.encerrada
+    if encerrada is None and linha.atualizada < time.time() - TAREFA_SEM_SINAL:
+        estado, erro = "erro", ERRO_SEM_SINAL
+    return {
+        "id": linha.id,
+        "usuario": linha.usuario,
+        "estado": estado,
+        "etapa": linha.etapa,
+        "progresso": {
+            "linhas_lidas": progresso.get("linhas_lidas", {}),
+            "linhas_ignoradas": progresso.get("linhas_ignoradas", {}),
+            "comunicacoes_processadas": progresso.get("comunicacoes_processadas", 0),
+            "comunicacoes_gravadas": progresso.get("comunicacoes_gravadas", 0)
+        },
+        "erro": erro,
+        "resultado": json.loads(linha.resultado) if linha.resultado else None,
+        "criada": linha.criada,
+        "iniciada": linha.iniciada,
+        "encerrada": encerrada
+    }
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Tarefas não encerradas executadas por este processo
+_tarefas: Dict[str, Tarefa] = {}
+_tarefas_lock = threading.Lock()
+_monitor: Optional[threading.Thread] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _tarefas_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(WORKERS_UPLOAD, 1), thread_name_prefix="upload")
+        return _executor
+
+
+def _monitorar():
+    """Publica o progresso das tarefas deste processo e aplica cancelamentos pedidos a outros workers"""
+    while True:
+        time.sleep(INTERVALO_SINAL)
+        with _tarefas_lock:
+            locais = dict(_tarefas)
+        if not locais:
+            continue
+        try:
+            for tarefa in locais.values():
+                tarefa.sincronizar()
+            with _engine().connect() as conn:
+                canceladas = conn.scalars(select(TarefaUpload.id).where(
+                    TarefaUpload.id.in_(list(locais)), TarefaUpload.cancelar == 1
+                )).all()
+        except Exception:
+            logger.exception("Erro ao publicar o estado das tarefas")
+            continue
+        for id in canceladas:
+            locais[id].cancelar()
+
+
+def _iniciar_monitor():
+    global _monitor
+    with _tarefas_lock:
+        if _monitor is None:
+            _monitor = threading.Thread(target=_monitorar, name="tarefas-monitor", daemon=True)
+            _monitor.start()
+
+
+def encerrar_tarefas():
+    """Cancela as tarefas pendentes e em andamento deste processo (desligamento do servidor)"""
+    global _executor
+    with _tarefas_lock:
+        tarefas = list(_tarefas.values())
+    for tarefa in tarefas:
+        tarefa.cancelar()
+    with _tarefas_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _registrar(tarefa: Tarefa) -> bool:
+    """Grava a tarefa nova; False se o usuário já tem uma tarefa não encerrada em qualquer worker"""
+    engine = _engine()
+    agora = time.time()
+    with engine.begin() as conn:
+        # Tarefas de workers que pararam não bloqueiam o usuário para sempre
+        conn.execute(update(TarefaUpload).where(
+            TarefaUpload.encerrada.is_(None), TarefaUpload.atualizada < agora - TAREFA_SEM_SINAL
+        ).values(estado="erro", erro=ERRO_SEM_SINAL, encerrada=agora, versao=TarefaUpload.versao + 1))
+        guardadas = select(TarefaUpload.id).where(TarefaUpload.encerrada.is_not(None)) \
+            .order_by(TarefaUpload.encerrada.desc()).limit(MAX_TAREFAS_GUARDADAS)
+        conn.execute(delete(TarefaUpload).where(
+            TarefaUpload.encerrada.is_not(None), TarefaUpload.id.not_in(guardadas)
+        ))
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(TarefaUpload).values(
+                id=tarefa.id, usuario=tarefa.usuario, criada=tarefa.criada, atualizada=agora,
+                **tarefa._colunas()
+            ))
+    except IntegrityError:
+        return False
+    with _tarefas_lock:
+        _tarefas[tarefa.id] = tarefa
+    _iniciar_monitor()
+    return True
+
+
+def tarefa_ativa(usuario: str) -> Optional[str]:
+    """Id da tarefa não encerrada do usuário, em qualquer worker"""
+    with _engine().connect() as conn:
+        linha = conn.execute(select(TarefaUpload).where(
+            TarefaUpload.usuario == usuario, TarefaUpload.encerrada.is_(None)
+        )).first()
+    if linha is None or _para_dict(linha)["estado"] in ESTADOS_FINAIS:
+        return None
+    return linha.id
+
+
+def _consultar(id: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """(versão, estado) da tarefa, ou None se ela não existe"""
+    with _engine().connect() as conn:
+        linha = conn.execute(select(TarefaUpload).where(TarefaUpload.id == id)).first()
+    return None if linha is None else (linha.versao, _para_dict(linha))
+
+
+def _executar(tarefa: Tarefa, processar: Callable[[Tarefa], Dict[str, Any]]):
+    tarefa._atualizar(estado="processando", iniciada=time.time())
+    try:
+        tarefa.verificar_cancelamento()
+        resultado = processar(tarefa)
+    except TarefaCancelada:
+        tarefa._encerrar("cancelada")
+    except Exception as e:
+        tarefa._encerrar("erro", erro=f"Erro ao processar arquivos: {e}")
+    else:
+        if resultado.get("success"):
+            tarefa._encerrar("concluida", resultado=resultado)
+        else:
+            tarefa._encerrar("erro", erro=resultado.get("msg"), resultado=resultado)
+
+
+def enfileirar(usuario: str, processar: Callable[[Tarefa], Dict[str, Any]]) -> Optional[Tarefa]:
+    """Cria uma tarefa e agenda `processar(tarefa)` no pool de uploads.
+
+    Devolve None se o usuário já tem uma tarefa pendente ou em andamento.
+    """
+    tarefa = Tarefa(usuario)
+    if not _registrar(tarefa):
+        return None
+    tarefa.futuro = _get_executor().submit(_executar, tarefa, processar)
+    return tarefa
+
+
+def executar(usuario: str, processar: Callable[[Tarefa], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Como enfileirar, mas processa na thread atual e devolve a resposta do processamento"""
+    tarefa = Tarefa(usuario)
+    if not _registrar(tarefa):
+        return None
+    _executar(tarefa, processar)
+    if tarefa.estado == "cancelada":
+        return {"success": False, "msg": "Processamento cancelado."}
+    return tarefa.resultado or {"success": False, "msg": tarefa.erro}
+
+
+def _buscar(id: str, autenticado: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+    encontrada = _consultar(id)
+    if encontrada is None:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    if autenticado and autenticado != encontrada[1]["usuario"]:
+        raise HTTPException(status_code=403, detail="Tarefa pertence a outro usuário")
+    return encontrada
+
+
+@router.get("/api/jobs/{id}")
+def consultar_tarefa(id: str, autenticado: Optional[str] = Depends(usuario_token)):
+    return _buscar(id, autenticado)[1]
+
+
+@router.delete("/api/jobs/{id}")
+def cancelar_tarefa(id: str, autenticado: Optional[str] = Depends(usuario_token)):
+    _, tarefa = _buscar(id, autenticado)
+    if tarefa["estado"] in ESTADOS_FINAIS:
+        raise HTTPException(status_code=409, detail=f"Tarefa já encerrada ({tarefa['estado']})")
+    # O worker que executa a tarefa vê o pedido no próximo sinal de vida
+    with _engine().begin() as conn:
+        conn.execute(update(TarefaUpload).where(TarefaUpload.id == id).values(cancelar=1))
+    with _tarefas_lock:
+        local = _tarefas.get(id)
+    if local is not None:
+        local.cancelar()
+    return {"success": True, "msg": "Cancelamento solicitado", "estado": _consultar(id)[1]["estado"]}
+
+
+@router.get("/api/jobs/{id}/eventos")
+async def eventos_tarefa(id: str, request: Request, autenticado: Optional[str] = Depends(usuario_token_ou_parametro)):
+    """Server-Sent Events com o estado da tarefa a cada mudança, até ela se encerrar.
+
+    O gerador é assíncrono e consulta a tabela de tarefas periodicamente, então
+    conexões abertas não ocupam threads do servidor e qualquer worker acompanha
+    a tarefa, não só o que a executa.
+    """
+    await asyncio.to_thread(_buscar, id, autenticado)
+
+    async def eventos():
+        enviada = None
+        ultimo_envio = time.monotonic()
+        while True:
+            encontrada = await asyncio.to_thread(_consultar, id)
+            if encontrada is None:
+                return
+            versao, tarefa = encontrada
+            if (versao, tarefa["estado"]) != enviada:
+                enviada = (versao, tarefa["estado"])
+                ultimo_envio = time.monotonic()
+                dados = json.dumps(tarefa, ensure_ascii=False)
+                yield f"event: progresso\ndata: {dados}\n\n"
+                if tarefa["estado"] in ESTADOS_FINAIS:
+                    yield f"event: fim\ndata: {dados}\n\n"
+                    return
+            elif time.monotonic() - ultimo_envio >= INTERVALO_HEARTBEAT:
+                ultimo_envio = time.monotonic()
+                yield ": heartbeat\n\n"
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(INTERVALO_EVENTOS)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -0,0 +1,347 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+
+from .auth import conferir_usuario, usuario_token
+from .tarefas import tarefa_ativa
+
+router = APIRouter()
+
+PASTA_PARCIAIS = "backend/database/uploads/.parciais"
+
+# Limites configuráveis por variável de ambiente
+MAX_TAMANHO_ARQUIVO = int(os.environ.get("RIF_MAX_UPLOAD_MB", "1024")) * 1024 * 1024
+COTA_USUARIO = int(os.environ.get("RIF_COTA_USUARIO_MB", "2048")) * 1024 * 1024
+TAMANHO_CHUNK = 1024 * 1024
+# Sessões não finalizadas são apagadas depois deste prazo, contado da criação
+EXPIRACAO_SESSAO = float(os.environ.get("RIF_UPLOAD_SESSAO_HORAS", "24")) * 3600
+# Intervalo mínimo entre varreduras da pasta de parciais feitas pela verificação da cota
+INTERVALO_VARREDURA = 300
+
+# Estado de hash incremental das sessões ativas neste processo, com o offset
+# que ele cobre. Se o processo reiniciar (ou outro worker tiver recebido
+# chunks), o hash é reconstruído a partir do arquivo parcial na retomada.
+_hashes: Dict[str, Tuple[int, Any]] = {}
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+# Bytes recebidos por usuário nas sessões não finalizadas, atualizados a cada
+# chunk. A varredura da pasta refaz os totais, incluindo chunks recebidos por
+# outros workers, e apaga as sessões expiradas.
+_em_andamento: Dict[str, int] = {}
+_em_andamento_lock = threading.Lock()
+_ultima_varredura: Optional[float] = None
+
+
+def _caminho_parcial(upload_id: str) -> str:
+    return os.path.join(PASTA_PARCIAIS, f"{upload_id}.part")
+
+
+def _caminho_estado(upload_id: str) -> str:
+    return os.path.join(PASTA_PARCIAIS, f"{upload_id}.json")
+
+
+def _lock(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _ler_estado(upload_id: str) -> Dict[str, Any]:
+    # upload_id vem da URL; aceitar apenas o formato gerado por iniciar_upload
+    if len(upload_id) != 32 or not all(c in '0123456789abcdef' for c in upload_id):
+        raise HTTPException(status_code=404, detail="Upload não encontrado.")
+    try:
+        with open(_caminho_estado(upload_id), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload não encontrado.")
+
+
+def _gravar_estado(estado: Dict[str, Any]):
+    caminho = _caminho_estado(estado['upload_id'])
+    temporario = caminho + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f)
+    os.replace(temporario, caminho)
+
+
+def _remover_sessao(upload_id: str):
+    for caminho in (_caminho_parcial(upload_id), _caminho_estado(upload_id)):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    _hashes.pop(upload_id, None)
+
+
+def limpar_sessoes_expiradas() -> int:
+    """Apaga as sessões criadas há mais de EXPIRACAO_SESSAO e refaz os totais por usuário.
+
+    Devolve o número de sessões apagadas. Sessões recebendo um chunk no
+    momento ficam para a próxima varredura.
+    """
+    global _ultima_varredura
+    agora = time.time()
+    totais: Dict[str, int] = {}
+    removidas = 0
+    nomes = os.listdir(PASTA_PARCIAIS) if os.path.isdir(PASTA_PARCIAIS) else []
+    for nome in nomes:
+        if not nome.endswith(".json"):
+            continue
+        upload_id = nome[:-len(".json")]
+        try:
+            with open(os.path.join(PASTA_PARCIAIS, nome), encoding='utf-8') as f:
+                estado = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if agora - estado.get('criado_em', agora) > EXPIRACAO_SESSAO:
+            lock = _lock(upload_id)
+            if lock.acquire(blocking=False):
+                try:
+                    _remover_sessao(upload_id)
+                finally:
+                    lock.release()
+                with _locks_guard:
+                    _locks.pop(upload_id, None)
+                removidas += 1
+                continue
+        usuario = estado.get('usuario')
+        totais[usuario] = totais.get(usuario, 0) + estado.get('offset', 0)
+    with _em_andamento_lock:
+        _em_andamento.clear()
+        _em_andamento.update(totais)
+        _ultima_varredura = agora
+    return removidas
+
+
+def _ajustar_em_andamento(usuario: str, delta: int):
+    with _em_andamento_lock:
+        total = _em_andamento.get(usuario, 0) + delta
+        if total > 0:
+            _em_andamento[usuario] = total
+        else:
+            _em_andamento.pop(usuario, None)
+
+
+def _bytes_em_andamento(usuario: str) -> int:
+    """Total de bytes dos uploads não finalizados do usuário.
+
+    Lido do total mantido em memória; a pasta de parciais só é varrida de
+    novo depois de INTERVALO_VARREDURA, o que também expira as sessões antigas.
+    """
+    if _ultima_varredura is None or time.time() - _ultima_varredura > INTERVALO_VARREDURA:
+        limpar_sessoes_expiradas()
+    with _em_andamento_lock:
+        return _em_andamento.get(usuario, 0)
+
+
+def _hash_sessao(estado: Dict[str, Any]):
+    """Retorna o hash incremental da sessão, reconstruindo-o se necessário"""
+    upload_id = estado['upload_id']
+    offset_hash, h = _hashes.get(upload_id, (None, None))
+    if h is None or offset_hash != estado['offset']:
+        h = hashlib.sha256()
+        caminho = _caminho_parcial(upload_id)
+        if estado['offset'] and os.path.exists(caminho):
+            with open(caminho, 'rb') as f:
+                restante = estado['offset']
+                while restante > 0:
+                    bloco = f.read(min(TAMANHO_CHUNK, restante))
+                    if not bloco:
+                        break
+                    h.update(bloco)
+                    restante -= len(bloco)
+        _hashes[upload_id] = (estado['offset'], h)
+    return h
+
+
+def iniciar_upload(usuario: str, nome_arquivo: str, tamanho_total: Optional[int] = None) -> Dict[str, Any]:
+    """Cria uma sessão de upload e reserva o arquivo parcial"""
+    if tamanho_total is not None:
+        if tamanho_total > MAX_TAMANHO_ARQUIVO:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo muito grande: {tamanho_total / (1024 * 1024):.2f}MB (máximo: {MAX_TAMANHO_ARQUIVO // (1024 * 1024)}MB)"
+            )
+        if _bytes_em_andamento(usuario) + tamanho_total > COTA_USUARIO:
+            raise HTTPException(status_code=413, detail="Cota de upload do usuário excedida.")
+
+    os.makedirs(PASTA_PARCIAIS, exist_ok=True)
+    estado = {
+        'upload_id': uuid.uuid4().hex,
+        'usuario': usuario,
+        'nome_arquivo': os.path.basename(nome_arquivo),
+        'tamanho_total': tamanho_total,
+        'offset': 0,
+        'criado_em': time.time()
+    }
+    open(_caminho_parcial(estado['upload_id']), 'wb').close()
+    _gravar_estado(estado)
+    _hashes[estado['upload_id']] = (0, hashlib.sha256())
+    return {'upload_id': estado['upload_id'], 'offset': 0, 'chunk_size': TAMANHO_CHUNK}
+
+
+def gravar_chunk(upload_id: str, offset: int, dados: bytes) -> Dict[str, Any]:
+    """Acrescenta um chunk ao arquivo parcial.
+
+    O offset precisa coincidir com o total já recebido; em caso contrário a
+    resposta 409 informa o offset correto para o cliente retomar o envio.
+    """
+    with _lock(upload_id):
+        estado = _ler_estado(upload_id)
+        if offset != estado['offset']:
+            raise HTTPException(status_code=409, detail={"msg": "Offset inesperado.", "offset": estado['offset']})
+
+        novo_offset = offset + len(dados)
+        limite = min(MAX_TAMANHO_ARQUIVO, estado['tamanho_total'] or MAX_TAMANHO_ARQUIVO)
+        if novo_offset > limite:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Arquivo muito grande: excede {limite / (1024 * 1024):.2f}MB"
+            )
+        if _bytes_em_andamento(estado['usuario']) + len(dados) > COTA_USUARIO:
+            raise HTTPException(status_code=413, detail="Cota de upload do usuário excedida.")
+
+        h = _hash_sessao(estado)
+        with open(_caminho_parcial(upload_id), 'r+b') as f:
+            f.seek(offset)
+            f.write(dados)
+            f.truncate()
+        h.update(dados)
+        _hashes[upload_id] = (novo_offset, h)
+
+        estado['offset'] = novo_offset
+        _gravar_estado(estado)
+        _ajustar_em_andamento(estado['usuario'], len(dados))
+        return {'upload_id': upload_id, 'offset': novo_offset}
+
+
+def status_upload(upload_id: str) -> Dict[str, Any]:
+    estado = _ler_estado(upload_id)
+    return {
+        'upload_id': upload_id,
+        'nome_arquivo': estado['nome_arquivo'],
+        'offset': estado['offset'],
+        'tamanho_total': estado['tamanho_total']
+    }
+
+
+def finalizar_upload(upload_id: str, destino: str) -> Dict[str, Any]:
+    """Move o arquivo completo para o destino e devolve o SHA-256 calculado no envio"""
+    with _lock(upload_id):
+        estado = _ler_estado(upload_id)
+        if estado['tamanho_total'] is not None and estado['offset'] != estado['tamanho_total']:
+            raise HTTPException(
+                status_code=409,
+                detail={"msg": "Upload incompleto.", "offset": estado['offset']}
+            )
+        sha256 = _hash_sessao(estado).hexdigest()
+
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        os.replace(_caminho_parcial(upload_id), destino)
+        os.remove(_caminho_estado(upload_id))
+        _hashes.pop(upload_id, None)
+        _ajustar_em_andamento(estado['usuario'], -estado['offset'])
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+    return {'upload_id': upload_id, 'caminho': destino, 'tamanho': estado['offset'], 'sha256': sha256}
+
+
+def cancelar_upload(upload_id: str):
+    with _lock(upload_id):
+        estado = _ler_estado(upload_id)
+        _remover_sessao(upload_id)
+        _ajustar_em_andamento(estado['usuario'], -estado['offset'])
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+
+def receber_arquivo(arquivo, usuario: str, destino: str) -> Dict[str, Any]:
+    """Envia um arquivo local/UploadFile pelo protocolo de chunks"""
+    sessao = iniciar_upload(usuario, os.path.basename(destino))
+    upload_id = sessao['upload_id']
+    try:
+        offset = 0
+        while True:
+            dados = arquivo.read(TAMANHO_CHUNK)
+            if not dados:
+                break
+            offset = gravar_chunk(upload_id, offset, dados)['offset']
+        return finalizar_upload(upload_id, destino)
+    except Exception:
+        if os.path.exists(_caminho_estado(upload_id)):
+            cancelar_upload(upload_id)
+        raise
+
+
+@router.post("/upload/sessoes")
+def criar_sessao(
+    usuario: str = Form(...),
+    nome_arquivo: str = Form(...),
+    tamanho_total: Optional[int] = Form(None),
+    autenticado: Optional[str] = Depends(usuario_token)
+):
+    return iniciar_upload(conferir_usuario(usuario, autenticado), nome_arquivo, tamanho_total)
+
+
+def _sessao_do_usuario(upload_id: str, usuario: Optional[str], autenticado: Optional[str]) -> Dict[str, Any]:
+    """Estado da sessão, se ela pertence ao usuário da requisição (o do token, se houver)"""
+    usuario = conferir_usuario(usuario, autenticado)
+    if not usuario:
+        raise HTTPException(status_code=401, detail="Usuário não informado.")
+    estado = _ler_estado(upload_id)
+    if estado['usuario'] != usuario:
+        raise HTTPException(status_code=403, detail="Upload pertence a outro usuário.")
+    return estado
+
+
+@router.put("/upload/sessoes/{upload_id}")
+async def enviar_chunk(upload_id: str, request: Request, offset: int = Query(...),
+                       usuario: Optional[str] = Query(None), autenticado: Optional[str] = Depends(usuario_token)):
+    _sessao_do_usuario(upload_id, usuario, autenticado)
+    # O corpo é lido em partes e gravado em blocos de até TAMANHO_CHUNK,
+    # de modo que os limites são verificados durante a transferência
+    posicao = offset
+    buffer = bytearray()
+    async for parte in request.stream():
+        buffer.extend(parte)
+        if len(buffer) >= TAMANHO_CHUNK:
+            posicao = (await asyncio.to_thread(gravar_chunk, upload_id, posicao, bytes(buffer)))['offset']
+            buffer.clear()
+    if buffer:
+        posicao = (await asyncio.to_thread(gravar_chunk, upload_id, posicao, bytes(buffer)))['offset']
+    return {'upload_id': upload_id, 'offset': posicao}
+
+
+@router.get("/upload/sessoes/{upload_id}")
+def consultar_sessao(upload_id: str, usuario: Optional[str] = Query(None),
+                     autenticado: Optional[str] = Depends(usuario_token)):
+    _sessao_do_usuario(upload_id, usuario, autenticado)
+    return status_upload(upload_id)
+
+
+@router.post("/upload/sessoes/{upload_id}/finalizar")
+def concluir_sessao(upload_id: str, usuario: str = Form(...), autenticado: Optional[str] = Depends(usuario_token)):
+    estado = _sessao_do_usuario(upload_id, usuario, autenticado)
+    # Os arquivos da pasta do usuário não podem ser trocados durante o processamento,
+    # que ainda pode estar lendo Envolvidos.csv
+    job_id = tarefa_ativa(estado['usuario'])
+    if job_id:
+        raise HTTPException(status_code=409, detail={
+            "msg": "Já existe um processamento em andamento para este usuário.", "job_id": job_id
+        })
+    destino = os.path.join(f"backend/database/uploads/{estado['usuario']}", estado['nome_arquivo'])
+    return finalizar_upload(upload_id, destino)
+
+
+@router.delete("/upload/sessoes/{upload_id}")
+def remover_sessao(upload_id: str, usuario: Optional[str] = Query(None),
+                   autenticado: Optional[str] = Depends(usuario_token)):
+    _sessao_do_usuario(upload_id, usuario, autenticado)
+    cancelar_upload(upload_id)
+    return {"success": True}
@@ -1,9 +1,21 @@
 import json
 import os
 import csv
-from typing import List, Dict, Any
+import codecs
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
 import chardet
 
+from . import metricas
+
+HEADERS_COMUNICACOES = [
+    'Indexador', 'idComunicacao', 'NumeroOcorrenciaBC', 'Data_do_Recebimento', 'Data_da_operacao', 'DataFimFato', 'cpfCnpjComunicante', 'nomeComunicante', 'CidadeAgencia', 'UFAgencia', 'NomeAgencia', 'NumeroAgencia', 'informacoesAdicionais', 'CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE', 'CodigoSegmento'
+]
+HEADERS_ENVOLVIDOS = ['Indexador', 'cpfCnpjEnvolvido', 'nomeEnvolvido', 'tipoEnvolvido']
+HEADERS_OCORRENCIAS = ['Indexador', 'idOcorrencia', 'Ocorrencia']
+
 def salvar_correcoes(comunicacao_id: int, novo_json: dict, path='backend/database/correcoes.json'):
     if os.path.exists(path):
         with open(path, 'r', encoding='utf-8') as f:
@@ -18,24 +30,151 @@ def registrar_log(mensagem: str, path='backend/database/logs.txt'):
     with open(path, 'a', encoding='utf-8') as f:
         f.write(mensagem + '\n')
 
-def detect_encoding(file_path: str) -> str:
-    """Detecta a codificação de um arquivo"""
+# Tamanho de cada trecho amostrado na detecção de encoding (início, meio e fim do arquivo)
+TAMANHO_AMOSTRA_ENCODING = 64 * 1024
+MAX_CACHE_ENCODING = 1024
+
+# Encodings ocidentais de 8 bits que o chardet costuma sugerir para exportações do COAF;
+# todos são tratados como cp1252, que é um superconjunto prático de latin-1
+ENCODINGS_OCIDENTAIS = {'ascii', 'iso-8859-1', 'iso-8859-15', 'latin-1', 'windows-1252', 'cp1252'}
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+_cache_encoding: "OrderedDict[str, str]" = OrderedDict()
+_cache_encoding_lock = threading.Lock()
+
+def _ler_amostras(f, tamanho_arquivo: int) -> List[bytes]:
+    """Lê trechos limitados do início, do meio e do fim do arquivo"""
+    if tamanho_arquivo <= 3 * TAMANHO_AMOSTRA_ENCODING:
+        return [f.read()]
+    amostras = []
+    for posicao in (0, (tamanho_arquivo - TAMANHO_AMOSTRA_ENCODING) // 2, tamanho_arquivo - TAMANHO_AMOSTRA_ENCODING):
+        f.seek(posicao)
+        amostras.append(f.read(TAMANHO_AMOSTRA_ENCODING))
+    return amostras
+
+def _amostra_utf8_valida(amostras: List[bytes]) -> bool:
+    """Decodifica as amostras em UTF-8 estrito, tolerando caracteres cortados nas bordas"""
+    for i, amostra in enumerate(amostras):
+        if i > 0:
+            # Trechos do meio/fim podem começar no meio de um caractere multibyte
+            inicio = 0
+            while inicio < 3 and inicio < len(amostra) and 0x80 <= amostra[inicio] <= 0xBF:
+                inicio += 1
+            amostra = amostra[inicio:]
+        decoder = codecs.getincrementaldecoder('utf-8')('strict')
+        try:
+            decoder.decode(amostra, final=False)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+def _decodifica(amostras: List[bytes], encoding: str) -> bool:
+    try:
+        for amostra in amostras:
+            amostra.decode(encoding)
+        return True
+    except (UnicodeDecodeError, LookupError):
+        return False
+
+def _detectar_encoding_amostras(amostras: List[bytes]) -> str:
+    """BOM, depois UTF-8 estrito, depois detecção estatística com fallback cp1252/latin-1"""
+    inicio = amostras[0]
+    if not inicio:
+        return 'utf-8'
+    for bom, encoding in BOMS:
+        if inicio.startswith(bom):
+            return encoding
+
+    if _amostra_utf8_valida(amostras):
+        return 'utf-8'
+
+    amostra = b''.join(amostras)
+    result = chardet.detect(amostra)
+    encoding = result.get('encoding')
+    confidence = result.get('confidence') or 0.0
+    if (
+        isinstance(encoding, str)
+        and encoding.lower() not in ENCODINGS_OCIDENTAIS
+        and confidence >= 0.5
+        and _decodifica(amostras, encoding)
+    ):
+        return encoding
+
+    # cp1252 não define alguns bytes (0x81, 0x8D, 0x8F, 0x90, 0x9D); latin-1 aceita qualquer byte
+    if _decodifica(amostras, 'cp1252'):
+        return 'cp1252'
+    return 'latin-1'
+
+def _arquivo_decodifica(f, encoding: str, tamanho_bloco: int = 1024 * 1024) -> bool:
+    """Decodifica o arquivo inteiro em blocos, sem guardar o texto"""
+    f.seek(0)
+    decoder = codecs.getincrementaldecoder(encoding)('strict')
+    try:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            decoder.decode(bloco)
+        decoder.decode(b'', final=True)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def detect_encoding(file_path: str, content_hash: Optional[str] = None) -> str:
+    """Detecta a codificação de um arquivo.
+
+    O palpite vem de amostras do início, do meio e do fim; em arquivos maiores
+    que as amostras ele é confirmado decodificando o arquivo inteiro, em uma
+    passagem, e trocado por cp1252 ou latin-1 se algum byte fora delas não
+    decodifica. O resultado é memorizado pelo SHA-256 do conteúdo
+    (`content_hash`, calculado no upload); sem ele não há cache.
+    """
     try:
         if not os.path.exists(file_path):
             return 'utf-8'
+        if content_hash is not None:
+            with _cache_encoding_lock:
+                encoding = _cache_encoding.get(content_hash)
+                if encoding is not None:
+                    _cache_encoding.move_to_end(content_hash)
+            metricas.contar_cache('encoding', encoding is not None)
+            if encoding is not None:
+                return encoding
+
+        tamanho_arquivo = os.path.getsize(file_path)
         with open(file_path, 'rb') as f:
-            content = f.read()
-            if not content:
-                return 'utf-8'
-            result = chardet.detect(content)
-            encoding = result.get('encoding')
-            if not encoding or not isinstance(encoding, str):
-                return 'utf-8'
-            return encoding
+            amostras = _ler_amostras(f, tamanho_arquivo)
+            encoding = _detectar_encoding_amostras(amostras)
+            if tamanho_arquivo > 3 * TAMANHO_AMOSTRA_ENCODING and encoding != 'latin-1':
+                for alternativa in (encoding, 'cp1252'):
+                    if _arquivo_decodifica(f, alternativa):
+                        encoding = alternativa
+                        break
+                else:
+                    encoding = 'latin-1'
+
+        if content_hash is not None:
+            with _cache_encoding_lock:
+                _cache_encoding[content_hash] = encoding
+                while len(_cache_encoding) > MAX_CACHE_ENCODING:
+                    _cache_encoding.popitem(last=False)
+        return encoding
     except Exception:
         return 'utf-8'
 
-def validate_csv_structure(file_path: str, expected_headers: List[str]) -> Dict[str, Any]:
+def sha256_arquivo(file_path: str, tamanho_bloco: int = 1024 * 1024) -> str:
+    """SHA-256 do arquivo, lido em blocos"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def validate_csv_structure(file_path: str, expected_headers: List[str], encoding: Optional[str] = None) -> Dict[str, Any]:
     """Valida a estrutura de um arquivo CSV"""
     try:
         if not os.path.exists(file_path):
@@ -44,7 +183,8 @@ def validate_csv_structure(file_path: str, expected_headers: List[str]) -> Dict[
                 'error': f'Arquivo não encontrado: {file_path}'
             }
         
-        encoding = detect_encoding(file_path)
+        if encoding is None:
+            encoding = detect_encoding(file_path)
         with open(file_path, encoding=encoding) as f:
             reader = csv.DictReader(f, delimiter=';')
             headers = reader.fieldnames or []
@@ -60,9 +200,8 @@ def validate_csv_structure(file_path: str, expected_headers: List[str]) -> Dict[
                     'expected_headers': expected_headers
                 }
 
-            # Contar linhas
-            rows = list(reader)
-            row_count = len(rows)
+            # Contar linhas sem materializar o arquivo
+            row_count = sum(1 for _ in reader)
 
             return {
                 'valid': True,
@@ -77,39 +216,17 @@ def validate_csv_structure(file_path: str, expected_headers: List[str]) -> Dict[
             'error': f'Erro ao validar arquivo: {str(e)}'
         }
 
-def validate_comunicacoes_csv(file_path: str) -> Dict[str, Any]:
+def validate_comunicacoes_csv(file_path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
     """Valida arquivo de comunicações"""
-    expected_headers = [
-        'Indexador', 'idComunicacao', 'NumeroOcorrenciaBC', 'Data_do_Recebimento', 'Data_da_operacao', 'DataFimFato', 'cpfCnpjComunicante', 'nomeComunicante', 'CidadeAgencia', 'UFAgencia', 'NomeAgencia', 'NumeroAgencia', 'informacoesAdicionais', 'CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE', 'CodigoSegmento'
-    ]
-    return validate_csv_structure(file_path, expected_headers)
+    return validate_csv_structure(file_path, HEADERS_COMUNICACOES, encoding)
 
-def validate_envolvidos_csv(file_path: str) -> Dict[str, Any]:
+def validate_envolvidos_csv(file_path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
     """Valida arquivo de envolvidos"""
-    expected_headers = [
-        'Indexador', 'cpfCnpjEnvolvido', 'nomeEnvolvido', 'tipoEnvolvido'
-    ]
-    return validate_csv_structure(file_path, expected_headers)
+    return validate_csv_structure(file_path, HEADERS_ENVOLVIDOS, encoding)
 
-def validate_ocorrencias_csv(file_path: str) -> Dict[str, Any]:
+def validate_ocorrencias_csv(file_path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
     """Valida arquivo de ocorrências"""
-    expected_headers = ['Indexador', 'idOcorrencia', 'Ocorrencia']
-    return validate_csv_structure(file_path, expected_headers)
-
-def limpa_valor(valor_str) -> float:
-    print(f'[DEBUG] limpa_valor recebeu: {valor_str} (tipo: {type(valor_str)})')
-    try:
-        if not valor_str:
-            return 0.0
-        # Garantir que é string
-        valor_str = str(valor_str)
-        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
-        if v != v:  # NaN check
-            return 0.0
-        return v
-    except Exception as e:
-        print(f'[DEBUG] limpa_valor erro: {e}')
-        return 0.0
+    return validate_csv_structure(file_path, HEADERS_OCORRENCIAS, encoding)
 
 def format_currency(value: float) -> str:
     """Formata valor como moeda brasileira"""
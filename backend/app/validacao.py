@@ -0,0 +1,140 @@
+import csv
+import io
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .ingestao import motivo_linha_ignorada
+from .utils import TAMANHO_AMOSTRA_ENCODING, _amostra_utf8_valida, _detectar_encoding_amostras
+
+# Bytes lidos do início de cada arquivo na validação rápida; o resto nunca é lido
+PREFIXO_VALIDACAO = 256 * 1024
+# Delimitadores considerados na detecção; o RIF do COAF usa ";"
+DELIMITADORES = (';', ',', '\t', '|')
+DELIMITADOR_RIF = ';'
+# Valores distintos listados por coluna de amostra (bancos, tipos de envolvido)
+MAX_VALORES_AMOSTRA = 20
+
+
+def ler_prefixo(f, tamanho: int = PREFIXO_VALIDACAO) -> bytes:
+    """Lê no máximo `tamanho` bytes do início de um arquivo binário"""
+    partes, lidos = [], 0
+    while lidos < tamanho:
+        bloco = f.read(tamanho - lidos)
+        if not bloco:
+            break
+        partes.append(bloco)
+        lidos += len(bloco)
+    return b''.join(partes)
+
+
+def _detectar_delimitador(cabecalho: str) -> str:
+    return max(DELIMITADORES, key=cabecalho.count)
+
+
+def validar_prefixo(prefixo: bytes, tamanho_total: int, expected_headers: Iterable[str],
+                    colunas_amostra: Iterable[str] = ()) -> Tuple[Dict[str, Any], Set[str]]:
+    """Valida um CSV do RIF a partir do cabeçalho e de um trecho inicial limitado.
+
+    Devolve o resultado (encoding, delimitador, colunas faltando e número de
+    linhas, exato se o arquivo inteiro coube no trecho ou estimado pelo tamanho
+    médio das linhas amostradas) e o conjunto de Indexadores vistos no trecho.
+    """
+    tamanho_total = max(tamanho_total, len(prefixo))
+    completo = len(prefixo) >= tamanho_total
+    # O chardet só vê o início; UTF-8 estrito é conferido no trecho inteiro, que é barato
+    encoding = _detectar_encoding_amostras([prefixo[:TAMANHO_AMOSTRA_ENCODING]])
+    if encoding == 'utf-8' and not _amostra_utf8_valida([prefixo]):
+        encoding = 'cp1252'
+    if not completo:
+        # Descarta a última linha, cortada no meio
+        fim = prefixo.rfind(b'\n')
+        prefixo = prefixo[:fim + 1] if fim >= 0 else prefixo
+
+    fim_cabecalho = prefixo.find(b'\n') + 1 or len(prefixo)
+    cabecalho = prefixo[:fim_cabecalho].decode(encoding, errors='replace').lstrip('\ufeff').rstrip('\r\n')
+    delimitador = _detectar_delimitador(cabecalho)
+    resultado: Dict[str, Any] = {
+        'valido': False,
+        'erro': None,
+        'encoding': encoding,
+        'delimitador': delimitador,
+        'colunas_faltando': [],
+        'linhas': 0,
+        'linhas_amostradas': 0,
+        'estimado': not completo,
+        'tamanho': tamanho_total,
+    }
+    indexadores: Set[str] = set()
+    if not cabecalho.strip():
+        resultado['erro'] = 'Arquivo vazio'
+        return resultado, indexadores
+
+    headers = next(csv.reader([cabecalho], delimiter=delimitador), [])
+    resultado['colunas_faltando'] = [h for h in expected_headers if h not in headers]
+    if delimitador != DELIMITADOR_RIF:
+        resultado['erro'] = f'Delimitador "{delimitador}" encontrado; os arquivos do RIF usam "{DELIMITADOR_RIF}"'
+    elif resultado['colunas_faltando']:
+        resultado['erro'] = f'Headers obrigatórios não encontrados: {", ".join(resultado["colunas_faltando"])}'
+
+    corpo = prefixo[fim_cabecalho:]
+    valores: Dict[str, Dict[str, None]] = {coluna: {} for coluna in colunas_amostra}
+    linhas = 0
+    reader = csv.DictReader(io.StringIO(corpo.decode(encoding, errors='replace'), newline=''),
+                            fieldnames=headers, delimiter=delimitador)
+    try:
+        for row in reader:
+            linhas += 1
+            indexador = row.get('Indexador') or ''
+            if motivo_linha_ignorada(indexador):
+                continue
+            indexadores.add(indexador.strip())
+            for coluna, vistos in valores.items():
+                valor = (row.get(coluna) or '').strip()
+                if valor and len(vistos) < MAX_VALORES_AMOSTRA:
+                    vistos[valor] = None
+    except csv.Error as e:
+        resultado['erro'] = resultado['erro'] or f'Erro ao ler amostra: {e}'
+
+    if completo or not corpo:
+        resultado['linhas'] = linhas
+    else:
+        # Linhas restantes estimadas pelo tamanho médio, em bytes, das linhas amostradas
+        resultado['linhas'] = round(linhas * (tamanho_total - fim_cabecalho) / len(corpo))
+    resultado['linhas_amostradas'] = linhas
+    for coluna, vistos in valores.items():
+        resultado[coluna] = list(vistos)
+    resultado['valido'] = resultado['erro'] is None
+    return resultado, indexadores
+
+
+def cobertura_indexador(comunicacoes: Set[str], outro: Set[str]) -> Dict[str, Any]:
+    """Confere os Indexadores amostrados das comunicações contra os de outro arquivo.
+
+    Como cada amostra é só o início do arquivo, a comparação se limita à faixa
+    de Indexadores que as duas amostras cobrem (os arquivos vêm ordenados).
+    Linhas de continuação sem aspas deixam textos no lugar do Indexador; com
+    Indexadores numéricos nos dois lados, esses textos são desconsiderados.
+    """
+    numericos = {int(i) for i in comunicacoes if i.isdigit()}
+    numericos_outro = {int(i) for i in outro if i.isdigit()}
+    if numericos and numericos_outro:
+        limite = min(max(numericos), max(numericos_outro))
+        comunicacoes = {str(i) for i in numericos if i <= limite}
+        outro = {str(i) for i in numericos_outro if i <= limite}
+    encontrados = len(comunicacoes & outro)
+    return {
+        'verificados': len(comunicacoes),
+        'encontrados': encontrados,
+        'orfaos': len(outro - comunicacoes),
+        'cobertura': round(encontrados / len(comunicacoes), 4) if comunicacoes else None,
+    }
+
+
+def aviso_cobertura(arquivo: str, cobertura: Dict[str, Any]) -> Optional[str]:
+    if cobertura['verificados'] and not cobertura['encontrados']:
+        return f'Nenhum Indexador das comunicações amostradas aparece em {arquivo}; os arquivos podem ser de RIFs diferentes'
+    if cobertura['cobertura'] is not None and cobertura['cobertura'] < 1:
+        faltando = cobertura['verificados'] - cobertura['encontrados']
+        return f'{faltando} comunicação(ões) amostrada(s) sem correspondência em {arquivo}'
+    if cobertura['orfaos']:
+        return f'{cobertura["orfaos"]} Indexador(es) de {arquivo} sem comunicação correspondente na amostra'
+    return None
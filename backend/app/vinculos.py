@@ -0,0 +1,77 @@
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .busca import somente_digitos
+
+# Tabelas de contrapartes extraídas pelos parsers: (caminho no parsing_json, vínculo, direção, chave do nome, chave do documento)
+# Direção "entrada": a contraparte envia recursos ao titular; "saida": recebe do titular; "relacao": sem sentido
+TABELAS_CONTRAPARTES = (
+    (('creditos', 'principais_depositantes'), 'Crédito', 'entrada', 'nome', 'cpf_cnpj'),
+    (('debitos', 'principais_favorecidos'), 'Débito', 'saida', 'nome', 'cpf_cnpj'),
+    (('debitos', 'principais_destinatarios'), 'Débito', 'saida', 'nome', 'cpf_cnpj'),
+    # Sacados de boletos pagos pelo titular: ligados a ele, sem sentido definido do recurso
+    (('boletos',), 'Boleto', 'relacao', 'nome_sacado', 'cpf_cnpj_sacado'),
+)
+# Pessoas ligadas ao titular sem movimentação de valores
+RELACIONADOS = (
+    ('socio_diretor', 'Sócio/Dirigente', 'nome', 'cpf_cnpj'),
+    ('conjuge', 'Cônjuge', 'nome', 'cpf'),
+)
+# Papel do envolvido (Envolvidos.csv) -> direção do vínculo com o titular
+DIRECAO_ENVOLVIDO = {
+    'remetente': 'entrada',
+    'depositante': 'entrada',
+    'beneficiário': 'saida',
+    'beneficiario': 'saida',
+}
+
+
+def tipo_pessoa(documento: Optional[str]) -> str:
+    if documento and len(documento) == 11:
+        return 'Pessoa Física'
+    if documento and len(documento) == 14:
+        return 'Pessoa Jurídica'
+    return 'Pessoa'
+
+
+def chave_entidade(nome: Optional[str], documento: Optional[str]) -> Optional[str]:
+    """Identificador estável de uma pessoa: o documento, ou o nome normalizado se não houver"""
+    digitos = somente_digitos(documento) if documento else None
+    if digitos:
+        return digitos
+    nome = ' '.join((nome or '').upper().split())
+    return f'NOME:{nome}' if nome else None
+
+
+def _valor(valor: Any) -> Optional[float]:
+    return float(valor) if isinstance(valor, (int, float)) and not isinstance(valor, bool) else None
+
+
+def _quantidade(valor: Any) -> Optional[int]:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def contrapartes(parsed: Dict[str, Any]) -> Iterator[Tuple[str, str, str, Optional[str], Optional[float], Optional[int]]]:
+    """Contrapartes extraídas de um parsing_json: (vínculo, direção, nome, documento, valor, quantidade)"""
+    for caminho, vinculo, direcao, chave_nome, chave_documento in TABELAS_CONTRAPARTES:
+        tabela: Any = parsed
+        for chave in caminho:
+            tabela = tabela.get(chave) if isinstance(tabela, dict) else None
+        if not isinstance(tabela, list):
+            continue
+        for linha in tabela:
+            if not isinstance(linha, dict):
+                continue
+            nome = (linha.get(chave_nome) or '').strip()
+            documento = (linha.get(chave_documento) or '').strip() or None
+            if nome or documento:
+                yield vinculo, direcao, nome, documento, _valor(linha.get('valor')), _quantidade(linha.get('quantidade'))
+    for chave, vinculo, chave_nome, chave_documento in RELACIONADOS:
+        pessoa = parsed.get(chave)
+        if isinstance(pessoa, dict):
+            nome = (pessoa.get(chave_nome) or '').strip()
+            documento = (pessoa.get(chave_documento) or '').strip() or None
+            if nome or documento:
+                yield vinculo, 'relacao', nome, documento, None, None
@@ -0,0 +1,46 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path
+
+from .auth import usuario_atual
+from .persistencia import ativar_workspace, listar_workspaces, remover_workspace
+
+router = APIRouter()
+
+TAMANHO_MAXIMO_NOME = 80
+
+
+def nome_workspace(nome: Optional[str]) -> Optional[str]:
+    """Nome normalizado do workspace; vazio significa upload avulso (substitui o anterior)"""
+    nome = (nome or '').strip()
+    if len(nome) > TAMANHO_MAXIMO_NOME:
+        raise HTTPException(status_code=400, detail=f"Nome do workspace com mais de {TAMANHO_MAXIMO_NOME} caracteres")
+    return nome or None
+
+
+def _usuario(usuario: Optional[str]) -> str:
+    if not usuario:
+        raise HTTPException(status_code=400, detail="Usuário não informado")
+    return usuario
+
+
+@router.get("/api/workspaces")
+def workspaces(usuario: Optional[str] = Depends(usuario_atual)):
+    """Workspaces do usuário, com os RIFs acrescentados a cada um"""
+    return listar_workspaces(_usuario(usuario))
+
+
+@router.post("/api/workspaces/{nome}/ativar")
+def ativar(nome: str = Path(...), usuario: Optional[str] = Depends(usuario_atual)):
+    """Passa a servir o workspace nas rotas de leitura (dashboard, comunicações, grafo)"""
+    if not ativar_workspace(_usuario(usuario), nome):
+        raise HTTPException(status_code=404, detail="Workspace não encontrado")
+    return {"success": True, "workspace": nome}
+
+
+@router.delete("/api/workspaces/{nome}")
+def remover(nome: str = Path(...), usuario: Optional[str] = Depends(usuario_atual)):
+    """Apaga o workspace; as ocorrências no índice de pessoas continuam registradas"""
+    if not remover_workspace(_usuario(usuario), nome):
+        raise HTTPException(status_code=404, detail="Workspace não encontrado")
+    return {"success": True}
@@ -0,0 +1,240 @@
+import re
+import tempfile
+import zipfile
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+# Bytes acumulados antes de entregar um pedaço do arquivo ao cliente
+TAMANHO_BLOCO = 64 * 1024
+# Linhas convertidas para XML de uma vez
+LINHAS_POR_ESCRITA = 500
+# Limite de caracteres de uma célula do Excel
+MAX_CARACTERES_CELULA = 32767
+# Compressão rápida: o XML das planilhas é muito repetitivo e comprime bem mesmo no nível 1
+NIVEL_COMPRESSAO = 1
+
+# Caracteres que exigem tratamento: escapes de XML e controles não permitidos em XML 1.0
+CARACTERES_ESPECIAIS = re.compile('[&<>\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;'}
+
+TIPOS_CONTEUDO = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{planilhas}</Types>'
+)
+TIPO_PLANILHA = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+RELS_PACOTE = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{planilhas}</sheets></workbook>'
+)
+RELS_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{planilhas}<Relationship Id="rId{estilos}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+REL_PLANILHA = (
+    '<Relationship Id="rId{n}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+# Estilo 1: cabeçalho em negrito
+ESTILOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+INICIO_PLANILHA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+FIM_PLANILHA = '</sheetData></worksheet>'
+
+
+def _texto(valor: str) -> str:
+    if len(valor) > MAX_CARACTERES_CELULA:
+        valor = valor[:MAX_CARACTERES_CELULA]
+    if CARACTERES_ESPECIAIS.search(valor):
+        valor = CARACTERES_ESPECIAIS.sub(lambda m: ESCAPES.get(m.group(), ''), valor)
+    return valor
+
+
+def _formatar_celula(valor: Any) -> str:
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        if valor != valor or valor in (float('inf'), float('-inf')):
+            return '<c/>'
+        return f'<c><v>{valor!r}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{_texto(str(valor))}</t></is></c>'
+
+
+# Nomes, documentos, tipos e datas se repetem muito entre as linhas; typed separa True de 1
+_celula = lru_cache(maxsize=65536, typed=True)(_formatar_celula)
+
+
+def linhas_xml(linhas: Iterable[Sequence[Any]]) -> str:
+    return ''.join('<row>' + ''.join(map(_celula, linha)) + '</row>' for linha in linhas)
+
+
+def cabecalho_xml(colunas: Sequence[str]) -> str:
+    return '<row>' + ''.join(f'<c t="inlineStr" s="1"><is><t>{_texto(c)}</t></is></c>' for c in colunas) + '</row>'
+
+
+class _Saida:
+    """Destino sem seek do zip: acumula os bytes até serem entregues ao cliente"""
+
+    def __init__(self):
+        self.partes: List[bytes] = []
+        self.tamanho = 0
+
+    def write(self, dados) -> int:
+        self.partes.append(bytes(dados))
+        self.tamanho += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self) -> bytes:
+        dados = b''.join(self.partes)
+        self.partes = []
+        self.tamanho = 0
+        return dados
+
+
+class PlanilhaTemporaria:
+    """Planilha escrita em disco enquanto outra é enviada; copiada para o zip depois"""
+
+    def __init__(self, nome: str, colunas: Sequence[str]):
+        self.nome = nome
+        self.arquivo = tempfile.TemporaryFile()
+        self.pendentes: List[Sequence[Any]] = []
+        self.linhas = 0
+        self.arquivo.write(cabecalho_xml(colunas).encode('utf-8'))
+
+    def adicionar(self, linha: Sequence[Any]):
+        self.pendentes.append(linha)
+        self.linhas += 1
+        if len(self.pendentes) >= LINHAS_POR_ESCRITA:
+            self._gravar()
+
+    def _gravar(self):
+        self.arquivo.write(linhas_xml(self.pendentes).encode('utf-8'))
+        self.pendentes = []
+
+    def conteudo(self) -> Iterator[bytes]:
+        self._gravar()
+        self.arquivo.seek(0)
+        while True:
+            bloco = self.arquivo.read(1024 * 1024)
+            if not bloco:
+                break
+            yield bloco
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+class EscritorXLSX:
+    """Gera um .xlsx só de escrita, em fluxo, com strings inline e sem estilos por célula.
+
+    As planilhas são escritas uma de cada vez, na ordem declarada; cada
+    chamada que escreve devolve os bytes já comprimidos que podem ser
+    enviados ao cliente. A memória usada não depende do número de linhas.
+    """
+
+    def __init__(self, planilhas: Sequence[str]):
+        self.planilhas = list(planilhas)
+        self.saida = _Saida()
+        self.zip = zipfile.ZipFile(self.saida, 'w', zipfile.ZIP_DEFLATED, compresslevel=NIVEL_COMPRESSAO)
+        self.atual: Optional[Any] = None
+        self.proxima = 0
+        self.pendentes: List[Sequence[Any]] = []
+        nomes = range(1, len(self.planilhas) + 1)
+        self.zip.writestr('[Content_Types].xml', TIPOS_CONTEUDO.format(
+            planilhas=''.join(TIPO_PLANILHA.format(n=n) for n in nomes)))
+        self.zip.writestr('_rels/.rels', RELS_PACOTE)
+        self.zip.writestr('xl/workbook.xml', WORKBOOK.format(planilhas=''.join(
+            f'<sheet name="{_texto(nome[:31])}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, nome in zip(nomes, self.planilhas))))
+        self.zip.writestr('xl/_rels/workbook.xml.rels', RELS_WORKBOOK.format(
+            planilhas=''.join(REL_PLANILHA.format(n=n) for n in nomes), estilos=len(self.planilhas) + 1))
+        self.zip.writestr('xl/styles.xml', ESTILOS)
+
+    def _pronto(self) -> bytes:
+        return self.saida.drenar() if self.saida.tamanho >= TAMANHO_BLOCO else b''
+
+    def iniciar_planilha(self, colunas: Sequence[str]) -> bytes:
+        """Fecha a planilha atual e abre a próxima, escrevendo o cabeçalho"""
+        self._fechar_planilha()
+        self.proxima += 1
+        self.atual = self.zip.open(f'xl/worksheets/sheet{self.proxima}.xml', 'w')
+        self.atual.write((INICIO_PLANILHA + cabecalho_xml(colunas)).encode('utf-8'))
+        return self._pronto()
+
+    def adicionar(self, linha: Sequence[Any]) -> bytes:
+        self.pendentes.append(linha)
+        if len(self.pendentes) >= LINHAS_POR_ESCRITA:
+            self.atual.write(linhas_xml(self.pendentes).encode('utf-8'))
+            self.pendentes = []
+            return self._pronto()
+        return b''
+
+    def copiar_planilha(self, temporaria: PlanilhaTemporaria) -> Iterator[bytes]:
+        """Escreve como próxima planilha o conteúdo de uma PlanilhaTemporaria"""
+        self._fechar_planilha()
+        self.proxima += 1
+        self.atual = self.zip.open(f'xl/worksheets/sheet{self.proxima}.xml', 'w')
+        self.atual.write(INICIO_PLANILHA.encode('utf-8'))
+        for bloco in temporaria.conteudo():
+            self.atual.write(bloco)
+            pronto = self._pronto()
+            if pronto:
+                yield pronto
+
+    def _fechar_planilha(self):
+        if self.atual is not None:
+            if self.pendentes:
+                self.atual.write(linhas_xml(self.pendentes).encode('utf-8'))
+                self.pendentes = []
+            self.atual.write(FIM_PLANILHA.encode('utf-8'))
+            self.atual.close()
+            self.atual = None
+
+    def finalizar(self) -> bytes:
+        """Fecha a última planilha e o diretório central do zip; devolve o restante do arquivo"""
+        self._fechar_planilha()
+        self.zip.close()
+        return self.saida.drenar()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Latência da busca textual (/api/comunicacoes/busca) sobre um upload de N
+comunicações, replicando as comunicações dos CSVs de exemplo. A gravação
+passa por salvar_rif, que também alimenta o índice FTS5 em lotes.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_busca [--registros N] [--repeticoes R]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("RIF_PARSE_CACHE", "0")
+
+PASTA_EXEMPLOS = os.path.abspath("backend/database/uploads")
+
+# O banco é criado em backend/database relativo ao diretório atual; muda antes
+# de importar o app para não gravar no banco do repositório
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.consultas import buscar_texto  # noqa: E402
+from app.ingestao import ingerir_rif  # noqa: E402
+from app.main import ARQUIVOS_RIF  # noqa: E402
+from app.persistencia import salvar_rif  # noqa: E402
+from app.utils import detect_encoding  # noqa: E402
+
+CONSULTAS = [
+    "prefeitura",
+    '"administracao publica"',
+    "constru*",
+    "04.375.003/0001-60",
+    "municipio OR prefeitura",
+    "ltda",
+]
+
+
+def carregar_exemplos():
+    resultados = []
+    for pasta in sorted(glob.glob(f"{PASTA_EXEMPLOS}/*/")):
+        caminhos = {chave: os.path.join(pasta, nome) for chave, nome in ARQUIVOS_RIF.items()}
+        if not all(os.path.exists(c) for c in caminhos.values()):
+            continue
+        encodings = {chave: detect_encoding(c) for chave, c in caminhos.items()}
+        resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings)
+        resultado['comunicacoes'] = list(resultado['comunicacoes'])
+        resultados.append(resultado)
+    return resultados
+
+
+def replicar(exemplos, total):
+    serializados = [json.dumps(c, ensure_ascii=False) for r in exemplos for c in r['comunicacoes']]
+    for i in range(total):
+        c = json.loads(serializados[i % len(serializados)])
+        c['id'] = i + 1
+        yield c
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registros', type=int, default=100_000)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    exemplos = carregar_exemplos()
+    if not exemplos:
+        print(f"Nenhum RIF encontrado em {PASTA_EXEMPLOS}")
+        return
+    resultado = {
+        'envolvidos': {k: v for r in exemplos for k, v in r['envolvidos'].items()},
+        'ocorrencias': {k: v for r in exemplos for k, v in r['ocorrencias'].items()},
+        'comunicacoes': replicar(exemplos, args.registros),
+    }
+    inicio = time.perf_counter()
+    salvar_rif("bench", resultado)
+    print(f"{args.registros} comunicações gravadas e indexadas em {time.perf_counter() - inicio:.1f} s")
+
+    for consulta in CONSULTAS:
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            itens = buscar_texto(consulta, "bench")["itens"]
+            tempos.append(time.perf_counter() - inicio)
+        tempos.sort()
+        p50, p99 = tempos[len(tempos) // 2], tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))]
+        print(f"  {consulta:<28} {len(itens):3d} itens  p50 {p50 * 1e3:7.2f} ms  p99 {p99 * 1e3:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
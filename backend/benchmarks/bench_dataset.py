@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compara a memória e o tempo de busca por id entre o formato antigo
+(lista de dicts com o texto bruto e o parsing_json aninhado) e o DatasetRIF
+colunar, replicando as comunicações dos CSVs de exemplo até N registros.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_dataset [--registros N]
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("RIF_PARSE_CACHE", "0")
+
+from app.dataset import construir_dataset
+from app.ingestao import ingerir_rif
+from app.main import ARQUIVOS_RIF
+from app.utils import detect_encoding
+
+PASTA_EXEMPLOS = "backend/database/uploads"
+
+
+def carregar_exemplos():
+    comunicacoes = []
+    for pasta in sorted(glob.glob(f"{PASTA_EXEMPLOS}/*/")):
+        caminhos = {chave: os.path.join(pasta, nome) for chave, nome in ARQUIVOS_RIF.items()}
+        if not all(os.path.exists(c) for c in caminhos.values()):
+            continue
+        encodings = {chave: detect_encoding(c) for chave, c in caminhos.items()}
+        resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings)
+        comunicacoes.extend(resultado['comunicacoes'])
+    return comunicacoes
+
+
+def replicar(exemplos, total):
+    # Cada registro é desserializado de novo, como aconteceria ao ler do banco
+    serializados = [json.dumps(c, ensure_ascii=False) for c in exemplos]
+    for i in range(total):
+        c = json.loads(serializados[i % len(serializados)])
+        c['id'] = i + 1
+        yield c
+
+
+def medir(construir):
+    tracemalloc.start()
+    objeto = construir()
+    tamanho, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registros', type=int, default=50000)
+    args = parser.parse_args()
+
+    exemplos = carregar_exemplos()
+    if not exemplos:
+        print(f"Nenhum RIF encontrado em {PASTA_EXEMPLOS}")
+        return
+
+    lista, bytes_lista = medir(lambda: list(replicar(exemplos, args.registros)))
+    dataset, bytes_dataset = medir(lambda: construir_dataset(0, "bench", (
+        (c['id'], c['id'], {**c, **c['valores']}) for c in replicar(exemplos, args.registros)
+    )))
+
+    ids = [1 + (i * 7919) % args.registros for i in range(200)]
+    inicio = time.perf_counter()
+    for id in ids:
+        next(c for c in lista if c["id"] == id)
+    linear_us = (time.perf_counter() - inicio) * 1e6 / len(ids)
+    inicio = time.perf_counter()
+    for id in ids:
+        dataset.linha(id)
+    indice_us = (time.perf_counter() - inicio) * 1e6 / len(ids)
+
+    print(f"{args.registros} comunicações")
+    print(f"  lista de dicts: {bytes_lista / 1e6:8.1f} MB   busca por id: {linear_us:10.1f} us")
+    print(f"  DatasetRIF:     {bytes_dataset / 1e6:8.1f} MB   busca por id: {indice_us:10.3f} us")
+    print(f"  redução de memória: {bytes_lista / bytes_dataset:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark da detecção de encoding por amostragem.
+
+Gera arquivos cp1252 de 100 KB a 100 MB e mede o tempo de `detect_encoding`
+(primeira chamada, com a confirmação no arquivo inteiro, e chamada memorizada
+pelo SHA-256). Com --comparar-antigo, mede também o chardet sobre o arquivo
+inteiro (comportamento anterior) até 10 MB.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_encoding
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import chardet
+
+from app import utils
+
+LINHA = (
+    "1;36903161;P0411184S000;01/04/2022 19:19:41;01/06/2021;28/03/2022;60746948000112;"
+    "BANCO BRADESCO S.A.;AÇU;RN;ASSU;1282;Consta atuar como vendedor, autônomo, com renda mensal "
+    "de R$ 2.090,00. Entre 01.06.2021 e 28.03.2022 os créditos somaram R$ 750.495,84, sendo "
+    "depósitos realizados nas praças de Açu-RN (Minério), Caicó-RN;750.495,84;0;0;0;0;41\n"
+).encode('cp1252')
+
+TAMANHOS_KB = [100, 1024, 10 * 1024, 100 * 1024]
+LIMITE_ANTIGO_KB = 10 * 1024
+
+
+def gerar_arquivo(pasta: str, tamanho_kb: int) -> str:
+    caminho = os.path.join(pasta, f"rif_{tamanho_kb}kb.csv")
+    repeticoes = (tamanho_kb * 1024) // len(LINHA) + 1
+    with open(caminho, 'wb') as f:
+        bloco = LINHA * 1000
+        for _ in range(repeticoes // 1000):
+            f.write(bloco)
+        f.write(LINHA * (repeticoes % 1000))
+    return caminho
+
+
+def cronometrar(funcao, *args) -> float:
+    inicio = time.perf_counter()
+    funcao(*args)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def chardet_arquivo_inteiro(caminho: str) -> str:
+    with open(caminho, 'rb') as f:
+        return chardet.detect(f.read()).get('encoding')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comparar-antigo', action='store_true', help='mede também o chardet no arquivo inteiro')
+    args = parser.parse_args()
+
+    # Aquece o chardet (carregamento de modelos) para não distorcer a primeira medição
+    chardet.detect(LINHA * 10)
+
+    print(f"{'tamanho':>10} {'encoding':>9} {'amostra (ms)':>13} {'cache (ms)':>11} {'antigo (ms)':>12}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for tamanho_kb in TAMANHOS_KB:
+            caminho = gerar_arquivo(pasta, tamanho_kb)
+            sha256 = utils.sha256_arquivo(caminho)
+            utils._cache_encoding.clear()
+            frio = cronometrar(utils.detect_encoding, caminho, sha256)
+            quente = cronometrar(utils.detect_encoding, caminho, sha256)
+            antigo = '-'
+            if args.comparar_antigo and tamanho_kb <= LIMITE_ANTIGO_KB:
+                antigo = f"{cronometrar(chardet_arquivo_inteiro, caminho):.1f}"
+            encoding = utils.detect_encoding(caminho)
+            print(f"{tamanho_kb:>8}KB {encoding:>9} {frio:>13.2f} {quente:>11.2f} {antigo:>12}")
+            os.remove(caminho)
+
+
+if __name__ == "__main__":
+    main()
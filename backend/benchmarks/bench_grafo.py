@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Consultas ao grafo de contrapartes (/api/grafo/*) sobre um grafo sintético.
+Monta um grafo em memória com titulares e contrapartes de grau desigual
+(poucas contrapartes muito frequentes, como órgãos públicos e adquirentes)
+e mede a compactação, vizinhos, expansão em 2 saltos e menor caminho.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_grafo [--arestas N] [--consultas N]
+"""
+
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.grafo import Grafo  # noqa: E402
+
+VINCULOS = ('Crédito', 'Débito', 'Boleto')
+
+
+def montar(arestas: int, semente: int = 42) -> Grafo:
+    aleatorio = random.Random(semente)
+    titulares = max(arestas // 20, 1)
+    contrapartes = max(arestas // 4, 1)
+    grafo = Grafo(upload_id=0)
+    codigos = [grafo._codigo_vinculo(v) for v in VINCULOS]
+    for i in range(titulares):
+        grafo.no(f'{i:011d}', f'TITULAR {i}')
+    for i in range(contrapartes):
+        grafo.no(f'{i:014d}', f'EMPRESA {i}')
+    for _ in range(arestas):
+        titular = aleatorio.randrange(titulares)
+        # Distribuição de Pareto: contrapartes de índice baixo concentram os vínculos
+        contraparte = titulares + min(int(aleatorio.paretovariate(1.2)) - 1, contrapartes - 1)
+        if aleatorio.random() < 0.5:
+            origem, destino = contraparte, titular
+        else:
+            origem, destino = titular, contraparte
+        grafo._nova_aresta(origem, destino, aleatorio.choice(codigos), 1,
+                           round(aleatorio.uniform(10, 100000), 2), aleatorio.randint(1, 50), 1)
+    return grafo
+
+
+def medir(nome: str, consulta, documentos):
+    tempos = []
+    for documento in documentos:
+        inicio = time.perf_counter()
+        consulta(documento)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[int(len(tempos) * 0.95) - 1] if len(tempos) >= 20 else tempos[-1]
+    print(f"  {nome}: mediana {statistics.median(tempos):.2f} ms, p95 {p95:.2f} ms, máx {tempos[-1]:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--arestas', type=int, default=1_000_000)
+    parser.add_argument('--consultas', type=int, default=200)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    grafo = montar(args.arestas)
+    montagem = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    grafo.compactar()
+    compactacao = time.perf_counter() - inicio
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{len(grafo)} arestas, {len(grafo.documentos)} entidades")
+    print(f"  montagem {montagem:.2f} s, compactação {compactacao:.2f} s, pico de RSS {rss:.0f} MB")
+
+    aleatorio = random.Random(7)
+    titulares = [d for d in grafo.documentos if len(d) == 11]
+    amostra = [aleatorio.choice(titulares) for _ in range(args.consultas)]
+    medir("vizinhos", lambda d: grafo.vizinhos(d), amostra)
+    medir("expansão 2 saltos", lambda d: grafo.expandir(d, 2), amostra)
+    pares = list(zip(amostra, reversed(amostra)))
+    medir("menor caminho", lambda par: grafo.caminho(*par, max_saltos=6), pares)
+    medir("menor caminho direcionado", lambda par: grafo.caminho(*par, max_saltos=6, direcionado=True), pares)
+
+
+if __name__ == "__main__":
+    main()
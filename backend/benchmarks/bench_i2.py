@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tempo e pico de memória da geração do .xlsx para o i2 (/api/i2/gerar-arquivo).
+Replica os CSVs de exemplo até o número pedido de comunicações, com
+indexadores únicos, e consome o arquivo gerado sem guardá-lo.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_i2 [--comunicacoes N]
+"""
+
+import argparse
+import csv
+import glob
+import os
+import resource
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("RIF_PARSE_CACHE", "0")
+
+PASTA_EXEMPLOS = os.path.abspath("backend/database/uploads")
+
+# Banco e caches relativos ao diretório atual: muda antes de importar o app
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.i2 import gerar_xlsx_i2  # noqa: E402
+from app.ingestao import ingerir_rif  # noqa: E402
+from app.main import ARQUIVOS_RIF  # noqa: E402
+from app.utils import detect_encoding  # noqa: E402
+
+
+def ler_exemplos():
+    exemplos = {chave: [] for chave in ARQUIVOS_RIF}
+    cabecalhos = {}
+    for pasta in sorted(glob.glob(f"{PASTA_EXEMPLOS}/*/")):
+        caminhos = {chave: os.path.join(pasta, nome) for chave, nome in ARQUIVOS_RIF.items()}
+        if not all(os.path.exists(c) for c in caminhos.values()):
+            continue
+        for chave, caminho in caminhos.items():
+            with open(caminho, encoding=detect_encoding(caminho)) as f:
+                leitor = csv.DictReader(f, delimiter=';')
+                cabecalhos[chave] = leitor.fieldnames
+                exemplos[chave].append([linha for linha in leitor if (linha.get('Indexador') or '').isdigit()])
+    return cabecalhos, exemplos
+
+
+def replicar(cabecalhos, exemplos, total, pasta):
+    """Copia os RIFs de exemplo com indexadores deslocados até `total` comunicações"""
+    caminhos = {chave: os.path.join(pasta, nome) for chave, nome in ARQUIVOS_RIF.items()}
+    arquivos = {chave: open(c, 'w', encoding='utf-8', newline='') for chave, c in caminhos.items()}
+    escritores = {chave: csv.DictWriter(f, cabecalhos[chave], delimiter=';') for chave, f in arquivos.items()}
+    for escritor in escritores.values():
+        escritor.writeheader()
+    gerado, deslocamento = 0, 0
+    while gerado < total:
+        for i in range(len(exemplos['comunicacoes'])):
+            maior = 0
+            for chave in ARQUIVOS_RIF:
+                for linha in exemplos[chave][i]:
+                    if chave == 'comunicacoes' and gerado >= total:
+                        break
+                    indexador = int(linha['Indexador'])
+                    maior = max(maior, indexador)
+                    escritores[chave].writerow({**linha, 'Indexador': str(indexador + deslocamento)})
+                    gerado += chave == 'comunicacoes'
+            deslocamento += maior
+    for f in arquivos.values():
+        f.close()
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comunicacoes', type=int, default=6000)
+    args = parser.parse_args()
+
+    cabecalhos, exemplos = ler_exemplos()
+    if not exemplos['comunicacoes']:
+        print(f"Nenhum RIF encontrado em {PASTA_EXEMPLOS}")
+        return
+    caminhos = replicar(cabecalhos, exemplos, args.comunicacoes, tempfile.mkdtemp())
+    encodings = {chave: 'utf-8' for chave in caminhos}
+
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings)
+    tamanho, blocos, primeiro = 0, 0, None
+    for bloco in gerar_xlsx_i2(resultado, caminhos, encodings):
+        if primeiro is None:
+            primeiro = time.perf_counter() - inicio
+        tamanho += len(bloco)
+        blocos += 1
+    tempo = time.perf_counter() - inicio
+    rss_final = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    envolvidos = resultado['estatisticas']['envolvidos']['linhas_validas']
+    print(f"{args.comunicacoes} comunicações, {envolvidos} envolvidos")
+    print(f"  arquivo: {tamanho / 1e6:.1f} MB em {blocos} blocos")
+    print(f"  primeiro bloco em {primeiro:.2f} s, total {tempo:.2f} s")
+    print(f"  pico de RSS: {rss_inicial / 1024:.0f} MB -> {rss_final / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ponta a ponta do upload e das rotas de leitura sobre um RIF
+sintético (benchmarks/gerador_rif.py).
+
+Mede cada etapa do processamento feito por /upload (SHA-256, detecção de
+encoding, validação dos cabeçalhos, leitura de envolvidos e ocorrências,
+parsing das comunicações, agregação e gravação no banco) e a latência das
+principais rotas de leitura, com o pico de RSS. O resultado pode ser gravado
+em JSON e é comparado com uma linha de base: etapas pela vazão
+(comunicações por segundo) e rotas pela mediana, quando a linha de base tem
+o mesmo número de comunicações. Sai com código 1 se houver regressão acima
+da tolerância.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_ingestao [--comunicacoes N] [--saida resultado.json]
+        [--baseline benchmarks/baseline_ingestao.json] [--gravar-baseline] [--tolerancia 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+os.environ.setdefault("RIF_PARSE_CACHE", "0")
+
+ORIGEM = os.getcwd()
+BASELINE_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_ingestao.json')
+USUARIO = 'bench'
+# Etapas mais curtas que isso na linha de base são ruído e não entram na comparação
+MINIMO_SEGUNDOS = 0.5
+
+# Banco e uploads relativos ao diretório atual: muda antes de importar o app
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+
+from app.agregados import AgregadosRIF  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.ingestao import ingerir_rif  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Comunicacao, EntidadeGrafo  # noqa: E402
+from app.parsing_paralelo import encerrar_pool  # noqa: E402
+from app.persistencia import salvar_rif  # noqa: E402
+from app.utils import detect_encoding, sha256_arquivo  # noqa: E402
+from benchmarks.gerador_rif import gerar_rif  # noqa: E402
+
+# Rotas medidas; {numero} e {documento} variam a cada requisição
+ENDPOINTS = [
+    ('dashboard', '/api/dashboard-resumo'),
+    ('estatisticas', '/api/estatisticas'),
+    ('pagina_valor', '/api/comunicacoes?limite=50&ordenar=-valor'),
+    ('pagina_banco', '/api/comunicacoes?limite=50&banco=BANCO DO BRASIL SA'),
+    ('busca', '/api/comunicacoes/busca?q=agiotagem'),
+    ('comunicacao', '/api/comunicacao/{numero}'),
+    ('entidade', '/api/entidades/{documento}'),
+    ('grafo_vizinhos', '/api/grafo/vizinhos/{documento}'),
+    ('grafo_expandir', '/api/grafo/expandir/{documento}?saltos=2'),
+]
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Cronometro:
+    """Envolve o iterador de comunicações separando o tempo de parsing do de gravação.
+
+    A agregação é medida em uma cópia dos agregados alimentada com as mesmas
+    comunicações, já que a de salvar_rif acontece dentro do laço de gravação.
+    """
+
+    def __init__(self, comunicacoes):
+        self.comunicacoes = comunicacoes
+        self.parsing = 0.0
+        self.agregacao = 0.0
+        self.agregados = AgregadosRIF()
+
+    def __iter__(self):
+        iterador = iter(self.comunicacoes)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                c = next(iterador)
+            except StopIteration:
+                self.parsing += time.perf_counter() - inicio
+                return
+            meio = time.perf_counter()
+            self.agregados.adicionar(c['banco'], c['valores'])
+            self.parsing += meio - inicio
+            self.agregacao += time.perf_counter() - meio
+            yield c
+
+
+def medir_upload(caminhos, comunicacoes):
+    etapas, rss = {}, {}
+
+    def registrar(nome, segundos):
+        etapas[nome] = segundos
+        rss[nome] = rss_mb()
+
+    inicio = time.perf_counter()
+    hashes = {'comunicacoes': sha256_arquivo(caminhos['comunicacoes'])}
+    registrar('sha256', time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    encodings = {chave: detect_encoding(caminho) for chave, caminho in caminhos.items()}
+    registrar('encoding', time.perf_counter() - inicio)
+
+    marcas = {}
+    resultado = ingerir_rif(caminhos['comunicacoes'], caminhos['envolvidos'], caminhos['ocorrencias'], encodings,
+                            etapa=lambda nome, estatisticas: marcas.setdefault(nome, time.perf_counter()))
+    registrar('validacao', marcas['envolvidos'] - marcas['validacao'])
+    registrar('envolvidos', marcas['ocorrencias'] - marcas['envolvidos'])
+    registrar('ocorrencias', marcas['comunicacoes'] - marcas['ocorrencias'])
+
+    cronometro = Cronometro(resultado['comunicacoes'])
+    resultado['comunicacoes'] = cronometro
+    inicio = time.perf_counter()
+    gravado = salvar_rif(USUARIO, resultado, hashes)
+    total = time.perf_counter() - inicio
+    registrar('parsing', cronometro.parsing)
+    registrar('agregacao', cronometro.agregacao)
+    # O restante de salvar_rif, descontadas a cópia e a agregação real
+    registrar('gravacao', total - cronometro.parsing - 2 * cronometro.agregacao)
+    assert gravado['comunicacoes'] == cronometro.agregados.total == comunicacoes, gravado
+
+    etapas['total'] = sum(etapas.values())
+    return {
+        nome: {'segundos': round(segundos, 3), 'comunicacoes_por_segundo': round(comunicacoes / segundos, 1)
+               if segundos > 0 else None, 'rss_mb': round(rss.get(nome, rss_mb()), 1)}
+        for nome, segundos in etapas.items()
+    }
+
+
+def amostras(comunicacoes: int, quantidade: int):
+    """Números de comunicação e documentos do grafo escolhidos de forma reprodutível"""
+    aleatorio = random.Random(7)
+    with SessionLocal() as session:
+        documentos = session.scalars(select(EntidadeGrafo.documento).order_by(EntidadeGrafo.id).limit(10000)).all()
+        numeros = session.scalars(select(Comunicacao.numero).order_by(Comunicacao.numero).limit(10000)).all()
+    return ([aleatorio.choice(numeros) for _ in range(quantidade)],
+            [aleatorio.choice(documentos) for _ in range(quantidade)])
+
+
+def medir_endpoints(cliente, requisicoes: int, comunicacoes: int):
+    numeros, documentos = amostras(comunicacoes, requisicoes)
+    resultado = {}
+    for nome, rota in ENDPOINTS:
+        tempos = []
+        for i in range(requisicoes):
+            url = rota.format(numero=numeros[i], documento=documentos[i])
+            url += ('&' if '?' in url else '?') + f'usuario={USUARIO}'
+            inicio = time.perf_counter()
+            resposta = cliente.get(url)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+            if resposta.status_code != 200:
+                raise RuntimeError(f"{url}: HTTP {resposta.status_code}")
+        primeira = tempos[0]
+        tempos.sort()
+        resultado[nome] = {
+            'primeira_ms': round(primeira, 2),
+            'mediana_ms': round(statistics.median(tempos), 2),
+            'p95_ms': round(tempos[max(int(len(tempos) * 0.95) - 1, 0)], 2),
+            'requisicoes': requisicoes,
+        }
+
+    inicio = time.perf_counter()
+    linhas = 0
+    with cliente.stream('GET', f'/api/comunicacoes/stream?usuario={USUARIO}') as resposta:
+        for linha in resposta.iter_lines():
+            linhas += bool(linha)
+    segundos = time.perf_counter() - inicio
+    resultado['exportacao_ndjson'] = {
+        'segundos': round(segundos, 3),
+        'comunicacoes_por_segundo': round(linhas / segundos, 1),
+    }
+    return resultado
+
+
+def comparar(atual, base, tolerancia: float):
+    """Linhas do relatório e lista de regressões acima da tolerância"""
+    linhas, regressoes = [], []
+    for nome, medida in atual['etapas'].items():
+        anterior = base.get('etapas', {}).get(nome)
+        if not anterior or anterior['segundos'] < MINIMO_SEGUNDOS or not medida['comunicacoes_por_segundo']:
+            continue
+        razao = medida['comunicacoes_por_segundo'] / anterior['comunicacoes_por_segundo']
+        linhas.append(f"  etapa {nome:<18} {anterior['comunicacoes_por_segundo']:>12.0f} -> "
+                      f"{medida['comunicacoes_por_segundo']:>12.0f} com/s ({razao - 1:+.0%})")
+        if razao < 1 / (1 + tolerancia):
+            regressoes.append(f"etapa {nome}")
+    if base.get('comunicacoes') != atual['comunicacoes']:
+        linhas.append(f"  rotas e RSS não comparados: linha de base com {base.get('comunicacoes')} comunicações")
+        return linhas, regressoes
+    for nome, medida in atual['endpoints'].items():
+        anterior = base.get('endpoints', {}).get(nome)
+        if not anterior or 'mediana_ms' not in medida or 'mediana_ms' not in anterior:
+            continue
+        razao = medida['mediana_ms'] / anterior['mediana_ms'] if anterior['mediana_ms'] else 1
+        linhas.append(f"  rota  {nome:<18} {anterior['mediana_ms']:>10.2f} -> {medida['mediana_ms']:>10.2f} ms "
+                      f"({razao - 1:+.0%})")
+        if razao > 1 + tolerancia:
+            regressoes.append(f"rota {nome}")
+    razao = atual['pico_rss_mb'] / base['pico_rss_mb'] if base.get('pico_rss_mb') else 1
+    linhas.append(f"  pico de RSS {base.get('pico_rss_mb')} -> {atual['pico_rss_mb']} MB ({razao - 1:+.0%})")
+    if razao > 1 + tolerancia:
+        regressoes.append("pico de RSS")
+    return linhas, regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--comunicacoes', type=int, default=10_000)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--requisicoes', type=int, default=50, help='requisições por rota')
+    parser.add_argument('--saida', help='grava o resultado neste arquivo JSON')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--gravar-baseline', action='store_true', help='substitui a linha de base pelo resultado')
+    parser.add_argument('--tolerancia', type=float, default=0.25)
+    args = parser.parse_args()
+    baseline = os.path.join(ORIGEM, args.baseline)
+
+    inicio = time.perf_counter()
+    caminhos = gerar_rif(os.path.join('backend', 'database', 'uploads', USUARIO), args.comunicacoes, args.semente)
+    print(f"RIF sintético com {args.comunicacoes} comunicações gerado em {time.perf_counter() - inicio:.1f} s")
+
+    etapas = medir_upload(caminhos, args.comunicacoes)
+    for nome, medida in etapas.items():
+        print(f"  {nome:<12} {medida['segundos']:>9.3f} s  {medida['comunicacoes_por_segundo'] or 0:>12.0f} com/s"
+              f"  RSS {medida['rss_mb']:.0f} MB")
+
+    with TestClient(app) as cliente:
+        endpoints = medir_endpoints(cliente, args.requisicoes, args.comunicacoes)
+    for nome, medida in endpoints.items():
+        if 'mediana_ms' in medida:
+            print(f"  {nome:<18} primeira {medida['primeira_ms']:>9.2f} ms, mediana {medida['mediana_ms']:>8.2f} ms, "
+                  f"p95 {medida['p95_ms']:>8.2f} ms")
+        else:
+            print(f"  {nome:<18} {medida['segundos']:.2f} s ({medida['comunicacoes_por_segundo']:.0f} com/s)")
+    encerrar_pool()
+
+    resultado = {
+        'comunicacoes': args.comunicacoes,
+        'semente': args.semente,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'tamanho_mb': {chave: round(os.path.getsize(c) / 1e6, 2) for chave, c in caminhos.items()},
+        'etapas': etapas,
+        'endpoints': endpoints,
+        'pico_rss_mb': round(rss_mb(), 1),
+        'pico_rss_filhos_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+    print(f"  pico de RSS {resultado['pico_rss_mb']:.0f} MB (processos de parsing: {resultado['pico_rss_filhos_mb']:.0f} MB)")
+
+    if args.saida:
+        with open(os.path.join(ORIGEM, args.saida), 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    if args.gravar_baseline:
+        with open(baseline, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Linha de base gravada em {baseline}")
+        return
+    if not os.path.exists(baseline):
+        print(f"Sem linha de base em {baseline}; use --gravar-baseline")
+        return
+    with open(baseline, encoding='utf-8') as f:
+        base = json.load(f)
+    linhas, regressoes = comparar(resultado, base, args.tolerancia)
+    print(f"Comparação com {os.path.relpath(baseline, ORIGEM)} ({base.get('data')}, tolerância {args.tolerancia:.0%}):")
+    print('\n'.join(linhas))
+    if regressoes:
+        print(f"Regressões: {', '.join(regressoes)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Verifica que os parsers bancários continuam lineares no tamanho do texto.
+
+Para cada entrada de benchmarks/corpus_patologico.py, aumenta n até o parse
+levar ao menos --tempo-minimo ms e compara o tempo com o de 4n: em tempo
+linear a razão fica perto de 4, em tempo quadrático perto de 16. Razões
+acima de --razao-maxima são regressões. Em seguida confere o limite de tempo
+por comunicação (RIF_PARSE_LIMITE_MS): um texto que passa do limite deve ser
+interrompido, interpretado pelo parser genérico e marcado com "limite_parsing".
+Sai com código 1 se alguma verificação falhar.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_linearidade [--razao-maxima 8] [--tempo-minimo 5]
+"""
+
+import argparse
+import sys
+import time
+
+from app.parsing_paralelo import LimiteParsing, parse_informacoes
+from benchmarks.corpus_patologico import CORPUS
+from parsers import registro
+
+FATOR = 4
+MAX_N = 1_000_000
+# Nome de comunicante que leva cada parser a ser escolhido por escolher_parser
+COMUNICANTES = {
+    'bb': 'BANCO DO BRASIL SA',
+    'bradesco': 'BANCO BRADESCO S.A.',
+    'nubank': 'NU PAGAMENTOS S.A.',
+    'generico': 'BANCO INTER S.A.',
+}
+
+
+def medir(parser, texto: str, repeticoes: int = 3) -> float:
+    """Menor tempo, em segundos, entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        parser(texto)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def verificar_linearidade(razao_maxima: float, tempo_minimo: float) -> list:
+    falhas = []
+    for nome_parser, nome, gerador in CORPUS:
+        parser = registro.obter(nome_parser).funcao
+        n = 100
+        while True:
+            tempo = medir(parser, gerador(n))
+            if tempo * 1000 >= tempo_minimo or n >= MAX_N:
+                break
+            n *= 2
+        tempo_maior = medir(parser, gerador(n * FATOR))
+        razao = tempo_maior / tempo if tempo else 0.0
+        situacao = 'ok' if razao <= razao_maxima else 'SUPERLINEAR'
+        print(f"  {nome_parser:<9} {nome:<22} n={n:>7}: {tempo * 1000:8.1f} ms -> "
+              f"{tempo_maior * 1000:8.1f} ms (x{razao:.1f}) {situacao}")
+        if razao > razao_maxima:
+            falhas.append(f"{nome_parser}.{nome}")
+    return falhas
+
+
+def verificar_limite(limite_ms: float = 50) -> list:
+    """Um texto acima do limite é interrompido e cai no parser genérico, marcado"""
+    falhas = []
+    _, nome, gerador = next(entrada for entrada in CORPUS if entrada[0] == 'bb')
+    n = 100
+    while medir(registro.obter('bb').funcao, gerador(n), repeticoes=1) * 1000 < limite_ms * 4 and n < MAX_N:
+        n *= 2
+    row = {"CodigoSegmento": "41", "nomeComunicante": COMUNICANTES['bb'], "informacoesAdicionais": gerador(n)}
+    inicio = time.perf_counter()
+    with LimiteParsing(limite_ms) as limite:
+        resultado = parse_informacoes(row, limite)
+    decorrido = (time.perf_counter() - inicio) * 1000
+    marca = resultado.get("limite_parsing")
+    print(f"  limite de {limite_ms:.0f} ms, bb.{nome} n={n}: {decorrido:.1f} ms no total, "
+          f"limite_parsing={marca}")
+    if not marca or marca["parser"] != 'bb':
+        falhas.append("limite: resultado sem limite_parsing")
+    elif limite.interromper and not marca["interrompido"]:
+        falhas.append("limite: parser não foi interrompido")
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--razao-maxima', type=float, default=8.0,
+                        help=f'maior razão aceita entre os tempos de {FATOR}n e n')
+    parser.add_argument('--tempo-minimo', type=float, default=5.0, help='tempo mínimo (ms) da medida em n')
+    args = parser.parse_args()
+
+    print(f"Tempo de parse com entrada {FATOR}x maior (linear ~x{FATOR}, quadrático ~x{FATOR * FATOR}):")
+    falhas = verificar_linearidade(args.razao_maxima, args.tempo_minimo)
+    print("Limite de tempo por comunicação:")
+    falhas += verificar_limite()
+    if falhas:
+        print(f"Falhas: {', '.join(falhas)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
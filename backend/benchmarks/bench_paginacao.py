@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Latência da listagem paginada (/api/comunicacoes com cursor) conforme o
+tamanho do upload. Para cada N, grava N comunicações sintéticas em um banco
+temporário e percorre as primeiras páginas com algumas combinações de
+ordenação e filtro, reportando p50 e p99 por página.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_paginacao [--registros 1000 100000 1000000] [--paginas 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# O banco é criado em backend/database relativo ao diretório atual
+os.chdir(tempfile.mkdtemp())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from app.consultas import listar_pagina  # noqa: E402
+from app.database import SessionLocal, garantir_schema  # noqa: E402
+from app.models import Comunicacao, Upload  # noqa: E402
+
+CENARIOS = [
+    ("id", {}),
+    ("-valor", {}),
+    ("data", {"data_inicio": "01/01/2018"}),
+    ("id", {"banco": "BANCO DO BRASIL"}),
+    ("-valor", {"uf": "SP", "valor_min": 1000}),
+    ("titular", {"titular": "MARIA"}),
+]
+
+
+def popular(total, semente=42):
+    aleatorio = random.Random(semente)
+    with SessionLocal() as session, session.begin():
+        session.execute(delete(Comunicacao))
+        session.execute(delete(Upload))
+        upload = Upload(usuario="bench", data="", versao=1)
+        session.add(upload)
+        session.flush()
+        lote = []
+        for numero in range(1, total + 1):
+            ano, mes, dia = aleatorio.randint(2010, 2024), aleatorio.randint(1, 12), aleatorio.randint(1, 28)
+            lote.append({
+                "numero": numero, "usuario": "bench", "upload_id": upload.id,
+                "banco": aleatorio.choice(["BANCO DO BRASIL", "BRADESCO", "NU PAGAMENTOS", "ITAU"]),
+                "data": f"{dia:02d}/{mes:02d}/{ano}", "data_iso": f"{ano}-{mes:02d}-{dia:02d}",
+                "titular": f"{aleatorio.choice(['MARIA', 'JOSE', 'ANA', 'JOAO'])} {numero}",
+                "cpf": str(aleatorio.randint(0, total // 10)),
+                "uf_agencia": aleatorio.choice(["SP", "RJ", "MG", "PE"]), "cidade_agencia": "CIDADE",
+                "codigo_segmento": aleatorio.choice(["41", "42", "37"]),
+                "valor_total": None if aleatorio.random() < 0.05 else aleatorio.uniform(0, 1e7),
+            })
+            if len(lote) == 10000:
+                session.execute(insert(Comunicacao), lote)
+                lote = []
+        if lote:
+            session.execute(insert(Comunicacao), lote)
+
+
+def percorrer(ordenar, filtros, paginas):
+    tempos, cursor = [], None
+    for _ in range(paginas):
+        inicio = time.perf_counter()
+        pagina = listar_pagina("bench", filtros, ordenar, 50, cursor)
+        tempos.append(time.perf_counter() - inicio)
+        cursor = pagina["proximo_cursor"]
+        if not cursor:
+            break
+    tempos.sort()
+    return tempos[len(tempos) // 2], tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registros', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--paginas', type=int, default=50)
+    args = parser.parse_args()
+
+    garantir_schema()
+    for total in args.registros:
+        popular(total)
+        print(f"{total} comunicações")
+        for ordenar, filtros in CENARIOS:
+            p50, p99 = percorrer(ordenar, filtros, args.paginas)
+            print(f"  ordenar={ordenar:<8} {str(filtros):<40} p50 {p50 * 1e3:6.2f} ms  p99 {p99 * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
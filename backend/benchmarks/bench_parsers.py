@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark dos parsers bancários sobre os CSVs de exemplo.
+
+Para cada parser mede:
+  - a detecção de termos de crime/atividade suspeita no formato antigo
+    (um re.search com IGNORECASE por termo) e com o DetectorTermos
+    (uma única varredura);
+  - o tempo médio do parse completo por texto.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_parsers [--repeticoes N]
+"""
+
+import argparse
+import csv
+import glob
+import re
+import time
+
+from app.utils import detect_encoding
+from parsers import bb, bradesco, nubank, parser_generico
+
+PASTA_EXEMPLOS = "backend/database/uploads"
+
+PARSERS = [
+    ("bradesco", bradesco.parse_bradesco, [p for _, p in bradesco.ATIVIDADES_SUSPEITAS] + bradesco.PADROES_CRIME,
+     bradesco.DETECTOR_TERMOS),
+    ("bb", bb.parse_bb, bb.PADROES_CRIME, bb.DETECTOR_CRIMES),
+    ("nubank", nubank.parse_nubank, None, None),
+    ("generico", parser_generico.parse_generico, None, None),
+]
+
+
+def carregar_textos():
+    textos = []
+    for caminho in sorted(glob.glob(f"{PASTA_EXEMPLOS}/*/Comunicacoes.csv")):
+        with open(caminho, encoding=detect_encoding(caminho)) as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                if row.get("informacoesAdicionais"):
+                    textos.append(row["informacoesAdicionais"])
+    return textos
+
+
+def termos_antigo(texto, padroes):
+    return [p for p in padroes if re.search(p, texto, re.IGNORECASE)]
+
+
+def cronometrar(funcao, textos, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for texto in textos:
+            funcao(texto)
+    return (time.perf_counter() - inicio) * 1e6 / (repeticoes * len(textos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=20)
+    args = parser.parse_args()
+
+    textos = carregar_textos()
+    if not textos:
+        print(f"Nenhum texto encontrado em {PASTA_EXEMPLOS}")
+        return
+    print(f"{len(textos)} textos, {sum(map(len, textos)) // len(textos)} caracteres em média\n")
+    print(f"{'parser':>10} {'termos antigo (us)':>19} {'termos detector (us)':>21} {'ganho':>7} {'parse (us)':>11}")
+
+    for nome, funcao, padroes, detector in PARSERS:
+        parse_us = cronometrar(funcao, textos, args.repeticoes)
+        if detector is None:
+            print(f"{nome:>10} {'-':>19} {'-':>21} {'-':>7} {parse_us:>11.1f}")
+            continue
+        for texto in textos:
+            assert set(termos_antigo(texto, padroes)) == {
+                padrao for chave, padrao in zip(detector.chaves, padroes) if chave in detector.encontrar(texto)
+            }
+        antigo_us = cronometrar(lambda t: termos_antigo(t, padroes), textos, args.repeticoes)
+        novo_us = cronometrar(detector.encontrar, textos, args.repeticoes)
+        print(f"{nome:>10} {antigo_us:>19.1f} {novo_us:>21.1f} {antigo_us / novo_us:>6.1f}x {parse_us:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark da conversão de valores monetários ("1.234,56" -> 1234.56).
+
+Compara, sobre N valores sintéticos (com uma fração de vazios e inválidos):
+  - o limpa_valor antigo, valor a valor (replace encadeados + try/except);
+  - converte_valor, valor a valor;
+  - normalizar_coluna, convertendo a coluna inteira de uma vez.
+
+Uso (a partir de backend/):
+    python -m benchmarks.bench_valores [--valores N]
+"""
+
+import argparse
+import random
+import time
+
+from parsers.valores import converte_valor, normalizar_coluna
+
+
+def limpa_valor_antigo(valor_str):
+    try:
+        if not valor_str:
+            return 0.0
+        valor_str = str(valor_str)
+        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
+        if v != v:
+            return 0.0
+        return v
+    except Exception:
+        return 0.0
+
+
+def gerar_valores(total, semente=42):
+    aleatorio = random.Random(semente)
+    valores = []
+    for _ in range(total):
+        sorteio = aleatorio.random()
+        if sorteio < 0.02:
+            valores.append("")
+        elif sorteio < 0.03:
+            valores.append("N/D")
+        else:
+            inteiro = aleatorio.randint(0, 50_000_000)
+            valores.append(f"{inteiro:,}".replace(",", ".") + f",{aleatorio.randint(0, 99):02d}")
+    return valores
+
+
+def cronometrar(funcao):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--valores', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    valores = gerar_valores(args.valores)
+    antigo, t_antigo = cronometrar(lambda: [limpa_valor_antigo(v) for v in valores])
+    individual, t_individual = cronometrar(lambda: [converte_valor(v) for v in valores])
+    coluna, t_coluna = cronometrar(lambda: normalizar_coluna(valores))
+
+    assert coluna == individual
+    assert [0.0 if v is None else v for v in coluna] == antigo
+    nulos = sum(1 for v in coluna if v is None)
+
+    print(f"{args.valores} valores ({nulos} vazios/inválidos -> None)")
+    for nome, tempo in [("limpa_valor antigo", t_antigo), ("converte_valor", t_individual),
+                        ("normalizar_coluna", t_coluna)]:
+        print(f"  {nome:<20} {tempo:7.3f} s  {tempo * 1e9 / args.valores:7.1f} ns/valor  {t_antigo / tempo:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
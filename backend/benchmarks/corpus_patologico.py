@@ -0,0 +1,83 @@
+"""
+Textos de pior caso para os parsers bancários.
+
+Cada entrada é (parser, nome, gerador): o gerador recebe n e devolve um
+informacoesAdicionais malformado cujo tamanho cresce linearmente com n,
+construído para forçar retrocesso nas expressões de cada parser (âncoras
+repetidas sem o restante do padrão, listas e tabelas que nunca fecham).
+Usado por benchmarks.bench_linearidade.
+"""
+
+from typing import Callable, List, Tuple
+
+CPF = "123.456.789-09"
+CNPJ = "12.345.678/0001-95"
+
+BB_DEPOSITANTES = "Principais remetentes/depositantes identificados:"
+BB_DEBITOS = "Resumo de lançamentos a débito"
+
+
+def _bb_tabela_sem_documento(n: int) -> str:
+    # Nomes separados por hífen em uma única linha, sem CPF/CNPJ: cada posição reabria a varredura da linha
+    return f"{BB_DEPOSITANTES}\n{'FULANO DE TAL - ' * n}\n{BB_DEBITOS}: Total R$ 1,00:"
+
+
+def _bb_tabela_sem_total(n: int) -> str:
+    return f"{BB_DEPOSITANTES}\n{f'FULANO - {CPF} (EMPRESARIO) - ' * n}\n{BB_DEBITOS}"
+
+
+def _bb_cabecalhos_sem_fim(n: int) -> str:
+    return f"{BB_DEPOSITANTES} Resumo de lançamentos a crédito Principais destinatários de recursos identificados: " * n
+
+
+def _bb_titular_sem_cidade(n: int) -> str:
+    return "cadastrado como: FULANO DE TAL, " * n
+
+
+def _bb_tipos_sem_valor(n: int) -> str:
+    return "1" * n + " " + "CREDITO EM CONTA " * n
+
+
+def _bradesco_pracas_sem_cheques(n: int) -> str:
+    # Valor sem vírgula: a lista de praças de cada ocorrência emenda na seguinte
+    return "sendo R$ 1000 por meio de 3 depósitos realizados nas praças de SAO PAULO, CAMPINAS, SANTOS " * n
+
+
+def _bradesco_tabela_sem_fim(n: int) -> str:
+    return "Demonstramos os principais remetentes: 1.000,00 2 FULANO " * n
+
+
+def _bradesco_conjuge_sem_cpf(n: int) -> str:
+    return "cônjuge, FULANO DE TAL " * n
+
+
+def _generico_conta_sem_campo(n: int) -> str:
+    return "conta," * n
+
+
+def _generico_valores_sem_moeda(n: int) -> str:
+    return "renda créditos débitos CampoA " * n
+
+
+def _generico_periodo_sem_fim(n: int) -> str:
+    return "Período: 01/01/2024 " * n
+
+
+def _nubank_valores_sem_moeda(n: int) -> str:
+    return "renda créditos débitos CampoB " * n
+
+
+CORPUS: List[Tuple[str, str, Callable[[int], str]]] = [
+    ('bb', 'tabela_sem_documento', _bb_tabela_sem_documento),
+    ('bb', 'tabela_sem_total', _bb_tabela_sem_total),
+    ('bb', 'cabecalhos_sem_fim', _bb_cabecalhos_sem_fim),
+    ('bb', 'titular_sem_cidade', _bb_titular_sem_cidade),
+    ('bb', 'tipos_sem_valor', _bb_tipos_sem_valor),
+    ('bradesco', 'pracas_sem_cheques', _bradesco_pracas_sem_cheques),
+    ('bradesco', 'tabela_sem_fim', _bradesco_tabela_sem_fim),
+    ('bradesco', 'conjuge_sem_cpf', _bradesco_conjuge_sem_cpf),
+    ('generico', 'conta_sem_campo', _generico_conta_sem_campo),
+    ('generico', 'valores_sem_moeda', _generico_valores_sem_moeda),
+    ('generico', 'periodo_sem_fim', _generico_periodo_sem_fim),
+    ('nubank', 'valores_sem_moeda', _nubank_valores_sem_moeda),
+]
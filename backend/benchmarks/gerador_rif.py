@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Gerador determinístico de RIFs sintéticos (Comunicacoes.csv, Envolvidos.csv
+e Ocorrencias.csv) para benchmarks em escala de produção.
+
+Os textos de informacoesAdicionais seguem os formatos que cada parser
+espera (Banco do Brasil, Bradesco, Nubank e genérico, no segmento 41), com
+comunicações dos segmentos 42 (espécie) e 37 (seguros) misturadas. As
+contrapartes vêm de um conjunto finito de pessoas e empresas, escolhidas
+com distribuição de Pareto (poucas muito frequentes), e os arquivos são
+gravados em cp1252, como os do COAF, linha a linha, sem montar o RIF em
+memória. A mesma semente gera sempre os mesmos bytes.
+
+Uso (a partir de backend/):
+    python -m benchmarks.gerador_rif PASTA [--comunicacoes N] [--semente S]
+"""
+
+import argparse
+import csv
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+COLUNAS_COMUNICACOES = [
+    'Indexador', 'idComunicacao', 'NumeroOcorrenciaBC', 'Data_do_Recebimento', 'Data_da_operacao', 'DataFimFato',
+    'cpfCnpjComunicante', 'nomeComunicante', 'CidadeAgencia', 'UFAgencia', 'NomeAgencia', 'NumeroAgencia',
+    'informacoesAdicionais', 'CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE', 'CodigoSegmento'
+]
+COLUNAS_ENVOLVIDOS = [
+    'Indexador', 'cpfCnpjEnvolvido', 'nomeEnvolvido', 'tipoEnvolvido', 'agenciaEnvolvido', 'contaEnvolvido',
+    'DataAberturaConta', 'DataAtualizacaoConta', 'bitPepCitado', 'bitPessoaObrigadaCitado', 'intServidorCitado'
+]
+COLUNAS_OCORRENCIAS = ['Indexador', 'idOcorrencia', 'Ocorrencia']
+ARQUIVOS = {
+    'comunicacoes': ('Comunicacoes.csv', COLUNAS_COMUNICACOES),
+    'envolvidos': ('Envolvidos.csv', COLUNAS_ENVOLVIDOS),
+    'ocorrencias': ('Ocorrencias.csv', COLUNAS_OCORRENCIAS),
+}
+ENCODING = 'cp1252'
+
+# Participação de cada segmento e, no 41, de cada parser
+SEGMENTOS = (('41', 0.80), ('42', 0.12), ('37', 0.08))
+BANCOS_41 = (('bb', 0.40), ('bradesco', 0.30), ('nubank', 0.10), ('generico', 0.20))
+COMUNICANTES = {
+    'bb': [('00000000000191', 'BANCO DO BRASIL SA')],
+    'bradesco': [('60746948000112', 'BANCO BRADESCO S.A.')],
+    'nubank': [('18236120000158', 'NU PAGAMENTOS S.A. - INSTITUICAO DE PAGAMENTO')],
+    'generico': [('58160789000128', 'Banco Safra S.A.'), ('00360305000104', 'CAIXA ECONÔMICA FEDERAL'),
+                 ('71027866000134', 'Banco BS2 S.A.'), ('27084098000169', 'TRANSFEERA INSTITUICAO DE PAGAMENTO S.A')],
+    'seguros': [('51990695000137', 'Bradesco Vida e Previdência S.A.'),
+                ('92682038000100', 'BRADESCO CAPITALIZACAO S/A')],
+}
+
+PRENOMES = ['JOSE', 'MARIA', 'ANA', 'FRANCISCO', 'ANTONIO', 'JOÃO', 'FRANCISCA', 'CARLOS', 'PAULO', 'LUCAS',
+            'ADRIANA', 'JULIANA', 'MARCOS', 'LUIZ', 'GABRIEL', 'RAFAEL', 'DANIEL', 'MÁRCIA', 'PEDRO', 'SEBASTIÃO',
+            'ALINE', 'FERNANDA', 'PATRÍCIA', 'RAIMUNDO', 'SANDRA', 'GILDECI', 'VALDEMIR', 'ROSÂNGELA']
+SOBRENOMES = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'LIMA', 'PEREIRA', 'FERREIRA', 'COSTA', 'RODRIGUES',
+              'ALMEIDA', 'NASCIMENTO', 'ARAÚJO', 'CARVALHO', 'GOMES', 'MARTINS', 'ROCHA', 'RIBEIRO', 'DANTAS',
+              'CAVALCANTI', 'MEDEIROS', 'FONSECA', 'BEZERRA', 'CONCEIÇÃO', 'MACIEL', 'GURGEL', 'TRINDADE']
+RAMOS = ['COMERCIO VAREJISTA', 'CONSTRUCAO', 'TRANSPORTES', 'DISTRIBUIDORA', 'SERVICOS', 'ENGENHARIA',
+         'ALIMENTOS', 'COMBUSTIVEIS', 'MATERIAIS ELETRICOS', 'INCORPORADORA', 'FOMENTO MERCANTIL', 'AGROPECUARIA']
+SUFIXOS = ['LTDA', 'LTDA ME', 'EIRELI', 'EIRELI - ME', 'S.A.', 'LTDA EPP']
+PROFISSOES = ['VENDEDOR - VENDEDOR PRACISTA E CAIXEIRO VIAJANTE', 'ELETRICISTA - ELETRICISTA E ASSEMELHADOS',
+              'SOCIO - EMPRESARIO', 'PENSIONISTA - PENSIONISTA', 'PROFESSORA DE ENSINO FUNDAMENTAL E MEDIO',
+              'TECNICO DE ENFERMAGEM - TECNICA DE ENFERMAGEM', 'REPRESENTANTE COMERCIAL - REPRESENTANTE COMERCIAL',
+              'APOSENTADO OU PENSIONISTA - APOSENTADO OU PENSIONISTA', 'CONSTRUCAO DE EDIFICIOS',
+              'COMERCIO VAREJISTA DE MATERIAIS DE CONSTRUCAO EM GERAL']
+CIDADES = [('NATAL', 'RN'), ('MOSSORO', 'RN'), ('PARNAMIRIM', 'RN'), ('CAICO', 'RN'), ('CAMPINA GRANDE', 'PB'),
+           ('JOAO PESSOA', 'PB'), ('RECIFE', 'PE'), ('FORTALEZA', 'CE'), ('BELEM', 'PA'), ('SAO PAULO', 'SP'),
+           ('PORTO ALEGRE', 'RS'), ('GOIANIA', 'GO')]
+TIPOS_CREDITO = ['TRANSFERÊNCIAS', 'DOC/TED', 'DEPÓSITOS', 'PIX', 'RESGATE DE APLICAÇÃO', 'JUROS POUPANCA']
+TIPOS_DEBITO = ['SAQUES', 'TRANSFERÊNCIAS', 'COMPRAS', 'PAGAMENTO TITULO', 'PIX', 'IMPOSTOS', 'TARIFAS']
+SUSPEITAS = [
+    'Indícios de sonegação fiscal.',
+    'Há indícios de suposta agiotagem.',
+    'Está utilizando a conta pessoal para movimentar recursos de terceiros.',
+    'Podendo configurar a existência de indícios do crime de lavagem de dinheiro.',
+    '',
+]
+OCORRENCIAS = [
+    ('1008', 'I-a) depósitos, aportes, saques, pedidos de provisionamento para saque ou qualquer outro instrumento '
+             'de transferência de recursos em espécie, que apresentem atipicidade em relação à atividade econômica '
+             'do cliente. Banco Central do Brasil - Carta-Circular nº 4.001/2020, art. 1º'),
+    ('1012', 'I-e) fragmentação de saques em espécie, a fim de burlar limites regulatórios de reportes. '
+             'Banco Central do Brasil - Carta-Circular nº 4.001/2020, art. 1º'),
+    ('1040', 'III-j) incompatibilidade da atividade econômica ou faturamento informados com o padrão apresentado '
+             'por clientes com o mesmo perfil. Banco Central do Brasil - Carta-Circular nº 4.001/2020, art. 1º'),
+    ('1045', 'IV-a) movimentação de recursos incompatível com o patrimônio, a atividade econômica ou a ocupação '
+             'profissional e a capacidade financeira do cliente. Banco Central do Brasil - Carta-Circular nº '
+             '4.001/2020, art. 1º'),
+    ('1047', 'IV-c) movimentação de recursos de alto valor, de forma contumaz, em benefício de terceiros. '
+             'Banco Central do Brasil - Carta-Circular nº 4.001/2020, art. 1º'),
+    ('1092', 'V-a) movimentações financeiras com indícios de burla aos controles de identificação do beneficiário '
+             'final. Banco Central do Brasil - Carta-Circular nº 4.001/2020, art. 1º'),
+]
+# Rodapé descritivo que o COAF acrescenta ao Comunicacoes.csv (ignorado na ingestão)
+RODAPE = [
+    '#COMENTÁRIOS SOBRE OS CAMPOS DE VALORES',
+    '37 - SUSEP - Mercado Segurador: CampoA = Valor da Operação, CampoB = Valor do Prêmio/Contribuição/Devolução , '
+    'CampoC = Quantidade, ',
+    '41 - SFN - Atípicas: CampoA = Total, CampoB = Valor do Crédito, CampoC = Valor do Débito, '
+    'CampoD = Valor do Provisionamento, CampoE = Valor da Proposta, ',
+    '42 - SFN - Espécie: CampoA = Total, CampoB = Valor do Crédito, CampoC = Valor do Débito, '
+    'CampoD = Valor do Provisionamento, CampoE = Valor da Proposta, ',
+]
+DATA_BASE = date(2019, 1, 1)
+
+
+def _pesos_cnpj(tamanho: int) -> List[int]:
+    return [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2] if tamanho == 12 else [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def cpf(numero: int) -> str:
+    """CPF válido (11 dígitos) derivado de um número"""
+    base = f'{numero % 10 ** 9:09d}'
+    for _ in range(2):
+        soma = sum(int(d) * p for d, p in zip(base, range(len(base) + 1, 1, -1)))
+        resto = soma % 11
+        base += '0' if resto < 2 else str(11 - resto)
+    return base
+
+
+def cnpj(numero: int) -> str:
+    """CNPJ válido (14 dígitos, matriz) derivado de um número"""
+    base = f'{numero % 10 ** 8:08d}0001'
+    for _ in range(2):
+        soma = sum(int(d) * p for d, p in zip(base, _pesos_cnpj(len(base))))
+        resto = soma % 11
+        base += '0' if resto < 2 else str(11 - resto)
+    return base
+
+
+def formatar_documento(documento: str, estilo: str) -> str:
+    """Documento como cada banco escreve: 'bb' (pontuado), 'bradesco' (CNPJ com 9 dígitos na raiz) ou 'digitos'"""
+    if estilo == 'digitos':
+        return documento
+    if len(documento) == 11:
+        if estilo == 'bradesco':
+            return f'{documento[:9]}-{documento[9:]}'
+        return f'{documento[:3]}.{documento[3:6]}.{documento[6:9]}-{documento[9:]}'
+    if estilo == 'bradesco':
+        return f'0{documento[:8]}/{documento[8:12]}-{documento[12:]}'
+    return f'{documento[:2]}.{documento[2:5]}.{documento[5:8]}/{documento[8:12]}-{documento[12:]}'
+
+
+def formatar_valor(valor: float) -> str:
+    """1234567.8 -> '1.234.567,80'"""
+    return f'{valor:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+class Populacao:
+    """Pessoas e empresas do RIF, calculadas a partir do índice (memória constante)"""
+
+    def __init__(self, tamanho: int, semente: int):
+        self.tamanho = max(tamanho, 10)
+        self.deslocamento = semente * 7919
+
+    def pessoa(self, i: int) -> Tuple[str, str]:
+        """(documento, nome); índices pares são pessoas físicas e ímpares, empresas"""
+        i %= self.tamanho
+        n = i + self.deslocamento
+        if i % 2 == 0:
+            nome = (f'{PRENOMES[n % len(PRENOMES)]} {SOBRENOMES[(n // 7) % len(SOBRENOMES)]} '
+                    f'{SOBRENOMES[(n // 131) % len(SOBRENOMES)]}')
+            return cpf(n * 104729 + 11), nome
+        nome = (f'{SOBRENOMES[(n // 3) % len(SOBRENOMES)]} {RAMOS[n % len(RAMOS)]} '
+                f'{SUFIXOS[(n // 11) % len(SUFIXOS)]}')
+        return cnpj(n * 7727 + 3), nome
+
+    def contraparte(self, aleatorio: random.Random) -> Tuple[str, str]:
+        """Metade das contrapartes segue uma distribuição de Pareto (os primeiros índices
+        concentram os vínculos, como órgãos públicos e adquirentes); a outra metade é uniforme"""
+        if aleatorio.random() < 0.5:
+            return self.pessoa(min(int(aleatorio.paretovariate(1.1)) - 1, self.tamanho - 1))
+        return self.pessoa(aleatorio.randrange(self.tamanho))
+
+    def pessoa_fisica(self, aleatorio: random.Random) -> Tuple[str, str]:
+        return self.pessoa(aleatorio.randrange(0, self.tamanho, 2))
+
+
+def _escolher(aleatorio: random.Random, opcoes):
+    x = aleatorio.random()
+    for valor, peso in opcoes:
+        x -= peso
+        if x < 0:
+            return valor
+    return opcoes[-1][0]
+
+
+def _partes(aleatorio: random.Random, total: float, quantidade: int) -> List[float]:
+    pesos = [aleatorio.random() + 0.1 for _ in range(quantidade)]
+    soma = sum(pesos)
+    return [round(total * p / soma, 2) for p in pesos]
+
+
+def texto_bb(aleatorio, titular, cidade, inicio, fim, contrapartes, relacionado) -> str:
+    creditos = round(aleatorio.uniform(5e4, 5e6), 2)
+    debitos = round(creditos * aleatorio.uniform(0.8, 1.05), 2)
+    agencia = aleatorio.randint(1, 9999)
+    tipos_c = aleatorio.sample(TIPOS_CREDITO, 3)
+    tipos_d = aleatorio.sample(TIPOS_DEBITO, 3)
+    metade = len(contrapartes) // 2
+    socio = '' if len(titular[0]) == 11 else (
+        f'Sócio/Dirigente: {relacionado[1]} - {formatar_documento(relacionado[0], "bb")}  ')
+
+    def tabela(pessoas, total):
+        return '  '.join(
+            f'{nome} - {formatar_documento(doc, "bb")} ( {aleatorio.choice(PROFISSOES)} ) -  '
+            f'{aleatorio.randint(1, 60)} lançamento(s) no total de: R${formatar_valor(valor)}'
+            for (doc, nome), valor in zip(pessoas, _partes(aleatorio, total * 0.6, len(pessoas)))
+        )
+
+    return (
+        f'Período analisado: {inicio:%d/%m/%Y} - {fim:%d/%m/%Y}  Trata-se de cliente deste Banco desde '
+        f'{inicio - timedelta(days=aleatorio.randint(400, 6000)):%d/%m/%Y}, cadastrado como:  '
+        f'{aleatorio.choice(PROFISSOES)}, percebendo rendimentos de R$ {formatar_valor(aleatorio.uniform(1300, 25000))}  '
+        f'residente na cidade de {cidade[0]}/{cidade[1]}.  {socio}    Contas analisadas:  {agencia:04d}/'
+        f'{aleatorio.randint(1, 99)}.{aleatorio.randint(100, 999)}    Resumo de lançamentos a crédito no período de '
+        f'{inicio:%d/%m/%Y} - {fim:%d/%m/%Y} | Total R$ {formatar_valor(creditos)}:   '
+        + '   '.join(f'{aleatorio.randint(1, 300)} {tipo} - R$ {formatar_valor(valor)}'
+                     for tipo, valor in zip(tipos_c, _partes(aleatorio, creditos, 3)))
+        + f'     Principais remetentes/depositantes identificados:   {tabela(contrapartes[:metade], creditos)}'
+        f'     Resumo de lançamentos a débito no período de {inicio:%d/%m/%Y} - {fim:%d/%m/%Y} | '
+        f'Total R$ {formatar_valor(debitos)}:   '
+        + '   '.join(f'{aleatorio.randint(1, 300)} {tipo} - R$ {formatar_valor(valor)}'
+                     for tipo, valor in zip(tipos_d, _partes(aleatorio, debitos, 3)))
+        + f'     Principais destinatários de recursos identificados:   {tabela(contrapartes[metade:], debitos)}'
+        f'  Segundo informações, realizou diversos saques em espécie. {aleatorio.choice(SUSPEITAS)}   '
+        f'Movimentação no período não é compatível com os dados cadastrais do cliente, {titular[1]}.'
+    )
+
+
+def texto_bradesco(aleatorio, titular, cidade, inicio, fim, contrapartes, relacionado) -> str:
+    creditos = round(aleatorio.uniform(5e4, 5e6), 2)
+    debitos = round(creditos * aleatorio.uniform(0.8, 1.05), 2)
+    depositos, cheques, especie, transferencias = _partes(aleatorio, creditos, 4)
+    terco = max(len(contrapartes) // 3, 1)
+    pracas = ', '.join(f'{c.title()}-{uf}' for c, uf in aleatorio.sample(CIDADES, aleatorio.randint(1, 4)))
+
+    def tabela(pessoas, total, prefixo=''):
+        return ' '.join(
+            f'{prefixo}{formatar_valor(valor)} {aleatorio.randint(1, 40):02d} {nome.title()} '
+            f'{formatar_documento(doc, "bradesco")} Bradesco ({aleatorio.randint(1000, 9999)}/{aleatorio.randint(1000, 99999)})'
+            for (doc, nome), valor in zip(pessoas, _partes(aleatorio, total * 0.5, len(pessoas)))
+        )
+
+    boletos = ''
+    if aleatorio.random() < 0.3:
+        boletos = (
+            ' - Por amostragem, em pagamentos de boletos de cobrança a terceiros e por amostragem, demonstramos os '
+            'principais pagadores/sacados registrados na emissão dos boletos: VALOR R$ QTDE NOME SACADO CPF/CNPJ SACADO '
+            + ' '.join(f'R${formatar_valor(aleatorio.uniform(500, 50000))} {aleatorio.randint(1, 9):02d} {nome.title()} '
+                       f'{formatar_documento(doc, "bradesco")}' for doc, nome in contrapartes[-terco:])
+            + ' Cliente informou que os boletos são de fornecedores.'
+        )
+    renda = (f'com renda mensal de R$ {formatar_valor(aleatorio.uniform(1500, 30000))}' if len(titular[0]) == 11 else
+             f'com faturamento médio mensal de R$ {formatar_valor(aleatorio.uniform(5e4, 2e6))}')
+    return (
+        f'Consta atuar como {aleatorio.choice(PROFISSOES).lower()}, {renda}.   Nota: Consta como cônjuge, '
+        f'{relacionado[1].title()}, CPF {formatar_documento(relacionado[0], "bradesco")}.    Entre {inicio:%d.%m.%Y} e '
+        f'{fim:%d.%m.%Y} os créditos somaram R$ {formatar_valor(creditos)}, sendo R$ {formatar_valor(depositos)} '
+        f'por meio de {aleatorio.randint(5, 900)} depósitos realizados nas praças de {pracas}, destes, '
+        f'R$ {formatar_valor(cheques)} depositados em cheques, {aleatorio.randint(1, 300)} transações, '
+        f'R$ {formatar_valor(especie)} constando como efetuados em espécie, {aleatorio.randint(1, 300)} transação(ões) e '
+        f'R$ {formatar_valor(transferencias)} provenientes de {aleatorio.randint(1, 2000)} TEDs, DOCs, PIXs e '
+        f'transferências entre contas. Demonstramos os principais remetentes:   VALOR R$ QTDE REMETENTE CPF/CNPJ BANCO '
+        f'{tabela(contrapartes[:terco], creditos)}   Os débitos, em igual período, totalizaram '
+        f'R$ {formatar_valor(debitos)}, dos quais R$ {formatar_valor(debitos * 0.3)} utilizados para pagamentos '
+        f'diversos, {aleatorio.randint(1, 300)} transações e R$ {formatar_valor(debitos * 0.6)} destinados para '
+        f'quitação de {aleatorio.randint(1, 900)} TEDs, DOCs, PIXs, transferências e depósitos em contas. Demonstramos '
+        f'os principais favorecidos:   VALOR R$ QTDE FAVORECIDOS  CPF/CNPJ BANCO '
+        f'{tabela(contrapartes[terco:len(contrapartes) - terco], debitos)}   Notas:{boletos}'
+        f'  - Em consulta externa identificamos que o cliente possui vínculo empregatício com a empresa '
+        f'{contrapartes[-1][1].title()}, CNPJ {formatar_documento(contrapartes[-1][0], "bradesco")}.  '
+        f'{aleatorio.choice(SUSPEITAS)}    Diante do exposto, identificamos movimentação incompatível com a renda '
+        f'declarada de {titular[1].title()}.'
+    )
+
+
+def texto_nubank(aleatorio, titular, cidade, inicio, fim, contrapartes, relacionado) -> str:
+    creditos = round(aleatorio.uniform(1e4, 1e6), 2)
+    debitos = round(creditos * aleatorio.uniform(0.8, 1.05), 2)
+    return (
+        f'Informações básicas de cadastro PF: Conta de pagamento em nome de {titular[1].title()}, CPF '
+        f'{formatar_documento(titular[0], "bb")}, residente em {cidade[0].title()} - {cidade[1]}.  '
+        f'- Cliente na categoria conta de pagamentos desde: {inicio - timedelta(days=aleatorio.randint(30, 2000)):%d/%m/%Y} '
+        f'Informações de atualização cadastral: - Renda informada pelo cliente: R$ '
+        f'{formatar_valor(aleatorio.uniform(1300, 15000))}.  Movimentações do Cliente:  - Período analisado: '
+        f'Entre {inicio:%d/%m/%Y} e {fim:%d/%m/%Y}.  -  Total dos créditos: R$ {formatar_valor(creditos)}.   '
+        '- Origem dos créditos, sendo as principais contrapartes: '
+        + ' '.join(f'- {aleatorio.uniform(1, 30):.2f}% (R$ {formatar_valor(valor)} em {aleatorio.randint(1, 40)} '
+                   f'transação(ões)) via {"CPF" if len(doc) == 11 else "CNPJ"} {doc} ({nome.title()})'
+                   for (doc, nome), valor in zip(contrapartes, _partes(aleatorio, creditos * 0.5, len(contrapartes))))
+        + f'  -  Total dos débitos: R$ {formatar_valor(debitos)}.  {aleatorio.choice(SUSPEITAS)}'
+    )
+
+
+def texto_generico(aleatorio, titular, cidade, inicio, fim, contrapartes, relacionado) -> str:
+    creditos = round(aleatorio.uniform(1e4, 3e6), 2)
+    debitos = round(creditos * aleatorio.uniform(0.8, 1.05), 2)
+    return (
+        f'Trata-se de conta em nome de {titular[1]}, CPF/CNPJ {formatar_documento(titular[0], "bb")}, com sede em '
+        f'{cidade[0]}/{cidade[1]}, cliente desde {inicio - timedelta(days=aleatorio.randint(30, 4000)):%d/%m/%Y}. '
+        f'Renda declarada de R$ {formatar_valor(aleatorio.uniform(1300, 50000))}.  Entre {inicio:%d/%m/%Y} e '
+        f'{fim:%d/%m/%Y} os créditos em conta totalizaram R$ {formatar_valor(creditos)} correspondentes a '
+        f'{aleatorio.randint(10, 2000)} transações.  No mesmo período os débitos totalizaram R$ '
+        f'{formatar_valor(debitos)} referente transferências ({aleatorio.randint(1, 50)} TED e '
+        f'{aleatorio.randint(1, 400)} PIX). Principais contrapartes: '
+        + ', '.join(f'{nome} ({formatar_documento(doc, "bb")})' for doc, nome in contrapartes)
+        + f'. {aleatorio.choice(SUSPEITAS)}'
+    )
+
+
+TEXTOS = {'bb': texto_bb, 'bradesco': texto_bradesco, 'nubank': texto_nubank, 'generico': texto_generico}
+
+
+def texto_especie(aleatorio, titular, valor: float) -> str:
+    return (f'Depósito em espécie de R$ {formatar_valor(valor)} em favor de {titular[1]}, realizado em '
+            f'{aleatorio.randint(1, 6)} operação(ões) no caixa da agência, sem comprovação da origem dos recursos.')
+
+
+def texto_seguro(aleatorio, titular, valor: float) -> str:
+    return (f'Resgate antecipado de plano de previdência de {titular[1]} no valor de R$ {formatar_valor(valor)}, '
+            f'{aleatorio.randint(1, 24)} meses após a contratação.')
+
+
+def gerar_linhas(comunicacoes: int, semente: int = 42) -> Iterator[Tuple[str, list]]:
+    """Linhas do RIF, na ordem em que são gravadas, como (arquivo, valores)"""
+    aleatorio = random.Random(semente)
+    populacao = Populacao(max(comunicacoes // 2, 50), semente)
+    for indexador in range(1, comunicacoes + 1):
+        segmento = _escolher(aleatorio, SEGMENTOS)
+        banco = _escolher(aleatorio, BANCOS_41) if segmento == '41' else None
+        comunicante = aleatorio.choice(COMUNICANTES[banco or ('seguros' if segmento == '37' else 'generico')])
+        titular = populacao.pessoa(aleatorio.randrange(populacao.tamanho))
+        cidade = aleatorio.choice(CIDADES)
+        inicio = DATA_BASE + timedelta(days=aleatorio.randint(0, 1800))
+        fim = inicio + timedelta(days=aleatorio.randint(30, 360))
+        recebimento = fim + timedelta(days=aleatorio.randint(1, 20))
+        contrapartes, relacionado = [], None
+        if segmento == '41':
+            quantidade = aleatorio.randint(4, 12)
+            contrapartes = list(dict.fromkeys(populacao.contraparte(aleatorio) for _ in range(quantidade)))
+            while len(contrapartes) < 4:
+                contrapartes.append(populacao.pessoa(aleatorio.randrange(populacao.tamanho)))
+            # Cônjuge (Bradesco) ou sócio de titular pessoa jurídica (Banco do Brasil)
+            relacionado = populacao.pessoa_fisica(aleatorio)
+            texto = TEXTOS[banco](aleatorio, titular, cidade, inicio, fim, contrapartes, relacionado)
+            if banco not in ('bb', 'bradesco'):
+                relacionado = None
+            credito = round(aleatorio.uniform(5e4, 5e6), 0)
+            debito = round(credito * aleatorio.uniform(0.8, 1.05), 0)
+            campos = [credito + debito, credito, debito, 0, 0]
+        elif segmento == '42':
+            valor = round(aleatorio.uniform(1e4, 5e5), 2)
+            texto = texto_especie(aleatorio, titular, valor)
+            campos = [valor, valor, 0, 0, 0]
+        else:
+            valor = round(aleatorio.uniform(1e4, 1e6), 2)
+            texto = texto_seguro(aleatorio, titular, valor)
+            campos = [valor, valor * 0.1, 1, 0, 0]
+        yield 'comunicacoes', [
+            indexador, 19000000 + indexador * 7 + semente % 7, f'{recebimento:%Y%m%d}{indexador % 100000:05d}',
+            f'{recebimento:%d/%m/%Y} {aleatorio.randint(8, 18):02d}:{aleatorio.randint(0, 59):02d}:00',
+            f'{inicio:%d/%m/%Y}', f'{fim:%d/%m/%Y}', comunicante[0], comunicante[1], cidade[0], cidade[1],
+            f'AG {cidade[0]}', aleatorio.randint(1, 9999), texto, *map(formatar_valor, campos), segmento,
+        ]
+        agencia, conta = aleatorio.randint(1, 9999), aleatorio.randint(1000, 999999)
+        abertura = inicio - timedelta(days=aleatorio.randint(100, 5000))
+        yield 'envolvidos', [indexador, formatar_documento(titular[0], 'bb'), titular[1], 'Titular', agencia, conta,
+                             f'{abertura:%d/%m/%Y}', f'{fim:%d/%m/%Y}', '-', 'Não', '-']
+        for j, (documento, nome) in enumerate(contrapartes):
+            papel = 'Remetente' if j < len(contrapartes) // 2 else 'Beneficiário'
+            yield 'envolvidos', [indexador, formatar_documento(documento, 'bb'), nome, papel,
+                                 '-', '-', '-', '-', '-', 'Não', '-']
+        if relacionado:
+            yield 'envolvidos', [indexador, formatar_documento(relacionado[0], 'bb'), relacionado[1], 'Outros',
+                                 '-', '-', '-', '-', '-', 'Não', '-']
+        if aleatorio.random() < 0.1:
+            procurador = populacao.pessoa_fisica(aleatorio)
+            yield 'envolvidos', [indexador, formatar_documento(procurador[0], 'bb'), procurador[1],
+                                 'Procurador / Representante Legal', agencia, conta, '-', '-', '-', 'Não', '-']
+        for codigo, descricao in aleatorio.sample(OCORRENCIAS, aleatorio.randint(1, 3)):
+            yield 'ocorrencias', [indexador, codigo, descricao]
+
+
+def gerar_rif(pasta: str, comunicacoes: int, semente: int = 42) -> Dict[str, str]:
+    """Grava a tripla de CSVs em `pasta` e devolve os caminhos por chave ('comunicacoes', ...)"""
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = {chave: os.path.join(pasta, nome) for chave, (nome, _) in ARQUIVOS.items()}
+    arquivos = {chave: open(caminho, 'w', encoding=ENCODING, newline='') for chave, caminho in caminhos.items()}
+    try:
+        escritores = {chave: csv.writer(f, delimiter=';', lineterminator='\n') for chave, f in arquivos.items()}
+        for chave, (_, colunas) in ARQUIVOS.items():
+            escritores[chave].writerow(colunas)
+        for chave, valores in gerar_linhas(comunicacoes, semente):
+            escritores[chave].writerow(valores)
+        for linha in RODAPE:
+            arquivos['comunicacoes'].write(linha + '\n')
+    finally:
+        for f in arquivos.values():
+            f.close()
+    return caminhos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pasta')
+    parser.add_argument('--comunicacoes', type=int, default=1000)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    caminhos = gerar_rif(args.pasta, args.comunicacoes, args.semente)
+    tempo = time.perf_counter() - inicio
+    for chave, caminho in caminhos.items():
+        print(f"  {os.path.basename(caminho)}: {os.path.getsize(caminho) / 1e6:.1f} MB")
+    print(f"{args.comunicacoes} comunicações geradas em {tempo:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
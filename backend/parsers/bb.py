@@ -1,18 +1,72 @@
 import re
+from bisect import bisect_left
 from collections import defaultdict
 
-def limpa_valor(valor_str):
-    try:
-        if not valor_str:
-            return 0.0
-        # Garantir que é string
-        valor_str = str(valor_str)
-        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
-        if v != v:
-            return 0.0
-        return v
-    except Exception:
-        return 0.0
+from parsers.padroes import registrar, CPF_CNPJ, NOTAS, DetectorTermos, PadraoAncorado
+from parsers.valores import limpa_valor
+
+# Titular e cidade eram um único padrão (`cadastrado como:...,.*residente na cidade de ...`),
+# cujo `.*` reabria a linha a cada "cadastrado como:"; agora são buscados em separado
+TITULAR = registrar('bb.titular', r'cadastrado como:([\w\s\-]+),', re.IGNORECASE)
+CIDADE = registrar('bb.cidade', r'residente na cidade de ([^\.\n]+)', re.IGNORECASE)
+INICIO_CIDADE = registrar('bb.inicio_cidade', r'(?=residente na cidade de [^\.\n])', re.IGNORECASE)
+RENDA_MENSAL = registrar('bb.renda_mensal', r'rendimentos de R\$\s*([\d\.,]+)', re.IGNORECASE)
+SOCIO_DIRETOR = registrar('bb.socio_diretor', r'Sócio/Dirigente\s*:\s*([\w\s\-\.]+)-\s*([\d\./\-]+)')
+CONTAS = registrar('bb.contas', r'(\d{4})\s*/\s*([\d\.]+)')
+PERIODO = registrar('bb.periodo', r'Período analisado: (\d{2}/\d{2}/\d{4}) - (\d{2}/\d{2}/\d{4})')
+CREDITOS_TOTAL = PadraoAncorado('bb.creditos_total', r'Resumo de lançamentos a crédito.*?Total R\$ ([\d\.,]+):', re.DOTALL)
+# Começa em um número inteiro (não no meio dele) e sem \s antes do hífen, que a classe já cobre
+TIPOS_LANCAMENTO = registrar('bb.tipos_lancamento', r'(?<!\d)(\d+)\s([A-Z\s/\(\)]+)-\s*R\$\s*([\d\.,]+)')
+TABELA_DEPOSITANTES = PadraoAncorado('bb.tabela_depositantes', r'Principais remetentes/depositantes identificados:(.+?)Resumo de lançamentos a débito', re.DOTALL)
+DEBITOS_TOTAL = PadraoAncorado('bb.debitos_total', r'Resumo de lançamentos a débito.*?Total R\$ ([\d\.,]+):', re.DOTALL)
+TABELA_DESTINATARIOS = PadraoAncorado('bb.tabela_destinatarios', r'Principais destinatários de recursos identificados:(.+?)Movimentação no período', re.DOTALL)
+# Linha da tabela a partir do hífen antes do CPF/CNPJ; o nome é o que vem antes, na mesma linha
+FIM_LINHA_TABELA = registrar('bb.fim_linha_tabela', rf'-\s*{CPF_CNPJ}\s*\(([^)]+)\)\s*-\s*(\d+) lançamento\(s\) no total de: R\$([\d\.,]+)')
+INFORMACOES_FINAIS = registrar('bb.informacoes_finais', r'Movimentação no período não é compatível(.+)', re.DOTALL)
+
+PADROES_CRIME = [r'agiotagem', r'lavagem', r'fraude', r'crime', r'ilícit[oa]', r'ind[ií]cio', r'suspeita', r'corrupção', r'doleir', r'caixa dois', r'sonega', r'pessoa jurídica em conta de pessoa física']
+DETECTOR_CRIMES = DetectorTermos('bb.crimes', [(p, p) for p in PADROES_CRIME])
+
+def titular_cidade(texto):
+    """(titular, cidade) do primeiro "cadastrado como: NOME," cuja linha traz depois
+    "residente na cidade de"; a cidade é a da última ocorrência na linha"""
+    inicios = None
+    for m in TITULAR.finditer(texto):
+        if inicios is None:
+            inicios = [c.start() for c in INICIO_CIDADE.finditer(texto)]
+        fim_linha = texto.find('\n', m.end())
+        i = bisect_left(inicios, fim_linha if fim_linha >= 0 else len(texto)) - 1
+        if i >= 0 and inicios[i] >= m.end():
+            return m.group(1), CIDADE.match(texto, inicios[i]).group(1)
+    return None
+
+
+def linhas_tabela(trecho):
+    """(nome, cpf_cnpj, profissão, quantidade, valor) de cada linha de uma tabela.
+
+    Equivale ao antigo findall de `(.+?)\\s*-\\s*CPF...`, que reabria a varredura da
+    linha em cada posição: localiza primeiro o final (do hífen antes do CPF/CNPJ em
+    diante) e toma como nome o trecho da linha anterior a ele, desde o fim da
+    linha de tabela anterior.
+    """
+    linhas = []
+    inicio = 0
+    for m in FIM_LINHA_TABELA.finditer(trecho):
+        # O nome termina onde começam os espaços (inclusive quebras de linha) antes do hífen
+        fim_nome = m.start()
+        while fim_nome > inicio and trecho[fim_nome - 1].isspace():
+            fim_nome -= 1
+        comeco = max(inicio, trecho.rfind('\n', 0, fim_nome) + 1)
+        if comeco < fim_nome:
+            nome = trecho[comeco:fim_nome]
+        elif trecho[max(inicio, fim_nome):m.start()].strip('\n'):
+            nome = ''
+        else:
+            continue
+        linhas.append((nome,) + m.groups())
+        inicio = m.end()
+    return linhas
+
 
 def parse_bb(texto):
     resultado = {
@@ -38,38 +92,38 @@ def parse_bb(texto):
     }
 
     # Titular e cidade
-    m = re.search(r'cadastrado como:\s*([\w\s\-]+),.*residente na cidade de ([^\.\n]+)', texto, re.IGNORECASE)
-    if m:
-        resultado['titular'] = m.group(1).strip()
-        resultado['cidade'] = m.group(2).strip()
+    encontrado = titular_cidade(texto)
+    if encontrado:
+        resultado['titular'] = encontrado[0].strip()
+        resultado['cidade'] = encontrado[1].strip()
 
     # Renda mensal
-    m = re.search(r'rendimentos de R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = RENDA_MENSAL.search(texto)
     if m:
         resultado['renda_mensal'] = limpa_valor(m.group(1))
 
     # Sócio/Dirigente
-    m = re.search(r'Sócio/Dirigente\s*:\s*([\w\s\-\.]+)\s*-\s*([\d\./\-]+)', texto)
+    m = SOCIO_DIRETOR.search(texto)
     if m:
         resultado['socio_diretor'] = {'nome': m.group(1).strip(), 'cpf_cnpj': m.group(2).strip()}
 
     # Contas analisadas
-    contas = re.findall(r'(\d{4})\s*/\s*([\d\.]+)', texto)
+    contas = CONTAS.findall(texto)
     resultado['contas'] = [f"{ag}/{cc}" for ag, cc in contas]
 
     # Período
-    m = re.search(r'Período analisado: (\d{2}/\d{2}/\d{4}) - (\d{2}/\d{2}/\d{4})', texto)
+    m = PERIODO.search(texto)
     if m:
         resultado['periodo'] = {'inicio': m.group(1), 'fim': m.group(2)}
 
     # Créditos totais
-    m = re.search(r'Resumo de lançamentos a crédito.*?Total R\$ ([\d\.,]+):', texto, re.DOTALL)
+    m = CREDITOS_TOTAL.search(texto)
     if m:
         resultado['creditos']['total'] = limpa_valor(m.group(1))
 
-    # Créditos por tipo
-    tipos_credito = re.findall(r'(\d+)\s+([A-Z\s/\(\)]+)\s*-\s*R\$\s*([\d\.,]+)', texto)
-    for qtde, tipo, valor in tipos_credito:
+    # Créditos por tipo (a mesma varredura alimenta os débitos por tipo)
+    tipos_lancamento = TIPOS_LANCAMENTO.findall(texto)
+    for qtde, tipo, valor in tipos_lancamento:
         resultado['creditos']['tipos'].append({
             'tipo': tipo.strip(),
             'quantidade': int(qtde),
@@ -77,11 +131,9 @@ def parse_bb(texto):
         })
 
     # Principais remetentes/depositantes
-    m = re.search(r'Principais remetentes/depositantes identificados:(.+?)Resumo de lançamentos a débito', texto, re.DOTALL)
+    m = TABELA_DEPOSITANTES.search(texto)
     if m:
-        tabela = m.group(1)
-        cpf_cnpj_pattern = r'(\d{3}\.\d{3}\.\d{3}-\d{2}|\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{2}\.\d{3}\.\d{3}-\d{2}|\d{3}\.\d{3}\.\d{3}/\d{4}-\d{2})'
-        linhas = re.findall(rf'(.+?)\s*-\s*{cpf_cnpj_pattern}\s*\(([^)]+)\)\s*-\s*(\d+) lançamento\(s\) no total de: R\$([\d\.,]+)', tabela)
+        linhas = linhas_tabela(m.group(1))
         for nome, cpf_cnpj, profissao, qtde, valor in linhas:
             resultado['creditos']['principais_depositantes'].append({
                 'nome': nome.strip(),
@@ -92,13 +144,12 @@ def parse_bb(texto):
             })
 
     # Débitos totais
-    m = re.search(r'Resumo de lançamentos a débito.*?Total R\$ ([\d\.,]+):', texto, re.DOTALL)
+    m = DEBITOS_TOTAL.search(texto)
     if m:
         resultado['debitos']['total'] = limpa_valor(m.group(1))
 
     # Débitos por tipo
-    tipos_debito = re.findall(r'(\d+)\s+([A-Z\s/\(\)]+)\s*-\s*R\$\s*([\d\.,]+)', texto)
-    for qtde, tipo, valor in tipos_debito:
+    for qtde, tipo, valor in tipos_lancamento:
         resultado['debitos']['tipos'].append({
             'tipo': tipo.strip(),
             'quantidade': int(qtde),
@@ -106,11 +157,9 @@ def parse_bb(texto):
         })
 
     # Principais destinatários
-    m = re.search(r'Principais destinatários de recursos identificados:(.+?)Movimentação no período', texto, re.DOTALL)
+    m = TABELA_DESTINATARIOS.search(texto)
     if m:
-        tabela = m.group(1)
-        cpf_cnpj_pattern = r'(\d{3}\.\d{3}\.\d{3}-\d{2}|\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{2}\.\d{3}\.\d{3}-\d{2}|\d{3}\.\d{3}\.\d{3}/\d{4}-\d{2})'
-        linhas = re.findall(rf'(.+?)\s*-\s*{cpf_cnpj_pattern}\s*\(([^)]+)\)\s*-\s*(\d+) lançamento\(s\) no total de: R\$([\d\.,]+)', tabela)
+        linhas = linhas_tabela(m.group(1))
         for nome, cpf_cnpj, profissao, qtde, valor in linhas:
             resultado['debitos']['principais_destinatarios'].append({
                 'nome': nome.strip(),
@@ -121,21 +170,17 @@ def parse_bb(texto):
             })
 
     # Notas
-    notas = re.findall(r'- ([^-]+)', texto)
+    notas = NOTAS.findall(texto)
     resultado['notas'] = [n.strip() for n in notas]
 
     # Informações finais
-    m = re.search(r'Movimentação no período não é compatível(.+)', texto, re.DOTALL)
+    m = INFORMACOES_FINAIS.search(texto)
     if m:
         resultado['informacoes_finais'].append(m.group(1).strip())
 
-    # Possíveis crimes
-    crimes = []
-    padroes_crime = [r'agiotagem', r'lavagem', r'fraude', r'crime', r'ilícit[oa]', r'ind[ií]cio', r'suspeita', r'corrupção', r'doleir', r'caixa dois', r'sonega', r'pessoa jurídica em conta de pessoa física']
-    for p in padroes_crime:
-        if re.search(p, texto, re.IGNORECASE):
-            crimes.append(p)
+    # Possíveis crimes (todos os termos em uma única varredura)
+    crimes = DETECTOR_CRIMES.filtrar(texto)
     if crimes:
-        resultado['possiveis_crimes'] = list(set([c.lower() for c in crimes]))
+        resultado['possiveis_crimes'] = list(dict.fromkeys(c.lower() for c in crimes))
 
     return resultado 
\ No newline at end of file
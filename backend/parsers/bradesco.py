@@ -1,24 +1,50 @@
 import re
 from collections import defaultdict
 
-def limpa_valor(valor_str):
-    try:
-        if not valor_str:
-            return 0.0
-        # Garantir que é string
-        valor_str = str(valor_str)
-        # Remover underscores e outros caracteres especiais
-        valor_str = valor_str.replace('_', '').replace(' ', '')
-        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
-        if v != v:  # NaN check
-            return 0.0
-        return v
-    except Exception:
-        return 0.0
+from parsers.padroes import registrar, NOTAS, DetectorTermos, PadraoAncorado
+from parsers.valores import limpa_valor
+
+ESPACOS = registrar('bradesco.espacos', r'\s+')
+CONJUGE = registrar('bradesco.conjuge', r'cônjuge,\s*([\w\s\.\-]+),\s*CPF\s*([\d\-\.]+)', re.IGNORECASE)
+RENDA_MENSAL = registrar('bradesco.renda_mensal', r'renda mensal de R\$\s*([\d\.,]+)', re.IGNORECASE)
+FATURAMENTO_MENSAL = registrar('bradesco.faturamento_mensal', r'faturamento (?:médio )?mensal de R\$\s*([\d\.,]+)', re.IGNORECASE)
+PERIODO = registrar('bradesco.periodo', r'Entre (\d{2}\.\d{2}\.\d{4}) e (\d{2}\.\d{2}\.\d{4})')
+CREDITOS_TOTAL = registrar('bradesco.creditos_total', r'os créditos somaram R\$\s*([\d\.,]+)')
+INICIO_DEPOSITOS = r'sendo R\$ ([\d\.,]+) por meio de (\d+) depósitos realizados nas praças de '
+LISTA_PRACAS = r'([^,]+(?:, [^,]+)*)'
+PRACAS = registrar('bradesco.pracas', LISTA_PRACAS)
+DEPOSITOS = registrar('bradesco.depositos', INICIO_DEPOSITOS)
+DEPOSITOS_COMPLETO = registrar('bradesco.depositos_completo', INICIO_DEPOSITOS + LISTA_PRACAS + r',? destes, R\$ ([\d\.,]+) depositados em cheques, (\d+) transações')
+DEPOSITOS_SIMPLES = registrar('bradesco.depositos_simples', INICIO_DEPOSITOS + LISTA_PRACAS)
+DEPOSITOS_ESPECIE = registrar('bradesco.depositos_especie', r'R\$ ([\d\.,]+) constando como efetuados em espécie, (\d+) transação')
+DEPOSITOS_CHEQUE = registrar('bradesco.depositos_cheque', r'R\$ ([\d\.,]+) depositados em cheques, (\d+) transações')
+CREDITOS_TRANSFERENCIAS = registrar('bradesco.creditos_transferencias', r'R\$ ([\d\.,]+) provenientes de (\d+) TEDs, DOCs, PIXs e transferências entre contas', re.IGNORECASE)
+TABELA_REMETENTES = PadraoAncorado('bradesco.tabela_remetentes', r'Demonstramos os principais remetentes:(.+?)(?:Os débitos|Notas:)', re.DOTALL)
+LINHA_REMETENTE = registrar('bradesco.linha_remetente', r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})*)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)\s+[\w\s\(\)/-]+')
+DEBITOS_TOTAL = registrar('bradesco.debitos_total', r'Os débitos, em igual período, totalizaram R\$ ([\d\.,]+)')
+PAGAMENTOS_DIVERSOS = registrar('bradesco.pagamentos_diversos', r'R\$ ([\d\.,]+) utilizados para pagamentos diversos, (\d+) transações')
+DEBITOS_TRANSFERENCIAS = registrar('bradesco.debitos_transferencias', r'R\$ ([\d\.,]+) destinados para quitação de (\d+) TEDs, DOCs, PIXs, transferências e depósitos em contas')
+TABELA_FAVORECIDOS = PadraoAncorado('bradesco.tabela_favorecidos', r'Demonstramos os principais favorecidos:(.+?)(?:Notas:|Diante do exposto)', re.DOTALL)
+LINHA_FAVORECIDO = registrar('bradesco.linha_favorecido', r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})*(?:___\d{2})?)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)\s+[\w\s\(\)/-]+')
+TABELA_BOLETOS = PadraoAncorado('bradesco.tabela_boletos', r'pagamentos de boletos de cobrança a terceiros e por amostragem, demonstramos os principais pagadores/sacados registrados na emissão dos boletos:(.+?)Cliente informou', re.DOTALL)
+LINHA_BOLETO = registrar('bradesco.linha_boleto', r'R\$([\d\.,]+)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)')
+VINCULOS = registrar('bradesco.vinculos', r'vínculo empregatício com a empresa ([^,]+)', re.IGNORECASE)
+INFORMACOES_FINAIS = registrar('bradesco.informacoes_finais', r'Diante do exposto,(.+)', re.DOTALL)
+
+ATIVIDADES_SUSPEITAS = [
+    ('Agiotagem', r'agiotagem'),
+    ('Lavagem de dinheiro', r'lavagem'),
+    ('Sonegação fiscal', r'sonegação'),
+    ('Uso de conta pessoal para recursos de terceiros', r'conta pessoal para movimentar recursos de terceiros'),
+    ('Pagamentos de boletos para terceiros', r'pagamentos de boletos tendo terceiros como pagadores/sacados'),
+]
+PADROES_CRIME = [r'agiotagem', r'lavagem', r'fraude', r'crime', r'ilícit[oa]', r'ind[ií]cio', r'suspeita', r'corrupção', r'doleir', r'caixa dois']
+# Atividades suspeitas e possíveis crimes são detectados na mesma varredura
+DETECTOR_TERMOS = DetectorTermos('bradesco.termos', ATIVIDADES_SUSPEITAS + [(p, p) for p in PADROES_CRIME])
 
 def extrai_tabela(texto, padrao):
     linhas = []
-    for m in re.finditer(padrao, texto):
+    for m in padrao.finditer(texto):
         valor = limpa_valor(m.group(1))
         qtde = f"{int(m.group(2)):02d}"
         nome = m.group(3).strip()
@@ -26,9 +52,27 @@ def extrai_tabela(texto, padrao):
         linhas.append({'valor': valor, 'quantidade': qtde, 'nome': nome, 'cpf_cnpj': cpf_cnpj})
     return linhas
 
+def busca_depositos_completo(texto):
+    """DEPOSITOS_COMPLETO.search(texto) sem percorrer de novo a mesma lista de praças.
+
+    Quando "destes, R$ ... em cheques" não fecha a lista de uma ocorrência, também não
+    fecha a de nenhuma ocorrência cuja lista comece dentro dela (as praças alcançáveis
+    são um subconjunto), então elas são puladas.
+    """
+    fim_lista = 0
+    for inicio in DEPOSITOS.finditer(texto):
+        if inicio.end() < fim_lista:
+            continue
+        m = DEPOSITOS_COMPLETO.match(texto, inicio.start())
+        if m:
+            return m
+        lista = PRACAS.match(texto, inicio.end())
+        fim_lista = lista.end() if lista else inicio.end()
+    return None
+
 def parse_bradesco(texto):
     # Normalizar o texto (remover quebras de linha extras e espaços múltiplos)
-    texto = re.sub(r'\s+', ' ', texto).strip()
+    texto = ESPACOS.sub(' ', texto).strip()
     
     resultado = {
         'titular': None,
@@ -64,33 +108,33 @@ def parse_bradesco(texto):
     }
 
     # Cônjuge
-    m = re.search(r'cônjuge,\s*([\w\s\.\-]+),\s*CPF\s*([\d\-\.]+)', texto, re.IGNORECASE)
+    m = CONJUGE.search(texto)
     if m:
         resultado['conjuge'] = {'nome': m.group(1).strip(), 'cpf': m.group(2).strip()}
 
     # Renda mensal (pessoas físicas) - padrão mais flexível
-    m = re.search(r'renda mensal de R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = RENDA_MENSAL.search(texto)
     if m:
         resultado['renda_mensal'] = limpa_valor(m.group(1))
 
     # Faturamento mensal (empresas) - padrão mais flexível
-    m = re.search(r'faturamento (?:médio )?mensal de R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = FATURAMENTO_MENSAL.search(texto)
     if m:
         resultado['faturamento_mensal'] = limpa_valor(m.group(1))
 
     # Período - padrão mais flexível
-    m = re.search(r'Entre (\d{2}\.\d{2}\.\d{4}) e (\d{2}\.\d{2}\.\d{4})', texto)
+    m = PERIODO.search(texto)
     if m:
         resultado['periodo'] = {'inicio': m.group(1), 'fim': m.group(2)}
 
     # Créditos totais - padrão mais flexível
-    m = re.search(r'os créditos somaram R\$\s*([\d\.,]+)', texto)
+    m = CREDITOS_TOTAL.search(texto)
     if m:
         resultado['creditos']['total'] = limpa_valor(m.group(1))
 
     # Detalhamento depósitos - múltiplos padrões para diferentes formatos
     # Padrão 1: formato original
-    m = re.search(r'sendo R\$ ([\d\.,]+) por meio de (\d+) depósitos realizados nas praças de ([^,]+(?:, [^,]+)*),? destes, R\$ ([\d\.,]+) depositados em cheques, (\d+) transações', texto)
+    m = busca_depositos_completo(texto)
     if m:
         resultado['creditos']['depositos']['total'] = limpa_valor(m.group(1))
         resultado['creditos']['depositos']['quantidade'] = int(m.group(2))
@@ -102,7 +146,7 @@ def parse_bradesco(texto):
     
     # Padrão 2: formato simplificado (novo modelo)
     if resultado['creditos']['depositos']['total'] == 0:
-        m = re.search(r'sendo R\$ ([\d\.,]+) por meio de (\d+) depósitos realizados nas praças de ([^,]+(?:, [^,]+)*)', texto)
+        m = DEPOSITOS_SIMPLES.search(texto)
         if m:
             resultado['creditos']['depositos']['total'] = limpa_valor(m.group(1))
             resultado['creditos']['depositos']['quantidade'] = int(m.group(2))
@@ -111,63 +155,56 @@ def parse_bradesco(texto):
             resultado['locais_depositos'] = locais
     
     # Depósitos em espécie - padrão mais flexível
-    m = re.search(r'R\$ ([\d\.,]+) constando como efetuados em espécie, (\d+) transação', texto)
+    m = DEPOSITOS_ESPECIE.search(texto)
     if m:
         resultado['creditos']['depositos']['especie']['valor'] = limpa_valor(m.group(1))
         resultado['creditos']['depositos']['especie']['quantidade'] = int(m.group(2))
 
     # Depósitos em cheques - padrão separado para novo formato
     if resultado['creditos']['depositos']['cheque']['valor'] == 0:
-        m = re.search(r'R\$ ([\d\.,]+) depositados em cheques, (\d+) transações', texto)
+        m = DEPOSITOS_CHEQUE.search(texto)
         if m:
             resultado['creditos']['depositos']['cheque']['valor'] = limpa_valor(m.group(1))
             resultado['creditos']['depositos']['cheque']['quantidade'] = int(m.group(2))
 
     # Transferências (TED, DOC, PIX, etc) - padrão mais flexível
-    m = re.search(r'R\$ ([\d\.,]+) provenientes de (\d+) TEDs, DOCs, PIXs e transferências entre contas', texto, re.IGNORECASE)
+    m = CREDITOS_TRANSFERENCIAS.search(texto)
     if m:
         resultado['creditos']['transferencias']['total'] = limpa_valor(m.group(1))
         resultado['creditos']['transferencias']['quantidade'] = int(m.group(2))
 
     # Principais depositantes/remetentes - regex específico
-    m = re.search(r'Demonstramos os principais remetentes:(.+?)(?:Os débitos|Notas:)', texto, re.DOTALL)
+    m = TABELA_REMETENTES.search(texto)
     if m:
-        tabela = m.group(1)
-        # Regex específico para capturar valores completos
-        padrao = r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})*)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)\s+[\w\s\(\)/-]+'
-        resultado['creditos']['principais_depositantes'] = extrai_tabela(tabela, padrao)
+        resultado['creditos']['principais_depositantes'] = extrai_tabela(m.group(1), LINHA_REMETENTE)
 
     # Débitos totais - padrão mais flexível
-    m = re.search(r'Os débitos, em igual período, totalizaram R\$ ([\d\.,]+)', texto)
+    m = DEBITOS_TOTAL.search(texto)
     if m:
         resultado['debitos']['total'] = limpa_valor(m.group(1))
 
     # Pagamentos diversos - padrão mais flexível
-    m = re.search(r'R\$ ([\d\.,]+) utilizados para pagamentos diversos, (\d+) transações', texto)
+    m = PAGAMENTOS_DIVERSOS.search(texto)
     if m:
         resultado['debitos']['pagamentos']['total'] = limpa_valor(m.group(1))
         resultado['debitos']['pagamentos']['quantidade'] = int(m.group(2))
 
     # Débitos transferências - padrão mais flexível
-    m = re.search(r'R\$ ([\d\.,]+) destinados para quitação de (\d+) TEDs, DOCs, PIXs, transferências e depósitos em contas', texto)
+    m = DEBITOS_TRANSFERENCIAS.search(texto)
     if m:
         resultado['debitos']['transferencias']['total'] = limpa_valor(m.group(1))
         resultado['debitos']['transferencias']['quantidade'] = int(m.group(2))
 
     # Principais favorecidos - regex específico
-    m = re.search(r'Demonstramos os principais favorecidos:(.+?)(?:Notas:|Diante do exposto)', texto, re.DOTALL)
+    m = TABELA_FAVORECIDOS.search(texto)
     if m:
-        tabela = m.group(1)
-        # Regex específico para capturar valores completos, incluindo underscores
-        padrao = r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})*(?:___\d{2})?)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)\s+[\w\s\(\)/-]+'
-        resultado['debitos']['principais_favorecidos'] = extrai_tabela(tabela, padrao)
+        # Os valores podem vir com underscores (ex.: 1.234___56)
+        resultado['debitos']['principais_favorecidos'] = extrai_tabela(m.group(1), LINHA_FAVORECIDO)
 
     # Pagamentos de boletos - padrão mais flexível
-    m = re.search(r'pagamentos de boletos de cobrança a terceiros e por amostragem, demonstramos os principais pagadores/sacados registrados na emissão dos boletos:(.+?)Cliente informou', texto, re.DOTALL)
+    m = TABELA_BOLETOS.search(texto)
     if m:
-        tabela = m.group(1)
-        padrao = r'R\$([\d\.,]+)\s+(\d+)\s+([\w\s\.\-]+?)\s+([\d\-/\.]+)'
-        boletos = extrai_tabela(tabela, padrao)
+        boletos = extrai_tabela(m.group(1), LINHA_BOLETO)
         for b in boletos:
             resultado['boletos'].append({
                 'valor': b['valor'],
@@ -177,40 +214,26 @@ def parse_bradesco(texto):
             })
 
     # Vínculos empresariais - padrão mais flexível
-    vinculos = re.findall(r'vínculo empregatício com a empresa ([^,]+)', texto, re.IGNORECASE)
+    vinculos = VINCULOS.findall(texto)
     resultado['vinculos_empresariais'] = vinculos
 
-    # Atividades suspeitas
-    atividades = []
-    if re.search(r'agiotagem', texto, re.IGNORECASE):
-        atividades.append('Agiotagem')
-    if re.search(r'lavagem', texto, re.IGNORECASE):
-        atividades.append('Lavagem de dinheiro')
-    if re.search(r'sonegação', texto, re.IGNORECASE):
-        atividades.append('Sonegação fiscal')
-    if re.search(r'conta pessoal para movimentar recursos de terceiros', texto, re.IGNORECASE):
-        atividades.append('Uso de conta pessoal para recursos de terceiros')
-    if re.search(r'pagamentos de boletos tendo terceiros como pagadores/sacados', texto, re.IGNORECASE):
-        atividades.append('Pagamentos de boletos para terceiros')
-    resultado['atividades_suspeitas'] = atividades
+    # Atividades suspeitas e possíveis crimes (todos os termos em uma única varredura)
+    termos = DETECTOR_TERMOS.encontrar(texto)
+    resultado['atividades_suspeitas'] = [chave for chave, _ in ATIVIDADES_SUSPEITAS if chave in termos]
 
     # Notas e informações finais
-    notas = re.findall(r'- ([^-]+)', texto)
+    notas = NOTAS.findall(texto)
     resultado['notas'] = [n.strip() for n in notas]
 
     # Informações finais (último parágrafo)
-    m = re.search(r'Diante do exposto,(.+)', texto, re.DOTALL)
+    m = INFORMACOES_FINAIS.search(texto)
     if m:
         resultado['informacoes_finais'].append(m.group(1).strip())
 
     # Possíveis crimes
-    crimes = []
-    padroes_crime = [r'agiotagem', r'lavagem', r'fraude', r'crime', r'ilícit[oa]', r'ind[ií]cio', r'suspeita', r'corrupção', r'doleir', r'caixa dois']
-    for p in padroes_crime:
-        if re.search(p, texto, re.IGNORECASE):
-            crimes.append(p)
+    crimes = [p for p in PADROES_CRIME if p in termos]
     if crimes:
-        resultado['possiveis_crimes'] = list(set([c.lower() for c in crimes]))
+        resultado['possiveis_crimes'] = list(dict.fromkeys(c.lower() for c in crimes))
 
     # Resumo financeiro
     credito_total = resultado['creditos']['total']
@@ -1,18 +1,15 @@
 import re
 from collections import defaultdict
 
-def limpa_valor(valor_str):
-    try:
-        if not valor_str:
-            return 0.0
-        # Garantir que é string
-        valor_str = str(valor_str)
-        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
-        if v != v:  # NaN check
-            return 0.0
-        return v
-    except Exception:
-        return 0.0
+from parsers.padroes import registrar, CAMPOS_VALOR, PadraoAncorado
+from parsers.valores import limpa_valor
+
+TITULAR = registrar('nubank.titular', r'em nome de ([^,]+)', re.IGNORECASE)
+CPF = registrar('nubank.cpf', r'CPF\s*([\d\-\.]+)', re.IGNORECASE)
+PERIODO = registrar('nubank.periodo', r'Entre (\d{2}/\d{2}/\d{4}) e (\d{2}/\d{2}/\d{4})')
+RENDA_MENSAL = PadraoAncorado('nubank.renda_mensal', r'renda.*?R\$\s*([\d\.,]+)', re.IGNORECASE)
+CREDITOS_TOTAL = PadraoAncorado('nubank.creditos_total', r'créditos.*?R\$\s*([\d\.,]+)', re.IGNORECASE)
+DEBITOS_TOTAL = PadraoAncorado('nubank.debitos_total', r'débitos.*?R\$\s*([\d\.,]+)', re.IGNORECASE)
 
 def parse_nubank(texto):
     resultado = {
@@ -36,38 +33,38 @@ def parse_nubank(texto):
 
     # Extrair informações básicas
     # Titular
-    m = re.search(r'em nome de ([^,]+)', texto, re.IGNORECASE)
+    m = TITULAR.search(texto)
     if m:
         resultado['titular'] = m.group(1).strip()
 
     # CPF
-    m = re.search(r'CPF\s*([\d\-\.]+)', texto, re.IGNORECASE)
+    m = CPF.search(texto)
     if m:
         resultado['cpf'] = m.group(1).strip()
 
     # Período
-    m = re.search(r'Entre (\d{2}/\d{2}/\d{4}) e (\d{2}/\d{2}/\d{4})', texto)
+    m = PERIODO.search(texto)
     if m:
         resultado['periodo'] = {'inicio': m.group(1), 'fim': m.group(2)}
 
     # Renda mensal
-    m = re.search(r'renda.*?R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = RENDA_MENSAL.search(texto)
     if m:
         resultado['renda_mensal'] = limpa_valor(m.group(1))
 
     # Créditos totais
-    m = re.search(r'créditos.*?R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = CREDITOS_TOTAL.search(texto)
     if m:
         resultado['creditos']['total'] = limpa_valor(m.group(1))
 
     # Débitos totais
-    m = re.search(r'débitos.*?R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    m = DEBITOS_TOTAL.search(texto)
     if m:
         resultado['debitos']['total'] = limpa_valor(m.group(1))
 
     # Extrair valores de campos específicos
-    for campo in ['CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE']:
-        m = re.search(rf'{campo}.*?R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    for campo, padrao in CAMPOS_VALOR.items():
+        m = padrao.search(texto)
         if m:
             resultado[campo.lower()] = limpa_valor(m.group(1))
 
@@ -0,0 +1,112 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Match, Optional, Pattern, Sequence, Set, Tuple
+
+# Registro central das expressões regulares dos parsers bancários.
+# Todos os padrões são compilados uma única vez, na importação dos módulos.
+REGISTRO: Dict[str, Pattern] = {}
+
+
+def registrar(nome: str, padrao: str, flags: int = 0) -> Pattern:
+    """Compila o padrão e o registra sob `nome` (ex.: 'bb.periodo')"""
+    if nome in REGISTRO:
+        raise ValueError(f"Padrão já registrado: {nome}")
+    compilado = re.compile(padrao, flags)
+    REGISTRO[nome] = compilado
+    return compilado
+
+
+class PadraoAncorado:
+    """Padrão `<âncora>.*?<resto>` (ou `<âncora>(.+?)<resto>`) buscado em tempo linear.
+
+    Com re.search, cada ocorrência da âncora reabre a varredura do `.*?` até o
+    fim do trecho alcançável, o que é quadrático em textos com a âncora repetida
+    e sem o restante. Como o trecho alcançável a partir de uma ocorrência
+    posterior está contido no da anterior, basta tentar a primeira: a do texto
+    todo com DOTALL, ou a primeira de cada linha sem ele (o `.` não atravessa
+    quebras de linha). O resultado é o mesmo de padrao.search(texto).
+    """
+
+    def __init__(self, nome: str, padrao: str, flags: int = 0):
+        posicoes = [i for i in (padrao.find('.*?'), padrao.find('(.+?)')) if i > 0]
+        ancora = padrao[:min(posicoes)] if posicoes else ''
+        if not ancora or any(c in ancora for c in '()[]{}?*+|^$\\.'):
+            raise ValueError(f"Padrão sem âncora literal antes de '.*?': {nome}")
+        self.padrao = registrar(nome, padrao, flags)
+        self.pattern = padrao
+        self._ancora = re.compile(ancora, flags)
+        self._por_linha = not flags & re.DOTALL
+
+    def search(self, texto: str) -> Optional[Match]:
+        posicao = 0
+        while True:
+            ancora = self._ancora.search(texto, posicao)
+            if ancora is None:
+                return None
+            m = self.padrao.match(texto, ancora.start())
+            if m is not None or not self._por_linha:
+                return m
+            posicao = texto.find('\n', ancora.end()) + 1
+            if posicao == 0:
+                return None
+
+
+# Padrões compartilhados entre os parsers
+CPF_CNPJ = r'(\d{3}\.\d{3}\.\d{3}-\d{2}|\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{2}\.\d{3}\.\d{3}-\d{2}|\d{3}\.\d{3}\.\d{3}/\d{4}-\d{2})'
+
+NOTAS = registrar('comum.notas', r'- ([^-]+)')
+
+CAMPOS_VALOR = {
+    campo: PadraoAncorado(f'comum.{campo.lower()}', rf'{campo}.*?R\$\s*([\d\.,]+)', re.IGNORECASE)
+    for campo in ['CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE']
+}
+
+
+class DetectorTermos:
+    """Encontra, em uma única varredura do texto, quais termos de uma lista aparecem nele.
+
+    Os termos são combinados em uma só expressão, agrupada pelo primeiro
+    caractere de cada termo, e comparados com o texto convertido para
+    minúsculas (equivalente ao re.IGNORECASE dos laços anteriores). Um mesmo
+    padrão pode responder por mais de uma chave.
+    """
+
+    def __init__(self, nome: str, termos: Sequence[Tuple[str, str]]):
+        self.chaves = [chave for chave, _ in termos]
+        self._chaves_por_grupo: Dict[str, List[str]] = {}
+        grupos_por_padrao: Dict[str, str] = {}
+        por_inicial: Dict[str, List[str]] = defaultdict(list)
+
+        for chave, padrao in termos:
+            padrao = padrao.lower()
+            grupo = grupos_por_padrao.get(padrao)
+            if grupo is None:
+                grupo = f"t{len(grupos_por_padrao)}"
+                grupos_por_padrao[padrao] = grupo
+                self._chaves_por_grupo[grupo] = []
+                if padrao[0].isalnum():
+                    por_inicial[padrao[0]].append(f"(?P<{grupo}>{padrao[1:]})")
+                else:
+                    por_inicial[''].append(f"(?P<{grupo}>{padrao})")
+            self._chaves_por_grupo[grupo].append(chave)
+
+        alternativas = [
+            f"{re.escape(inicial)}(?:{'|'.join(resto)})"
+            for inicial, resto in por_inicial.items()
+        ]
+        self.padrao = registrar(f"detector.{nome}", '|'.join(alternativas))
+        self._total_grupos = len(grupos_por_padrao)
+
+    def encontrar(self, texto: str) -> Set[str]:
+        """Retorna o conjunto de chaves cujos termos aparecem no texto"""
+        grupos = set()
+        for m in self.padrao.finditer(texto.lower()):
+            grupos.add(m.lastgroup)
+            if len(grupos) == self._total_grupos:
+                break
+        return {chave for grupo in grupos for chave in self._chaves_por_grupo[grupo]}
+
+    def filtrar(self, texto: str) -> List[str]:
+        """Chaves encontradas, na ordem em que foram declaradas"""
+        encontradas = self.encontrar(texto)
+        return [chave for chave in self.chaves if chave in encontradas]
@@ -1,14 +1,47 @@
 import re
 from collections import defaultdict
 
-def limpa_valor(valor_str):
-    try:
-        v = float(valor_str.replace('.', '').replace(',', '.').rstrip('.'))
-        if v != v:  # NaN check
-            return 0.0
-        return v
-    except Exception:
-        return 0.0
+from parsers.padroes import registrar, CAMPOS_VALOR, PadraoAncorado
+from parsers.valores import limpa_valor
+
+# Padrões genéricos para extração, em ordem de prioridade por campo
+PADROES = {
+    'titular': [
+        r'em nome de ([^,]+)',
+        r'titular[:\s]+([^,\n]+)',
+        r'conta.*?([^,\n]+)',
+    ],
+    'cpf': [
+        r'CPF[:\s]*([\d\-\.]+)',
+        r'CPF/CNPJ[:\s]*([\d\-\.\/]+)',
+    ],
+    'periodo': [
+        r'Entre (\d{2}[/\.]\d{2}[/\.]\d{4}) e (\d{2}[/\.]\d{2}[/\.]\d{4})',
+        r'Período[:\s]*(\d{2}[/\.]\d{2}[/\.]\d{4})[^\d]*(\d{2}[/\.]\d{2}[/\.]\d{4})',
+    ],
+    'renda': [
+        r'renda.*?R\$\s*([\d\.,]+)',
+        r'salário.*?R\$\s*([\d\.,]+)',
+        r'remuneração.*?R\$\s*([\d\.,]+)',
+    ],
+    'creditos': [
+        r'créditos.*?R\$\s*([\d\.,]+)',
+        r'entradas.*?R\$\s*([\d\.,]+)',
+        r'depósitos.*?R\$\s*([\d\.,]+)',
+    ],
+    'debitos': [
+        r'débitos.*?R\$\s*([\d\.,]+)',
+        r'saídas.*?R\$\s*([\d\.,]+)',
+        r'pagamentos.*?R\$\s*([\d\.,]+)',
+    ]
+}
+# Padrões `âncora.*?resto` são buscados sem reabrir a linha a cada ocorrência da âncora
+PADROES_COMPILADOS = {
+    campo: [(PadraoAncorado if '.*?' in padrao else registrar)(f'generico.{campo}.{i}', padrao, re.IGNORECASE)
+            for i, padrao in enumerate(lista_padroes)]
+    for campo, lista_padroes in PADROES.items()
+}
+TRANSFERENCIAS = registrar('generico.transferencias', r'(\d+)\s+(?:TED|DOC|PIX|transferência)', re.IGNORECASE)
 
 def parse_generico(texto):
     resultado = {
@@ -31,42 +64,10 @@ def parse_generico(texto):
         'possiveis_crimes': []
     }
 
-    # Padrões genéricos para extração
-    padroes = {
-        'titular': [
-            r'em nome de ([^,]+)',
-            r'titular[:\s]+([^,\n]+)',
-            r'conta.*?([^,\n]+)',
-        ],
-        'cpf': [
-            r'CPF[:\s]*([\d\-\.]+)',
-            r'CPF/CNPJ[:\s]*([\d\-\.\/]+)',
-        ],
-        'periodo': [
-            r'Entre (\d{2}[/\.]\d{2}[/\.]\d{4}) e (\d{2}[/\.]\d{2}[/\.]\d{4})',
-            r'Período[:\s]*(\d{2}[/\.]\d{2}[/\.]\d{4})[^\d]*(\d{2}[/\.]\d{2}[/\.]\d{4})',
-        ],
-        'renda': [
-            r'renda.*?R\$\s*([\d\.,]+)',
-            r'salário.*?R\$\s*([\d\.,]+)',
-            r'remuneração.*?R\$\s*([\d\.,]+)',
-        ],
-        'creditos': [
-            r'créditos.*?R\$\s*([\d\.,]+)',
-            r'entradas.*?R\$\s*([\d\.,]+)',
-            r'depósitos.*?R\$\s*([\d\.,]+)',
-        ],
-        'debitos': [
-            r'débitos.*?R\$\s*([\d\.,]+)',
-            r'saídas.*?R\$\s*([\d\.,]+)',
-            r'pagamentos.*?R\$\s*([\d\.,]+)',
-        ]
-    }
-
     # Extrair informações usando padrões genéricos
-    for campo, lista_padroes in padroes.items():
+    for campo, lista_padroes in PADROES_COMPILADOS.items():
         for padrao in lista_padroes:
-            m = re.search(padrao, texto, re.IGNORECASE)
+            m = padrao.search(texto)
             if m:
                 if campo == 'titular':
                     resultado['titular'] = m.group(1).strip()
@@ -83,13 +84,13 @@ def parse_generico(texto):
                 break
 
     # Extrair valores de campos específicos (CampoA, CampoB, etc.)
-    for campo in ['CampoA', 'CampoB', 'CampoC', 'CampoD', 'CampoE']:
-        m = re.search(rf'{campo}.*?R\$\s*([\d\.,]+)', texto, re.IGNORECASE)
+    for campo, padrao in CAMPOS_VALOR.items():
+        m = padrao.search(texto)
         if m:
             resultado[campo.lower()] = limpa_valor(m.group(1))
 
     # Tentar extrair informações de transferências
-    transferencias = re.findall(r'(\d+)\s+(?:TED|DOC|PIX|transferência)', texto, re.IGNORECASE)
+    transferencias = TRANSFERENCIAS.findall(texto)
     if transferencias:
         resultado['creditos']['tipos'].append({
             'tipo': 'Transferências',
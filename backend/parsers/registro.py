@@ -0,0 +1,130 @@
+"""
+Registro dos parsers bancários do segmento 41.
+
+Cada banco é um plugin: módulo e função do parser, versão e como reconhecer
+o comunicante. A escolha usa a raiz do CNPJ do comunicante (8 primeiros
+dígitos de cpfCnpjComunicante) e, só quando ela não é conhecida, trechos do
+nomeComunicante; comunicantes que nenhum plugin reconhece vão para o parser
+genérico. A escolha é memorizada por comunicante, de modo que cada linha
+custa uma consulta a um dicionário, e o módulo do parser só é importado no
+primeiro uso. Um novo banco é só mais uma chamada a registrar() no fim deste
+arquivo.
+"""
+
+import importlib
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+GENERICO = 'generico'
+
+# Comunicantes distintos memorizados; ao passar disso a memória é refeita do zero
+MAX_ESCOLHAS = 10000
+
+
+class Plugin:
+    """Parser bancário `modulo.funcao`, importado na primeira chamada.
+
+    `versao` entra na chave do cache de parsing: incrementá-la ao mudar a
+    saída do parser invalida as entradas dele. `raizes_cnpj` identificam o
+    comunicante; `nomes` (trechos do nome) e `palavras_iniciais` (primeira
+    palavra) são usados só quando o CNPJ não identifica nenhum plugin.
+    """
+
+    def __init__(self, nome: str, modulo: str, funcao: str, versao: str,
+                 raizes_cnpj: Tuple[str, ...] = (), nomes: Tuple[str, ...] = (),
+                 palavras_iniciais: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.modulo = modulo
+        self.atributo = funcao
+        self.versao = versao
+        self.raizes_cnpj = raizes_cnpj
+        self.nomes = nomes
+        self.palavras_iniciais = palavras_iniciais
+        self._funcao: Optional[Callable[[str], Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def funcao(self) -> Callable[[str], Dict[str, Any]]:
+        if self._funcao is None:
+            with self._lock:
+                if self._funcao is None:
+                    self._funcao = getattr(importlib.import_module(self.modulo), self.atributo)
+        return self._funcao
+
+    def __call__(self, texto: str) -> Dict[str, Any]:
+        return self.funcao(texto)
+
+    def reconhece_nome(self, nome: str) -> bool:
+        """`nome` já normalizado por normalizar_nome"""
+        if any(trecho in nome for trecho in self.nomes):
+            return True
+        palavras = nome.split()
+        return bool(palavras) and palavras[0] in self.palavras_iniciais
+
+
+# Na ordem de registro, que é a ordem de tentativa pelo nome
+PLUGINS: Dict[str, Plugin] = {}
+_por_raiz: Dict[str, str] = {}
+_escolhas: Dict[Tuple[str, str], str] = {}
+
+
+def registrar(plugin: Plugin) -> Plugin:
+    if plugin.nome in PLUGINS:
+        raise ValueError(f"Parser já registrado: {plugin.nome}")
+    for raiz in plugin.raizes_cnpj:
+        if len(raiz) != 8 or not raiz.isdigit():
+            raise ValueError(f"Raiz de CNPJ inválida para {plugin.nome}: {raiz!r}")
+        if raiz in _por_raiz:
+            raise ValueError(f"Raiz de CNPJ {raiz} já registrada para {_por_raiz[raiz]}")
+    PLUGINS[plugin.nome] = plugin
+    for raiz in plugin.raizes_cnpj:
+        _por_raiz[raiz] = plugin.nome
+    _escolhas.clear()
+    return plugin
+
+
+def obter(nome: str) -> Plugin:
+    return PLUGINS[nome]
+
+
+def raiz_cnpj(documento: str) -> Optional[str]:
+    """8 primeiros dígitos do CNPJ, completando os zeros à esquerda perdidos em planilhas"""
+    digitos = ''.join(c for c in documento if c.isdigit())
+    if not digitos or len(digitos) > 14 or not digitos.strip('0'):
+        return None
+    return digitos.zfill(14)[:8]
+
+
+def normalizar_nome(nome: str) -> str:
+    return nome.lower().replace(".", "").replace(",", "").replace("-", "").replace("  ", " ").strip()
+
+
+def _escolher(cnpj: str, nome: str) -> str:
+    nome_parser = _por_raiz.get(raiz_cnpj(cnpj))
+    if nome_parser is not None:
+        return nome_parser
+    nome = normalizar_nome(nome)
+    for plugin in PLUGINS.values():
+        if plugin.reconhece_nome(nome):
+            return plugin.nome
+    return GENERICO
+
+
+def escolher(cnpj: str, nome: str) -> str:
+    """Nome do parser para o comunicante (cpfCnpjComunicante, nomeComunicante)"""
+    chave = (cnpj, nome)
+    nome_parser = _escolhas.get(chave)
+    if nome_parser is None:
+        if len(_escolhas) >= MAX_ESCOLHAS:
+            _escolhas.clear()
+        nome_parser = _escolhas[chave] = _escolher(cnpj, nome)
+    return nome_parser
+
+
+registrar(Plugin('bradesco', 'parsers.bradesco', 'parse_bradesco', versao="1",
+                 raizes_cnpj=('60746948',), nomes=('bradesco',)))
+registrar(Plugin('bb', 'parsers.bb', 'parse_bb', versao="1",
+                 raizes_cnpj=('00000000',), nomes=('banco do brasil',), palavras_iniciais=('bb',)))
+registrar(Plugin('nubank', 'parsers.nubank', 'parse_nubank', versao="1",
+                 raizes_cnpj=('18236120',), nomes=('nubank', 'nu pagamentos')))
+registrar(Plugin(GENERICO, 'parsers.parser_generico', 'parse_generico', versao="1"))
@@ -0,0 +1,104 @@
+import math
+import re
+from typing import Any, List, Optional, Sequence
+
+# Normalização de valores monetários no formato brasileiro ("1.234,56").
+# Pontos de milhar, sublinhados e espaços são removidos e a vírgula vira ponto decimal.
+# Diferenças para o limpa_valor anterior, que passava o texto direto a float():
+# espaços internos ("1 234,56") agora são aceitos, e "inf", "nan" e expoentes
+# ("1e5") são inválidos. O sinal de "+" continua aceito.
+TABELA_VALOR = str.maketrans({'.': None, '_': None, ' ': None, ',': '.'})
+
+NUMERO = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)')
+
+# Remove os caracteres que float() pode receber direto; o que sobra exige conversão completa
+TABELA_PERMITIDOS = str.maketrans(dict.fromkeys('0123456789.+-\n'))
+
+
+def converte_valor(valor: Any) -> Optional[float]:
+    """Converte um valor monetário para float; None se vazio ou inválido"""
+    if valor.__class__ is not str:
+        if valor is None or isinstance(valor, bool):
+            return None
+        if isinstance(valor, (int, float)):
+            valor = float(valor)
+            return valor if math.isfinite(valor) else None
+        valor = str(valor)
+    # replace encadeados são mais rápidos que translate para textos curtos
+    texto = valor.replace('.', '').replace(',', '.')
+    if '_' in texto or ' ' in texto:
+        texto = texto.replace('_', '').replace(' ', '')
+    if not NUMERO.fullmatch(texto):
+        texto = texto.rstrip('.').strip()
+        if not NUMERO.fullmatch(texto):
+            return None
+    return float(texto)
+
+
+def limpa_valor(valor: Any) -> float:
+    """Como converte_valor, mas com 0.0 para valores vazios ou inválidos"""
+    convertido = converte_valor(valor)
+    return 0.0 if convertido is None else convertido
+
+
+def _float_ou_none(texto: str) -> Optional[float]:
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def normalizar_coluna(valores: Sequence[Any]) -> List[Optional[float]]:
+    """Converte uma coluna inteira de uma vez, com o mesmo resultado de converte_valor.
+
+    Os textos são unidos e normalizados com um único translate e separados de
+    novo. As partes com caracteres além de dígitos, ponto e sinal são
+    localizadas com str.find sobre o texto unido; as demais vão direto para
+    float(). Apenas as localizadas (e as que float() recusar) passam por
+    converte_valor.
+    """
+    try:
+        juntos = '\n'.join(valores)
+    except TypeError:
+        # Coluna com None ou números: converte apenas os textos em lote
+        resultado = [None if valor is None else converte_valor(valor) for valor in valores]
+        indices = [i for i, valor in enumerate(valores) if isinstance(valor, str)]
+        for i, valor in zip(indices, normalizar_coluna([valores[i] for i in indices])):
+            resultado[i] = valor
+        return resultado
+    if not valores:
+        return []
+
+    normalizado = juntos.translate(TABELA_VALOR)
+    partes = normalizado.split('\n')
+    if len(partes) != len(valores):
+        # Algum texto continha quebra de linha
+        return [converte_valor(valor) for valor in valores]
+
+    revisar = set()
+    estranhos = set(normalizado.translate(TABELA_PERMITIDOS))
+    if estranhos:
+        posicoes = []
+        for caractere in estranhos:
+            posicao = normalizado.find(caractere)
+            while posicao != -1:
+                posicoes.append(posicao)
+                posicao = normalizado.find(caractere, posicao + 1)
+        # Número da parte de cada posição, contando as quebras de linha entre elas
+        linha = anterior = 0
+        for posicao in sorted(posicoes):
+            linha += normalizado.count('\n', anterior, posicao)
+            anterior = posicao
+            revisar.add(linha)
+        for j in revisar:
+            partes[j] = ''
+
+    try:
+        convertidos = [float(parte) if parte else None for parte in partes]
+    except ValueError:
+        # Partes só com dígitos, ponto e sinal que ainda assim não são números ("12,,", "-")
+        convertidos = [_float_ou_none(parte) if parte else None for parte in partes]
+        revisar.update(j for j, (parte, valor) in enumerate(zip(partes, convertidos)) if parte and valor is None)
+    for j in revisar:
+        convertidos[j] = converte_valor(valores[j])
+    return convertidos
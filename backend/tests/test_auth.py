@@ -0,0 +1,143 @@
+"""Autenticação LDAP (servidor MOCK_SYNC do ldap3) e tokens de sessão.
+
+Executar a partir de backend/: python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+from ldap3 import Connection, MOCK_SYNC, SIMPLE, Server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import auth  # noqa: E402
+
+USUARIO = "analista"
+SENHA = "senha-ldap"
+
+
+@pytest.fixture
+def ldap(monkeypatch):
+    servidor = Server("fake")
+    diretorio = Connection(servidor, client_strategy=MOCK_SYNC)
+    diretorio.strategy.add_entry(f"cn={USUARIO},ou=test,o=lab", {"userPassword": SENHA, "sn": USUARIO})
+    configuracao = auth.ConfiguracaoLDAP(servidor, estrategia=MOCK_SYNC, autenticacao=SIMPLE,
+                                         formato_usuario="cn={usuario},ou=test,o=lab")
+    chamadas = {"bind": 0, "nova_conexao": 0}
+    bind, nova_conexao = configuracao.bind, configuracao.nova_conexao
+
+    def contar_bind(*args):
+        chamadas["bind"] += 1
+        return bind(*args)
+
+    def contar_nova_conexao():
+        chamadas["nova_conexao"] += 1
+        return nova_conexao()
+
+    monkeypatch.setattr(configuracao, "bind", contar_bind)
+    monkeypatch.setattr(configuracao, "nova_conexao", contar_nova_conexao)
+    auth.configurar_ldap(configuracao)
+    yield configuracao, chamadas
+    auth.configurar_ldap(None)
+
+
+@pytest.fixture
+def chave(monkeypatch, tmp_path):
+    monkeypatch.setattr(auth, "SECRET_KEY", b"")
+    monkeypatch.setattr(auth, "CAMINHO_CHAVE", str(tmp_path / "secret_key"))
+    monkeypatch.setattr(auth, "_chave_gerada", None)
+    return tmp_path / "secret_key"
+
+
+def test_bind_com_senha_correta(ldap):
+    assert auth.validar_usuario(USUARIO, SENHA)
+
+
+def test_bind_com_senha_errada(ldap):
+    _, chamadas = ldap
+    assert not auth.validar_usuario(USUARIO, "outra")
+    assert not auth.validar_usuario("desconhecido", SENHA)
+    assert not auth.validar_usuario(USUARIO, "")
+    assert chamadas["bind"] == 2
+
+
+def test_cache_dispensa_novo_bind(ldap):
+    _, chamadas = ldap
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert chamadas["bind"] == 1
+    # Senha diferente da guardada não é aceita pelo cache e vai ao LDAP
+    assert not auth.validar_usuario(USUARIO, "outra")
+    assert chamadas["bind"] == 2
+
+
+def test_cache_desligado_refaz_bind(ldap, monkeypatch):
+    _, chamadas = ldap
+    monkeypatch.setattr(auth, "LDAP_CACHE_TTL", 0)
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert chamadas["bind"] == 2
+
+
+def test_pool_reaproveita_conexao(ldap, monkeypatch):
+    configuracao, chamadas = ldap
+    monkeypatch.setattr(auth, "LDAP_CACHE_TTL", 0)
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert not auth.validar_usuario(USUARIO, "outra")
+    assert auth.validar_usuario(USUARIO, SENHA)
+    assert chamadas["nova_conexao"] == 1
+    assert configuracao.conexoes.qsize() == 1
+
+
+def test_token_ida_e_volta(chave):
+    token, expira = auth.emitir_token(USUARIO)
+    assert expira > 0
+    assert auth.verificar_token(token) == USUARIO
+    assert auth.usuario_token(f"Bearer {token}") == USUARIO
+    assert auth.usuario_token_ou_parametro(None, token) == USUARIO
+
+
+def test_token_expirado(chave, monkeypatch):
+    monkeypatch.setattr(auth, "SESSAO_TTL", -1)
+    token, _ = auth.emitir_token(USUARIO)
+    assert auth.verificar_token(token) is None
+    with pytest.raises(HTTPException) as erro:
+        auth.usuario_token(f"Bearer {token}")
+    assert erro.value.status_code == 401
+
+
+def test_token_adulterado(chave):
+    token, _ = auth.emitir_token(USUARIO)
+    carga, _, assinatura = token.partition(".")
+    outro, _ = auth.emitir_token("outro")
+    assert auth.verificar_token(f"{outro.partition('.')[0]}.{assinatura}") is None
+    with pytest.raises(HTTPException) as erro:
+        auth.usuario_token(f"Bearer {carga}.x{assinatura[1:]}")
+    assert erro.value.status_code == 401
+
+
+def test_sem_cabecalho(monkeypatch):
+    monkeypatch.setattr(auth, "EXIGIR_TOKEN", False)
+    assert auth.usuario_token(None) is None
+    monkeypatch.setattr(auth, "EXIGIR_TOKEN", True)
+    with pytest.raises(HTTPException):
+        auth.usuario_token(None)
+
+
+def test_chave_gerada_persiste(chave, monkeypatch):
+    token, _ = auth.emitir_token(USUARIO)
+    assert chave.exists()
+    assert chave.stat().st_mode & 0o777 == 0o600
+    # Outro processo (ou um reinício) lê a mesma chave do arquivo
+    monkeypatch.setattr(auth, "_chave_gerada", None)
+    assert auth.verificar_token(token) == USUARIO
+    assert [p.name for p in chave.parent.iterdir()] == ["secret_key"]
+
+
+def test_chave_do_ambiente_tem_precedencia(chave, monkeypatch):
+    monkeypatch.setattr(auth, "SECRET_KEY", b"chave-do-ambiente")
+    token, _ = auth.emitir_token(USUARIO)
+    assert not chave.exists()
+    monkeypatch.setattr(auth, "SECRET_KEY", b"outra-chave")
+    assert auth.verificar_token(token) is None
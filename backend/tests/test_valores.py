@@ -0,0 +1,44 @@
+"""Conversão de valores monetários (parsers/valores.py).
+
+Executar a partir de backend/: python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers.valores import converte_valor, limpa_valor, normalizar_coluna  # noqa: E402
+
+CASOS = [
+    ("1.234,56", 1234.56),
+    ("-1.234,56", -1234.56),
+    ("+5", 5.0),
+    ("+1.234,56", 1234.56),
+    ("12,", 12.0),
+    (" 7 ", 7.0),
+    ("1 234,56", 1234.56),
+    ("", None),
+    ("N/D", None),
+    ("inf", None),
+    ("nan", None),
+    ("1e5", None),
+    ("+-5", None),
+    ("-", None),
+    (None, None),
+    (3, 3.0),
+    (float("inf"), None),
+]
+
+
+@pytest.mark.parametrize("valor, esperado", CASOS)
+def test_converte_valor(valor, esperado):
+    assert converte_valor(valor) == esperado
+    assert limpa_valor(valor) == (0.0 if esperado is None else esperado)
+
+
+def test_coluna_igual_a_valor_a_valor():
+    valores = [valor for valor, _ in CASOS if isinstance(valor, str)]
+    assert normalizar_coluna(valores) == [converte_valor(valor) for valor in valores]
+    assert normalizar_coluna([valor for valor, _ in CASOS]) == [esperado for _, esperado in CASOS]
@@ -1,6 +1,9 @@
 import React, { useState } from 'react';
 import { API_BASE_URL } from '../config';
 
+// A validação só lê o início de cada arquivo: envia esse trecho e o tamanho real
+const PREFIXO_VALIDACAO = 256 * 1024;
+
 export default function GeradorI2() {
   const [arquivos, setArquivos] = useState({
     comunicacoes: null,
@@ -33,9 +36,10 @@ export default function GeradorI2() {
 
     try {
       const formData = new FormData();
-      formData.append('comunicacoes', arquivos.comunicacoes);
-      formData.append('envolvidos', arquivos.envolvidos);
-      formData.append('ocorrencias', arquivos.ocorrencias);
+      Object.entries(arquivos).forEach(([tipo, file]) => {
+        formData.append(tipo, file.slice(0, PREFIXO_VALIDACAO), file.name);
+        formData.append(`tamanho_${tipo}`, file.size);
+      });
 
       const response = await fetch(`${API_BASE_URL}/api/i2/validar-arquivos`, {
         method: 'POST',
@@ -146,6 +150,12 @@ export default function GeradorI2() {
           </div>
         </div>
 
+        {validacao.status_geral.avisos?.length > 0 && (
+          <div className="p-3 rounded-lg bg-yellow-50 border border-yellow-200 text-sm text-yellow-800 space-y-1">
+            {validacao.status_geral.avisos.map((aviso, i) => <p key={i}>⚠ {aviso}</p>)}
+          </div>
+        )}
+
         {/* Detalhes por arquivo */}
         <div className="grid grid-cols-1 md:grid-cols-3 gap-4">
           {Object.entries(validacao).filter(([key]) => key !== 'status_geral').map(([arquivo, dados]) => (
@@ -154,7 +164,7 @@ export default function GeradorI2() {
               {dados.valido ? (
                 <div className="text-sm text-green-700 space-y-1">
                   <p>✓ Válido</p>
-                  <p>Linhas: {dados.linhas || 'N/A'}</p>
+                  <p>Linhas: {dados.linhas ? `${dados.estimado ? '~' : ''}${dados.linhas}` : 'N/A'}</p>
                   {dados.bancos_encontrados && (
                     <p>Bancos: {dados.bancos_encontrados.join(', ')}</p>
                   )}
@@ -7,6 +7,7 @@ export default function Navbar() {
 
   function logout() {
     localStorage.removeItem('usuario');
+    localStorage.removeItem('token');
     navigate('/login');
   }
 
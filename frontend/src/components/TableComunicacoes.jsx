@@ -1,54 +1,134 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
+import apiService from '../services/api';
 
-export default function TableComunicacoes({ comunicacoes }) {
-  const [busca, setBusca] = useState('');
+const LIMITE = 50;
+const FILTROS_INICIAIS = { titular: '', cpf: '', banco: '', data_inicio: '', data_fim: '' };
+// Colunas ordenáveis no servidor (parâmetro `ordenar` de /api/comunicacoes)
+const ORDENACOES = { titular: 'titular', banco: 'banco', periodo: 'data', valor: 'valor' };
+
+// Listagem paginada no servidor: filtros e ordenação vão como parâmetros e só a página atual é carregada
+export default function TableComunicacoes() {
+  const [filtros, setFiltros] = useState(FILTROS_INICIAIS);
+  const [filtrosAplicados, setFiltrosAplicados] = useState(FILTROS_INICIAIS);
+  const [ordenar, setOrdenar] = useState('id');
+  // Cursores das páginas já visitadas; o último é o da página atual (null na primeira)
+  const [cursores, setCursores] = useState([null]);
+  const [pagina, setPagina] = useState({ itens: [], proximo_cursor: null });
+  const [loading, setLoading] = useState(false);
+  const [erro, setErro] = useState('');
   const navigate = useNavigate();
 
-  const filtradas = comunicacoes.filter(c =>
-    (c.banco || '').toLowerCase().includes(busca.toLowerCase()) ||
-    (c.nome_envolvido || '').toLowerCase().includes(busca.toLowerCase()) ||
-    (c.data || '').includes(busca)
+  // Aplica os filtros digitados depois de uma pausa, voltando à primeira página
+  useEffect(() => {
+    const espera = setTimeout(() => {
+      setFiltrosAplicados(filtros);
+      setCursores([null]);
+    }, 400);
+    return () => clearTimeout(espera);
+  }, [filtros]);
+
+  const cursor = cursores[cursores.length - 1];
+  useEffect(() => {
+    let ativo = true;
+    setLoading(true);
+    setErro('');
+    // Titular e banco são gravados em maiúsculas, como vêm do COAF
+    const { titular, banco } = filtrosAplicados;
+    apiService.getComunicacoes({
+      ...filtrosAplicados, titular: titular.toUpperCase(), banco: banco.toUpperCase(), ordenar, limite: LIMITE, cursor
+    })
+      .then(dados => { if (ativo) setPagina(dados); })
+      .catch(() => { if (ativo) setErro('Erro ao buscar comunicações.'); })
+      .finally(() => { if (ativo) setLoading(false); });
+    return () => { ativo = false; };
+  }, [filtrosAplicados, ordenar, cursor]);
+
+  const alterarFiltro = (campo) => (e) => setFiltros({ ...filtros, [campo]: e.target.value });
+
+  const alternarOrdem = (coluna) => {
+    const chave = ORDENACOES[coluna];
+    setOrdenar(ordenar === chave ? `-${chave}` : chave);
+    setCursores([null]);
+  };
+
+  const indicadorOrdem = (coluna) => {
+    const chave = ORDENACOES[coluna];
+    if (ordenar === chave) return ' ▲';
+    if (ordenar === `-${chave}`) return ' ▼';
+    return '';
+  };
+
+  const cabecalho = (coluna, titulo, classe = '') => (
+    <th
+      onClick={() => alternarOrdem(coluna)}
+      className={`px-4 py-3 text-left font-semibold text-gray-700 cursor-pointer select-none ${classe}`}
+    >
+      {titulo}{indicadorOrdem(coluna)}
+    </th>
   );
 
+  const campo = 'px-3 py-2 border rounded focus:outline-none focus:ring-2 focus:ring-blue-400';
+  const itens = pagina.itens || [];
+
   return (
     <div>
-      <input
-        type="text"
-        placeholder="Buscar por banco, envolvido ou data..."
-        value={busca}
-        onChange={e => setBusca(e.target.value)}
-        className="mb-2 px-3 py-2 border rounded w-full max-w-xs focus:outline-none focus:ring-2 focus:ring-blue-400"
-      />
-      <div className="overflow-x-auto">
+      <div className="flex flex-wrap gap-2 mb-3">
+        <input type="text" placeholder="Titular (início do nome)" value={filtros.titular} onChange={alterarFiltro('titular')} className={campo} />
+        <input type="text" placeholder="CPF/CNPJ (com pontuação)" value={filtros.cpf} onChange={alterarFiltro('cpf')} className={campo} />
+        <input type="text" placeholder="Banco (nome completo)" value={filtros.banco} onChange={alterarFiltro('banco')} className={campo} />
+        <input type="date" title="Data inicial" value={filtros.data_inicio} onChange={alterarFiltro('data_inicio')} className={campo} />
+        <input type="date" title="Data final" value={filtros.data_fim} onChange={alterarFiltro('data_fim')} className={campo} />
+      </div>
+      {erro && <div className="text-red-600 mb-2">{erro}</div>}
+      <div className="overflow-x-auto rounded-2xl">
         <table className="w-full bg-white text-base">
           <thead>
-            <tr>
-              <th className="px-4 py-2 border">Banco</th>
-              <th className="px-4 py-2 border">Envolvido</th>
-              <th className="px-4 py-2 border">Data</th>
-              <th className="px-4 py-2 border">Valor</th>
-              <th className="px-4 py-2 border">Ações</th>
+            <tr className="bg-gray-50">
+              {cabecalho('titular', 'Titular')}
+              <th className="px-4 py-3 text-left font-semibold text-gray-700 min-w-[140px]">CPF/CNPJ</th>
+              {cabecalho('banco', 'Banco', 'min-w-[180px]')}
+              {cabecalho('periodo', 'Período', 'min-w-[170px]')}
+              {cabecalho('valor', 'Valor', 'min-w-[120px]')}
+              <th className="px-4 py-3 text-center font-semibold text-gray-700">Ações</th>
             </tr>
           </thead>
           <tbody>
-            {filtradas.map(c => (
-              <tr key={c.id} className="hover:bg-blue-50">
-                <td className="px-4 py-2 border">{c.banco}</td>
-                <td className="px-4 py-2 border">{c.nome_envolvido}</td>
-                <td className="px-4 py-2 border">{c.data}</td>
-                <td className="px-4 py-2 border">R$ {c.valor?.toLocaleString('pt-BR')}</td>
-                <td className="px-4 py-2 border">
-                  <button onClick={() => navigate(`/comunicacao/${c.id}`)} className="bg-blue-700 text-white px-3 py-1 rounded hover:bg-blue-800 transition">Detalhes</button>
+            {itens.map((c, idx) => (
+              <tr key={c.id} className={"transition hover:bg-blue-50 " + (idx === itens.length - 1 ? '' : 'border-b border-gray-100')}>
+                <td className="px-4 py-2 whitespace-nowrap">{c.titular}</td>
+                <td className="px-4 py-2 whitespace-nowrap min-w-[140px]">{c.cpf}</td>
+                <td className="px-4 py-2 whitespace-nowrap min-w-[180px]">{c.banco}</td>
+                <td className="px-4 py-2 whitespace-nowrap min-w-[170px]">{c.periodo ? `${c.periodo.inicio || ''} - ${c.periodo.fim || ''}` : '-'}</td>
+                <td className="px-4 py-2 whitespace-nowrap min-w-[120px]">R$ {c.valor?.toLocaleString('pt-BR')}</td>
+                <td className="px-4 py-2 text-center">
+                  <button onClick={() => navigate(`/comunicacao/${c.id}`)} className="bg-blue-600 text-white px-4 py-1 rounded shadow-sm hover:bg-blue-700 transition">Detalhes</button>
                 </td>
               </tr>
             ))}
-            {filtradas.length === 0 && (
-              <tr><td colSpan={5} className="text-center py-4 text-gray-500">Nenhuma comunicação encontrada.</td></tr>
+            {!loading && itens.length === 0 && (
+              <tr><td colSpan={6} className="text-center py-6 text-gray-500">Nenhuma comunicação encontrada.</td></tr>
             )}
           </tbody>
         </table>
       </div>
+      <div className="flex items-center justify-between mt-3">
+        <button
+          onClick={() => setCursores(cursores.slice(0, -1))}
+          disabled={loading || cursores.length === 1}
+          className="px-4 py-1 rounded border disabled:opacity-50"
+        >
+          Anterior
+        </button>
+        <span className="text-gray-500 text-sm">{loading ? 'Carregando...' : `Página ${cursores.length}`}</span>
+        <button
+          onClick={() => setCursores([...cursores, pagina.proximo_cursor])}
+          disabled={loading || !pagina.proximo_cursor}
+          className="px-4 py-1 rounded border disabled:opacity-50"
+        >
+          Próxima
+        </button>
+      </div>
     </div>
   );
-} 
\ No newline at end of file
+}
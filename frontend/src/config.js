@@ -7,7 +7,7 @@ const config = {
   REQUEST_TIMEOUT: 30000,
   
   // Configurações de upload
-  MAX_FILE_SIZE: 10 * 1024 * 1024, // 10MB
+  MAX_FILE_SIZE: 1024 * 1024 * 1024, // 1GB (limite do backend: RIF_MAX_UPLOAD_MB)
   ALLOWED_FILE_TYPES: ['.csv'],
   
   // Configurações de paginação
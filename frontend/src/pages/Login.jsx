@@ -19,6 +19,7 @@ export default function Login() {
       const data = await apiService.login(usuario, senha);
       if (data.success) {
         localStorage.setItem('usuario', usuario);
+        localStorage.setItem('token', data.token);
         navigate('/upload');
       } else {
         setErro(data.erro || 'Usuário ou senha inválidos.');
@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import apiService from '../services/api';
 
@@ -6,30 +6,58 @@ export default function Upload() {
   const [comunicacoes, setComunicacoes] = useState(null);
   const [envolvidos, setEnvolvidos] = useState(null);
   const [ocorrencias, setOcorrencias] = useState(null);
+  const [workspace, setWorkspace] = useState('');
   const [msg, setMsg] = useState('');
   const [erro, setErro] = useState('');
   const [loading, setLoading] = useState(false);
+  const [tarefa, setTarefa] = useState(null);
+  const pararAcompanhamento = useRef(null);
   const navigate = useNavigate();
   const usuario = localStorage.getItem('usuario');
 
+  useEffect(() => () => pararAcompanhamento.current && pararAcompanhamento.current(), []);
+
+  const acompanhar = (jobId) => {
+    pararAcompanhamento.current = apiService.acompanharJob(jobId, (t) => {
+      setTarefa(t);
+      if (t.estado === 'concluida') {
+        setLoading(false);
+        setMsg('Arquivos enviados com sucesso!');
+        setTimeout(() => navigate('/dashboard'), 1200);
+      } else if (t.estado === 'erro' || t.estado === 'cancelada') {
+        setLoading(false);
+        setErro(t.estado === 'cancelada' ? 'Processamento cancelado.' : (t.erro || 'Erro ao processar arquivos.'));
+      }
+    }, () => {
+      setLoading(false);
+      setErro('Conexão perdida durante o processamento.');
+    });
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
-    setMsg(''); setErro(''); setLoading(true);
+    setMsg(''); setErro(''); setTarefa(null); setLoading(true);
     try {
-      const data = await apiService.uploadFiles(comunicacoes, envolvidos, ocorrencias, usuario);
+      const data = await apiService.uploadFiles(comunicacoes, envolvidos, ocorrencias, usuario, true, workspace.trim());
       if (data.success) {
-        setMsg('Arquivos enviados com sucesso!');
-        setTimeout(() => navigate('/dashboard'), 1200);
+        setMsg('Arquivos enviados. Processando...');
+        acompanhar(data.job_id);
       } else {
         setErro(data.msg || 'Erro ao enviar arquivos.');
+        setLoading(false);
       }
     } catch (err) {
       setErro('Erro de conexão com o servidor.');
-    } finally {
       setLoading(false);
     }
   };
 
+  const cancelar = async () => {
+    if (tarefa) await apiService.cancelarJob(tarefa.id).catch(() => {});
+  };
+
+  const ETAPAS = { validacao: 'Validando arquivos', envolvidos: 'Lendo envolvidos', ocorrencias: 'Lendo ocorrências', comunicacoes: 'Processando comunicações' };
+
   return (
     <div className="min-h-screen flex items-center justify-center bg-gradient-to-tl from-gray-600 via-gray-200 to-gray-100">
       <div className="w-full max-w-lg bg-white rounded-2xl shadow-xl p-10 flex flex-col items-center">
@@ -52,6 +80,17 @@ export default function Upload() {
             <label className="block text-gray-700 font-medium mb-1">Ocorrencias.csv</label>
             <input type="file" accept=".csv" required onChange={e => setOcorrencias(e.target.files[0])} className="w-full px-4 py-2 border-2 border-blue-200 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-400 bg-gray-50 transition" />
           </div>
+          <div>
+            <label className="block text-gray-700 font-medium mb-1">Workspace (opcional)</label>
+            <input type="text" maxLength={80} value={workspace} onChange={e => setWorkspace(e.target.value)} placeholder="Acrescentar a um caso existente ou criar um novo" className="w-full px-4 py-2 border-2 border-blue-200 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-400 bg-gray-50 transition" />
+          </div>
+          {loading && tarefa && (
+            <div className="text-gray-600 text-sm text-center">
+              <div>{tarefa.estado === 'na_fila' ? 'Aguardando na fila' : (ETAPAS[tarefa.etapa] || 'Iniciando')}</div>
+              <div>{tarefa.progresso.comunicacoes_processadas} comunicações lidas, {tarefa.progresso.comunicacoes_gravadas} gravadas</div>
+              <button type="button" onClick={cancelar} className="text-red-600 underline mt-1">Cancelar</button>
+            </div>
+          )}
           {msg && <div className="text-green-600 text-sm text-center">{msg}</div>}
           {erro && <div className="text-red-600 text-sm text-center">{erro}</div>}
           <button type="submit" disabled={loading} className="w-full bg-blue-700 text-white py-3 rounded-lg font-bold text-lg shadow hover:bg-blue-800 transition disabled:opacity-50 mt-4">
@@ -8,10 +8,13 @@ class ApiService {
 
   async request(endpoint, options = {}) {
     const url = `${this.baseURL}${endpoint}`;
+    // Token de sessão emitido no login identifica o usuário nas demais rotas
+    const token = localStorage.getItem('token');
     const defaultOptions = {
       timeout: this.timeout,
       headers: {
         'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
         ...options.headers,
       },
     };
@@ -22,7 +25,7 @@ class ApiService {
     }
 
     try {
-      const response = await fetch(url, { ...defaultOptions, ...options });
+      const response = await fetch(url, { ...defaultOptions, ...options, headers: defaultOptions.headers });
       
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
@@ -49,12 +52,16 @@ class ApiService {
   }
 
   // Upload de arquivos
-  async uploadFiles(comunicacoes, envolvidos, ocorrencias, usuario) {
+  // Com assincrono, o servidor responde logo com job_id e processa em segundo plano
+  // Com workspace, o RIF é acrescentado a ele em vez de substituir o upload anterior
+  async uploadFiles(comunicacoes, envolvidos, ocorrencias, usuario, assincrono = false, workspace = '') {
     const formData = new FormData();
     formData.append('comunicacoes', comunicacoes);
     formData.append('envolvidos', envolvidos);
     formData.append('ocorrencias', ocorrencias);
     formData.append('usuario', usuario);
+    formData.append('assincrono', assincrono);
+    if (workspace) formData.append('workspace', workspace);
     
     return this.request('/upload', {
       method: 'POST',
@@ -63,19 +70,87 @@ class ApiService {
     });
   }
 
+  // Processamento assíncrono de upload
+  async getJob(id) {
+    return this.request(`/api/jobs/${id}`);
+  }
+
+  async cancelarJob(id) {
+    return this.request(`/api/jobs/${id}`, { method: 'DELETE' });
+  }
+
+  // Chama onEvento(tarefa) a cada mudança até a tarefa encerrar; devolve função para parar
+  acompanharJob(id, onEvento, onErro) {
+    // O EventSource não envia cabeçalhos: o token vai como parâmetro
+    const token = localStorage.getItem('token');
+    const parametros = token ? `?token=${encodeURIComponent(token)}` : '';
+    const eventos = new EventSource(`${this.baseURL}/api/jobs/${id}/eventos${parametros}`);
+    eventos.addEventListener('progresso', (e) => onEvento(JSON.parse(e.data)));
+    eventos.addEventListener('fim', () => eventos.close());
+    eventos.onerror = (e) => {
+      if (eventos.readyState === EventSource.CLOSED) return;
+      eventos.close();
+      if (onErro) onErro(e);
+    };
+    return () => eventos.close();
+  }
+
   // Dashboard
   async getDashboardResumo() {
     return this.request('/api/dashboard-resumo');
   }
 
-  async getComunicacoes() {
-    return this.request('/api/comunicacoes');
+  // Uma página da listagem, filtrada e ordenada no servidor; parâmetros vazios são omitidos
+  async getComunicacoes(parametros = {}) {
+    const query = new URLSearchParams(
+      Object.entries(parametros).filter(([, valor]) => valor !== undefined && valor !== null && valor !== '')
+    );
+    return this.request(`/api/comunicacoes?${query}`);
   }
 
   async getComunicacaoDetalhe(id) {
     return this.request(`/api/comunicacao/${id}`);
   }
 
+  // Grafo de contrapartes
+  async getVizinhos(documento, direcao = 'todas') {
+    return this.request(`/api/grafo/vizinhos/${encodeURIComponent(documento)}?direcao=${direcao}`);
+  }
+
+  async expandirGrafo(documento, saltos = 2) {
+    return this.request(`/api/grafo/expandir/${encodeURIComponent(documento)}?saltos=${saltos}`);
+  }
+
+  async getCaminho(origem, destino, direcionado = false) {
+    const params = new URLSearchParams({ origem, destino, direcionado });
+    return this.request(`/api/grafo/caminho?${params}`);
+  }
+
+  // Índice de pessoas entre RIFs
+  async getEntidade(documento) {
+    return this.request(`/api/entidades/${encodeURIComponent(documento)}`);
+  }
+
+  async consultarEntidades(documentos) {
+    return this.request('/api/entidades/consulta', {
+      method: 'POST',
+      body: JSON.stringify({ documentos }),
+    });
+  }
+
+  // Workspaces: vários RIFs acumulados sob um nome
+  async getWorkspaces() {
+    return this.request('/api/workspaces');
+  }
+
+  async ativarWorkspace(nome) {
+    return this.request(`/api/workspaces/${encodeURIComponent(nome)}/ativar`, { method: 'POST' });
+  }
+
+  async removerWorkspace(nome) {
+    return this.request(`/api/workspaces/${encodeURIComponent(nome)}`, { method: 'DELETE' });
+  }
+
   // Parsing
   async parseInformacoes(banco, texto) {
     return this.request(`/api/parse/${banco}`, {